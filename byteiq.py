@@ -4,9 +4,7 @@
 ByteIQ - 主程序（清理版）
 """
 
-import os
 import sys
-import json
 
 from colorama import Fore, Style, init
 
@@ -26,27 +24,7 @@ def handle_mode_switch_command(user_input):
     return False
 
 # ========== 配置管理 ==========
-CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".byteiq_config.json")
-
-def load_config():
-    """加载配置文件"""
-    if not os.path.exists(CONFIG_PATH):
-        return {}
-
-    try:
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {}
-
-def save_config(config):
-    """保存配置文件"""
-    try:
-        with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
-        return True
-    except:
-        return False
+from src.config import config_store, load_config, save_config
 
 # ========== 设置功能 ==========
 def set_language_interactive():
@@ -113,211 +91,21 @@ def show_settings():
 
 # ========== AI功能 ==========
 # AI模块延迟导入，提升启动速度
-# 移除全局AI客户端导入，改为延迟加载
 
 def process_ai_conversation(user_input):
-    """处理AI对话"""
-    # 导入theme_manager
-    from src.theme import theme_manager
-    
-    # 检查是否配置了API密钥
-    config = load_config()
-    if not config.get('api_key'):
-        print("错误：请先设置API密钥。使用 /s 命令进入设置。")
-        return
-    
-    try:
-        # 自动创建TODO任务 - 已禁用
-        # try:
-        #     from src.auto_todo import auto_todo_manager
-        #     task_id = auto_todo_manager.create_todo_from_request(user_input)
-        #     if task_id:
-        #         print(f"📝 已自动创建任务: {auto_todo_manager.active_tasks[task_id]['title']}")
-        # except Exception as e:
-        #     # 忽略自动TODO创建过程中的任何错误，不显示错误信息
-        #     pass
-        
-        # 使用延迟加载器获取AI客户端
-        from src.lazy_loader import lazy_loader
-        ai_client = lazy_loader.get_ai_client()
-        if ai_client:
-            ai_response = ai_client.send_message(user_input)
-        else:
-            # 回退到直接导入
-            from src.ai_client import ai_client
-            ai_response = ai_client.send_message(user_input)
-
-        # 检查是否处于HACPP模式
-        from src.modes import hacpp_mode
-        from src.hacpp_client import hacpp_client
-
-        if hacpp_mode.is_hacpp_active():
-            print(f"\n{theme_manager.format_tool_header('HACPP', '模式激活 - 双AI协作处理')}")
-            hacpp_client.process_hacpp_request(user_input)
-            return
-
-        # 使用延迟加载器获取AI工具处理器
-        ai_tool_processor = lazy_loader.get_ai_tools()
-        if not ai_tool_processor:
-            # 回退到直接导入
-            from src.ai_tools import ai_tool_processor
-        
-        # 使用延迟加载器获取token动画器
-        token_animator = lazy_loader.get_token_animator()
-        if not token_animator:
-            # 回退到直接导入
-            from src.token_animator import token_animator
-        
-        # 重置中断标志并启动ESC监控
-        from src.keyboard_handler import reset_interrupt_flag, is_task_interrupted, start_task_monitoring, stop_task_monitoring, interrupt_current_task, show_esc_hint
-        reset_interrupt_flag()
-        
-        # 启动ESC键监控
-        start_task_monitoring(interrupt_current_task)
-        show_esc_hint()
-
-        # 开始上传动画
-        token_animator.start_upload_animation(user_input)
-        
-        # 等待上传动画完成后再显示检查状态
-        token_animator.wait_upload_complete()
-        print(f"{Fore.YELLOW}● 检查中...{Style.RESET_ALL}")
-        
-        # 发送消息给AI（已集成思考动画和ESC监控）
-        ai_response = ai_client.send_message(user_input)
-
-        # 检查是否在发送阶段被中断
-        if is_task_interrupted():
-            print(f"\n  • 任务已被用户中断")
-            token_animator.cleanup()
-            return
-
-        # 开始下载动画
-        if ai_response:
-            token_animator.start_download_animation(ai_response)
-            token_animator.wait_download_complete()
-
-        # 检查是否启用了原始输出模式
-        from src.debug_config import is_raw_output_enabled
-        if is_raw_output_enabled():
-            print(f"\n{ai_response}")
-            token_animator.cleanup()
-            return
-
-        # 处理AI响应和工具调用（添加循环计数器和重复检测）
-        max_iterations = 100  # 🚨 最大迭代次数提升到100次
-        iteration_count = 0
-        recent_operations = []  # 记录最近的操作，用于检测重复
-
-        while True:
-            # 检查是否被中断
-            if is_task_interrupted():
-                print(f"\n  • 任务处理已被用户中断")
-                break
-
-            iteration_count += 1
-            if iteration_count >= max_iterations:
-                print(f"\n{Fore.YELLOW}⚠️ 现在已经迭代{max_iterations}次，请确认后继续{Style.RESET_ALL}")
-                print(f"{Fore.CYAN}输入 'y' 继续处理，或按 Enter 停止:{Style.RESET_ALL} ", end="", flush=True)
-                
-                try:
-                    user_choice = input().strip().lower()
-                    if user_choice == 'y':
-                        print(f"{Fore.GREEN}继续处理...{Style.RESET_ALL}")
-                        max_iterations += 50  # 每次确认后再增加50次
-                    else:
-                        print(f"\n  • 用户选择停止处理")
-                        break
-                except (EOFError, KeyboardInterrupt):
-                    print(f"\n  • 用户中断，停止处理")
-                    break
-
-            result = ai_tool_processor.process_response(ai_response)
-
-            # 检测重复操作
-            current_operation = result['display_text'].strip()
-            if current_operation:
-                recent_operations.append(current_operation)
-                # 只保留最近5次操作
-                if len(recent_operations) > 5:
-                    recent_operations.pop(0)
-
-                # 检查是否有重复操作（最近3次都是相同操作）
-                if len(recent_operations) >= 3 and len(set(recent_operations[-3:])) == 1:
-                    print(f"\n  • 检测到重复操作，停止处理避免无限循环")
-                    break
-
-            # 显示AI的意图（过滤XML）
-            if result['display_text'].strip():
-                print(f"\n{theme_manager.format_tool_header('AI', result['display_text'])}")
-
-            # 工具调用结果已在工具输出中显示，这里不再重复显示
-
-            # 简化停止条件检查 - 只有should_continue=False才能停止
-            if not result['should_continue']:
-                print(f"\n  • 任务处理完成")
-                break
-
-            # 如果需要继续，继续对话（包括工具执行失败的情况）
-            if result['has_tool']:
-                # 检查是否被中断
-                if is_task_interrupted():
-                    print(f"\n  • 任务处理已被用户中断")
-                    break
-                    
-                # 将工具执行结果发送回AI，包括错误信息
-                ai_response = ai_client.send_message(f"工具执行结果: {result['tool_result']}", include_structure=False)
-                
-                # 为继续的AI响应显示下载动画
-                if ai_response:
-                    token_animator.start_download_animation(ai_response)
-                    token_animator.wait_download_complete()
-
-                # 检查继续处理时是否被中断
-                if is_task_interrupted():
-                    print(f"\n  • 任务处理已被用户中断")
-                    break
-            else:
-                # 没有工具调用的情况，也要检查是否应该继续
-                if result['should_continue']:
-                    # 检查是否被中断
-                    if is_task_interrupted():
-                        print(f"\n  • 任务处理已被用户中断")
-                        break
-                        
-                    # 发送一个继续的提示
-                    ai_response = ai_client.send_message("请继续完成任务。", include_structure=False)
-                    
-                    # 为继续的AI响应显示下载动画
-                    if ai_response:
-                        token_animator.start_download_animation(ai_response)
-                        token_animator.wait_download_complete()
-                    
-                    # 检查继续处理时是否被中断
-                    if is_task_interrupted():
-                        print(f"\n  • 任务处理已被用户中断")
-                        break
-                else:
-                    break
+    """处理AI对话
 
-        # 清理token动画器
-        try:
-            token_animator.cleanup()
-        except:
-            pass
-    
+    对话循环统一在 src/command_processor.py 中实现：在会话事件循环中流式请求、
+    边输出边解析和预取工具，ESC直接取消整个对话任务。
+    """
+    from src.command_processor import process_ai_conversation as run_ai_conversation
+    try:
+        run_ai_conversation(user_input)
     except Exception as e:
         print(f"处理AI对话时出错: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        # 确保停止ESC监控
-        try:
-            from src.keyboard_handler import stop_task_monitoring
-            stop_task_monitoring()
-        except:
-            pass
-    
+
     print()  # 空行分隔
 
 # ========== 命令处理 ==========
@@ -763,40 +551,6 @@ def handle_mcp_command(user_input):
     except Exception as e:
         print(f"  • MCP命令处理失败: {e}")
 
-def auto_start_mcp_servers():
-    """自动启动MCP服务器（延迟加载版本）"""
-    try:
-        from src.lazy_loader import lazy_loader
-        
-        # 使用延迟加载器获取MCP组件
-        mcp_config = lazy_loader.get_mcp_config()
-        mcp_client = lazy_loader.get_mcp_client()
-        
-        if not mcp_config or not mcp_client:
-            # 回退到直接导入
-            from src.mcp_config import mcp_config
-            from src.mcp_client import mcp_client
-        
-        # 获取配置的服务器列表
-        servers = mcp_config.get_configured_servers()
-        
-        if not servers:
-            print(f"  • 没有配置MCP服务器")
-            return
-        
-        print(f"\n{theme_manager.format_tool_header('MCP', '启动服务器')}")
-        
-        # 启动所有配置的服务器
-        for server_name in servers:
-            try:
-                mcp_client.start_server(server_name)
-                print(f"  • {server_name} 服务器已启动")
-            except Exception as e:
-                print(f"  • {server_name} 启动失败: {e}")
-                
-    except Exception as e:
-        print(f"  • MCP服务器启动失败: {e}")
-
 def auto_stop_mcp_servers():
     """自动停止MCP服务器（延迟加载版本）"""
     try:
@@ -811,22 +565,21 @@ def auto_stop_mcp_servers():
             from src.mcp_config import mcp_config
             from src.mcp_client import mcp_client
         
-        # 获取配置的服务器列表
-        servers = mcp_config.get_configured_servers()
+        from src.async_runtime import async_runtime
+        from src.theme import theme_manager
         
-        if not servers:
-            print(f"  • 没有配置MCP服务器")
+        running = [name for name, status in mcp_client.get_server_status().items()
+                   if status in ("运行中", "启动中")]
+        if not running:
+            print(f"  • 没有运行中的MCP服务器")
             return
         
         print(f"\n{theme_manager.format_tool_header('MCP', '停止服务器')}")
         
-        # 停止所有配置的服务器
-        for server_name in servers:
-            try:
-                mcp_client.stop_server(server_name)
-                print(f"  • {server_name} 服务器已停止")
-            except Exception as e:
-                print(f"  • {server_name} 停止失败: {e}")
+        # 并发停止所有服务器
+        async_runtime.run(mcp_client.stop_all_servers())
+        for server_name in running:
+            print(f"  • {server_name} 服务器已停止")
                 
     except Exception as e:
         print(f"  • MCP服务器停止失败: {e}")
@@ -889,7 +642,8 @@ def _start_mcp_servers():
     """启动MCP服务器"""
     from src.mcp_config import mcp_config
     from src.mcp_client import mcp_client
-    import asyncio
+    from src.async_runtime import async_runtime
+    from src.theme import theme_manager
 
     if not mcp_config.is_enabled():
         print(f"  • MCP功能未启用")
@@ -902,50 +656,25 @@ def _start_mcp_servers():
 
     print(f"\n{theme_manager.format_tool_header('MCP', '启动服务器')}")
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    # 添加服务器到MCP客户端，并发启动（使用会话事件循环）
+    server_names = mcp_client.add_servers_from_config(mcp_config, enabled_servers)
+    results = async_runtime.run(mcp_client.start_servers(server_names))
 
-    try:
-        for server_name in enabled_servers:
-            server_config = mcp_config.get_server_config(server_name)
-            if server_config:
-                print(f"启动服务器: {server_name}")
-
-                # 添加服务器到MCP客户端
-                mcp_client.add_server(
-                    server_name,
-                    server_config.get("command", []),
-                    server_config.get("args", []),
-                    server_config.get("env", {}),
-                    server_config.get("type", "process"),
-                    server_config.get("url")
-                )
-
-                # 启动服务器
-                success = loop.run_until_complete(mcp_client.start_server(server_name))
-
-                if success:
-                    print(f"  • {server_name} 启动成功")
-                else:
-                    print(f"  • {server_name} 启动失败")
-    finally:
-        loop.close()
+    for server_name, success in results.items():
+        if success:
+            print(f"  • {server_name} 启动成功")
+        else:
+            print(f"  • {server_name} 启动失败")
 
 def _stop_mcp_servers():
     """停止MCP服务器"""
     from src.mcp_client import mcp_client
-    import asyncio
+    from src.async_runtime import async_runtime
 
     print(f"\n{Fore.CYAN}停止MCP服务器{Style.RESET_ALL}")
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    try:
-        loop.run_until_complete(mcp_client.stop_all_servers())
-        print(f"  • 所有MCP服务器已停止")
-    finally:
-        loop.close()
+    async_runtime.run(mcp_client.stop_all_servers())
+    print(f"  • 所有MCP服务器已停止")
 
 def _show_mcp_server_status():
     """显示MCP服务器状态"""
@@ -1057,40 +786,22 @@ def auto_start_mcp_servers():
 
         # 只有在确实需要时才导入重量级模块
         from src.mcp_client import mcp_client
-        import asyncio
+        from src.async_runtime import async_runtime
+        from src.theme import theme_manager
 
         print(f"\n{theme_manager.format_tool_header('MCP', '启动服务器')}")
 
-        # 创建异步事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # 添加服务器到MCP客户端，并发启动（使用会话事件循环）
+        server_names = mcp_client.add_servers_from_config(mcp_config, enabled_servers)
+        results = async_runtime.run(mcp_client.start_servers(server_names))
+        success_count = sum(1 for success in results.values() if success)
+        for server_name, success in results.items():
+            if not success:
+                print(f"  • {server_name} 启动失败")
 
-        try:
-            success_count = 0
-            for server_name in enabled_servers:
-                server_config = mcp_config.get_server_config(server_name)
-                if server_config:
-                    # 添加服务器到MCP客户端
-                    mcp_client.add_server(
-                        server_name,
-                        server_config.get("command", []),
-                        server_config.get("args", []),
-                        server_config.get("env", {}),
-                        server_config.get("type", "process"),
-                        server_config.get("url")
-                    )
-
-                    # 启动服务器
-                    success = loop.run_until_complete(mcp_client.start_server(server_name))
-                    if success:
-                        success_count += 1
-
-            if success_count > 0:
-                tools_count = len(mcp_client.get_available_tools())
-                print(f"  • MCP服务器启动完成，可用工具: {tools_count} 个")
-
-        finally:
-            loop.close()
+        if success_count > 0:
+            tools_count = len(mcp_client.get_available_tools())
+            print(f"  • MCP服务器启动完成，可用工具: {tools_count} 个")
 
     except Exception as e:
         print(f"  • MCP服务器启动失败: {e}")
@@ -1099,11 +810,8 @@ def initialize_theme():
     """初始化主题设置"""
     try:
         from src.theme import theme_manager
-        from src.config import load_config, save_config
-
         # 获取主题设置
-        cfg = load_config()
-        theme = cfg.get("theme", "default")
+        theme = config_store.get_str("theme", "default")
 
         # 设置主题
         theme_manager.set_theme(theme)
@@ -1129,8 +837,7 @@ def main():
         print_welcome_screen()
         print()
 
-        # 延迟启动MCP服务器，避免阻塞启动
-        # auto_start_mcp_servers()  # 移至首次使用时启动
+        # MCP服务器推迟到首次使用MCP工具时在后台启动（见 MCPClient.start_configured_servers）
 
         # 主循环
         while True:
@@ -17,7 +17,7 @@ def start_simple_gui():
     """启动简化版GUI"""
     try:
         from flask import Flask, render_template, request, jsonify
-        from src.config import load_config, save_config
+        from src.config import config_store
         from src.todo_manager import todo_manager
         from src.commands import get_available_commands, get_command_descriptions
         
@@ -29,7 +29,7 @@ def start_simple_gui():
         
         @app.route('/api/config', methods=['GET'])
         def get_config():
-            config = load_config()
+            config = config_store.snapshot()
             return jsonify({
                 'language': config.get('language', 'zh-CN'),
                 'model': config.get('model', 'gpt-3.5-turbo'),
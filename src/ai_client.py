@@ -4,6 +4,7 @@ AI客户端模块 - 处理与AI API的交互
 
 import os
 import json
+import asyncio
 import requests
 import threading
 import time
@@ -17,8 +18,14 @@ from .keyboard_handler import (
     interrupt_current_task
 )
 from .output_monitor import start_output_monitoring, stop_output_monitoring, enable_print_monitoring
-from .config import load_config, DEFAULT_API_URL
+from .config import config_store, DEFAULT_API_URL
+from .prompt_cache import prompt_cache
+from .history_store import HistoryBuffer
+from .sse_decoder import SSEDecoder, StreamPrinter, event_content, stream_fps
+from .http_transport import http_transport, DRAIN_MAX_BYTES
+from .async_runtime import async_runtime
 from .debug_config import is_raw_output_enabled
+from .tool_parser import StreamingToolParser
 from colorama import Fore, Style
 
 def format_ai_response(raw_response, api_result=None):
@@ -42,7 +49,6 @@ def format_ai_response(raw_response, api_result=None):
         if api_result:
             output_lines.append("\n📡 完整API响应:")
             output_lines.append("-" * 40)
-            import json
             try:
                 formatted_json = json.dumps(api_result, indent=2, ensure_ascii=False)
                 output_lines.append(formatted_json)
@@ -139,13 +145,15 @@ class AIClient:
     """AI客户端类，负责与AI API交互"""
     
     def __init__(self):
-        self.config = load_config()
+        self.config = config_store.snapshot()
         self.api_url = DEFAULT_API_URL
-        self.conversation_history = []
+        self.conversation_history = HistoryBuffer()
         self.max_history_length = 50
         self.context_messages = []  # 存储上下文消息
         self.loading_thread = None
         self.network_manager = AsyncNetworkManager()
+        # 最近一次流式响应的工具调用解析结果，供process_response直接复用
+        self.last_tool_parser = None
         
         # 集成智能上下文管理器
         from .context_manager import context_manager
@@ -155,26 +163,19 @@ class AIClient:
         from .agent_enhancer import agent_enhancer
         self.agent_enhancer = agent_enhancer
 
-    def get_system_prompt(self):
-        """获取系统提示词"""
-        # 检查当前模式和提示词强度
-        from .modes import mode_manager
-        from .config import load_config
-        from .byteiq_config import byteiq_config_manager
+    def get_system_prompt(self, thinking_mode="normal"):
+        """获取系统提示词
 
-        current_mode = mode_manager.get_current_mode()
-        config = load_config()
-        prompt_strength = config.get('prompt_strength', 'claude')  # 默认使用claude强度
+        按当前模式、提示词强度、BYTEIQ.md版本和思考模式缓存，设置不变时每轮返回相同的提示词。
+        """
+        from .prompt_builder import system_prompt_builder
+        return system_prompt_builder.build(thinking_mode)
 
-        # 导入提示词模板系统
-        from .prompt_templates import get_prompt_template
-
-        base_prompt = get_prompt_template(current_mode, prompt_strength)
-        
-        # 使用BYTEIQ.md配置增强提示词
-        enhanced_prompt = byteiq_config_manager.get_enhanced_system_prompt(base_prompt)
-        
-        return enhanced_prompt
+    def _record_exchange(self, user_input, ai_response):
+        """把一轮对话追加到历史，超过上限时在检查点一次性裁剪，保持请求前缀稳定"""
+        self.conversation_history.append("user", user_input)
+        self.conversation_history.append("assistant", ai_response)
+        prompt_cache.trim_history(self.conversation_history)
 
 
 
@@ -208,22 +209,68 @@ class AIClient:
     # 旧的加载动画已移除，使用新的思考动画系统
 
     def _make_network_request(self, data, headers):
-        """执行网络请求（在子线程中运行）"""
+        """执行网络请求（在子线程中运行）
+
+        失败时返回 {"error", "status_code"}；服务端给出 Retry-After 时附带 retry_after（秒）。
+        status_code 为None表示网络异常；重试也无法解决的错误附带 "retryable": False。
+        """
         try:
-            response = requests.post(self.api_url, json=data, headers=headers, timeout=180)
+            response = http_transport.post(self.api_url, json=data, headers=headers, timeout=180)
             if response.status_code == 401:
                 return {"error": "API密钥无效或未授权。请检查您的密钥。", "status_code": 401}
             response.raise_for_status()
-            return response.json()
+            try:
+                result = response.json()
+            except ValueError:
+                return {"error": f"API响应不是有效的JSON: {response.text[:200]}",
+                        "status_code": response.status_code, "retryable": False}
+            if isinstance(result, dict):
+                prompt_cache.record_usage(result.get("usage"))
+            return result
         except requests.exceptions.HTTPError as e:
-            return {"error": f"HTTP 错误: {e.response.status_code} - {e.response.text}"}
+            error = {"error": f"HTTP 错误: {e.response.status_code} - {e.response.text}",
+                     "status_code": e.response.status_code}
+            retry_after = getattr(e.response, "headers", {}).get("Retry-After")
+            try:
+                error["retry_after"] = float(retry_after)
+            except (TypeError, ValueError):
+                pass
+            return error
         except Exception as e:
             return {"error": str(e)}
 
+    def chat_completion(self, messages, model_override=None, temperature=0.3, max_tokens=12000):
+        """发送一次独立的非流式请求，不读写对话历史、不执行工具
+
+        成功时返回 {"content": 回复文本}，失败时返回 _make_network_request 的错误字典。
+        供项目文档分析等需要并发调用模型的场景使用（线程安全）。
+        """
+        config = config_store.snapshot()
+        if not config.get('api_key'):
+            return {"error": "请先设置API密钥", "status_code": None, "retryable": False}
+
+        data = {
+            "model": model_override or config.get('model', 'gpt-3.5-turbo'),
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        headers = {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+        result = self._make_network_request(data, headers)
+        if isinstance(result, dict) and "error" in result:
+            return result
+        try:
+            return {"content": result["choices"][0]["message"]["content"] or ""}
+        except (KeyError, IndexError, TypeError):
+            return {"error": f"API响应格式错误: {str(result)[:200]}", "status_code": None, "retryable": False}
+
     def send_message_async(self, user_input, include_structure=True, model_override=None):
         """异步发送消息，返回Future对象"""
-        # 每次都重新加载配置以获取最新设置
-        config = load_config()
+        # 配置文件变化时自动重新加载
+        config = config_store.snapshot()
         self.config = config  # 更新实例配置
 
         if not config.get('api_key'):
@@ -235,11 +282,11 @@ class AIClient:
         # 构建请求数据
         data = {
             "model": model_to_use,
-            "messages": [
+            "messages": prompt_cache.apply_breakpoints([
                 {"role": "system", "content": self.get_system_prompt()},
                 *self.conversation_history,
                 {"role": "user", "content": user_input}
-            ],
+            ], model_to_use),
             "temperature": 0.7,
             "max_tokens": 12000
         }
@@ -252,10 +299,25 @@ class AIClient:
         # 提交异步请求
         return self.network_manager.submit_request(self._make_network_request, data, headers)
 
-    def send_message_streaming(self, user_input, include_structure=True, model_override=None, is_continuation=False):
-        """流式发送消息给AI，实时显示响应"""
-        # 每次都重新加载配置以获取最新设置
-        config = load_config()
+    def send_message_streaming(self, user_input, include_structure=True, model_override=None, is_continuation=False, on_tool_call=None):
+        """流式发送消息给AI，实时显示响应（同步接口）
+
+        on_tool_call 为可选回调，流式输出中每解析出一个完整的工具调用就调用一次，
+        用于在响应结束前提前执行只读工具。
+        """
+        try:
+            return async_runtime.run(self.stream_message(
+                user_input, include_structure, model_override, is_continuation, on_tool_call))
+        except asyncio.CancelledError:
+            return "任务已被用户中断"
+
+    async def stream_message(self, user_input, include_structure=True, model_override=None, is_continuation=False, on_tool_call=None):
+        """流式发送消息给AI的协程版本
+
+        用户中断时任务被取消，关闭响应后向上抛出 asyncio.CancelledError。
+        """
+        # 配置文件变化时自动重新加载
+        config = config_store.snapshot()
         self.config = config  # 更新实例配置
 
         if not config.get('api_key'):
@@ -265,6 +327,7 @@ class AIClient:
         model_to_use = model_override if model_override else config.get('model', 'gpt-3.5-turbo')
 
         # 构建消息列表，避免系统提示词重复
+        # 系统提示词、上下文消息和历史只追加不变动，构成稳定的缓存前缀
         messages = [{"role": "system", "content": self.get_system_prompt()}]
         
         # 添加上下文消息
@@ -282,10 +345,11 @@ class AIClient:
         # 构建请求数据
         data = {
             "model": model_to_use,
-            "messages": messages,
+            "messages": prompt_cache.apply_breakpoints(messages, model_to_use),
             "temperature": 0.7,
             "max_tokens": 12000,
-            "stream": True  # 启用流式输出
+            "stream": True,  # 启用流式输出
+            **prompt_cache.request_options()
         }
 
         headers = {
@@ -293,14 +357,17 @@ class AIClient:
             "Content-Type": "application/json"
         }
 
-        # 启动任务监控
-        start_task_monitoring(interrupt_current_task)
+        # 启动任务监控；对话循环已在监控时由它负责停止，覆盖工具执行阶段
+        owns_monitoring = start_task_monitoring(interrupt_current_task)
+        self.last_tool_parser = None
+        response = None
 
         try:
             print(f"{Fore.GREEN}AI: {Style.RESET_ALL}", end="", flush=True)
             
             # 发送流式请求
-            response = requests.post(self.api_url, json=data, headers=headers, stream=True, timeout=180)
+            response = await async_runtime.to_thread(
+                http_transport.post, self.api_url, json=data, headers=headers, stream=True, timeout=180)
             
             if response.status_code == 401:
                 return f"认证失败: API密钥无效或未授权。请检查您的密钥。"
@@ -308,47 +375,59 @@ class AIClient:
             if response.status_code != 200:
                 return f"API请求失败: {response.status_code} - {response.text}"
 
-            full_response = ""
-            
-            # 逐行处理流式响应
-            for line in response.iter_lines():
-                # 检查用户中断
-                if is_task_interrupted():
-                    reset_interrupt_flag()
-                    print(f"\n{Fore.YELLOW}[任务已被用户中断]{Style.RESET_ALL}")
-                    return "任务已被用户中断"
-                
-                if line:
-                    line_str = line.decode('utf-8')
-                    if line_str.startswith('data: '):
-                        data_str = line_str[6:]  # 移除 'data: ' 前缀
-                        
-                        if data_str.strip() == '[DONE]':
-                            break
-                        
-                        try:
-                            chunk_data = json.loads(data_str)
-                            if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                delta = chunk_data['choices'][0].get('delta', {})
-                                if 'content' in delta:
-                                    content = delta['content']
-                                    print(content, end="", flush=True)
-                                    full_response += content
-                        except json.JSONDecodeError:
-                            continue
+            response_parts = []
+            # 边接收边解析工具调用，流结束时解析也随之完成
+            tool_parser = StreamingToolParser()
+            decoder = SSEDecoder()
+            printer = StreamPrinter(stream_fps())
             
+            # 按网络数据块处理流式响应：一个数据块中的所有增量合并后再输出和解析
+            chunk_iter = self._aiter_chunks(response)
+            try:
+                async for chunk in chunk_iter:
+                    deltas = []
+                    for event in decoder.feed(chunk):
+                        if event.get('usage'):
+                            prompt_cache.record_usage(event['usage'])
+                        content = event_content(event)
+                        if content:
+                            deltas.append(content)
+                    if deltas:
+                        content = "".join(deltas)
+                        printer.write(content)
+                        response_parts.append(content)
+                        completed_calls = tool_parser.feed(content)
+                        if on_tool_call:
+                            for tool_call in completed_calls:
+                                on_tool_call(tool_call)
+                    if decoder.done:
+                        break
+                for event in decoder.close():
+                    content = event_content(event)
+                    if content:
+                        printer.write(content)
+                        response_parts.append(content)
+                        tool_parser.feed(content)
+            finally:
+                printer.flush()
+            if decoder.done:
+                # 读完 [DONE] 之后剩余的结尾数据，连接才会回到连接池被下次请求复用
+                await self._drain_chunks(chunk_iter)
+
+            full_response = "".join(response_parts)
             print()  # 换行
+            tool_parser.close()
+            self.last_tool_parser = tool_parser
             
             # 添加到对话历史
-            self.conversation_history.append({"role": "user", "content": user_input})
-            self.conversation_history.append({"role": "assistant", "content": full_response})
-
-            # 限制历史长度，但保留更多上下文（从10增加到20）
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
+            self._record_exchange(user_input, full_response)
 
             return full_response
 
+        except asyncio.CancelledError:
+            # 中断标志由对话入口重置，这里保留，供仍在线程中执行的工具检查
+            print(f"\n{Fore.YELLOW}[任务已被用户中断]{Style.RESET_ALL}")
+            raise
         except requests.exceptions.Timeout:
             return "请求超时，请检查网络连接或稍后重试"
         except requests.exceptions.RequestException as e:
@@ -356,11 +435,56 @@ class AIClient:
         except Exception as e:
             return f"发生错误: {str(e)}"
         finally:
-            # 确保停止监控
+            # 关闭响应：提前结束或取消时读取线程随之退出，未读完的连接被丢弃
+            if response is not None:
+                response.close()
+            # 确保停止本次启动的监控
+            if owns_monitoring:
+                try:
+                    stop_task_monitoring()
+                except:
+                    pass
+
+    async def _aiter_chunks(self, response):
+        """在后台线程中读取流式响应，按网络数据块交给事件循环
+
+        阻塞的读取不占用事件循环，等待下一块数据时任务可以被立即取消。
+        按数据块而不是按行传递，每次跨线程投递可以携带多个SSE事件。
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        finished = object()
+
+        def reader():
             try:
-                stop_task_monitoring()
-            except:
-                pass
+                for chunk in response.iter_content(chunk_size=None):
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, finished)
+
+        loop.run_in_executor(None, reader)
+        while True:
+            chunk = await chunks.get()
+            if chunk is finished:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    async def _drain_chunks(self, chunk_iter, timeout=1.0):
+        """读完流式响应的剩余数据；超时或剩余数据过多时放弃，关闭响应时连接被丢弃"""
+        async def drain():
+            drained = 0
+            async for chunk in chunk_iter:
+                drained += len(chunk)
+                if drained > DRAIN_MAX_BYTES:
+                    return
+        try:
+            await asyncio.wait_for(drain(), timeout)
+        except (asyncio.TimeoutError, requests.exceptions.RequestException):
+            pass
 
     def send_message_non_blocking(self, user_input, include_structure=True, model_override=None):
         """非阻塞发送消息给AI"""
@@ -406,12 +530,7 @@ class AIClient:
                         ai_response = result["choices"][0]["message"]["content"]
 
                         # 添加到对话历史
-                        self.conversation_history.append({"role": "user", "content": user_input})
-                        self.conversation_history.append({"role": "assistant", "content": ai_response})
-
-                        # 限制历史长度，但保留更多上下文（从10增加到20）
-                        if len(self.conversation_history) > 20:
-                            self.conversation_history = self.conversation_history[-20:]
+                        self._record_exchange(user_input, ai_response)
 
                         # 根据调试配置格式化响应
                         return format_ai_response(ai_response, result)
@@ -435,15 +554,15 @@ class AIClient:
     def send_message(self, user_input, include_structure=True):
         """发送消息给AI（保持向后兼容）"""
         try:
-            # 每次都重新加载配置以获取最新设置
-            config = load_config()
+            # 配置文件变化时自动重新加载
+            config = config_store.snapshot()
             self.config = config  # 更新实例配置
             
             # 分析用户请求并创建执行计划
             analysis = self.agent_enhancer.analyze_user_request(user_input)
             
             # 添加用户消息到上下文管理器
-            self.context_manager.add_message("user", user_input, {"analysis": analysis})
+            self.context_manager.add_message("user", user_input)
             
             # 更新TODO上下文
             self.context_manager.update_todo_context()
@@ -464,10 +583,8 @@ class AIClient:
                 else:
                     user_message += "\n\n当前项目结构：空"
 
-            # 获取系统提示词并根据思考模式增强
-            base_prompt = self.get_system_prompt()
-            thinking_mode = analysis["thinking_mode"]
-            enhanced_prompt = self.agent_enhancer.enhance_prompt_with_thinking(base_prompt, thinking_mode)
+            # 获取根据思考模式增强的系统提示词
+            enhanced_prompt = self.get_system_prompt(analysis["thinking_mode"])
 
             # 使用智能上下文管理器获取消息
             messages = [{"role": "system", "content": enhanced_prompt}]
@@ -479,7 +596,7 @@ class AIClient:
             # 准备请求数据
             data = {
                 "model": config.get("model", "gpt-3.5-turbo"),
-                "messages": messages,
+                "messages": prompt_cache.apply_breakpoints(messages, config.get("model", "gpt-3.5-turbo")),
                 "temperature": 0.7,
                 "max_tokens": 12000
             }
@@ -497,7 +614,7 @@ class AIClient:
 
             try:
                 # 发送请求，增加超时时间
-                response = requests.post(self.api_url, json=data, headers=headers, timeout=180)
+                response = http_transport.post(self.api_url, json=data, headers=headers, timeout=180)
             finally:
                 # 确保无论如何都停止动画和监控
                 stop_thinking()
@@ -513,22 +630,18 @@ class AIClient:
 
             if response.status_code == 200:
                 result = response.json()
+                prompt_cache.record_usage(result.get("usage"))
                 ai_response = result['choices'][0]['message']['content']
 
                 # 添加AI响应到上下文管理器
                 self.context_manager.add_message("assistant", ai_response)
 
                 # 保持向后兼容的历史记录（但现在主要由context_manager管理）
-                self.conversation_history.append({"role": "user", "content": user_input})
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
+                self._record_exchange(user_input, ai_response)
                 
                 # 自动保存上下文
                 self.context_manager.save_context()
 
-                # 限制历史长度，但保留更多上下文（保持20条消息）
-                if len(self.conversation_history) > 20:
-                    self.conversation_history = self.conversation_history[-20:]
-
                 # 返回原始响应，由调用者决定如何格式化
                 return ai_response
             else:
@@ -569,16 +682,16 @@ class AIClient:
 
     def clear_history(self):
         """清除对话历史"""
-        self.conversation_history = []
+        self.conversation_history.clear()
 
 
     def get_history(self):
         """获取当前对话历史"""
-        return self.conversation_history
+        return self.conversation_history.messages()
 
     def set_history(self, history):
         """设置新的对话历史"""
-        self.conversation_history = history
+        self.conversation_history.replace(history)
 
 # 全局AI客户端实例
 ai_client = AIClient()
@@ -4,18 +4,26 @@ AI工具系统 - 处理AI的工具调用
 
 import os
 import re
-import subprocess
 import json
 import asyncio
 import difflib
 from colorama import Fore, Style
 from .todo_manager import todo_manager
 from .todo_renderer import get_todo_renderer
-from .modes import mode_manager
 from .mcp_client import mcp_client
 from .mcp_config import mcp_config
 from .thinking_animation import show_dot_cycle_animation
 from .theme import theme_manager
+from .tool_parser import StreamingToolParser
+from .async_runtime import async_runtime
+from .code_index import get_code_index, iter_search_files
+from .symbol_index import get_symbol_index
+from .parallel_scanner import parallel_scanner
+from .line_index import line_index_cache
+from .file_cache import file_cache, split_lines
+from .file_reader import size_aware_reader
+from .command_runner import command_runner
+from .tool_scheduler import tool_execution_engine, tool_call_args
 
 class AIToolProcessor:
     """AI工具处理器"""
@@ -43,11 +51,14 @@ class AIToolProcessor:
             'plan': self.plan,
             'code_search': self.code_search,
             'list_directory': self.list_directory,
+            'find_definition': self.find_definition,
+            'find_references': self.find_references,
+            'list_symbols': self.list_symbols,
             'end_guidance_start_fixing': self.end_guidance_start_fixing
         }
         self.todo_renderer = get_todo_renderer(todo_manager)
 
-    def process_response(self, ai_response):
+    def process_response(self, ai_response, tool_parser=None, prefetcher=None):
         # HACPP State Machine Logic: Check if we are in the researcher phase
         from .modes import hacpp_mode
         if hacpp_mode.is_hacpp_active() and hacpp_mode.phase == "researching":
@@ -59,50 +70,24 @@ class AIToolProcessor:
                 return {'is_handover': True, 'summary': summary}
 
             # If not handing over, process only read-only tools
-            result = self.process_response_for_researcher(ai_response)
+            result = self.process_response_for_researcher(ai_response, tool_parser)
             result['should_continue'] = True # Researcher should always continue until handover
             return result
 
-        """处理AI响应，提取和执行工具调用"""
-        # 查找XML工具调用
-        tool_patterns = {
-            'read_file': r'<read_file><path>(.*?)</path></read_file>',
-            'precise_reading': r'<precise_reading><path>(.*?)</path><start_line>(.*?)</start_line><end_line>(.*?)</end_line></precise_reading>',
-            'write_file': r'<write_file><path>(.*?)</path><content>(.*?)</content></write_file>',
-            'create_file': r'<create_file><path>(.*?)</path><content>(.*?)</content></create_file>',
-            'insert_code': r'<insert_code><path>(.*?)</path><line>(.*?)</line><content>(.*?)</content></insert_code>',
-            'replace_code': r'<replace_code><path>(.*?)</path><start_line>(.*?)</start_line><end_line>(.*?)</end_line><content>(.*?)</content></replace_code>',
-            'execute_command': r'<execute_command><command>(.*?)</command></execute_command>',
-            'add_todo': r'<add_todo><title>(.*?)</title><description>(.*?)</description><priority>(.*?)</priority></add_todo>',
-            'update_todo': r'<update_todo><id>(.*?)</id><status>(.*?)</status>(?:<progress>(.*?)</progress>)?</update_todo>',
-            'show_todos': r'<show_todos></show_todos>',
-            'delete_file': r'<delete_file><path>(.*?)</path></delete_file>',
-            'mcp_call_tool': r'<mcp_call_tool><tool>(.*?)</tool><arguments>(.*?)</arguments></mcp_call_tool>',
-            'mcp_read_resource': r'<mcp_read_resource><uri>(.*?)</uri></mcp_read_resource>',
-            'mcp_list_tools': r'<mcp_list_tools></mcp_list_tools>',
-            'mcp_list_resources': r'<mcp_list_resources></mcp_list_resources>',
-            'mcp_server_status': r'<mcp_server_status></mcp_server_status>',
-            'task_complete': r'<task_complete><summary>(.*?)</summary></task_complete>',
-            'plan': r'<plan><completed_action>(.*?)</completed_action><next_step>(.*?)</next_step><original_request>(.*?)</original_request><completed_tasks>(.*?)</completed_tasks></plan>',
-            'code_search': r'<code_search><keyword>(.*?)</keyword></code_search>'
-        }
-
-        tool_found = False
+        """处理AI响应，提取和执行工具调用
 
+        tool_parser 为流式输出时已喂入完整响应的 StreamingToolParser，
+        提供时直接复用其解析结果，不再重新扫描响应文本。
+        prefetcher 为流式输出期间提前执行只读工具的 ToolPrefetcher，
+        已预执行的工具直接取用结果；其余工具交给 tool_execution_engine 按依赖图调度，
+        需要确认的工具仍按出现顺序逐个确认。
+        """
+        tool_parser = self._get_tool_parser(ai_response, tool_parser)
 
-        # 查找所有工具调用，并按其在文本中的出现顺序排序
-        found_tool_calls = []
-        for tool_name, pattern in tool_patterns.items():
-            for match in re.finditer(pattern, ai_response, re.DOTALL):
-                # 使用 finditer 来获取匹配的位置
-                found_tool_calls.append({
-                    "tool_name": tool_name,
-                    "matches": [match.groups()], # 保持与旧代码一致的格式
-                    "start_pos": match.start()
-                })
+        tool_found = False
 
-        # 按工具在文本中的出现位置排序
-        found_tool_calls.sort(key=lambda x: x['start_pos'])
+        # 解析器按工具在文本中的出现顺序给出所有工具调用
+        found_tool_calls = tool_parser.tool_calls
 
         # 添加大概率判断机制：检查不完整输出
         if not found_tool_calls:
@@ -117,96 +102,87 @@ class AIToolProcessor:
                     'should_continue': True  # 让AI继续修复
                 }
 
-        # 提取一次思考过程
-        thought_process = self._extract_thought_process(ai_response, tool_patterns)
         # 注意：思考过程已在流式输出中显示，这里不再重复输出
 
         all_tool_results = []
         executed_tool_names = []
         display_text = ""
 
-        # 依次处理所有找到的工具
+        # 按依赖图执行所有找到的工具：互不依赖的只读调用并发执行，结果按出现顺序处理
+        task_should_continue = False
+        task_summary = None
+        tool_latency = []
+
+        def on_result(node, total):
+            nonlocal task_should_continue, task_summary
+            tool_name, tool_result, tool_summary = node.tool_name, node.result, node.summary
+
+            # 特殊处理task_complete工具
+            if tool_name == 'task_complete' and isinstance(tool_result, dict):
+                # 将task_complete的返回结果中的should_continue标志传递出去
+                if tool_result.get('should_continue'):
+                    task_should_continue = True
+                    task_summary = tool_result.get('summary', '')
+
+            all_tool_results.append(tool_result)
+            executed_tool_names.append(tool_name)
+            if node.elapsed is not None:
+                tool_latency.append({'tool': tool_name, 'ms': round(node.elapsed * 1000, 1)})
+
+            # 特殊处理需要显示完整输出的工具
+            if tool_name == 'show_todos':
+                # show_todos工具需要显示完整的TODO列表
+                if isinstance(tool_result, str) and tool_result:
+                    print(tool_result)
+            elif tool_name == 'plan':
+                # plan工具需要格式化显示
+                if isinstance(tool_result, str) and '::' in tool_result:
+                    parts = tool_result.split('::')
+                    if len(parts) >= 3:
+                        print(f"\n{Fore.CYAN}📋 执行计划更新:{Style.RESET_ALL}")
+                        for part in parts[1:]:  # 跳过PLAN标记
+                            if part.startswith('COMPLETED:'):
+                                print(f"  ✅ 已完成: {part[10:]}")
+                            elif part.startswith('NEXT:'):
+                                print(f"  ➡️ 下一步: {part[5:]}")
+                            elif part.startswith('ORIGINAL_REQUEST:'):
+                                print(f"  📌 原始需求: {part[17:]}")
+                            elif part.startswith('COMPLETED_TASKS:'):
+                                print(f"  📝 已完成任务: {part[16:]}")
+            elif tool_name == 'task_complete':
+                # task_complete工具需要显示任务完成总结
+                if isinstance(tool_result, dict):
+                    summary = tool_result.get('summary', '')
+                    message = tool_result.get('message', '')
+                    if summary:
+                        print(f"\n{Fore.GREEN}🎉 任务完成总结:{Style.RESET_ALL}")
+                        print(f"{Fore.WHITE}{summary}{Style.RESET_ALL}")
+                    if message:
+                        print(f"\n{Fore.CYAN}📝 {message}{Style.RESET_ALL}")
+                elif isinstance(tool_result, str) and tool_result:
+                    print(f"\n{Fore.GREEN}🎉 任务完成:{Style.RESET_ALL}")
+                    print(f"{Fore.WHITE}{tool_result}{Style.RESET_ALL}")
+            else:
+                # 其他工具打印摘要（如果有）
+                if tool_summary:
+                    print(f"{Fore.CYAN}{tool_summary}{Style.RESET_ALL}")
+
         if found_tool_calls:
             tool_found = True
-            for i, tool_call in enumerate(found_tool_calls):
-                tool_name = tool_call['tool_name']
-                matches = tool_call['matches']
-
-                permission = mode_manager.can_auto_execute(tool_name)
-                tool_result, tool_summary = "", ""
-
-                _, temp_summary = self._execute_tool_with_matches(tool_name, matches, dry_run=True)
-
-                if permission is False:
-                    tool_result = f"当前模式 ({mode_manager.get_current_mode()}) 不允许此操作"
-                    tool_summary = f"操作被禁止: {tool_name}"
-                elif permission == "confirm":
-                    # 在多工具调用中显示工具调用信息
-                    print(f"\n{Fore.YELLOW}AI 想要 ({i+1}/{len(found_tool_calls)}) {temp_summary}{Style.RESET_ALL}")
-
-                    if self._ask_user_confirmation(f"执行操作: {temp_summary}"):
-                        tool_result, tool_summary = self._execute_tool_with_matches(tool_name, matches)
-                    else:
-                        tool_result = "用户取消了操作"
-                        tool_summary = f"用户取消 - {temp_summary}"
-                else:  # Auto-execute
-                    tool_result, tool_summary = self._execute_tool_with_matches(tool_name, matches)
-
-                # 特殊处理task_complete工具
-                if tool_name == 'task_complete':
-                    # 将task_complete的返回结果中的should_continue标志传递出去
-                    tool_result_dict = json.loads(tool_result) if isinstance(tool_result, str) else tool_result
-                    if tool_result_dict.get('should_continue'):
-                        result['should_continue'] = True
-                        result['summary'] = tool_result_dict.get('summary', '')
-
-                all_tool_results.append(tool_result)
-                executed_tool_names.append(tool_name)
-                
-                # 特殊处理需要显示完整输出的工具
-                if tool_name == 'show_todos':
-                    # show_todos工具需要显示完整的TODO列表
-                    if isinstance(tool_result, str) and tool_result:
-                        print(tool_result)
-                elif tool_name == 'plan':
-                    # plan工具需要格式化显示
-                    if isinstance(tool_result, str) and '::' in tool_result:
-                        parts = tool_result.split('::')
-                        if len(parts) >= 3:
-                            print(f"\n{Fore.CYAN}📋 执行计划更新:{Style.RESET_ALL}")
-                            for part in parts[1:]:  # 跳过PLAN标记
-                                if part.startswith('COMPLETED:'):
-                                    print(f"  ✅ 已完成: {part[10:]}")
-                                elif part.startswith('NEXT:'):
-                                    print(f"  ➡️ 下一步: {part[5:]}")
-                                elif part.startswith('ORIGINAL_REQUEST:'):
-                                    print(f"  📌 原始需求: {part[17:]}")
-                                elif part.startswith('COMPLETED_TASKS:'):
-                                    print(f"  📝 已完成任务: {part[16:]}")
-                elif tool_name == 'task_complete':
-                    # task_complete工具需要显示任务完成总结
-                    if isinstance(tool_result, dict):
-                        summary = tool_result.get('summary', '')
-                        message = tool_result.get('message', '')
-                        if summary:
-                            print(f"\n{Fore.GREEN}🎉 任务完成总结:{Style.RESET_ALL}")
-                            print(f"{Fore.WHITE}{summary}{Style.RESET_ALL}")
-                        if message:
-                            print(f"\n{Fore.CYAN}📝 {message}{Style.RESET_ALL}")
-                    elif isinstance(tool_result, str) and tool_result:
-                        print(f"\n{Fore.GREEN}🎉 任务完成:{Style.RESET_ALL}")
-                        print(f"{Fore.WHITE}{tool_result}{Style.RESET_ALL}")
-                else:
-                    # 其他工具打印摘要（如果有）
-                    if tool_summary:
-                        print(f"{Fore.CYAN}{tool_summary}{Style.RESET_ALL}")
+            from .keyboard_handler import is_task_interrupted
+            _, interrupted = tool_execution_engine.run(
+                self, found_tool_calls, prefetcher=prefetcher, on_result=on_result,
+                should_stop=is_task_interrupted)
+            # 对话任务已被取消时不再执行后续工具
+            if interrupted:
+                all_tool_results.append("用户中断了后续工具的执行")
 
         # 处理显示文本
         if not tool_found:
             display_text = self._remove_xml_tags(ai_response)
         else:
             # 提取思考文本但不立即显示，保持正确的显示顺序
-            thought_text = self._extract_thought_process(ai_response, tool_patterns)
+            thought_text = tool_parser.thought_text
             if thought_text.strip():
                 display_text = thought_text.strip()
             else:
@@ -216,8 +192,10 @@ class AIToolProcessor:
         string_results = []
         for result in all_tool_results:
             if isinstance(result, dict):
-                # 如果是字典，转换为字符串
-                if 'message' in result:
+                # 如果是字典，转换为字符串；读取结果带上内容（大文件为大纲或一页）
+                if 'message' in result and 'content' in result:
+                    string_results.append(f"{result['message']}\n{result['content']}")
+                elif 'message' in result:
                     string_results.append(result['message'])
                 elif 'summary' in result:
                     string_results.append(result['summary'])
@@ -241,22 +219,33 @@ class AIToolProcessor:
             if any(keyword in ai_response.lower() for keyword in ['继续', '接下来', '然后', '下一步', 'continue', 'next']):
                 should_continue = True
 
-        return {
+        if task_should_continue:
+            should_continue = True
+
+        response = {
             'has_tool': tool_found,
             'tool_result': final_tool_result,
             'executed_tools': executed_tool_names,
             'display_text': display_text, # display_text 现在主要由打印语句处理
-            'should_continue': should_continue
+            'should_continue': should_continue,
+            'tool_latency': tool_latency
         }
+        if task_summary is not None:
+            response['summary'] = task_summary
+        return response
+
 
 
+    def _get_tool_parser(self, ai_response, tool_parser=None, tool_names=None):
+        """复用流式阶段的解析结果；不可用时对完整响应做一次线性解析"""
+        if (tool_parser is not None and tool_parser.is_closed
+                and tool_parser.source_length == len(ai_response)):
+            return tool_parser
+        return StreamingToolParser.parse(ai_response, tool_names)
 
-    def _extract_thought_process(self, text, tool_patterns):
+    def _extract_thought_process(self, text, tool_parser=None):
         """Removes all tool call XML blocks to isolate the AI's reasoning."""
-        processed_text = text
-        for pattern in tool_patterns.values():
-            processed_text = re.sub(pattern, '', processed_text, flags=re.DOTALL)
-        return processed_text.strip()
+        return self._get_tool_parser(text, tool_parser).thought_text
 
     def _check_incomplete_tool_call(self, text):
         """检查不完整的工具调用"""
@@ -298,42 +287,29 @@ class AIToolProcessor:
         clean_text = re.sub(r'<[^>]+>', '', text)
         return clean_text.strip()
 
-    def process_response_for_researcher(self, ai_response):
+    def process_response_for_researcher(self, ai_response, tool_parser=None):
         """便宜AI阶段的工具处理器，支持读取文件和执行命令"""
-        tool_patterns = {
-            'read_file': r'<read_file><path>(.*?)</path></read_file>',
-            'execute_command': r'<execute_command><command>(.*?)</command></execute_command>',
-        }
-
-        # 查找所有工具调用，并按其在文本中的出现顺序排序
-        found_tool_calls = []
-        for tool_name, pattern in tool_patterns.items():
-            for match in re.finditer(pattern, ai_response, re.DOTALL):
-                found_tool_calls.append({
-                    "tool_name": tool_name,
-                    "matches": [match.groups()],
-                    "start_pos": match.start()
-                })
+        researcher_tools = ('read_file', 'execute_command')
+        tool_parser = self._get_tool_parser(ai_response, tool_parser, researcher_tools)
 
-        # 按工具在文本中的出现位置排序
-        found_tool_calls.sort(key=lambda x: x['start_pos'])
+        # 解析结果已按出现顺序排列，只保留研究员可用的工具
+        found_tool_calls = [call for call in tool_parser.tool_calls
+                            if call['tool_name'] in researcher_tools]
 
         all_tool_results = []
         executed_tool_names = []
         tool_found = len(found_tool_calls) > 0
 
-        # 依次处理所有找到的工具
-        for tool_call in found_tool_calls:
-            tool_name = tool_call['tool_name']
-            matches = tool_call['matches']
-            
-            # 便宜AI的工具总是自动执行
-            if tool_name in self.tools:
-                tool_result, tool_summary = self._execute_tool_with_matches(tool_name, matches)
-                # 确保tool_result是字符串
-                if tool_result is not None:
-                    all_tool_results.append(str(tool_result))
-                executed_tool_names.append(tool_name)
+        # 便宜AI的工具总是自动执行；读取互不依赖时并发执行
+        def on_result(node, total):
+            # 确保tool_result是字符串
+            if node.result is not None:
+                all_tool_results.append(str(node.result))
+            executed_tool_names.append(node.tool_name)
+
+        if found_tool_calls:
+            tool_execution_engine.run(self, found_tool_calls, permission=lambda tool_name: True,
+                                      on_result=on_result)
 
         # 合并所有工具结果
         combined_result = '\n'.join(all_tool_results) if all_tool_results else ""
@@ -345,50 +321,58 @@ class AIToolProcessor:
             'display_text': self._remove_xml_tags(ai_response),
         }
 
-    def read_file(self, path):
-        """读取文件工具"""
+    def read_file(self, path, cursor=None):
+        """读取文件工具
+
+        小文件返回全部内容；大文件首次读取返回结构大纲，之后按 cursor 分页读取，
+        读取限制见 file_reader.DEFAULT_READ_LIMITS 和配置项 read_file_limits。
+        """
         try:
             if not os.path.exists(path):
                 return f"错误：文件 {path} 不存在"
 
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                line_count = len(lines)
-                char_count = len(content)
+            result = size_aware_reader.read(path, cursor)
+            if not isinstance(result, dict):
+                return result
 
             # 只显示简化的格式
             print(f"\n{theme_manager.format_tool_header('Read', path)}")
-            print(f"  • {line_count} lines viewed")
-            print(f"  • {char_count} characters")
+            if result['mode'] == 'outline':
+                print(f"  • outline: {result['outline_entries']} symbols, {result['line_count']} lines")
+            elif result['mode'] == 'page':
+                print(f"  • lines {result['start_line']}-{result['end_line']} of {result['line_count']} viewed")
+            else:
+                print(f"  • {result['line_count']} lines viewed")
+            print(f"  • {len(result['content'])} characters")
 
-            # 返回包含实际文件内容的详细结果，供引导者AI使用
-            return {
-                'status': 'success',
-                'message': f"成功读取文件 {path}，内容长度: {len(content)} 字符",
-                'file_path': path,
-                'content': content,
-                'line_count': line_count,
-                'char_count': char_count
-            }
+            # 返回包含实际文件内容的详细结果
+            return result
         except Exception as e:
             return f"读取文件失败: {str(e)}"
 
     def precise_reading(self, path, start_line, end_line):
-        """精确读取文件指定行范围的内容"""
+        """精确读取文件指定行范围的内容，返回 {'message', 'content', ...}"""
         try:
             start_line, end_line = int(start_line), int(end_line)
             if not os.path.exists(path):
                 return f"错误：文件 {path} 不存在"
 
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            # 文件内容已在缓存中时直接切片，否则通过行偏移索引只读取所需范围
+            cached_text = file_cache.peek(path)
+            if cached_text is not None:
+                cached_lines = split_lines(cached_text)
+                if 1 <= start_line <= end_line <= len(cached_lines):
+                    content_slice = cached_lines[start_line - 1:end_line]
+                else:
+                    return f"错误：行号范围 {start_line}-{end_line} 无效，文件共 {len(cached_lines)} 行"
+            else:
+                content_slice = line_index_cache.read_lines(path, start_line, end_line)
 
             # 验证行号
-            if start_line < 1 or end_line > len(lines) or start_line > end_line:
-                return f"错误：行号范围 {start_line}-{end_line} 无效，文件共 {len(lines)} 行"
+            if content_slice is None:
+                line_count = line_index_cache.get(path).line_count
+                return f"错误：行号范围 {start_line}-{end_line} 无效，文件共 {line_count} 行"
 
-            content_slice = lines[start_line - 1:end_line]
             content = "".join(content_slice)
 
             # 渲染标题
@@ -398,7 +382,15 @@ class AIToolProcessor:
             # 打印内容
             print(content.strip())
 
-            return f"成功读取文件 {path} 的第 {start_line}-{end_line} 行，内容长度: {len(content)} 字符"
+            # 与 read_file 相同，返回包含内容的结果，process_response 把内容一并交给AI
+            return {
+                'status': 'success',
+                'file_path': path,
+                'start_line': start_line,
+                'end_line': end_line,
+                'content': content,
+                'message': f"成功读取文件 {path} 的第 {start_line}-{end_line} 行，内容长度: {len(content)} 字符"
+            }
         except Exception as e:
             return f"精确读取文件失败: {str(e)}"
 
@@ -451,9 +443,7 @@ class AIToolProcessor:
             # 读取文件信息用于显示
             line_count = 0
             try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                    line_count = len(lines)
+                line_count = len(split_lines(file_cache.read_text(path)))
             except:
                 line_count = 0
 
@@ -477,13 +467,11 @@ class AIToolProcessor:
             if not os.path.exists(path):
                 return f"错误：文件 {path} 不存在"
 
-            # 读取文件内容
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            line_count = line_index_cache.get(path).line_count
 
             # 验证行号
-            if line_number < 1 or line_number > len(lines) + 1:
-                return f"错误：行号 {line_number} 超出文件范围 (1-{len(lines) + 1})"
+            if line_number < 1 or line_number > line_count + 1:
+                return f"错误：行号 {line_number} 超出文件范围 (1-{line_count + 1})"
 
             # 显示插入预览
             self._show_code_insertion_preview(path, line_number, content)
@@ -493,12 +481,8 @@ class AIToolProcessor:
             # 确保每行都有换行符（除了最后一行如果原本没有）
             insert_lines = [line + '\n' if not line.endswith('\n') else line for line in insert_lines]
 
-            # 在指定位置插入
-            lines[line_number - 1:line_number - 1] = insert_lines
-
-            # 写回文件
-            with open(path, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
+            # 在指定位置插入，只重写插入点之后的内容
+            line_index_cache.splice_lines(path, line_number, line_number - 1, insert_lines)
 
             return f"成功在 {path} 第{line_number}行插入 {len(insert_lines)} 行代码"
         except Exception as e:
@@ -510,16 +494,13 @@ class AIToolProcessor:
             if not os.path.exists(path):
                 return f"错误：文件 {path} 不存在"
 
-            # 读取文件内容
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            # 获取被替换的原始代码（只读取该行范围）
+            original_lines = line_index_cache.read_lines(path, start_line, end_line)
 
             # 验证行号范围
-            if start_line < 1 or end_line < start_line or end_line > len(lines):
-                return f"错误：行号范围 {start_line}-{end_line} 无效，文件共 {len(lines)} 行"
-
-            # 获取被替换的原始代码
-            original_lines = lines[start_line - 1:end_line]
+            if original_lines is None:
+                line_count = line_index_cache.get(path).line_count
+                return f"错误：行号范围 {start_line}-{end_line} 无效，文件共 {line_count} 行"
 
             # 显示替换对比
             self._show_code_replacement_diff(path, [l.rstrip('\n\r') for l in original_lines], content)
@@ -529,12 +510,8 @@ class AIToolProcessor:
             # 确保每行都有换行符（除了最后一行如果原本没有）
             replace_lines = [line + '\n' if not line.endswith('\n') else line for line in replace_lines]
 
-            # 替换指定范围的行（行号从1开始，数组索引从0开始）
-            lines[start_line - 1:end_line] = replace_lines
-
-            # 写回文件
-            with open(path, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
+            # 替换指定范围的行，只重写替换位置之后的内容
+            line_index_cache.splice_lines(path, start_line, end_line, replace_lines)
 
             replaced_count = end_line - start_line + 1
             return f"成功替换 {path} 第{start_line}-{end_line}行 ({replaced_count}行) 为 {len(replace_lines)} 行新代码"
@@ -553,81 +530,30 @@ class AIToolProcessor:
 
             # 导入键盘处理器
             from .keyboard_handler import is_task_interrupted
-            
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='ignore'
-            )
 
-            output_lines = []
             print(f"{Fore.CYAN}实时输出:{Style.RESET_ALL}")
-            
-            # 实时读取输出，支持中断检查
-            import select
-            import sys
-            
-            while True:
-                # 检查是否被ESC键中断
-                if is_task_interrupted():
-                    print(f"\n{Fore.YELLOW}⚠️ 检测到ESC键，正在终止命令...{Style.RESET_ALL}")
-                    process.terminate()
-                    try:
-                        process.wait(timeout=3)
-                    except subprocess.TimeoutExpired:
-                        process.kill()
-                        process.wait()
-                    return "命令被用户中断"
-                
-                # 检查进程是否结束
-                if process.poll() is not None:
-                    break
-                
-                # 读取输出（非阻塞）
-                if sys.platform == "win32":
-                    # Windows下使用不同的方法
-                    import time
-                    time.sleep(0.1)
-                    try:
-                        line = process.stdout.readline()
-                        if line:
-                            clean_line = line.rstrip()
-                            print(f"  {clean_line}", flush=True)
-                            output_lines.append(clean_line)
-                    except:
-                        pass
-                else:
-                    # Unix/Linux下使用select
-                    ready, _, _ = select.select([process.stdout], [], [], 0.1)
-                    if ready:
-                        line = process.stdout.readline()
-                        if line:
-                            clean_line = line.rstrip()
-                            print(f"  {clean_line}", flush=True)
-                            output_lines.append(clean_line)
-
-            # 读取剩余输出
-            remaining_output = process.stdout.read()
-            if remaining_output:
-                for line in remaining_output.split('\n'):
-                    if line.strip():
-                        print(f"  {line}", flush=True)
-                        output_lines.append(line)
-
-            process.stdout.close()
-            return_code = process.returncode
-            full_output = "\n".join(output_lines)
 
+            def show_output(lines):
+                print("".join(f"  {line.rstrip()}\n" for line in lines), end="", flush=True)
+
+            result = command_runner.run(command, on_output=show_output, should_stop=is_task_interrupted)
+
+            if result['interrupted']:
+                print(f"\n{Fore.YELLOW}⚠️ 检测到ESC键，已终止命令{Style.RESET_ALL}")
+                return "命令被用户中断"
+            if result['timed_out']:
+                reason = "无输出" if result['timed_out'] == 'idle' else "运行"
+                print(f"\n{Fore.YELLOW}⚠️ 命令{reason}超过 {result['timeout']} 秒，已终止{Style.RESET_ALL}")
+                return (f"命令执行超时 ({reason}超过 {result['timeout']} 秒)，已终止命令及其子进程:\n"
+                        f"{result['output']}")
+
+            return_code = result['return_code']
             print(f"\n{Fore.CYAN}执行完毕 (返回码: {return_code}){Style.RESET_ALL}")
 
             if return_code == 0:
                 return "命令执行成功"
             else:
-                return f"命令执行失败 (返回码: {return_code}):\n{full_output}"
+                return f"命令执行失败 (返回码: {return_code}):\n{result['output']}"
 
         except Exception as e:
             print(f"\n{theme_manager.format_tool_header('Execute', command)}")
@@ -775,42 +701,71 @@ class AIToolProcessor:
             
         return "::".join(plan_parts)
 
-    def code_search(self, query, path="."):
-        """搜索代码中的特定内容"""
+    def code_search(self, query, path=".", max_results=20):
+        """搜索代码中的特定内容
+
+        先用项目三元组索引筛选出可能包含查询字面量的文件，再由并行扫描引擎对候选文件
+        运行正则，凑够 max_results 条结果后立即停止；搜索路径不在当前项目内时退回逐个遍历。
+        """
         try:
-            import os
             import re
             
             results = []
-            search_pattern = re.compile(query, re.IGNORECASE)
-            
-            for root, dirs, files in os.walk(path):
-                # 跳过常见的忽略目录
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules']]
-                
-                for file in files:
-                    if file.endswith(('.py', '.js', '.html', '.css', '.md', '.txt')):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                if search_pattern.search(content):
-                                    # 找到匹配的行
-                                    lines = content.split('\n')
-                                    for i, line in enumerate(lines, 1):
-                                        if search_pattern.search(line):
-                                            results.append(f"{file_path}:{i}: {line.strip()}")
-                        except Exception:
-                            continue
+            # 提前校验正则，错误直接返回给AI
+            re.compile(query, re.IGNORECASE)
+
+            index = get_code_index()
+            if index.covers(path):
+                candidate_files = index.candidates(query, path)
+            else:
+                candidate_files = iter_search_files(path)
+
+            matches = parallel_scanner.search(query, candidate_files)
+            try:
+                for line in matches:
+                    results.append(line)
+                    if len(results) >= max_results:
+                        break
+            finally:
+                matches.close()
             
             if results:
-                return f"搜索结果 (查询: {query}):\n" + "\n".join(results[:20])  # 限制结果数量
+                return f"搜索结果 (查询: {query}):\n" + "\n".join(results)
             else:
                 return f"未找到匹配 '{query}' 的内容"
                 
         except Exception as e:
             return f"搜索失败: {str(e)}"
 
+    def find_definition(self, symbol, path="."):
+        """通过Python符号索引查找定义（支持 Class.method 形式）"""
+        try:
+            index = get_symbol_index()
+            if not index.covers(path):
+                return f"错误：{path} 不在当前项目内"
+            return index.format_definitions(symbol)
+        except Exception as e:
+            return f"查找定义失败: {str(e)}"
+
+    def find_references(self, symbol, path="."):
+        """通过Python符号索引查找名称的引用和导入位置"""
+        try:
+            index = get_symbol_index()
+            if not index.covers(path):
+                return f"错误：{path} 不在当前项目内"
+            return index.format_references(symbol)
+        except Exception as e:
+            return f"查找引用失败: {str(e)}"
+
+    def list_symbols(self, path):
+        """列出Python文件中的类、函数、方法和模块级变量及其行号范围"""
+        try:
+            if not os.path.exists(path):
+                return f"错误：文件 {path} 不存在"
+            return get_symbol_index().format_file_symbols(path)
+        except Exception as e:
+            return f"列出符号失败: {str(e)}"
+
     def list_directory(self, path=".", max_depth=10, show_hidden=False):
         """列出目录结构，支持递归和深度控制"""
         try:
@@ -915,6 +870,12 @@ GUIDANCE_ENDED_START_FIXING::
         except Exception as e:
             return f"结束引导模式失败: {str(e)}"
 
+    def _ensure_mcp_started(self, wait=False):
+        """首次使用MCP工具时在后台启动已启用的服务器；wait=True 时等待启动完成"""
+        mcp_client.start_configured_servers(mcp_config)
+        if wait:
+            async_runtime.run(mcp_client.wait_starting_servers())
+
     def mcp_call_tool(self, tool_name, arguments_json):
         """调用MCP工具"""
         try:
@@ -933,17 +894,11 @@ GUIDANCE_ENDED_START_FIXING::
             print(f"参数: {json.dumps(arguments, ensure_ascii=False, indent=2)}")
             print(f"{Fore.YELLOW}⏳ 正在搜索中，请稍候...{Style.RESET_ALL}")
 
-            # 异步调用MCP工具，添加超时处理
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # 在会话事件循环中调用MCP工具
             try:
-                # 添加15秒超时
-                result = loop.run_until_complete(
-                    asyncio.wait_for(
-                        mcp_client.call_tool(tool_name, arguments),
-                        timeout=15.0
-                    )
-                )
+                # 请求20秒超时（超时后通知服务器取消）；服务器仍在启动时先按 mcp_startup_timeout 等待就绪
+                self._ensure_mcp_started()
+                result = async_runtime.run(mcp_client.call_tool(tool_name, arguments, timeout=20.0))
 
                 if result:
                     if "error" in result:
@@ -969,14 +924,11 @@ GUIDANCE_ENDED_START_FIXING::
                     print(f"{Fore.RED}❌ 工具调用返回空结果{Style.RESET_ALL}")
                     return f"❌ MCP工具 {tool_name} 调用失败或未找到"
 
-            except asyncio.TimeoutError:
-                print(f"{Fore.RED}❌ 工具调用超时（15秒）{Style.RESET_ALL}")
-                return f"❌ MCP工具调用超时，请检查网络连接或服务器状态"
+            except asyncio.CancelledError:
+                return "❌ MCP工具调用已被用户中断"
             except Exception as e:
                 print(f"{Fore.RED}❌ 工具调用异常: {str(e)}{Style.RESET_ALL}")
                 return f"❌ MCP工具调用异常: {str(e)}"
-            finally:
-                loop.close()
 
         except Exception as e:
             return f"❌ MCP工具调用异常: {str(e)}"
@@ -990,11 +942,10 @@ GUIDANCE_ENDED_START_FIXING::
             print(f"\n{Fore.CYAN}📄 读取MCP资源: {uri}{Style.RESET_ALL}")
             print("=" * 60)
 
-            # 异步读取MCP资源
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # 在会话事件循环中读取MCP资源
             try:
-                result = loop.run_until_complete(mcp_client.read_resource(uri))
+                self._ensure_mcp_started()
+                result = async_runtime.run(mcp_client.read_resource(uri))
 
                 if result:
                     if "error" in result:
@@ -1011,8 +962,8 @@ GUIDANCE_ENDED_START_FIXING::
                         return f"✅ MCP资源读取成功:\n{json.dumps(result, ensure_ascii=False, indent=2)}"
                 else:
                     return f"❌ MCP资源 {uri} 读取失败或未找到"
-            finally:
-                loop.close()
+            except asyncio.CancelledError:
+                return "❌ MCP资源读取已被用户中断"
 
         except Exception as e:
             return f"❌ MCP资源读取异常: {str(e)}"
@@ -1026,6 +977,7 @@ GUIDANCE_ENDED_START_FIXING::
             print(f"\n{Fore.CYAN}🔧 可用的MCP工具{Style.RESET_ALL}")
             print("=" * 60)
 
+            self._ensure_mcp_started(wait=True)
             tools = mcp_client.get_available_tools()
 
             if not tools:
@@ -1056,6 +1008,7 @@ GUIDANCE_ENDED_START_FIXING::
             print(f"\n{Fore.CYAN}📄 可用的MCP资源{Style.RESET_ALL}")
             print("=" * 60)
 
+            self._ensure_mcp_started(wait=True)
             resources = mcp_client.get_available_resources()
 
             if not resources:
@@ -1087,6 +1040,7 @@ GUIDANCE_ENDED_START_FIXING::
             print(f"\n{Fore.CYAN}🖥️ MCP服务器状态{Style.RESET_ALL}")
             print("=" * 60)
 
+            self._ensure_mcp_started()
             status = mcp_client.get_server_status()
 
             if not status:
@@ -1129,18 +1083,8 @@ GUIDANCE_ENDED_START_FIXING::
                 print(f"\n{Fore.RED}操作已取消{Style.RESET_ALL}")
                 return False
 
-    def _execute_tool_with_matches(self, tool_name, matches, dry_run=False):
-        """Executes a tool and returns the result and a user-friendly summary."""
-        # Step 1: Generate the summary based on the tool and arguments
-        tool_summary = ""
-        # Handle cases where a tool has no arguments (e.g., <show_todos/>)
-        if not matches or matches[0] is None:
-            raw_args = ()
-        else:
-            raw_args = matches[0] if isinstance(matches[0], tuple) else (matches[0],)
-
-        args = [arg.strip() if isinstance(arg, str) else arg for arg in raw_args]
-
+    def _summarize_tool_call(self, tool_name, args):
+        """根据工具名和参数生成给用户看的摘要（只格式化参数，不访问文件系统）"""
         # This block creates a human-readable summary for every tool.
         if tool_name in ['write_file', 'delete_file', 'read_file']:
             actions = {'write_file': '写入文件', 'delete_file': '删除文件', 'read_file': '读取文件'}
@@ -1162,9 +1106,19 @@ GUIDANCE_ENDED_START_FIXING::
             tool_summary = f"编辑代码: {args[0]}"
         elif tool_name == 'execute_command':
             tool_summary = f"执行命令: {args[0]}"
+        elif tool_name in ['find_definition', 'find_references', 'list_symbols']:
+            actions = {'find_definition': '查找定义', 'find_references': '查找引用', 'list_symbols': '列出符号'}
+            tool_summary = f"{actions[tool_name]}: {args[0]}"
         else:
             tool_summary = f"执行工具: {tool_name}"
 
+        return tool_summary
+
+    def _execute_tool_with_matches(self, tool_name, matches, dry_run=False, animate=True):
+        """Executes a tool and returns the result and a user-friendly summary."""
+        args = tool_call_args(matches)
+        tool_summary = self._summarize_tool_call(tool_name, args)
+
         if dry_run:
             return None, tool_summary
 
@@ -1177,13 +1131,22 @@ GUIDANCE_ENDED_START_FIXING::
                         args[i] = int(arg)
 
             tool_result = self.tools[tool_name](*args)
-            show_dot_cycle_animation("执行", 0.3)
+            if tool_name in ('write_file', 'create_file', 'insert_code', 'replace_code', 'delete_file'):
+                # 写入类工具直接更新代码搜索索引，并让文件内容缓存和行索引失效
+                # （同一 mtime 粒度内大小不变的改写无法通过 (mtime, 大小) 校验发现）
+                file_cache.invalidate(args[0])
+                line_index_cache.invalidate(args[0])
+                get_code_index().notify_changed(args[0])
+                get_symbol_index().notify_changed(args[0])
+            if animate:
+                show_dot_cycle_animation("执行", 0.3)
             return tool_result, tool_summary
         except Exception as e:
             error_msg = str(e)
             tool_result = f"❌ 工具执行失败: {error_msg}"
             tool_summary = f"❌ {tool_name} 执行失败: {error_msg}"
-            show_dot_cycle_animation("失败", 0.3)
+            if animate:
+                show_dot_cycle_animation("失败", 0.3)
             return tool_result, tool_summary
 
     def _is_command_real_failure(self, tool_result):
@@ -1353,8 +1316,7 @@ GUIDANCE_ENDED_START_FIXING::
         original_lines = []
         if os.path.exists(path):
             try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    original_lines = [l.rstrip('\n\r') for l in f.readlines()]
+                original_lines = [l.rstrip('\n\r') for l in split_lines(file_cache.read_text(path))]
             except:
                 pass # Ignore if cannot read
 
@@ -1397,15 +1359,20 @@ GUIDANCE_ENDED_START_FIXING::
     def _show_code_insertion_preview(self, path, line_number, content):
         """显示代码插入的预览，使用git风格"""
         from colorama import Back
+        # 差异只显示插入点前后3行上下文，只读取这一小段
+        window_start = max(1, line_number - 3)
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                original_lines = [l.rstrip('\n\r') for l in f.readlines()]
+            line_count = line_index_cache.get(path).line_count
+            window_end = min(line_count, line_number + 2)
+            original_lines = [l.rstrip('\n\r') for l in
+                              (line_index_cache.read_lines(path, window_start, window_end) or [])]
         except Exception:
             original_lines = []
 
         new_lines_to_insert = content.split('\n')
         # Create the new file content in memory
-        new_full_lines = original_lines[:line_number - 1] + new_lines_to_insert + original_lines[line_number - 1:]
+        split_at = line_number - window_start
+        new_full_lines = original_lines[:split_at] + new_lines_to_insert + original_lines[split_at:]
 
         diff = difflib.unified_diff(original_lines, new_full_lines, fromfile='a/' + path, tofile='b/' + path, lineterm='', n=3)
 
@@ -1433,14 +1400,12 @@ GUIDANCE_ENDED_START_FIXING::
             if not os.path.exists(path):
                 return None
 
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            if start_line < 1 or end_line > len(lines) or start_line > end_line:
+            lines = line_index_cache.read_lines(path, start_line, end_line)
+            if lines is None:
                 return None
 
             # 返回指定范围的行（去掉换行符）
-            return [line.rstrip('\n\r') for line in lines[start_line - 1:end_line]]
+            return [line.rstrip('\n\r') for line in lines]
         except Exception:
             return None
 
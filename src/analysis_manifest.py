@@ -0,0 +1,198 @@
+"""
+项目分析清单 - 记录每个文件的内容哈希和分析时间，重新分析时只处理新增、修改和删除的文件
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .parallel_scanner import parallel_scanner
+
+MANIFEST_VERSION = 1
+# 分析过程自己生成的文件，不作为项目文件参与分析
+ANALYSIS_OUTPUT_FILES = ("BYTEIQ.md", "PROJECT_DOCUMENTATION.md")
+# 已停用的分区：ProjectAnalyzer 改用语法树提取特征后，逐行匹配的结果从 features 换到了 py_features
+_OBSOLETE_SECTIONS = ("features",)
+_HASH_CHUNK = 1024 * 1024
+
+
+def docs_folder_name(project_path):
+    """文档文件夹名: <项目名>_analysis_docs"""
+    return f"{os.path.basename(os.path.abspath(project_path))}_analysis_docs"
+
+
+def manifest_file_name(project_path):
+    """清单文件名: <项目名>_analysis_manifest.json（与文档文件夹同级）"""
+    return f"{os.path.basename(os.path.abspath(project_path))}_analysis_manifest.json"
+
+
+def analysis_artifact_names(project_path):
+    """分析过程生成的文件/文件夹名（文档文件夹、清单、汇总文档），扫描项目文件时应跳过"""
+    return frozenset((docs_folder_name(project_path), manifest_file_name(project_path),
+                      manifest_file_name(project_path) + '.tmp') + ANALYSIS_OUTPUT_FILES)
+
+
+def file_digest(file_path):
+    """文件内容的 blake2b 哈希，读取失败时返回None"""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def text_digest(text):
+    """字符串内容的 blake2b 哈希"""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+class AnalysisManifest:
+    """项目级分析清单
+
+    清单按分区保存，每个分析器使用自己的分区：
+    - docs: ProjectDocAnalyzer 的单文件分析文档，条目含 doc（文档文件名）
+    - py_features: ProjectAnalyzer 的Python代码特征（project_analyzer.FEATURES_SECTION），条目含 features
+    - byteiq_md: BYTEIQ.md 的生成记录
+    文件条目为 相对路径 -> {"h": 内容哈希, "s": 大小, "m": mtime_ns, "t": 分析时间, ...}。
+    旧版本写入的 features 分区已停用，加载时丢弃。
+    diff() 先比较大小和 mtime，不同时才计算哈希，未变化的文件不需要读取内容。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, manifest_file_name(self.root))
+        self._lock = threading.RLock()
+        self._sections = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION and isinstance(data.get('sections'), dict):
+                self._sections = data['sections']
+                for name in _OBSOLETE_SECTIONS:
+                    if self._sections.pop(name, None) is not None:
+                        self._dirty = True
+        except (OSError, ValueError, AttributeError):
+            # 清单不存在或已损坏：所有文件按新文件处理
+            self._sections = {}
+
+    def section(self, name):
+        """获取分区（不存在时创建）"""
+        with self._lock:
+            return self._sections.setdefault(name, {})
+
+    def relpath(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.root).replace(os.sep, '/')
+
+    def diff(self, section_name, file_paths):
+        """比较当前文件与清单记录
+
+        返回 (changed, unchanged, removed)：
+        - changed: {文件路径: 签名}，新增或内容变化的文件，签名在分析完成后传给 record()
+        - unchanged: 内容未变化的文件路径列表（保持传入顺序）
+        - removed: 清单中有记录但已不存在的相对路径列表
+        """
+        section = self.section(section_name)
+        changed = {}
+        unchanged = []
+        to_hash = []
+        seen = set()
+
+        for file_path in file_paths:
+            rel_path = self.relpath(file_path)
+            seen.add(rel_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entry = section.get(rel_path)
+            if entry and entry.get('s') == stat.st_size and entry.get('m') == stat.st_mtime_ns:
+                unchanged.append(file_path)
+            else:
+                to_hash.append((file_path, rel_path, stat))
+
+        # 大小或 mtime 变化的文件并行计算哈希：内容未变（如只是 touch/检出）时只更新签名
+        stats = {file_path: (rel_path, stat) for file_path, rel_path, stat in to_hash}
+        same_content = set()
+        for file_path, digest in parallel_scanner.map_files(file_digest, list(stats)):
+            if digest is None:
+                continue
+            rel_path, stat = stats[file_path]
+            signature = {'h': digest, 's': stat.st_size, 'm': stat.st_mtime_ns}
+            with self._lock:
+                entry = section.get(rel_path)
+                if entry and entry.get('h') == digest:
+                    entry.update(signature)
+                    self._dirty = True
+                    same_content.add(file_path)
+                else:
+                    changed[file_path] = signature
+
+        if same_content:
+            order = {file_path: i for i, file_path in enumerate(file_paths)}
+            unchanged = sorted(unchanged + list(same_content), key=order.__getitem__)
+        removed = [rel_path for rel_path in list(section) if rel_path not in seen]
+        return changed, unchanged, removed
+
+    def get(self, section_name, file_path):
+        """获取文件的清单条目"""
+        with self._lock:
+            return self.section(section_name).get(self.relpath(file_path))
+
+    def record(self, section_name, file_path, signature, **fields):
+        """记录文件分析完成：保存签名、分析时间和分析器自己的字段"""
+        entry = dict(signature, t=time.time(), **fields)
+        with self._lock:
+            self.section(section_name)[self.relpath(file_path)] = entry
+            self._dirty = True
+
+    def remove(self, section_name, rel_path):
+        """删除相对路径的条目，返回被删除的条目"""
+        with self._lock:
+            entry = self.section(section_name).pop(rel_path, None)
+            if entry is not None:
+                self._dirty = True
+            return entry
+
+    def set_value(self, section_name, **values):
+        """更新非文件类分区（如 byteiq_md）的字段"""
+        with self._lock:
+            self.section(section_name).update(values)
+            self._dirty = True
+
+    def save(self):
+        """原子写回清单（只在有变化时写入）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                tmp_file = self.path + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MANIFEST_VERSION, 'sections': self._sections}, f,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_file, self.path)
+                self._dirty = False
+            except OSError:
+                pass
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_analysis_manifest(project_path):
+    """获取项目的分析清单实例（同一项目在进程内共享）"""
+    root = os.path.abspath(project_path)
+    with _manifests_lock:
+        manifest = _manifests.get(root)
+        if manifest is None:
+            manifest = _manifests[root] = AnalysisManifest(root)
+        return manifest
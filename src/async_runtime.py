@@ -0,0 +1,115 @@
+"""
+异步运行时 - 整个会话共享的单一事件循环
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError
+
+
+class AsyncRuntime:
+    """会话级事件循环
+
+    事件循环在后台守护线程中常驻，同步代码通过 run() 提交协程并等待结果，
+    不再为每次请求、每轮迭代新建和关闭事件循环。通过 run() 提交的顶层任务会被
+    记录下来，用户中断时 cancel_running() 直接取消这些任务，而不是依赖各处轮询中断标志。
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._running_tasks = set()
+
+    @property
+    def loop(self):
+        """获取（必要时启动）会话事件循环"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._run_loop, args=(self._loop, ready),
+                    name="byteiq-event-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_loop(self, loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    def in_loop_thread(self):
+        """当前是否运行在会话事件循环线程中"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run(self, coro, timeout=None):
+        """在会话事件循环中运行协程并阻塞等待结果
+
+        任务被取消时抛出 asyncio.CancelledError；在等待期间按下 Ctrl+C 会先取消任务再抛出 KeyboardInterrupt。
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("不能在事件循环线程中同步等待协程，请直接 await")
+
+        future = asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+        try:
+            return future.result(timeout)
+        except FutureCancelledError:
+            raise asyncio.CancelledError()
+        except KeyboardInterrupt:
+            self.cancel_running()
+            try:
+                future.result(5)
+            except BaseException:
+                pass
+            raise
+
+    def submit(self, coro, track=True):
+        """提交协程但不等待，返回 concurrent.futures.Future
+
+        track=False 的任务（如后台启动MCP服务器）不随用户中断被 cancel_running() 取消。
+        """
+        if not track:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+
+    async def _track(self, coro):
+        task = asyncio.current_task()
+        self._running_tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self._running_tasks.discard(task)
+
+    def cancel_running(self):
+        """取消所有通过 run()/submit() 提交且仍在运行的任务（线程安全）"""
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        def _cancel():
+            for task in list(self._running_tasks):
+                task.cancel()
+
+        self._loop.call_soon_threadsafe(_cancel)
+
+    async def to_thread(self, func, *args, **kwargs):
+        """在线程池中运行阻塞函数（兼容 Python 3.8，等价于 asyncio.to_thread）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    def shutdown(self):
+        """停止事件循环"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=2)
+            if not loop.is_running():
+                loop.close()
+
+
+# 全局异步运行时实例
+async_runtime = AsyncRuntime()
@@ -32,6 +32,26 @@ class ByteIQConfigManager:
         
         return None
     
+    def get_config_signature(self):
+        """当前生效的BYTEIQ.md的 (路径, mtime_ns, 大小)，不存在时返回None
+
+        供系统提示词缓存判断项目配置是否变化，只做 stat 不读取文件内容。
+        """
+        current_path = os.getcwd()
+        # 与 find_byteiq_config 相同的查找范围：向上最多5级目录
+        for _ in range(5):
+            config_path = os.path.join(current_path, self.config_file)
+            try:
+                stat = os.stat(config_path)
+                return (config_path, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+            parent = os.path.dirname(current_path)
+            if parent == current_path:
+                break
+            current_path = parent
+        return None
+    
     def load_config(self, force_reload=False):
         """加载BYTEIQ.md配置文件"""
         config_path = self.find_byteiq_config()
@@ -170,6 +190,7 @@ class ByteIQConfigManager:
             return base_prompt
         
         # 构建增强提示词
+        enhanced_prompt = base_prompt
         enhanced_sections = []
         
         # 添加项目上下文
@@ -247,6 +268,9 @@ class ByteIQConfigManager:
             with open(byteiq_file, 'w', encoding='utf-8') as f:
                 f.write(sample_content)
             
+            from .prompt_builder import system_prompt_builder
+            system_prompt_builder.invalidate()
+            
             print(f"{Fore.GREEN}✓ 已创建示例BYTEIQ.md文件: {byteiq_file}{Style.RESET_ALL}")
             return True
             
@@ -258,11 +258,6 @@ class ChatManager:
             context_manager.project_context = data.get('project_context', {})
             context_manager.session_summary = data.get('session_summary', '')
             
-            # 重新计算token数（如果缺失）
-            for msg in context_manager.conversation_history:
-                if 'tokens' not in msg:
-                    msg['tokens'] = context_manager.count_tokens(msg['content'])
-            
             context_name = data.get('name', filepath.stem)
             print(f"\n{theme_manager.format_tool_header('Load', context_name)}")
             print(f"  • 上下文已加载")
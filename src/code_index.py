@@ -0,0 +1,246 @@
+"""
+代码搜索索引 - 基于三元组(trigram)的增量索引，在运行正则前缩小候选文件范围
+"""
+
+import os
+import re
+import json
+import threading
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# 参与搜索的文件类型，与 code_search 原有范围一致
+SEARCH_EXTENSIONS = ('.py', '.js', '.html', '.css', '.md', '.txt')
+IGNORED_DIRS = {'__pycache__', 'node_modules'}
+# 超过该大小的文件不建立三元组，搜索时总是作为候选
+MAX_INDEXED_BYTES = 2 * 1024 * 1024
+INDEX_VERSION = 1
+
+
+def _trigrams(text):
+    """提取文本（已转小写）中的所有三元组"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _required_literals(pattern):
+    """从正则中提取任何匹配都必须包含的字面量片段
+
+    只分析顶层的顺序结构：遇到分支、重复、字符类等无法确定的节点就截断当前片段。
+    无法解析的正则返回空列表，此时不做过滤。
+    """
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except Exception:
+        return []
+
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(value))
+            continue
+        if op is sre_constants.BRANCH:
+            # 顶层分支：各分支的字面量都不是必需的
+            return []
+        if current:
+            literals.append("".join(current))
+            current = []
+    if current:
+        literals.append("".join(current))
+    return [literal.lower() for literal in literals if len(literal) >= 3]
+
+
+def iter_search_files(path):
+    """按 code_search 的过滤规则遍历目录下的可搜索文件"""
+    for root, dirs, files in os.walk(path):
+        # 跳过常见的忽略目录
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS]
+        for file in files:
+            if file.endswith(SEARCH_EXTENSIONS):
+                yield os.path.join(root, file)
+
+
+class CodeIndex:
+    """项目级三元组索引
+
+    索引保存在 <项目根目录>/.byteiq_memory/code_index.json。每次搜索前按文件的
+    mtime 和大小增量刷新，只重新读取发生变化的文件；写入类工具执行后直接调用
+    notify_changed() 更新对应文件。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.index_file = os.path.join(self.root, '.byteiq_memory', 'code_index.json')
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        # 相对路径 -> {"m": mtime_ns, "s": size, "g": 三元组集合 / None(大文件) , "skip": 无法解码}
+        self.files = {}
+        self.postings = {}
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                return
+            for rel_path, entry in data.get('files', {}).items():
+                grams = entry.get('g')
+                if grams is not None:
+                    entry['g'] = {grams[i:i + 3] for i in range(0, len(grams), 3)}
+                self._add_entry(rel_path, entry)
+        except (OSError, ValueError, AttributeError):
+            # 索引不存在或已损坏：从空索引开始重建
+            self.files = {}
+            self.postings = {}
+
+    def save(self):
+        """把索引写回磁盘（只在有变化时写入）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            files = {}
+            for rel_path, entry in self.files.items():
+                stored = dict(entry)
+                if stored.get('g') is not None:
+                    stored['g'] = "".join(stored['g'])
+                files[rel_path] = stored
+            try:
+                os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+                tmp_file = self.index_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': INDEX_VERSION, 'files': files}, f,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_file, self.index_file)
+                self._dirty = False
+            except OSError:
+                pass
+
+    def _add_entry(self, rel_path, entry):
+        self.files[rel_path] = entry
+        for gram in entry.get('g') or ():
+            self.postings.setdefault(gram, set()).add(rel_path)
+
+    def _remove_entry(self, rel_path):
+        entry = self.files.pop(rel_path, None)
+        if entry is None:
+            return
+        for gram in entry.get('g') or ():
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(rel_path)
+                if not posting:
+                    del self.postings[gram]
+
+    def _index_file(self, rel_path, stat):
+        entry = {'m': stat.st_mtime_ns, 's': stat.st_size, 'g': None}
+        if stat.st_size <= MAX_INDEXED_BYTES:
+            try:
+                with open(os.path.join(self.root, rel_path), 'r', encoding='utf-8') as f:
+                    entry['g'] = _trigrams(f.read().lower())
+            except UnicodeDecodeError:
+                # 与原搜索逻辑一致：无法按UTF-8读取的文件不参与搜索
+                entry['skip'] = True
+            except OSError:
+                return
+        self._remove_entry(rel_path)
+        self._add_entry(rel_path, entry)
+        self._dirty = True
+
+    def refresh(self):
+        """按 mtime/大小 增量刷新索引"""
+        with self._lock:
+            self._load()
+            seen = set()
+            for file_path in iter_search_files(self.root):
+                rel_path = os.path.relpath(file_path, self.root)
+                seen.add(rel_path)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entry = self.files.get(rel_path)
+                if entry and entry['m'] == stat.st_mtime_ns and entry['s'] == stat.st_size:
+                    continue
+                self._index_file(rel_path, stat)
+
+            for rel_path in [p for p in self.files if p not in seen]:
+                self._remove_entry(rel_path)
+                self._dirty = True
+
+    def notify_changed(self, path):
+        """文件被写入/修改/删除后调用，直接更新该文件的索引"""
+        with self._lock:
+            if not self._loaded:
+                # 索引尚未加载，下次搜索刷新时会根据mtime发现变化
+                return
+            abs_path = os.path.abspath(path)
+            rel_path = os.path.relpath(abs_path, self.root)
+            if not self.covers(abs_path) or not abs_path.endswith(SEARCH_EXTENSIONS):
+                return
+            try:
+                stat = os.stat(abs_path)
+            except OSError:
+                if rel_path in self.files:
+                    self._remove_entry(rel_path)
+                    self._dirty = True
+                return
+            self._index_file(rel_path, stat)
+
+    def candidates(self, query, path="."):
+        """返回可能匹配 query 的文件路径列表（相对于当前工作目录的形式）"""
+        with self._lock:
+            self.refresh()
+            scope = os.path.relpath(os.path.abspath(path), self.root)
+            prefix = "" if scope == os.curdir else scope + os.sep
+
+            literals = _required_literals(query)
+            selected = None
+            if literals:
+                grams = set()
+                for literal in literals:
+                    grams |= _trigrams(literal)
+                postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+                selected = set(postings[0])
+                for posting in postings[1:]:
+                    selected &= posting
+                    if not selected:
+                        break
+
+            result = []
+            for rel_path, entry in self.files.items():
+                if entry.get('skip') or not rel_path.startswith(prefix):
+                    continue
+                # 大文件没有三元组，总是作为候选
+                if selected is None or rel_path in selected or entry.get('g') is None:
+                    result.append(os.path.join(path, rel_path[len(prefix):]))
+            self.save()
+        result.sort()
+        return result
+
+    def covers(self, path):
+        """path 是否位于索引的项目目录内"""
+        rel_path = os.path.relpath(os.path.abspath(path), self.root)
+        return rel_path != os.pardir and not rel_path.startswith(os.pardir + os.sep)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(root=None):
+    """获取指定项目根目录（默认当前目录）的索引实例"""
+    root = os.path.abspath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = CodeIndex(root)
+        return index
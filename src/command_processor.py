@@ -3,15 +3,23 @@
 """
 
 import os
+import asyncio
 from colorama import Fore, Style
 from .commands import show_help, show_status, handle_todo_command, show_todos
-from .config import show_settings, load_config
+from .config import show_settings, config_store
 from .modes import mode_manager, hacpp_mode
 from .hacpp_client import hacpp_client
 from .ui import print_welcome_screen
 from .ai_client import ai_client
 from .ai_tools import ai_tool_processor
+from .tool_prefetcher import ToolPrefetcher, install_output_capture
 from .output_monitor import start_output_monitoring, stop_output_monitoring, enable_print_monitoring
+from .async_runtime import async_runtime
+from .keyboard_handler import (
+    reset_interrupt_flag, is_task_interrupted, start_task_monitoring, stop_task_monitoring,
+    interrupt_current_task, show_esc_hint
+)
+from .debug_config import is_raw_output_enabled
 from .debug_session import debug_session
 from .project_doc_analyzer import project_doc_analyzer
 from .context_manager import context_manager
@@ -38,11 +46,34 @@ def get_project_analysis_context():
     return ""
 
 def process_ai_conversation(user_input):
-    """处理AI对话，包含继承计划逻辑"""
+    """处理AI对话，包含继承计划逻辑
+
+    对话在会话级事件循环中作为一个任务运行，用户按ESC或Ctrl+C时直接取消该任务。
+    ESC监控覆盖整个对话（包括工具执行阶段），而不只是模型输出阶段。
+    """
+    reset_interrupt_flag()
+    start_task_monitoring(interrupt_current_task)
+    show_esc_hint()
+    try:
+        async_runtime.run(_run_ai_conversation(user_input))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        # Ctrl+C 只取消了任务，这里补上中断标志；标志保留到下一次对话开始，
+        # 仍在线程中执行的工具在执行或确认下一个调用前据此停止
+        if not is_task_interrupted():
+            interrupt_current_task()
+        print(f"\n{Fore.YELLOW}⚠️ 用户中断了处理流程{Style.RESET_ALL}")
+    finally:
+        try:
+            stop_task_monitoring()
+        except Exception:
+            pass
+
+
+async def _run_ai_conversation(user_input):
+    """AI对话主循环：流式请求、工具执行在同一个事件循环中协作运行"""
     import re
     original_user_input = user_input
-    config = load_config()
-    if not config.get('api_key'):
+    if not config_store.get_str('api_key'):
         print(f"{Fore.RED}错误：请先设置API密钥。使用 /s 命令进入设置。{Style.RESET_ALL}")
         return
 
@@ -66,11 +97,14 @@ def process_ai_conversation(user_input):
     
     print(f"{Fore.CYAN}AI助手正在处理您的请求...{Style.RESET_ALL}")
     enable_print_monitoring()
+    # 输出监控会替换 sys.stdout，之后再在其上安装工具输出截获代理
+    install_output_capture()
 
     max_iterations = 50
     iteration_count = 0
     next_message_to_ai = user_input
     inherited_plan = None
+    recent_operations = []  # 最近的操作，用于检测重复
     original_request_reminder = f"[原始用户需求提醒] {user_input}" if user_input else ""
 
     try:
@@ -110,14 +144,33 @@ My mandatory next step is: {inherited_plan['next']}
                 next_message_to_ai = message_with_plan
                 inherited_plan = None
 
-            model_to_use = hacpp_mode.cheap_model if hacpp_mode.is_hacpp_active() and hacpp_mode.phase == "researching" else None
-            ai_response_text = ai_client.send_message_streaming(next_message_to_ai, model_override=model_to_use)
+            is_researching = hacpp_mode.is_hacpp_active() and hacpp_mode.phase == "researching"
+            model_to_use = hacpp_mode.cheap_model if is_researching else None
 
-            if not ai_response_text or any(keyword in ai_response_text.lower() for keyword in ['error', 'timeout', '任务已被用户中断']):
-                print(f"\n{Fore.RED}⚠️ AI 错误: {ai_response_text}{Style.RESET_ALL}")
-                break
+            # 流式输出期间提前执行只读工具（研究员阶段使用独立的工具处理逻辑）
+            prefetcher = None
+            if config_store.get_bool('stream_tool_execution', True) and not is_researching:
+                prefetcher = ToolPrefetcher(ai_tool_processor, max_workers=config_store.get_int('stream_tool_workers', 4))
+
+            try:
+                ai_response_text = await ai_client.stream_message(
+                    next_message_to_ai, model_override=model_to_use,
+                    on_tool_call=prefetcher.submit if prefetcher else None)
 
-            result = ai_tool_processor.process_response(ai_response_text)
+                if not ai_response_text or any(keyword in ai_response_text.lower() for keyword in ['error', 'timeout', '任务已被用户中断']):
+                    print(f"\n{Fore.RED}⚠️ AI 错误: {ai_response_text}{Style.RESET_ALL}")
+                    break
+
+                # 原始输出模式只显示模型输出，不执行工具
+                if is_raw_output_enabled():
+                    break
+
+                # 工具执行包含阻塞IO和用户确认，放到线程中运行，不阻塞事件循环
+                result = await async_runtime.to_thread(
+                    ai_tool_processor.process_response, ai_response_text, ai_client.last_tool_parser, prefetcher)
+            finally:
+                if prefetcher:
+                    prefetcher.shutdown()
 
             if result.get('has_tool') and result.get('tool_result'):
                 tool_output = result.get('tool_result')
@@ -133,6 +186,14 @@ My mandatory next step is: {inherited_plan['next']}
                             clean_tool_result = "\n".join([res for res in tool_output.split('\n') if not res.startswith("PLAN::")])
                             result['tool_result'] = clean_tool_result.strip()
 
+            # 最近3次都是相同操作时停止，避免无限循环
+            current_operation = (result.get('display_text') or '').strip()
+            if current_operation:
+                recent_operations = (recent_operations + [current_operation])[-5:]
+                if len(recent_operations) >= 3 and len(set(recent_operations[-3:])) == 1:
+                    print(f"\n{Fore.YELLOW}⚠️ 检测到重复操作，停止处理避免无限循环{Style.RESET_ALL}")
+                    break
+
             if hacpp_mode.is_hacpp_active() and result.get('is_handover'):
                 print(f"\n{Fore.MAGENTA}HACPP 交接：研究员分析完成，执行者接管...{Style.RESET_ALL}")
                 hacpp_mode.phase = "executing"
@@ -161,8 +222,9 @@ My mandatory next step is: {inherited_plan['next']}
             else:
                 break
 
-    except KeyboardInterrupt:
-        print(f"\n{Fore.YELLOW}⚠️ 用户中断了处理流程{Style.RESET_ALL}")
+    except asyncio.CancelledError:
+        # 清理在 finally 中完成，取消继续向上传给 process_ai_conversation
+        raise
     except Exception as e:
         print(f"\n{Fore.RED}⚠️ 处理过程中出现异常: {str(e)}{Style.RESET_ALL}")
     finally:
@@ -303,7 +365,9 @@ def handle_init_command(command_parts):
             print(f"  项目路径: {status['project_path']}")
             print(f"  分析进度: {status['progress']}")
             print(f"  总文件数: {status['total_files']}")
-            print(f"  已处理: {status['processed_files']}")
+            print(f"  已处理: {status['processed_files']} (失败 {status['failed_files']})")
+            print(f"  批次: {status['batches_done']}/{status['batches_planned']}，在途请求 {status['in_flight']}，重试 {status['retries']} 次，补发 {status['repairs']} 次")
+            print(f"  已用时间: {status['elapsed_seconds']}秒，预计剩余: {status['eta']}")
         else:
             print(f"  状态: {Fore.YELLOW}未运行{Style.RESET_ALL}")
     
@@ -366,6 +430,19 @@ def handle_context_command(command_parts):
         print(f"  项目上下文数: {stats['project_contexts']}")
         print(f"  代码上下文数: {stats['code_contexts']}")
         print(f"  有会话摘要: {'是' if stats['has_summary'] else '否'}")
+        cache_stats = stats['token_cache']
+        print(f"  Token计数缓存: {cache_stats['entries']}条, 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} ({cache_stats['hit_rate']}%)")
+        prompt_stats = stats['system_prompt']
+        print(f"  系统提示词缓存: {prompt_stats['entries']}条, 命中 {prompt_stats['hits']} / 构建 {prompt_stats['misses']}, 本轮构建 {prompt_stats['last_build_ms']}ms (平均 {prompt_stats['avg_build_ms']}ms)")
+        usage_stats = stats['prompt_cache']
+        print(f"  服务端提示词缓存: {usage_stats['requests']}次请求, 输入 {usage_stats['input_tokens']:,} tokens, 缓存命中 {usage_stats['cached_tokens']:,} / 未命中 {usage_stats['uncached_tokens']:,} ({usage_stats['hit_rate']}%)")
+        file_stats = stats['file_cache']
+        print(f"  文件内容缓存: {file_stats['entries']}个文件 {file_stats['bytes'] / 1048576:.1f}/{file_stats['max_bytes'] / 1048576:.0f}MB, 命中 {file_stats['hits']} / 未命中 {file_stats['misses']} ({file_stats['hit_rate']}%), 节省读取 {file_stats['bytes_saved'] / 1048576:.1f}MB")
+        tool_stats = stats['tool_latency']
+        if tool_stats['tools']:
+            print(f"  工具执行: {tool_stats['batches']}批, 实际耗时 {tool_stats['wall_ms']}ms / 串行合计 {tool_stats['serial_ms']}ms")
+            for item in tool_stats['tools'][:5]:
+                print(f"    {item['tool']}: {item['count']}次, 平均 {item['avg_ms']}ms, 最大 {item['max_ms']}ms")
         
         # 显示进度条
         bar_width = 40
@@ -426,8 +503,7 @@ def handle_hacpp_command(command_parts):
             print(f"{Fore.CYAN}HACPP模式已完全激活，可以开始双AI协作{Style.RESET_ALL}")
 
             # 显示当前配置
-            config = load_config()
-            expensive_model = config.get('model', '未设置')
+            expensive_model = config_store.get_str('model', '未设置')
             print(f"{Fore.WHITE}当前配置:{Style.RESET_ALL}")
             print(f"  便宜AI模型: {Fore.YELLOW}{model_name}{Style.RESET_ALL}")
             print(f"  贵AI模型: {Fore.MAGENTA}{expensive_model}{Style.RESET_ALL}")
@@ -442,8 +518,7 @@ def handle_hacpp_command(command_parts):
     elif len(command_parts) == 2 and command_parts[1].lower() == 'status':
         # /HACPP status 命令 - 显示状态
         if hacpp_mode.is_hacpp_active():
-            config = load_config()
-            expensive_model = config.get('model', '未设置')
+            expensive_model = config_store.get_str('model', '未设置')
             print(f"{Fore.GREEN}HACPP模式状态: 激活{Style.RESET_ALL}")
             print(f"  便宜AI模型: {Fore.YELLOW}{hacpp_mode.cheap_model}{Style.RESET_ALL}")
             print(f"  贵AI模型: {Fore.MAGENTA}{expensive_model}{Style.RESET_ALL}")
@@ -0,0 +1,349 @@
+"""
+命令执行器 - 非阻塞读取子进程输出，内存中只保留开头和结尾，完整输出写入日志文件，支持超时和终止整个进程组
+"""
+
+import os
+import sys
+import time
+import queue
+import codecs
+import signal
+import threading
+import selectors
+import subprocess
+from collections import deque
+
+from .config import config_store
+
+# 返回给AI的输出上限（KB），开头占四分之一，其余留给结尾
+DEFAULT_OUTPUT_KB = 32
+# 命令总超时和无输出超时（秒），0 表示不限制
+DEFAULT_TIMEOUT = 1800
+DEFAULT_IDLE_TIMEOUT = 0
+# 终止进程组时，SIGTERM 之后等待多久再强制结束
+KILL_GRACE_SECONDS = 3
+# 每个项目保留的命令日志数量
+MAX_LOG_FILES = 20
+_READ_SIZE = 64 * 1024
+_POLL_INTERVAL = 0.1
+
+
+class OutputBuffer:
+    """有字节上限的命令输出缓冲
+
+    按行保存：开头的行填满 head_bytes 后不再增加，之后的行进入结尾队列，队列超过
+    tail_bytes 时丢弃最早的行并计数。第一次丢弃之前把已有的全部输出写入日志文件，
+    之后的输出都追加到日志中，因此日志始终是完整输出。超长的单行在内存中截断。
+    """
+
+    def __init__(self, max_bytes, log_path=None, header=""):
+        self.head_bytes = max_bytes // 4
+        self.tail_bytes = max(1, max_bytes - self.head_bytes)
+        self.head = []
+        self.tail = deque()
+        self._head_size = 0
+        self._tail_size = 0
+        self._head_full = False
+        self._partial = ""
+        self._log = None
+        self._log_header = header
+        self.log_path = log_path
+        self.spilled = False
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.dropped_lines = 0
+        self.truncated_lines = 0
+
+    def feed(self, text):
+        """追加一段解码后的输出，返回其中完整的行（不含换行符）"""
+        text = self._partial + text
+        # \r\n 可能被切在两段之间，结尾的 \r 留到下一段再处理
+        if text.endswith('\r'):
+            text, self._partial = text[:-1], '\r'
+        else:
+            self._partial = ""
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        rest = lines.pop()
+        if len(rest) > self.tail_bytes * 8:
+            # 长时间没有换行的输出在这里强制分行，避免无限增长
+            lines.append(rest)
+            rest = ""
+        self._partial = rest + self._partial
+        for line in lines:
+            self._add_line(line)
+        return lines
+
+    def finish(self):
+        """输出结束，返回最后一个不完整的行"""
+        rest = self._partial.rstrip('\r')
+        self._partial = ""
+        if rest:
+            self._add_line(rest)
+            return [rest]
+        return []
+
+    def _add_line(self, line):
+        size = len(line.encode('utf-8', errors='replace')) + 1
+        self.total_lines += 1
+        self.total_bytes += size
+        logged = self._log is not None
+        if logged:
+            self._log.write(line + '\n')
+
+        max_line = self.tail_bytes // 2
+        if len(line) > max_line:
+            # _spill() 只写入之前的行，当前行在这里补上
+            self._spill()
+            if self._log and not logged:
+                self._log.write(line + '\n')
+            self.truncated_lines += 1
+            line = line[:max_line] + f" ... (该行共 {len(line)} 字符，已截断)"
+            size = len(line.encode('utf-8', errors='replace')) + 1
+
+        if not self._head_full:
+            if self._head_size + size <= self.head_bytes:
+                self.head.append(line)
+                self._head_size += size
+                return
+            self._head_full = True
+
+        self.tail.append(line)
+        self._tail_size += size
+        while self._tail_size > self.tail_bytes and len(self.tail) > 1:
+            self._spill()
+            dropped = self.tail.popleft()
+            self._tail_size -= len(dropped.encode('utf-8', errors='replace')) + 1
+            self.dropped_lines += 1
+
+    def _spill(self):
+        """第一次需要丢弃或截断内容时，把目前为止的完整输出写入日志文件"""
+        if self.spilled or not self.log_path:
+            return
+        self.spilled = True
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self._log = open(self.log_path, 'w', encoding='utf-8', errors='replace')
+            if self._log_header:
+                self._log.write(self._log_header)
+            for line in self.head:
+                self._log.write(line + '\n')
+            for line in self.tail:
+                self._log.write(line + '\n')
+        except OSError:
+            self._log = None
+            self.log_path = None
+
+    def close(self):
+        if self._log:
+            try:
+                self._log.close()
+            except OSError:
+                pass
+            self._log = None
+
+    def text(self):
+        """返回给AI的输出：开头 + 省略说明 + 结尾"""
+        parts = list(self.head)
+        if self.dropped_lines:
+            parts.append(f"... (省略中间 {self.dropped_lines} 行，共 {self.total_lines} 行) ...")
+        parts.extend(self.tail)
+        if self.spilled and self.log_path:
+            parts.append(f"[完整输出 ({self.total_lines} 行) 已保存到 {self.log_path}，可用 read_file 分页查看]")
+        return "\n".join(parts)
+
+
+class _PipeReader:
+    """非阻塞读取管道：Unix 用 selectors + 非阻塞 os.read，Windows 的管道不支持 select，用读取线程转发"""
+
+    def __init__(self, pipe):
+        self._fd = pipe.fileno()
+        if sys.platform == "win32":
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._pump, daemon=True)
+            self._thread.start()
+            self._selector = None
+        else:
+            os.set_blocking(self._fd, False)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._fd, selectors.EVENT_READ)
+
+    def _pump(self):
+        while True:
+            try:
+                chunk = os.read(self._fd, _READ_SIZE)
+            except OSError:
+                chunk = b""
+            self._queue.put(chunk)
+            if not chunk:
+                return
+
+    def read(self, timeout):
+        """返回读到的字节；b"" 表示管道已关闭，None 表示 timeout 内没有数据"""
+        if self._selector is None:
+            try:
+                return self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        if not self._selector.select(timeout):
+            return None
+        try:
+            return os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return None
+        except OSError:
+            return b""
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+
+
+def kill_process_group(process, grace=KILL_GRACE_SECONDS):
+    """终止命令启动的整个进程树（shell 及其所有子进程），先温和结束，超时后强制结束"""
+    if sys.platform == "win32":
+        if process.poll() is None:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+    else:
+        # 命令在新会话中启动，进程组号等于 shell 的 pid；shell 退出后组内仍可能有子进程
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=grace)
+        except (ProcessLookupError, PermissionError, subprocess.TimeoutExpired):
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class CommandRunner:
+    """流式执行 shell 命令
+
+    输出按块非阻塞读取（不再每 0.1 秒只读一行），逐块交给 on_output 实时显示，
+    同时写入 OutputBuffer：内存和返回给AI的结果只保留开头和结尾，超出上限时完整输出
+    保存在 <当前目录>/.byteiq_memory/command_logs/ 下。命令在新的进程组中运行，
+    中断、超时（总时长 command_timeout 或无输出 command_idle_timeout）时终止整个进程组。
+    shell 退出后即结束读取，不会因为后台子进程仍占用管道而一直等待。
+    """
+
+    def __init__(self):
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _new_log_path(self, cwd=None):
+        log_dir = os.path.join(os.path.abspath(cwd or os.getcwd()), '.byteiq_memory', 'command_logs')
+        with self._lock:
+            self._counter += 1
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._counter}.log"
+        self._prune_logs(log_dir)
+        return os.path.join(log_dir, name)
+
+    @staticmethod
+    def _prune_logs(log_dir):
+        """只保留最近的 MAX_LOG_FILES - 1 个日志，为新日志留出位置"""
+        try:
+            logs = sorted((entry for entry in os.scandir(log_dir) if entry.name.endswith('.log')),
+                          key=lambda entry: entry.stat().st_mtime)
+        except OSError:
+            return
+        for entry in logs[:max(0, len(logs) - MAX_LOG_FILES + 1)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def run(self, command, on_output=None, should_stop=None, timeout=None, idle_timeout=None, cwd=None):
+        """执行命令并返回结果字典
+
+        on_output(lines) 在读到完整的行时调用；should_stop() 返回True时终止命令。
+        timeout/idle_timeout 为None时使用配置，0 表示不限制。
+        返回 {return_code, output, interrupted, timed_out, log_path, total_lines, omitted_lines, elapsed}。
+        """
+        if timeout is None:
+            timeout = config_store.get_int('command_timeout', DEFAULT_TIMEOUT)
+        if idle_timeout is None:
+            idle_timeout = config_store.get_int('command_idle_timeout', DEFAULT_IDLE_TIMEOUT)
+        max_bytes = max(4, config_store.get_int('command_output_kb', DEFAULT_OUTPUT_KB)) * 1024
+
+        popen_kwargs = {}
+        if sys.platform == "win32":
+            popen_kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            popen_kwargs['start_new_session'] = True
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            **popen_kwargs
+        )
+
+        buffer = OutputBuffer(max_bytes, self._new_log_path(cwd), header=f"$ {command}\n")
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        reader = _PipeReader(process.stdout)
+        started = last_output = time.monotonic()
+        interrupted = timed_out = False
+
+        def emit(lines):
+            if on_output and lines:
+                on_output(lines)
+
+        try:
+            while True:
+                if should_stop and should_stop():
+                    interrupted = True
+                    break
+                now = time.monotonic()
+                if (timeout and now - started > timeout) or (idle_timeout and now - last_output > idle_timeout):
+                    timed_out = 'total' if timeout and now - started > timeout else 'idle'
+                    break
+
+                chunk = reader.read(_POLL_INTERVAL)
+                if chunk is None:
+                    # shell 已退出且管道中没有剩余数据（后台子进程可能仍持有管道）
+                    if process.poll() is not None:
+                        break
+                    continue
+                if not chunk:
+                    break
+                last_output = time.monotonic()
+                emit(buffer.feed(decoder.decode(chunk)))
+
+            if interrupted or timed_out:
+                kill_process_group(process)
+            else:
+                process.wait()
+            emit(buffer.feed(decoder.decode(b"", final=True)))
+            emit(buffer.finish())
+        except BaseException:
+            # KeyboardInterrupt 等异常：不留下孤儿进程
+            kill_process_group(process)
+            raise
+        finally:
+            reader.close()
+            process.stdout.close()
+            buffer.close()
+
+        return {
+            'return_code': process.returncode,
+            'output': buffer.text(),
+            'interrupted': interrupted,
+            'timed_out': timed_out,
+            'timeout': timeout if timed_out == 'total' else idle_timeout,
+            'log_path': buffer.log_path if buffer.spilled else None,
+            'total_lines': buffer.total_lines,
+            'omitted_lines': buffer.dropped_lines,
+            'elapsed': time.monotonic() - started
+        }
+
+
+# 全局命令执行器实例
+command_runner = CommandRunner()
@@ -117,10 +117,10 @@ def show_help():
 
 def show_status():
     """显示当前状态"""
-    from .config import load_config
+    from .config import config_store
     from .modes import mode_manager
     
-    cfg = load_config()
+    cfg = config_store.snapshot()
     api_key_status = "已设置" if cfg.get("api_key") else "未设置"
     language = cfg.get("language", "zh-CN")
     model = cfg.get("model", "gpt-3.5-turbo")
@@ -223,8 +223,8 @@ def _ai_compression(history):
     temp_client = AIClient()
 
     # 确保临时客户端有API密钥
-    from .config import load_config
-    config = load_config()
+    from .config import config_store
+    config = config_store.snapshot()
     if not config.get('api_key'):
         print(f"{Fore.RED}错误：无法执行AI压缩，因为缺少API密钥。{Style.RESET_ALL}")
         return history # 返回原始历史
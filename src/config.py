@@ -3,28 +3,117 @@
 """
 
 import os
+import copy
 import json
 import getpass
+import threading
+from types import MappingProxyType
 from colorama import Fore, Style
 
 CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".byteiq_config.json")
 DEFAULT_API_URL = "https://api.byteiq.cn/v1/chat/completions"
 
+class ConfigStore:
+    """带内存缓存的配置服务
+
+    配置文件只在 mtime / 大小 / inode 变化时重新解析，其余读取直接使用内存中的字典，
+    每次访问的代价只是一次 os.stat()。写入通过临时文件 + os.replace 原子完成，
+    并同步刷新缓存。
+    """
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self._data = {}
+        self._signature = False  # False 表示尚未加载；None 表示文件不存在
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _current(self):
+        """返回最新的配置字典（内部共享对象，调用方不得修改）"""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature:
+                data = {}
+                if signature is not None:
+                    try:
+                        with open(self.path, "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                    except Exception:
+                        data = {}
+                self._data = data if isinstance(data, dict) else {}
+                self._signature = signature
+            return self._data
+
+    def snapshot(self):
+        """只读的配置视图，不复制"""
+        return MappingProxyType(self._current())
+
+    def load(self):
+        """配置的可修改副本，用于读取-修改-保存"""
+        return copy.deepcopy(self._current())
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def get_str(self, key, default=""):
+        value = self._current().get(key)
+        return value if isinstance(value, str) and value else default
+
+    def get_int(self, key, default=0):
+        try:
+            return int(self._current().get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        try:
+            return float(self._current().get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        value = self._current().get(key, default)
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+
+    def save(self, cfg: dict):
+        """原子写入配置文件并更新缓存"""
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cfg, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._data = copy.deepcopy(cfg)
+            self._signature = self._file_signature()
+
+    def update(self, **values):
+        """修改若干配置项并保存"""
+        cfg = self.load()
+        cfg.update(values)
+        return save_config(cfg)
+
+
+# 全局配置服务实例
+config_store = ConfigStore()
+
+
 def load_config():
-    """加载配置文件"""
-    if not os.path.exists(CONFIG_PATH):
-        return {}
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    """加载配置文件（返回可修改的副本；只读访问请使用 config_store）"""
+    return config_store.load()
 
 def save_config(cfg: dict):
     """保存配置文件"""
     try:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=2)
+        config_store.save(cfg)
         return True
     except Exception as e:
         print(f"{Fore.RED}保存配置失败: {e}{Style.RESET_ALL}")
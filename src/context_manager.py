@@ -4,10 +4,11 @@
 
 import json
 import time
-import tiktoken
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
 from pathlib import Path
 from colorama import Fore, Style
+from .token_counter import token_counter
+from .history_store import HistoryBuffer, select_important
 
 class ContextManager:
     """智能上下文管理器"""
@@ -15,39 +16,87 @@ class ContextManager:
     def __init__(self, max_tokens=None):  # 用户可配置的上下文限制
         # 从配置文件加载max_tokens设置
         if max_tokens is None:
-            from .config import load_config
-            config = load_config()
-            max_tokens = config.get('max_tokens', 12800)
+            from .config import config_store
+            max_tokens = config_store.get_int('max_tokens', 12800)
         self.max_tokens = max_tokens
-        self.conversation_history = []
-        self.project_context = {}
-        self.code_context = {}
-        self.session_summary = ""
-        self.encoding = tiktoken.get_encoding("cl100k_base")  # Claude使用的编码
-        
+        # 当前总token数，插入和移除时增量更新，整体替换时按已存的tokens字段重算
+        self._total_tokens = 0
+        self._summary_tokens = 0
+        # 对话历史与各AI客户端使用同一种记录存储，token数和标记位在追加时算好
+        self._history = HistoryBuffer()
+        self._project_context = {}
+        self._code_context = {}
+        self._session_summary = ""
+        # TODO上下文缓存，任务变化时由 todo_manager 通知清空
+        self._todo_context_cache = None
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """对话历史的 {"role", "content"} 消息列表（只读视图，修改请用 add_message 或整体赋值）"""
+        return self._history.messages()
+
+    @conversation_history.setter
+    def conversation_history(self, messages: List[Dict]):
+        self._history.replace(messages)
+        self._recalculate_total_tokens()
+
+    @property
+    def project_context(self) -> Dict[str, Dict]:
+        return self._project_context
+
+    @project_context.setter
+    def project_context(self, contexts: Dict[str, Dict]):
+        self._project_context = contexts
+        self._recalculate_total_tokens()
+
+    @property
+    def code_context(self) -> Dict[str, Dict]:
+        return self._code_context
+
+    @code_context.setter
+    def code_context(self, contexts: Dict[str, Dict]):
+        self._code_context = contexts
+        self._recalculate_total_tokens()
+
+    @property
+    def session_summary(self) -> str:
+        return self._session_summary
+
+    @session_summary.setter
+    def session_summary(self, summary: str):
+        summary_tokens = self.count_tokens(summary) if summary else 0
+        self._total_tokens += summary_tokens - self._summary_tokens
+        self._summary_tokens = summary_tokens
+        self._session_summary = summary
+
     def count_tokens(self, text: str) -> int:
-        """计算文本的token数量"""
-        try:
-            return len(self.encoding.encode(text))
-        except:
-            # 如果编码失败，使用近似计算
-            return len(text) // 3
+        """计算文本的token数量（结果按内容哈希缓存）"""
+        # 如果编码失败，使用近似计算
+        return token_counter.count(text, fallback=lambda t: len(t) // 3)
+
+    def _entry_tokens(self, entry: Dict) -> int:
+        """取条目已记录的token数，缺失时补算（例如从旧文件加载的条目）"""
+        if "tokens" not in entry:
+            entry["tokens"] = self.count_tokens(entry.get("content", ""))
+        return entry["tokens"]
+
+    def _recalculate_total_tokens(self):
+        """按各条目已存的token数重算总数，不重新编码"""
+        total = self._summary_tokens + self._history.total_tokens
+        for context in self._project_context.values():
+            total += self._entry_tokens(context)
+        for context in self._code_context.values():
+            total += self._entry_tokens(context)
+        self._total_tokens = total
     
-    def add_message(self, role: str, content: str, metadata: Optional[Dict] = None):
+    def add_message(self, role: str, content: str):
         """添加消息到上下文"""
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": time.time(),
-            "tokens": self.count_tokens(content),
-            "metadata": metadata or {}
-        }
-        
         # 如果是用户的原始需求，标记为高优先级
-        if role == "user" and not self.conversation_history:
+        if role == "user" and not self._history:
             self.add_project_context("original_request", content, "critical")
         
-        self.conversation_history.append(message)
+        record = self._history.append(role, content)
+        self._total_tokens += record.tokens
         self._optimize_context()
     
     def _optimize_context(self):
@@ -64,76 +113,44 @@ class ContextManager:
         self._cleanup_code_context()
     
     def _calculate_total_tokens(self) -> int:
-        """计算当前总token数"""
-        total = 0
-        
-        # 计算对话历史
-        for msg in self.conversation_history:
-            total += msg.get("tokens", 0)
-        
-        # 计算项目上下文
-        for context in self.project_context.values():
-            total += self.count_tokens(str(context))
-        
-        # 计算代码上下文
-        for context in self.code_context.values():
-            total += self.count_tokens(str(context))
-        
-        # 计算会话摘要
-        if self.session_summary:
-            total += self.count_tokens(self.session_summary)
-        
-        return total
+        """当前总token数"""
+        return self._total_tokens
     
     def _compress_context(self):
         """压缩上下文"""
         print(f"{Fore.YELLOW}🔄 上下文接近限制，正在智能压缩...{Style.RESET_ALL}")
         
         # 1. 保留最近的重要消息
-        important_messages = self._extract_important_messages()
+        important_indices = self._extract_important_indices()
         
         # 2. 生成会话摘要
-        old_messages = [msg for msg in self.conversation_history if msg not in important_messages]
+        keep = set(important_indices)
+        old_messages = [msg for i, msg in enumerate(self._history) if i not in keep]
         if old_messages:
             self.session_summary = self._generate_session_summary(old_messages)
         
-        # 3. 更新对话历史
-        self.conversation_history = important_messages
+        # 3. 更新对话历史：保留的记录原样复用
+        self._history.retain(important_indices)
+        self._recalculate_total_tokens()
         
         # 4. 清理过期的代码上下文
         self._cleanup_code_context()
         
         print(f"{Fore.GREEN}✓ 上下文压缩完成{Style.RESET_ALL}")
     
+    def _extract_important_indices(self) -> List[int]:
+        """提取重要消息的下标（按时间顺序）
+        
+        保留最近的20条消息、最后10条包含工具调用的消息和最后5条错误/状态消息，
+        标记位在添加消息时已算好，这里只需一次遍历。
+        """
+        return select_important((record.flags for record in self._history.records()),
+                                recent=20, tool_limit=10, status_limit=5)
+    
     def _extract_important_messages(self) -> List[Dict]:
         """提取重要消息"""
-        important = []
-        
-        # 保留最近的20条消息
-        recent_messages = self.conversation_history[-20:]
-        
-        # 保留包含工具调用的消息
-        tool_messages = [msg for msg in self.conversation_history 
-                        if any(tag in msg["content"] for tag in ["<", ">", "工具", "执行"])]
-        
-        # 保留错误和重要信息
-        error_messages = [msg for msg in self.conversation_history 
-                         if any(keyword in msg["content"].lower() 
-                               for keyword in ["错误", "error", "失败", "成功", "完成"])]
-        
-        # 合并并去重
-        all_important = recent_messages + tool_messages[-10:] + error_messages[-5:]
-        seen = set()
-        for msg in all_important:
-            msg_id = (msg["role"], msg["content"][:100], msg["timestamp"])
-            if msg_id not in seen:
-                important.append(msg)
-                seen.add(msg_id)
-        
-        # 按时间排序
-        important.sort(key=lambda x: x["timestamp"])
-        
-        return important
+        messages = self._history.messages()
+        return [messages[i] for i in self._extract_important_indices()]
     
     def _generate_session_summary(self, messages: List[Dict]) -> str:
         """生成会话摘要"""
@@ -174,48 +191,57 @@ class ContextManager:
                 expired_keys.append(key)
         
         for key in expired_keys:
-            del self.code_context[key]
+            self._total_tokens -= self._entry_tokens(self.code_context.pop(key))
     
     def add_project_context(self, key: str, content: str, priority: str = "normal"):
         """添加项目上下文"""
+        previous = self.project_context.get(key)
+        if previous is not None:
+            self._total_tokens -= self._entry_tokens(previous)
         self.project_context[key] = {
             "content": content,
             "priority": priority,  # critical > high > normal
             "timestamp": time.time(),
             "tokens": self.count_tokens(content)
         }
+        self._total_tokens += self.project_context[key]["tokens"]
     
+    def _on_todos_changed(self):
+        self._todo_context_cache = None
+
     def _get_todo_context(self) -> str:
-        """获取当前TODO任务上下文"""
+        """获取当前TODO任务上下文
+
+        直接读取 todo_manager 的内存视图，结果缓存到任务发生变化为止。
+        """
+        if self._todo_context_cache is not None:
+            return self._todo_context_cache
         try:
-            import os
-            todo_file = "todo_data.json"
-            if os.path.exists(todo_file):
-                import json
-                with open(todo_file, 'r', encoding='utf-8') as f:
-                    todos = json.load(f)
-                
-                active_todos = []
-                for todo in todos:
-                    if todo.get('status') in ['pending', 'in_progress']:
-                        priority_mark = "🔥" if todo.get('priority') == 'high' else "📋"
-                        status_mark = "⏳" if todo.get('status') == 'in_progress' else "📝"
-                        active_todos.append(f"{priority_mark}{status_mark} {todo.get('content', '')}")
-                
-                if active_todos:
-                    return "; ".join(active_todos[:3])  # 最多显示3个任务
-        except:
-            pass
-        return ""
+            from .todo_manager import todo_manager
+            todo_manager.subscribe(self._on_todos_changed)
+
+            active_todos = []
+            for todo in todo_manager.get_active_todos()[:3]:  # 最多显示3个任务
+                priority_mark = "🔥" if todo.priority in ('high', 'urgent') else "📋"
+                status_mark = "⏳" if todo.status == 'in_progress' else "📝"
+                active_todos.append(f"{priority_mark}{status_mark} {todo.title}")
+            self._todo_context_cache = "; ".join(active_todos)
+        except Exception:
+            return ""
+        return self._todo_context_cache
     
     def add_code_context(self, file_path: str, content: str, context_type: str = "file"):
         """添加代码上下文"""
+        previous = self.code_context.get(file_path)
+        if previous is not None:
+            self._total_tokens -= self._entry_tokens(previous)
         self.code_context[file_path] = {
             "content": content,
             "type": context_type,
             "timestamp": time.time(),
             "tokens": self.count_tokens(content)
         }
+        self._total_tokens += self.code_context[file_path]["tokens"]
     
     def update_todo_context(self):
         """更新TODO上下文到项目上下文中"""
@@ -225,18 +251,16 @@ class ContextManager:
     
     def get_context_for_ai(self) -> Dict[str, Any]:
         """获取用于AI的上下文信息"""
+        total_tokens = self._calculate_total_tokens()
         context = {
-            "conversation_history": [
-                {"role": msg["role"], "content": msg["content"]} 
-                for msg in self.conversation_history
-            ],
+            "conversation_history": self._history.messages(),
             "session_summary": self.session_summary,
             "project_context": {},
             "code_context": {},
             "stats": {
-                "total_tokens": self._calculate_total_tokens(),
+                "total_tokens": total_tokens,
                 "max_tokens": self.max_tokens,
-                "utilization": f"{(self._calculate_total_tokens() / self.max_tokens * 100):.1f}%"
+                "utilization": f"{(total_tokens / self.max_tokens * 100):.1f}%"
             }
         }
         
@@ -305,13 +329,8 @@ class ContextManager:
                 "content": f"[会话摘要] {self.session_summary}"
             })
         
-        # 4. 添加对话历史，但跳过系统消息避免重复
-        for msg in self.conversation_history:
-            if msg["role"] != "system":
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+        # 4. 添加对话历史，但跳过系统消息避免重复；消息字典直接复用
+        messages.extend(msg for msg in self._history if msg["role"] != "system")
         
         return messages
     
@@ -343,11 +362,7 @@ class ContextManager:
             self.conversation_history = context_data.get("conversation_history", [])
             self.project_context = context_data.get("project_context", {})
             self.session_summary = context_data.get("session_summary", "")
-            
-            # 重新计算token数
-            for msg in self.conversation_history:
-                if "tokens" not in msg:
-                    msg["tokens"] = self.count_tokens(msg["content"])
+            # token数在赋值时重新计算（按内容哈希缓存）
             
             print(f"{Fore.GREEN}✓ 已加载上下文历史{Style.RESET_ALL}")
             return True
@@ -366,16 +381,25 @@ class ContextManager:
     
     def get_context_stats(self) -> Dict[str, Any]:
         """获取上下文统计信息"""
+        from .prompt_builder import system_prompt_builder
+        from .prompt_cache import prompt_cache
+        from .tool_scheduler import tool_execution_engine
+        from .file_cache import file_cache
         total_tokens = self._calculate_total_tokens()
         
         return {
             "total_tokens": total_tokens,
             "max_tokens": self.max_tokens,
             "utilization_percent": round((total_tokens / self.max_tokens) * 100, 1),
-            "conversation_messages": len(self.conversation_history),
+            "conversation_messages": len(self._history),
             "project_contexts": len(self.project_context),
             "code_contexts": len(self.code_context),
-            "has_summary": bool(self.session_summary)
+            "has_summary": bool(self.session_summary),
+            "token_cache": token_counter.get_stats(),
+            "system_prompt": system_prompt_builder.get_stats(),
+            "prompt_cache": prompt_cache.get_stats(),
+            "tool_latency": tool_execution_engine.get_stats(),
+            "file_cache": file_cache.get_stats()
         }
     
     def set_max_tokens(self, max_tokens: int):
@@ -388,10 +412,8 @@ class ContextManager:
         self.max_tokens = max_tokens
         
         # 保存到配置文件
-        from .config import load_config, save_config
-        config = load_config()
-        config['max_tokens'] = max_tokens
-        save_config(config)
+        from .config import config_store
+        config_store.update(max_tokens=max_tokens)
         
         print(f"{Fore.GREEN}✓ 上下文限制已设置为 {max_tokens:,} tokens{Style.RESET_ALL}")
         
@@ -84,10 +84,9 @@ class DebugSession:
             try:
                 # 为fix bug模式设置专用提示词
                 from .prompt_templates import get_fix_bug_prompt
-                from .config import load_config
+                from .config import config_store
                 
-                config = load_config()
-                model_strength = config.get('model_strength', 'claude')
+                model_strength = config_store.get_str('model_strength', 'claude')
                 fix_bug_prompt = get_fix_bug_prompt(model_strength)
                 
                 # 将引导内容与fix bug提示词结合
@@ -116,7 +115,7 @@ class DebugSession:
                 if original_hacpp_state:
                     hacpp_mode.deactivate()
                 
-                tool_result = ai_tool_processor.process_response(main_ai_response)
+                tool_result = ai_tool_processor.process_response(main_ai_response, ai_client.last_tool_parser)
                 
                 # 恢复原始HACPP状态
                 if original_hacpp_state:
@@ -234,10 +233,9 @@ class DebugSession:
         """显示当前使用的Fix Bug提示词"""
         try:
             from .prompt_templates import get_fix_bug_prompt
-            from .config import load_config
+            from .config import config_store
             
-            config = load_config()
-            model_strength = config.get('model_strength', 'claude')
+            model_strength = config_store.get_str('model_strength', 'claude')
             fix_bug_prompt = get_fix_bug_prompt(model_strength)
             
             print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
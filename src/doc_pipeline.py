@@ -0,0 +1,444 @@
+"""
+文档分析流水线 - 预读文件、按token预算装箱分批、有界并发请求模型并增量写出结果
+"""
+
+import re
+import time
+import queue
+import random
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .token_counter import token_counter
+
+# 需要退避重试的HTTP状态码；status_code 为None（网络异常）时同样重试，
+# 但错误带有 "retryable": False（如未设置API密钥、响应格式错误）时不重试
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+MAX_BACKOFF_SECONDS = 60
+# 每个分析单元在提示词中的标题、路径和代码块标记的估算token数（不含路径本身）
+CHUNK_OVERHEAD_TOKENS = 32
+# 批次装到容量的该比例以上时立即发出，不再等待更小的文件
+BATCH_FULL_RATIO = 0.95
+
+# 切分超大文件时优先的切分位置：顶层定义 > 缩进的定义 > 空行之后
+_DEFINITION_RE = re.compile(
+    r'(?:@|(?:async\s+)?def\s|class\s|(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|'
+    r'(?:public|private|protected|internal|static|final|abstract)\s|func\s|fn\s|pub\s|impl\b|'
+    r'struct\s|interface\s|enum\s|module\s|namespace\s|type\s)'
+)
+
+
+class FileChunk:
+    """一个分析单元：完整的文件，或超大文件按函数/类边界切出的一段（part/parts 从1开始计数）"""
+
+    __slots__ = ("path", "content", "tokens", "part", "parts", "start_line", "end_line")
+
+    def __init__(self, path, content, tokens, part=1, parts=1, start_line=1, end_line=None):
+        self.path = path
+        self.content = content
+        self.tokens = tokens
+        self.part = part
+        self.parts = parts
+        self.start_line = start_line
+        self.end_line = end_line
+
+    @property
+    def is_partial(self):
+        return self.parts > 1
+
+
+class AnalysisBatch:
+    """一次模型请求要分析的文件或文件片段（repairs 为补发次数，原始批次为0）"""
+
+    __slots__ = ("index", "files", "tokens", "repairs")
+
+    def __init__(self, index=0, repairs=0):
+        self.index = index
+        self.files = []  # [FileChunk]
+        self.tokens = 0
+        self.repairs = repairs
+
+    def add(self, chunk):
+        self.files.append(chunk)
+        self.tokens += chunk.tokens
+
+    @property
+    def paths(self):
+        """批次涉及的文件路径（去重，保持顺序）"""
+        return list(dict.fromkeys(chunk.path for chunk in self.files))
+
+
+def _boundary_ranks(lines):
+    """每个切分位置的优先级（越小越优先），None 表示不宜在此切分
+
+    下标 i 表示在第 i 行之前切分。装饰器和紧随其后的定义视为一体。
+    """
+    ranks = [None] * (len(lines) + 1)
+    previous = ""
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        if i and stripped and not previous.lstrip().startswith("@"):
+            if _DEFINITION_RE.match(stripped):
+                ranks[i] = 0 if len(stripped) == len(line) else 1
+            elif not previous.strip():
+                ranks[i] = 2
+        previous = line
+    return ranks
+
+
+def split_content(content, max_tokens, total_tokens=None):
+    """把超过 max_tokens 的内容切成若干段，返回 [(起始行, 结束行, 文本, token数)]
+
+    先按文件整体的 token/字符 比例估算每行的token数，确定本段最远能到哪一行，再在后半段内
+    选优先级最高（其次最靠后）的切分位置；切出的文本用精确计数校验，超出时收紧估算重新切。
+    单行就超出预算时（如压缩过的JS）按字符切开。
+    """
+    lines = content.splitlines(keepends=True)
+    if total_tokens is None:
+        total_tokens = token_counter.count(content)
+    scale = total_tokens / max(len(content), 1)
+    prefix = [0.0]
+    for line in lines:
+        prefix.append(prefix[-1] + len(line) * scale)
+    ranks = _boundary_ranks(lines)
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        limit = max_tokens
+        while True:
+            end = bisect.bisect_right(prefix, prefix[start] + limit) - 1
+            end = min(max(end, start + 1), len(lines))
+            if end < len(lines):
+                candidates = [i for i in range(start + (end - start + 1) // 2, end + 1) if ranks[i] is not None]
+                if candidates:
+                    end = min(candidates, key=lambda i: (ranks[i], -i))
+            text = "".join(lines[start:end])
+            tokens = token_counter.count(text)
+            if tokens <= max_tokens or end - start == 1:
+                break
+            limit = max(1.0, limit * max_tokens / tokens * 0.9)
+
+        if tokens > max_tokens:
+            # 单行超出预算：按字符比例硬切
+            step = max(1, int(len(text) * max_tokens / tokens * 0.9))
+            for offset in range(0, len(text), step):
+                piece = text[offset:offset + step]
+                chunks.append((start + 1, end, piece, token_counter.count(piece)))
+        else:
+            chunks.append((start + 1, end, text, tokens))
+        start = end
+    return chunks
+
+
+class BatchPacker:
+    """流式 first-fit 装箱
+
+    每个分析单元放进第一个装得下的未满批次，都装不下时新开一个批次；未满批次超过 max_open 个时
+    发出最满的一个，装到容量 BATCH_FULL_RATIO 以上的批次立即发出。文件按优先级顺序到达，
+    较小的文件可以填进前面批次的剩余空间，请求数接近离线装箱的结果，同时不必等全部文件读完。
+    """
+
+    def __init__(self, capacity, max_open=4):
+        self.capacity = capacity
+        self.max_open = max(1, max_open)
+        self._open = []
+
+    def add(self, chunk):
+        """放入一个分析单元，返回可以发出的批次列表"""
+        for batch in self._open:
+            if batch.tokens + chunk.tokens <= self.capacity:
+                batch.add(chunk)
+                if batch.tokens >= self.capacity * BATCH_FULL_RATIO:
+                    self._open.remove(batch)
+                    return [batch]
+                return []
+
+        batch = AnalysisBatch()
+        batch.add(chunk)
+        if batch.tokens >= self.capacity * BATCH_FULL_RATIO:
+            return [batch]
+        self._open.append(batch)
+        if len(self._open) > self.max_open:
+            fullest = max(self._open, key=lambda item: item.tokens)
+            self._open.remove(fullest)
+            return [fullest]
+        return []
+
+    def flush(self):
+        """发出剩余的所有批次"""
+        ready, self._open = self._open, []
+        return ready
+
+
+class DocAnalysisPipeline:
+    """有界并发的批量分析流水线
+
+    三个阶段同时进行：
+    1. 预读：线程池按分析顺序读取文件，最多领先 read_ahead 个文件
+    2. 装箱：超出 batch_tokens 的文件先按函数/类边界切成多段，再用 BatchPacker 把文件和片段
+       装入批次，每个批次（含提示词中的文件标题开销）不超过 batch_tokens
+    3. 请求：concurrency 个工作线程同时请求模型。遇到限流(429)时按 Retry-After 或指数退避
+       设置全局冷却时间，所有工作线程一起暂停；服务端错误和网络异常只退避当前批次
+    每个批次完成后立即调用 on_result(batch, content) 写出结果，失败的批次调用 on_failure(batch, error)。
+    on_result 返回结果缺失或格式错误的分析单元时，只把这些单元组成新批次补发，最多 max_repairs 次。
+    request_fn(batch) 的返回值与 AIClient.chat_completion 相同。进度按文件统计：文件的所有片段都
+    成功才计为完成，任一片段失败即计为失败。
+    """
+
+    def __init__(self, request_fn, on_result, on_failure=None, concurrency=4,
+                 batch_tokens=24000, max_retries=5, read_ahead=64, max_repairs=2):
+        self.request_fn = request_fn
+        self.on_result = on_result
+        self.on_failure = on_failure
+        self.concurrency = max(1, concurrency)
+        self.batch_tokens = batch_tokens
+        self.max_retries = max_retries
+        self.read_ahead = max(1, read_ahead)
+        self.max_repairs = max(0, max_repairs)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cooldown_until = 0.0
+        self._parts_left = {}  # 文件路径 -> 尚未完成的片段数
+        self._failed_paths = set()
+
+        self.total_files = 0
+        self.done_files = 0
+        self.failed_files = 0
+        self.batches_planned = 0
+        self.batches_done = 0
+        self.in_flight = 0
+        self.retries = 0
+        self.repairs = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        """停止流水线：不再发起新请求，已在途的请求完成后丢弃"""
+        self._stop.set()
+
+    def run(self, file_paths, read_fn):
+        """分析 file_paths（按给定顺序分批），阻塞直到全部完成或被停止
+
+        read_fn(path) 返回文件内容，读取失败时返回None（该文件计为失败）。
+        """
+        self.total_files = len(file_paths)
+        self.started_at = time.time()
+        batches = queue.Queue(maxsize=self.concurrency * 2)
+        workers = [threading.Thread(target=self._worker, args=(batches,),
+                                    name=f"byteiq-doc-{i}", daemon=True)
+                   for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._plan(file_paths, read_fn, batches)
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            for _ in workers:
+                batches.put(None)
+            try:
+                # 分段等待，主线程仍能响应 Ctrl+C
+                for worker in workers:
+                    while worker.is_alive():
+                        worker.join(0.2)
+            except KeyboardInterrupt:
+                self.stop()
+                raise
+            finally:
+                self.finished_at = time.time()
+
+    def _plan(self, file_paths, read_fn, batches):
+        """预读文件并按token预算装批"""
+        paths = iter(file_paths)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=min(8, self.read_ahead),
+                                thread_name_prefix="byteiq-doc-read") as reader:
+            def fill():
+                while len(pending) < self.read_ahead:
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    pending.append((path, reader.submit(read_fn, path)))
+
+            packer = BatchPacker(self.batch_tokens, max_open=self.concurrency)
+            fill()
+            while pending and not self.stopped:
+                path, future = pending.popleft()
+                fill()
+                content = future.result()
+                if content is None:
+                    with self._lock:
+                        self.failed_files += 1
+                    continue
+                for chunk in self._chunks(path, content):
+                    for batch in packer.add(chunk):
+                        self._emit(batch, batches)
+
+            for batch in packer.flush():
+                self._emit(batch, batches)
+            for _, future in pending:
+                future.cancel()
+
+    def _chunks(self, path, content):
+        """把文件转换为分析单元，超出批次预算的文件切成多段"""
+        overhead = CHUNK_OVERHEAD_TOKENS + token_counter.count(path)
+        tokens = token_counter.count(content)
+        if tokens + overhead <= self.batch_tokens:
+            chunks = [FileChunk(path, content, tokens + overhead)]
+        else:
+            pieces = split_content(content, max(1, self.batch_tokens - overhead), tokens)
+            chunks = [FileChunk(path, text, piece_tokens + overhead, part, len(pieces), start_line, end_line)
+                      for part, (start_line, end_line, text, piece_tokens) in enumerate(pieces, 1)]
+        with self._lock:
+            self._parts_left[path] = len(chunks)
+        return chunks
+
+    def _emit(self, batch, batches):
+        with self._lock:
+            batch.index = self.batches_planned
+            self.batches_planned += 1
+        # 队列满时等待工作线程消费，同时检查停止标志
+        while not self.stopped:
+            try:
+                batches.put(batch, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _worker(self, batches):
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            # 补发批次由同一个工作线程紧接着处理，不经过队列
+            while batch is not None and not self.stopped:
+                batch = self._process(batch)
+
+    def _process(self, batch):
+        """请求并保存一个批次，返回需要补发的批次（没有时返回None）"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            content, error = self._request_with_retry(batch)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if self.stopped:
+            return None
+
+        invalid = []
+        if content is not None:
+            try:
+                invalid = list(self.on_result(batch, content) or [])
+            except Exception as e:
+                content, error = None, f"保存结果失败: {e}"
+        if content is None and self.on_failure:
+            self.on_failure(batch, error)
+
+        repair = None
+        if invalid:
+            repair = AnalysisBatch(batch.index, batch.repairs + 1)
+            for chunk in invalid:
+                repair.add(chunk)
+            if batch.repairs >= self.max_repairs:
+                if self.on_failure:
+                    self.on_failure(repair, f"补发 {batch.repairs} 次后分析结果仍缺失或格式错误")
+                repair = None
+
+        with self._lock:
+            if repair is None:
+                self.batches_done += 1
+            else:
+                self.repairs += 1
+            invalid_ids = {id(chunk) for chunk in invalid}
+            for chunk in batch.files:
+                if id(chunk) not in invalid_ids:
+                    self._finish_chunk(chunk, content is not None)
+                elif repair is None:
+                    # 补发次数用完仍不合格
+                    self._finish_chunk(chunk, False)
+        return repair
+
+    def _finish_chunk(self, chunk, succeeded):
+        """按文件统计进度（调用方持有锁）"""
+        path = chunk.path
+        if path in self._failed_paths:
+            return
+        if not succeeded:
+            self._failed_paths.add(path)
+            self.failed_files += 1
+            return
+        self._parts_left[path] -= 1
+        if self._parts_left[path] == 0:
+            del self._parts_left[path]
+            self.done_files += 1
+
+    def _wait_cooldown(self):
+        while not self.stopped:
+            with self._lock:
+                remaining = self._cooldown_until - time.time()
+            if remaining <= 0:
+                return
+            self._stop.wait(min(remaining, 1.0))
+
+    def _request_with_retry(self, batch):
+        """请求模型，返回 (内容, None) 或 (None, 错误信息)"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            self._wait_cooldown()
+            if self.stopped:
+                return None, "分析已停止"
+
+            result = self.request_fn(batch)
+            if "error" not in result:
+                return result.get("content", ""), None
+
+            error = result["error"]
+            status = result.get("status_code")
+            retryable = result.get("retryable", status is None or status in RETRYABLE_STATUS)
+            if not retryable or attempt == self.max_retries:
+                break
+
+            delay = result.get("retry_after")
+            if not delay:
+                delay = min(MAX_BACKOFF_SECONDS, 2 ** attempt) * (1 + random.random() * 0.25)
+            with self._lock:
+                self.retries += 1
+                if status == 429:
+                    # 限流：所有工作线程一起等待
+                    self._cooldown_until = max(self._cooldown_until, time.time() + delay)
+            if status != 429:
+                self._stop.wait(delay)
+        return None, error
+
+    def get_progress(self):
+        """获取进度：已完成/失败文件数、批次、在途请求数、已用时间和预计剩余时间"""
+        with self._lock:
+            finished = self.done_files + self.failed_files
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0.0
+            eta = None
+            if finished and finished < self.total_files and self.finished_at is None:
+                eta = elapsed / finished * (self.total_files - finished)
+            return {
+                "total_files": self.total_files,
+                "done_files": self.done_files,
+                "failed_files": self.failed_files,
+                "batches_planned": self.batches_planned,
+                "batches_done": self.batches_done,
+                "in_flight": self.in_flight,
+                "retries": self.retries,
+                "repairs": self.repairs,
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": round(eta, 1) if eta is not None else None
+            }
@@ -0,0 +1,99 @@
+"""
+文档分析响应协议 - 用成对的文件标记包裹每个文件的分析结果，解析并校验后按文件对应回去
+"""
+
+import re
+
+# 每个文件的分析结果写在 <<<FILE n>>> 与 <<<END FILE n>>> 之间，n 是请求中的文件序号
+SECTION_START = "<<<FILE {index}>>>"
+SECTION_END = "<<<END FILE {index}>>>"
+# 每段分析结果必须包含的标题
+REQUIRED_HEADING = "# 文件分析"
+
+_MARKER_RE = re.compile(r'^[ \t]*<<<(END )?FILE (\d+)>>>[ \t]*$', re.MULTILINE)
+_FENCE_RE = re.compile(r'^```[a-zA-Z]*\s*\n(.*?)\n```\s*$', re.DOTALL)
+
+
+def format_instructions(count):
+    """批量请求末尾的输出格式说明"""
+    example = "\n".join((SECTION_START.format(index=1), f"{REQUIRED_HEADING}: [文件名]", "...",
+                         SECTION_END.format(index=1)))
+    return (f"请为全部 {count} 个文件（或文件片段）分别输出分析结果。每个结果必须以单独一行的 "
+            f"`{SECTION_START.format(index='序号')}` 开始、以单独一行的 `{SECTION_END.format(index='序号')}` "
+            f"结束，序号与上面的“文件 序号”一致，标记之外不要输出任何内容。例如：\n\n{example}")
+
+
+def validate_section(text):
+    """校验一段分析结果，返回 (清理后的文本, 错误原因)；合格时错误原因为None"""
+    text = text.strip()
+    # 模型有时会把整段结果包进 ```markdown 代码块
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    if not text:
+        return text, "分析结果为空"
+    if REQUIRED_HEADING not in text:
+        return text, f"缺少“{REQUIRED_HEADING}”标题"
+    return text, None
+
+
+def parse_response(response, count):
+    """把批量分析的响应拆回各个文件
+
+    返回 (sections, problems)：sections 为 {序号: 分析文本}（序号从1开始），problems 为
+    {序号: 原因}，包含缺失、未闭合（通常是输出被截断）、重复和校验不通过的文件。
+    同一序号有两个完整且合格的结果时视为重复；先前未闭合或不合格的结果会被后面合格的结果取代。
+    只有一个文件且响应中没有任何标记时，整个响应视为该文件的结果。
+    """
+    sections = {}
+    problems = {}
+    markers = list(_MARKER_RE.finditer(response))
+
+    if not markers and count == 1:
+        text, error = validate_section(response)
+        if error:
+            problems[1] = error
+        else:
+            sections[1] = text
+        return sections, problems
+
+    def unclosed(index):
+        # 已有完整结果时忽略后面未闭合的同序号标记
+        if index not in sections:
+            problems.setdefault(index, "缺少结束标记")
+
+    open_index = None
+    open_at = 0
+    for marker in markers:
+        is_end, index = marker.group(1) is not None, int(marker.group(2))
+        if not is_end:
+            if open_index is not None:
+                unclosed(open_index)
+            open_index, open_at = index, marker.end()
+            continue
+        if open_index != index:
+            continue
+        if index in sections:
+            problems[index] = "结果重复"
+            sections.pop(index)
+        elif problems.get(index) != "结果重复":
+            # 之前未闭合或校验不通过的同序号结果，以后面完整且合格的结果为准
+            text, error = validate_section(response[open_at:marker.start()])
+            if error:
+                problems[index] = error
+            else:
+                problems.pop(index, None)
+                sections[index] = text
+        open_index = None
+    if open_index is not None:
+        unclosed(open_index)
+
+    for index in range(1, count + 1):
+        if index not in sections and index not in problems:
+            problems[index] = "缺少分析结果"
+    # 序号超出范围的结果无法对应到文件
+    for index in [index for index in sections if not 1 <= index <= count]:
+        del sections[index]
+    for index in [index for index in problems if not 1 <= index <= count]:
+        del problems[index]
+    return sections, problems
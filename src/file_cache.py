@@ -0,0 +1,137 @@
+"""
+文件内容缓存 - 按 (路径, mtime, 大小) 缓存解码后的文件文本，所有读取类工具共享
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from .config import config_store
+
+DEFAULT_MAX_MB = 64
+
+
+def split_lines(text):
+    """与文本模式 readlines() 相同的分行结果（保留行尾的\\n）"""
+    if not text:
+        return []
+    lines = [line + '\n' for line in text.split('\n')]
+    if text.endswith('\n'):
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+class _Entry:
+    __slots__ = ('mtime_ns', 'size', 'text')
+
+    def __init__(self, mtime_ns, size, text):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.text = text
+
+
+class FileContentCache:
+    """进程级的只读文件内容缓存
+
+    主AI、引导AI和研究员AI的读取都经过这里：文件的 mtime 和大小与缓存一致时直接返回
+    缓存的文本，否则重新读取。文本与 open(path, encoding='utf-8').read() 的结果相同
+    （换行统一为\\n）。缓存按文件字节数计入 max_bytes 预算，超出时淘汰最久未使用的文件，
+    超过预算四分之一的大文件不缓存。写入类工具修改文件后调用 invalidate()，
+    避免同一 mtime 粒度内的改写被误判为未变化。
+    """
+
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = max(0, config_store.get_int('file_cache_mb', DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _lookup(self, key, stat):
+        """返回与 stat 一致的缓存文本并记为命中（调用方持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += entry.size
+        return entry.text
+
+    def read_text(self, path):
+        """读取文件文本；文件不存在或不是UTF-8时抛出与 open().read() 相同的异常"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            text = self._lookup(key, stat)
+            if text is not None:
+                return text
+            self.misses += 1
+
+        with open(key, 'rb') as f:
+            data = f.read()
+        text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+        # 读取期间文件被修改时不缓存，下次读取重新获取
+        stat_after = os.stat(key)
+        size = len(data)
+        if (stat_after.st_mtime_ns == stat.st_mtime_ns and stat_after.st_size == size
+                and size <= self.max_bytes // 4):
+            with self._lock:
+                self._drop(key)
+                self._entries[key] = _Entry(stat.st_mtime_ns, size, text)
+                self._bytes += size
+                while self._bytes > self.max_bytes and self._entries:
+                    self._drop(next(iter(self._entries)))
+        return text
+
+    def peek(self, path):
+        """只在缓存中有该文件的最新内容时返回文本，否则返回None（不读取文件）"""
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        with self._lock:
+            return self._lookup(key, stat)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def invalidate(self, path):
+        """文件被写入/修改/删除后调用"""
+        with self._lock:
+            self._drop(os.path.abspath(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """获取缓存占用、命中率和节省的读取字节数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+                "bytes_saved": self.bytes_saved
+            }
+
+
+# 全局文件内容缓存实例
+file_cache = FileContentCache()
@@ -0,0 +1,282 @@
+"""
+按大小读取文件 - 大文件先返回结构大纲，再按token预算分页读取，限制可按扩展名配置
+"""
+
+import os
+import re
+import ast
+import json
+
+from .config import config_store
+from .file_cache import file_cache, split_lines
+from .token_counter import token_counter
+
+# 扩展名 -> 读取限制；'*' 为默认值，配置项 read_file_limits 中的同名条目覆盖这里的字段
+# - max_tokens: 不超过该token数的文件直接返回全部内容
+# - page_tokens: 分页读取时每页的token预算
+# - outline: 超过 max_tokens 的文件首次读取时是否返回结构大纲
+DEFAULT_READ_LIMITS = {
+    '*': {'max_tokens': 8000, 'page_tokens': 4000, 'outline': True},
+    '.json': {'max_tokens': 4000, 'page_tokens': 3000},
+    '.min.js': {'max_tokens': 2000, 'page_tokens': 2000, 'outline': False},
+    '.min.css': {'max_tokens': 2000, 'page_tokens': 2000, 'outline': False},
+    '.map': {'max_tokens': 1000, 'page_tokens': 2000, 'outline': False},
+    '.lock': {'max_tokens': 2000, 'page_tokens': 2000, 'outline': False},
+    '.log': {'max_tokens': 4000, 'page_tokens': 4000, 'outline': False},
+    '.csv': {'max_tokens': 4000, 'page_tokens': 3000, 'outline': False},
+}
+# 估算token数时编码的样本长度，更短的文件直接精确计数
+_SAMPLE_CHARS = 64 * 1024
+# 大纲最多列出的条目数
+MAX_OUTLINE_ENTRIES = 300
+
+_MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+_DECLARATION_RE = re.compile(
+    r'^(\s*)(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|static\s+|abstract\s+|pub\s+)*'
+    r'(?:async\s+)?(function\*?|class|interface|type|enum|struct|trait|impl|fn|func|def|module|namespace)\s+([A-Za-z_$][\w$]*)')
+_ARROW_RE = re.compile(r'^(\s*)(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*=>')
+_CURSOR_RE = re.compile(r'^\s*(\d+)(?::(\d+))?\s*$')
+
+
+class SizeAwareReader:
+    """read_file 的读取策略
+
+    - 文件不超过 max_tokens：返回全部内容
+    - 超过 max_tokens 且未指定游标：有本地解析器（Python用ast，Markdown标题，JSON顶层键，
+      其他代码用声明正则）时返回带行号范围的结构大纲，否则直接返回第一页
+    - 指定游标：从游标位置开始返回一页不超过 page_tokens 的内容，并给出下一页游标
+    游标格式为 "行号" 或 "行号:列"，后者用于压缩后单行很长的文件。
+    """
+
+    def limits(self, path):
+        """获取文件适用的读取限制：按最长匹配的扩展名合并默认值和配置"""
+        configured = config_store.get('read_file_limits', {}) or {}
+        limits = dict(DEFAULT_READ_LIMITS['*'])
+        limits.update(configured.get('*', {}))
+        name = os.path.basename(path).lower()
+        suffixes = set(DEFAULT_READ_LIMITS) | set(configured)
+        matched = [suffix for suffix in suffixes if suffix != '*' and name.endswith(suffix.lower())]
+        if matched:
+            suffix = max(matched, key=len)
+            limits.update(DEFAULT_READ_LIMITS.get(suffix, {}))
+            limits.update(configured.get(suffix, {}))
+        return limits
+
+    def estimate_tokens(self, text):
+        """估算文本的token数：短文本精确计数，长文本按开头样本的字符/token比例推算"""
+        if len(text) <= _SAMPLE_CHARS:
+            return token_counter.count(text)
+        sample = text[:_SAMPLE_CHARS]
+        return int(len(text) * token_counter.count(sample) / max(1, len(sample)))
+
+    def read(self, path, cursor=None):
+        """读取文件，返回 read_file 的结果字典；游标无效时返回错误字符串"""
+        text = file_cache.read_text(path)
+        limits = self.limits(path)
+        tokens = self.estimate_tokens(text)
+        lines = split_lines(text)
+        result = {
+            'status': 'success',
+            'file_path': path,
+            'line_count': len(lines),
+            'char_count': len(text),
+            'tokens': tokens
+        }
+
+        if cursor is None or not str(cursor).strip():
+            if tokens <= limits['max_tokens']:
+                result.update(mode='full', content=text,
+                              message=f"成功读取文件 {path}，内容长度: {len(text)} 字符")
+                return result
+            outline = self.outline(path, text, lines) if limits.get('outline', True) else None
+            if outline:
+                result.update(mode='outline', content=self._format_outline(outline, limits['page_tokens']),
+                              outline_entries=len(outline), next_cursor='1')
+                result['message'] = (f"文件 {path} 较大（{len(lines)} 行，约 {tokens} tokens），已返回结构大纲。"
+                                     f"请用 precise_reading 读取需要的行范围，或用 {self.cursor_call(path, '1')} 从头分页读取")
+                return result
+            cursor = '1'
+
+        match = _CURSOR_RE.match(str(cursor))
+        if not match:
+            return f"错误：无效的读取游标 {cursor}，格式应为 行号 或 行号:列"
+        line, column = int(match.group(1)), int(match.group(2) or 0)
+        if not lines or line < 1 or line > len(lines) or column >= len(lines[line - 1]):
+            return f"错误：读取游标 {cursor} 超出文件范围，文件共 {len(lines)} 行"
+
+        chars_per_token = len(text) / max(1, tokens)
+        content, end_line, next_cursor = self.page(lines, line, column,
+                                                   max(1, int(limits['page_tokens'] * chars_per_token)))
+        result.update(mode='page', content=content, start_line=line, end_line=end_line, next_cursor=next_cursor)
+        position = f"第 {line}-{end_line} 行" if not column else f"第 {line} 行第 {column} 列起至第 {end_line} 行"
+        message = f"成功读取文件 {path} 的{position}（共 {len(lines)} 行）"
+        if next_cursor:
+            message += f"，继续读取请使用 {self.cursor_call(path, next_cursor)}"
+        else:
+            message += "，已读到文件末尾"
+        result['message'] = message
+        return result
+
+    @staticmethod
+    def cursor_call(path, cursor):
+        return f"<read_file><path>{path}</path><cursor>{cursor}</cursor></read_file>"
+
+    @staticmethod
+    def page(lines, line, column, budget_chars):
+        """从第 line 行第 column 列开始取不超过 budget_chars 个字符
+
+        返回 (内容, 最后一行的行号, 下一页游标)；读到文件末尾时游标为None。
+        整行放不下时下一页从该行开始，单独一行就超出预算时在行内切开。
+        """
+        parts = []
+        used = 0
+        index, offset = line - 1, column
+        while index < len(lines):
+            rest = lines[index][offset:]
+            room = budget_chars - used
+            if len(rest) <= room:
+                parts.append(rest)
+                used += len(rest)
+                index, offset = index + 1, 0
+                continue
+            if parts and offset == 0:
+                break
+            parts.append(rest[:room])
+            offset += room
+            break
+
+        end_line = index + 1 if offset else index
+        if index >= len(lines):
+            next_cursor = None
+        else:
+            next_cursor = f"{index + 1}:{offset}" if offset else str(index + 1)
+        return "".join(parts), end_line, next_cursor
+
+    def outline(self, path, text, lines):
+        """用本地解析器生成结构大纲 [(层级, 描述, 起始行, 结束行)]，无法解析时返回None
+
+        JSON 大纲列出顶层键，起止行为None。
+        """
+        name = path.lower()
+        entries = None
+        if name.endswith('.py'):
+            entries = self._python_outline(text)
+        elif name.endswith(_MARKDOWN_EXTENSIONS):
+            entries = self._markdown_outline(lines)
+        elif name.endswith('.json'):
+            entries = self._json_outline(text)
+        if entries is None:
+            entries = self._declaration_outline(lines)
+        return entries or None
+
+    @staticmethod
+    def _python_outline(text):
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return None
+
+        entries = []
+
+        def visit(body, depth):
+            for node in body:
+                if isinstance(node, ast.ClassDef):
+                    entries.append((depth, f"class {node.name}", node.lineno, node.end_lineno))
+                    visit(node.body, depth + 1)
+                elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                    entries.append((depth, f"{prefix} {node.name}()", node.lineno, node.end_lineno))
+
+        visit(tree.body, 0)
+        return entries
+
+    @staticmethod
+    def _markdown_outline(lines):
+        headings = []
+        in_fence = False
+        for number, line in enumerate(lines, 1):
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+                continue
+            match = None if in_fence else _HEADING_RE.match(line.rstrip('\n'))
+            if match:
+                headings.append((len(match.group(1)), match.group(2), number))
+
+        entries = []
+        for i, (level, title, start) in enumerate(headings):
+            # 章节到下一个同级或更高级标题之前结束
+            end = len(lines)
+            for next_level, _, next_start in headings[i + 1:]:
+                if next_level <= level:
+                    end = next_start - 1
+                    break
+            entries.append((level - 1, "#" * level + " " + title, start, end))
+        return entries
+
+    @staticmethod
+    def _json_outline(text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+
+        def describe(value):
+            if isinstance(value, dict):
+                return f"对象, {len(value)} 个键"
+            if isinstance(value, list):
+                return f"数组, {len(value)} 项"
+            return type(value).__name__
+
+        if isinstance(data, dict):
+            return [(0, f"\"{key}\": {describe(value)}", None, None) for key, value in data.items()]
+        return [(0, f"顶层{describe(data)}", None, None)]
+
+    @staticmethod
+    def _declaration_outline(lines):
+        starts = []
+        for number, line in enumerate(lines, 1):
+            if len(line) > 500:
+                # 压缩过的超长行没有可用的结构
+                continue
+            match = _DECLARATION_RE.match(line)
+            if match:
+                starts.append((len(match.group(1).expandtabs(4)), f"{match.group(2)} {match.group(3)}", number))
+                continue
+            match = _ARROW_RE.match(line)
+            if match:
+                starts.append((len(match.group(1).expandtabs(4)), f"const {match.group(2)} =>", number))
+
+        entries = []
+        for i, (indent, title, start) in enumerate(starts):
+            # 没有语法树时，声明到下一个缩进不更深的声明之前结束
+            end = len(lines)
+            for next_indent, _, next_start in starts[i + 1:]:
+                if next_indent <= indent:
+                    end = next_start - 1
+                    break
+            entries.append((1 if indent else 0, title, start, end))
+        return entries
+
+    @staticmethod
+    def _format_outline(entries, page_tokens):
+        """格式化大纲，条目过多时截断"""
+        # JSON 的键没有对应的行号范围
+        rows = [f"{'  ' * min(depth, 6)}{title}" + (f"  [行 {start}-{end}]" if start else "")
+                for depth, title, start, end in entries]
+        budget = page_tokens * 3
+        output = []
+        used = 0
+        for row in rows[:MAX_OUTLINE_ENTRIES]:
+            used += len(row) + 1
+            if used > budget:
+                break
+            output.append(row)
+        if len(output) < len(rows):
+            output.append(f"... (还有 {len(rows) - len(output)} 个条目未列出)")
+        return "\n".join(output)
+
+
+# 全局按大小读取策略实例
+size_aware_reader = SizeAwareReader()
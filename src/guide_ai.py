@@ -3,23 +3,27 @@ AI引导者模块 - 用于引导主AI进行问题诊断和修复
 """
 
 import requests
-import json
 import re
 import os
 import subprocess
 from colorama import Fore, Style
 from .ai_tools import ai_tool_processor
-from .config import load_config, DEFAULT_API_URL
+from .file_cache import file_cache
+from .config import config_store, DEFAULT_API_URL
+from .history_store import HistoryBuffer
+from .sse_decoder import SSEDecoder, StreamPrinter, event_content, stream_fps
+from .http_transport import http_transport
 from .ai_client import ai_client
 
 class GuideAI:
     """AI引导者类，负责引导主AI进行问题诊断"""
     
     def __init__(self):
-        self.config = load_config()
+        self.config = config_store.snapshot()
         self.api_url = DEFAULT_API_URL
         self.guide_model = None
-        self.conversation_history = []
+        # 最近20条对话，超出时自动淘汰最旧的消息
+        self.conversation_history = HistoryBuffer(maxlen=20)
         self.main_ai_responses = []
         
     def set_guide_model(self, model_name):
@@ -150,11 +154,10 @@ class GuideAI:
                         content_found = False
                         for path in possible_paths:
                             if os.path.exists(path):
-                                with open(path, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-                                    tool_result = f"\n[文件内容: {path}]\n{content}\n[文件结束]\n"
-                                    content_found = True
-                                    break
+                                content = file_cache.read_text(path)
+                                tool_result = f"\n[文件内容: {path}]\n{content}\n[文件结束]\n"
+                                content_found = True
+                                break
                         
                         if not content_found:
                             # 列出当前目录文件帮助调试
@@ -209,7 +212,7 @@ class GuideAI:
             
             # 添加历史对话（如果有）
             if self.conversation_history:
-                messages.extend(self.conversation_history[-10:])  # 只保留最近10轮对话
+                messages.extend(self.conversation_history.recent(10))  # 只保留最近10轮对话
             
             # 添加当前提示
             messages.append({"role": "user", "content": prompt})
@@ -239,7 +242,7 @@ class GuideAI:
     def _handle_streaming_response(self, headers, data, prompt):
         """处理流式响应"""
         try:
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=60, stream=True)
+            response = http_transport.post(self.api_url, headers=headers, json=data, timeout=60, stream=True)
             
             if response.status_code != 200:
                 error_detail = ""
@@ -252,25 +255,29 @@ class GuideAI:
             
             print(f"{Fore.CYAN}🤖 引导者AI:{Style.RESET_ALL}")
             
-            ai_response = ""
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data_str = line[6:]
-                        if data_str == '[DONE]':
-                            break
-                        try:
-                            data_obj = json.loads(data_str)
-                            if 'choices' in data_obj and data_obj['choices']:
-                                delta = data_obj['choices'][0].get('delta', {})
-                                content = delta.get('content', '')
-                                if content:
-                                    print(content, end='', flush=True)
-                                    ai_response += content
-                        except json.JSONDecodeError:
-                            continue
-            
+            response_parts = []
+            decoder = SSEDecoder()
+            printer = StreamPrinter(stream_fps())
+            chunks = response.iter_content(chunk_size=None)
+            try:
+                for chunk in chunks:
+                    for event in decoder.feed(chunk):
+                        content = event_content(event)
+                        if content:
+                            printer.write(content)
+                            response_parts.append(content)
+                    if decoder.done:
+                        break
+                for event in decoder.close():
+                    content = event_content(event)
+                    if content:
+                        printer.write(content)
+                        response_parts.append(content)
+            finally:
+                printer.flush()
+                # 读完剩余数据再关闭，连接回到连接池
+                http_transport.release(response, chunks)
+            ai_response = "".join(response_parts)
             print()  # 换行
             
             if not ai_response:
@@ -280,12 +287,8 @@ class GuideAI:
             processed_response = self.process_guide_tools(ai_response)
             
             # 保存对话历史
-            self.conversation_history.append({"role": "user", "content": prompt})
-            self.conversation_history.append({"role": "assistant", "content": processed_response})
-                
-            # 限制历史长度
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
+            self.conversation_history.append("user", prompt)
+            self.conversation_history.append("assistant", processed_response)
             
             return processed_response
             
@@ -295,7 +298,7 @@ class GuideAI:
     def _handle_non_streaming_response(self, headers, data, prompt):
         """处理非流式响应"""
         try:
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=60)
+            response = http_transport.post(self.api_url, headers=headers, json=data, timeout=60)
             
             if response.status_code != 200:
                 error_detail = ""
@@ -320,12 +323,8 @@ class GuideAI:
             processed_response = self.process_guide_tools(ai_response)
             
             # 保存对话历史
-            self.conversation_history.append({"role": "user", "content": prompt})
-            self.conversation_history.append({"role": "assistant", "content": processed_response})
-                
-            # 限制历史长度
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
+            self.conversation_history.append("user", prompt)
+            self.conversation_history.append("assistant", processed_response)
             
             return processed_response
             
@@ -365,7 +364,7 @@ class GuideAI:
     
     def clear_session(self):
         """清除当前调试会话"""
-        self.conversation_history = []
+        self.conversation_history.clear()
         self.main_ai_responses = []
         print(f"{Fore.YELLOW}调试会话已清除{Style.RESET_ALL}")
 
@@ -7,43 +7,34 @@ import sys
 import json
 import re
 import asyncio
-import aiohttp
 from colorama import Fore, Style
-from .config import load_config, DEFAULT_API_URL
+from .config import config_store, DEFAULT_API_URL
+from .http_transport import http_transport
+from .async_runtime import async_runtime
 from .modes import hacpp_mode
 from .thinking_animation import show_dot_cycle_animation_async
 from .ai_tools import AIToolProcessor
 from .file_utils import get_directory_structure
+from .history_store import HistoryBuffer
 
 class HACPPAIClient:
     """HACPP模式AI客户端"""
 
     def __init__(self):
-        self.cheap_ai_history = []
-        self.expensive_ai_history = []
         self.max_history_messages = 20  # 最大历史消息数
-        # 文件读取缓存，避免重复读取
-        self.file_cache = {}
+        # 超过最大数量时自动淘汰最旧的消息
+        self.cheap_ai_history = HistoryBuffer(maxlen=self.max_history_messages)
+        self.expensive_ai_history = HistoryBuffer(maxlen=self.max_history_messages)
         self.read_history = set()  # 记录已读取的文件路径
         # 为便宜AI创建一个独立的、权限受限的工具处理器
         self.researcher_tool_processor = AIToolProcessor()
         # 给便宜AI更多工具权限，包括执行命令
         self.researcher_tool_processor.tools = {
-            'read_file': self._cached_read_file,  # 使用缓存版本
+            'read_file': self._cached_read_file,  # 使用共享文件缓存
             'execute_command': self.researcher_tool_processor.execute_command,  # 添加执行命令权限
             'task_complete': self.researcher_tool_processor.task_complete
         }
 
-    def _add_to_history(self, history_list, role, content):
-        """添加消息到历史记录，并限制最大数量"""
-        history_list.append({"role": role, "content": content})
-        # 保留最近的max_history_messages条消息
-        if len(history_list) > self.max_history_messages:
-            # 如果超过限制，移除最旧的消息，但保留系统消息
-            history_list = [msg for msg in history_list if msg.get("role") == "system"][-1:] + \
-                          [msg for msg in history_list if msg.get("role") != "system"][-(self.max_history_messages-1):]
-        return history_list
-
     def _summarize_history(self, history_list):
         """生成历史记录的摘要"""
         if not history_list:
@@ -74,23 +65,16 @@ class HACPPAIClient:
 
     def clear_cache(self):
         """清空缓存，用于新的分析任务"""
-        self.file_cache.clear()
         self.read_history.clear()
-        self.cheap_ai_history = []
-        self.expensive_ai_history = []
-
-    def _cached_read_file(self, path):
-        """带缓存的文件读取方法，避免重复读取"""
-        # 检查是否已经读取过这个文件
-        if path in self.read_history:
-            return f"文件 {path} 已在本次分析中读取过，内容已缓存。如需重新查看，请使用 code_search 工具搜索特定内容。"
-        
+        self.cheap_ai_history.clear()
+        self.expensive_ai_history.clear()
+
+    def _cached_read_file(self, path, cursor=None):
+        """研究员的文件读取：内容来自全局文件缓存，与主AI共享，文件未变化时不重复读取"""
         try:
-            # 如果没有读取过，则调用原始的读取方法
-            result = self.researcher_tool_processor.read_file(path)
-            
-            # 如果读取成功，记录到历史中
-            if "成功读取文件" in result or "文件内容:" in result:
+            result = self.researcher_tool_processor.read_file(path, cursor)
+            # 记录本次分析读取过的文件
+            if isinstance(result, dict) and result.get('status') == 'success':
                 self.read_history.add(path)
             return result
         except FileNotFoundError:
@@ -109,9 +93,8 @@ class HACPPAIClient:
         system_prompt = self._get_cheap_ai_system_prompt()
 
         try:
-            config = load_config()
-            api_key = config.get('api_key')
-            api_url = config.get('api_url', DEFAULT_API_URL)
+            api_key = config_store.get_str('api_key')
+            api_url = config_store.get_str('api_url', DEFAULT_API_URL)
 
             if not api_key:
                 return "错误：未配置API密钥"
@@ -134,7 +117,7 @@ class HACPPAIClient:
             messages.append({"role": "user", "content": message})
             
             # 添加最近的几条完整对话
-            recent_messages = self.cheap_ai_history[-4:]  # 保留最近的2轮对话
+            recent_messages = self.cheap_ai_history.recent(4)  # 保留最近的2轮对话
             for msg in recent_messages:
                 messages.append(msg)
 
@@ -145,20 +128,19 @@ class HACPPAIClient:
                 'max_tokens': 12000
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, headers=headers, json=payload, timeout=30) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        ai_response = result['choices'][0]['message']['content']
-                        # 使用新的方法添加历史记录
-                        self.cheap_ai_history = self._add_to_history(
-                            self.cheap_ai_history, "user", message)
-                        self.cheap_ai_history = self._add_to_history(
-                            self.cheap_ai_history, "assistant", ai_response)
-                        return ai_response
-                    else:
-                        error_text = await response.text()
-                        return f"便宜AI请求失败: {response.status} - {error_text}"
+            # 复用共享连接池，避免每一步都重新建立连接
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                None, lambda: http_transport.post(api_url, headers=headers, json=payload, timeout=30))
+            if response.status_code == 200:
+                result = response.json()
+                ai_response = result['choices'][0]['message']['content']
+                # 添加历史记录，超出上限的旧消息由缓冲区自动淘汰
+                self.cheap_ai_history.append("user", message)
+                self.cheap_ai_history.append("assistant", ai_response)
+                return ai_response
+            else:
+                return f"便宜AI请求失败: {response.status_code} - {response.text}"
 
         except Exception as e:
             return f"便宜AI请求异常: {str(e)}"
@@ -185,7 +167,12 @@ class HACPPAIClient:
         while i < max_iterations:
             i += 1
             # 异步调用便宜AI并显示动画
-            ai_response = asyncio.run(self._get_response_with_animation(current_message, i, max_iterations))
+            # 所有迭代共用会话事件循环，不再每轮新建
+            try:
+                ai_response = async_runtime.run(self._get_response_with_animation(current_message, i, max_iterations))
+            except asyncio.CancelledError:
+                print(f"\n{Fore.YELLOW}便宜AI分析已被用户中断{Style.RESET_ALL}")
+                return None
 
             if "错误" in ai_response:
                 print(f"{Fore.RED}便宜AI请求失败: {ai_response}{Style.RESET_ALL}")
@@ -244,7 +231,7 @@ class HACPPAIClient:
 # 你的工作流程
 1.  **分析需求**：深入理解用户的最终目标。
 2.  **收集信息**：你可以使用以下只读工具来探索项目、阅读文件，并收集所有必要的信息：
-    *   `<read_file><path>...</path></read_file>` - 注意：每个文件只能读取一次，重复读取会被阻止
+    *   `<read_file><path>...</path></read_file>` - 读取文件；大文件会先返回结构大纲，再用 `<read_file><path>...</path><cursor>行号</cursor></read_file>` 分页读取
 3.  **循环迭代**：你可以多次调用这些工具来逐步完善你的理解和计划。
 4.  **完成并移交**：当你收集到足够的信息并制定了完整的计划后，通过调用 `<task_complete><summary>...</summary></task_complete>` 工具来结束你的工作。这是将计划移交给执行者的信号。
 
@@ -298,8 +285,8 @@ class HACPPAIClient:
 
     def clear_history(self):
         """清除对话历史"""
-        self.cheap_ai_history = []
-        self.expensive_ai_history = []
+        self.cheap_ai_history.clear()
+        self.expensive_ai_history.clear()
 
 
 # 全局HACPP客户端实例
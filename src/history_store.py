@@ -0,0 +1,157 @@
+"""
+对话历史存储 - 基于 deque 的紧凑消息记录，供各客户端和上下文管理器共享
+"""
+
+import time
+from collections import deque
+from itertools import islice
+
+from .token_counter import token_counter
+
+# 角色位
+ROLE_SYSTEM = 1
+ROLE_USER = 2
+ROLE_ASSISTANT = 4
+ROLE_BITS = {"system": ROLE_SYSTEM, "user": ROLE_USER, "assistant": ROLE_ASSISTANT}
+# 内容标记位
+FLAG_TOOL = 8      # 含工具调用/执行相关内容
+FLAG_STATUS = 16   # 含错误、成功、完成等状态信息
+
+# 与上下文压缩原有的判定规则一致
+TOOL_MARKERS = ("<", ">", "工具", "执行")
+STATUS_KEYWORDS = ("错误", "error", "失败", "成功", "完成")
+
+
+def message_flags(role, content):
+    """计算消息的角色/标记位"""
+    flags = ROLE_BITS.get(role, 0)
+    if any(marker in content for marker in TOOL_MARKERS):
+        flags |= FLAG_TOOL
+    lowered = content.lower()
+    if any(keyword in lowered for keyword in STATUS_KEYWORDS):
+        flags |= FLAG_STATUS
+    return flags
+
+
+def select_important(flags, recent=20, tool_limit=10, status_limit=5):
+    """按标记位选出需要保留的消息下标（升序）
+
+    保留最近 recent 条、最后 tool_limit 条工具消息和最后 status_limit 条状态消息，
+    一次遍历完成，结果按原顺序返回。
+    """
+    flags = list(flags)
+    count = len(flags)
+    keep = set(range(max(count - recent, 0), count))
+    tool_indices = deque(maxlen=tool_limit)
+    status_indices = deque(maxlen=status_limit)
+    for index, value in enumerate(flags):
+        if value & FLAG_TOOL:
+            tool_indices.append(index)
+        if value & FLAG_STATUS:
+            status_indices.append(index)
+    keep.update(tool_indices)
+    keep.update(status_indices)
+    return sorted(keep)
+
+
+class MessageRecord:
+    """单条消息记录
+
+    message 是发送给API的 {"role", "content"} 字典，创建后不再变化，
+    每轮构建请求时直接复用同一个对象。
+    """
+
+    __slots__ = ("message", "tokens", "flags", "timestamp")
+
+    def __init__(self, role, content, timestamp=None):
+        self.message = {"role": role, "content": content}
+        self.tokens = token_counter.count(content)
+        self.flags = message_flags(role, content)
+        self.timestamp = timestamp or time.time()
+
+    @property
+    def role(self):
+        return self.message["role"]
+
+    @property
+    def content(self):
+        return self.message["content"]
+
+
+class HistoryBuffer:
+    """有界的对话历史环形缓冲区
+
+    maxlen 不为空时由 deque 自动淘汰最旧的记录；trim_to() 用于检查点式裁剪。
+    迭代得到的是消息字典，可以直接展开到请求的 messages 列表中。
+    """
+
+    def __init__(self, maxlen=None, messages=None):
+        self._records = deque(maxlen=maxlen)
+        self.total_tokens = 0
+        if messages:
+            self.extend(messages)
+
+    @property
+    def maxlen(self):
+        return self._records.maxlen
+
+    def append(self, role, content):
+        """追加一条消息，返回对应的记录"""
+        record = MessageRecord(role, content)
+        if self._records.maxlen is not None and len(self._records) == self._records.maxlen:
+            self.total_tokens -= self._records[0].tokens
+        self._records.append(record)
+        self.total_tokens += record.tokens
+        return record
+
+    def extend(self, messages):
+        """追加若干 {"role", "content"} 消息"""
+        for message in messages:
+            self.append(message.get("role", "user"), message.get("content", ""))
+
+    def replace(self, messages):
+        """用新的消息列表替换全部历史"""
+        self.clear()
+        self.extend(messages)
+
+    def retain(self, indices):
+        """只保留给定下标（升序）的记录，记录对象原样复用，不重新计算token"""
+        records = list(self._records)
+        self._records = deque((records[index] for index in indices), maxlen=self._records.maxlen)
+        self.total_tokens = sum(record.tokens for record in self._records)
+
+    def trim_to(self, keep, start_role=None):
+        """只保留最近 keep 条记录；给定 start_role 时继续丢弃开头直到该角色的消息"""
+        while len(self._records) > keep:
+            self.total_tokens -= self._records.popleft().tokens
+        if start_role is not None:
+            while self._records and self._records[0].role != start_role:
+                self.total_tokens -= self._records.popleft().tokens
+
+    def clear(self):
+        self._records.clear()
+        self.total_tokens = 0
+
+    def records(self):
+        return iter(self._records)
+
+    def recent(self, count):
+        """最近 count 条消息（按时间顺序）"""
+        if count <= 0:
+            return []
+        result = list(islice(reversed(self._records), count))
+        result.reverse()
+        return [record.message for record in result]
+
+    def messages(self):
+        """全部消息字典列表"""
+        return [record.message for record in self._records]
+
+    def __iter__(self):
+        return (record.message for record in self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __bool__(self):
+        return bool(self._records)
@@ -0,0 +1,225 @@
+"""
+HTTP传输层 - 所有模型后端共享的连接池会话
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .config import config_store
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# 释放流式响应时最多读取的剩余字节数，超过时直接断开连接
+DRAIN_MAX_BYTES = 64 * 1024
+
+
+class _HttpxResponse:
+    """把httpx响应包装成调用方使用的requests响应接口"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    @property
+    def text(self):
+        self._response.read()
+        return self._response.text
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error: {self.text[:200]}", response=self)
+
+    def iter_lines(self):
+        for line in self._response.iter_lines():
+            yield line.encode('utf-8')
+
+    def iter_content(self, chunk_size=None):
+        yield from self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+
+class _StreamResponse:
+    """流式响应的包装：关闭时通知传输层该请求已结束，其余属性直接转给原响应"""
+
+    def __init__(self, response, on_close):
+        self._response = response
+        self._on_close = on_close
+
+    def close(self):
+        try:
+            self._response.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class _ClientSet:
+    """按同一组配置建立的连接池，记录仍在使用它的请求数"""
+
+    def __init__(self, settings, session, http2_client):
+        self.settings = settings
+        self.session = session
+        self.http2_client = http2_client
+        self.active = 0       # 在途请求数，流式响应关闭前一直计入
+        self.retired = False  # 配置已变化，最后一个在途请求结束后关闭
+
+    def close(self):
+        self.session.close()
+        if self.http2_client is not None:
+            self.http2_client.close()
+
+
+class HTTPTransport:
+    """共享HTTP传输层
+
+    每次agent步骤都重新建立TCP+TLS连接代价很高，这里为所有模型请求维护一个
+    带keep-alive的连接池会话。配置项:
+      http_pool_connections  缓存的主机连接池数量 (默认10)
+      http_pool_maxsize      每个主机的最大连接数 (默认10)
+      http2                  使用HTTP/2 (默认False)。默认所有请求都走 requests 的
+                             HTTP/1.1 keep-alive 连接池；只有设置为True且安装了
+                             httpx[http2] 时才改用 httpx 的HTTP/2客户端
+    配置变化时新请求改用新建的连接池，旧连接池等其上的在途请求（包括未关闭的流式响应）
+    全部结束后再关闭，不会打断其他线程正在读取的响应。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = None
+        self._retired = []  # 已退役但仍有在途请求的连接池
+
+    def _current_settings(self):
+        return (
+            config_store.get_int('http_pool_connections', 10),
+            config_store.get_int('http_pool_maxsize', 10),
+            config_store.get_bool('http2', False) and HTTPX_AVAILABLE,
+        )
+
+    def _create_clients(self, settings):
+        pool_connections, pool_maxsize, use_http2 = settings
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        http2_client = None
+        if use_http2:
+            try:
+                http2_client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=pool_connections * pool_maxsize,
+                                        max_keepalive_connections=pool_maxsize))
+            except ImportError:
+                # 缺少h2依赖时退回HTTP/1.1连接池
+                http2_client = None
+        return _ClientSet(settings, session, http2_client)
+
+    def _acquire(self):
+        """取当前配置对应的连接池并计入一个在途请求；配置变化时新建连接池"""
+        settings = self._current_settings()
+        with self._lock:
+            if self._clients is None or self._clients.settings != settings:
+                if self._clients is not None:
+                    self._retire(self._clients)
+                self._clients = self._create_clients(settings)
+            self._clients.active += 1
+            return self._clients
+
+    def _retire(self, clients):
+        """停止向旧连接池分配新请求，没有在途请求时立即关闭（调用方持有锁）"""
+        clients.retired = True
+        if clients.active == 0:
+            clients.close()
+        else:
+            self._retired.append(clients)
+
+    def _finish(self, clients):
+        """一个在途请求结束，已退役的连接池在最后一个请求结束时关闭"""
+        with self._lock:
+            clients.active -= 1
+            if not (clients.retired and clients.active == 0):
+                return
+            if clients in self._retired:
+                self._retired.remove(clients)
+        clients.close()
+
+    def post(self, url, json=None, headers=None, timeout=None, stream=False):
+        """发送POST请求，返回requests风格的响应对象
+
+        stream=True 时响应在 close()（或 release()）之前一直占用所属的连接池。
+        """
+        clients = self._acquire()
+        try:
+            if clients.http2_client is not None:
+                response = self._post_http2(clients.http2_client, url, json, headers, timeout, stream)
+            else:
+                response = clients.session.post(url, json=json, headers=headers, timeout=timeout, stream=stream)
+        except BaseException:
+            self._finish(clients)
+            raise
+        if not stream:
+            # 非流式响应在返回前已读完
+            self._finish(clients)
+            return response
+        return _StreamResponse(response, lambda: self._finish(clients))
+
+    def release(self, response, chunks=None, max_bytes=DRAIN_MAX_BYTES):
+        """结束使用流式响应并关闭
+
+        收到 [DONE] 后提前结束时，响应体通常只剩结尾的分块标记；先把剩余数据读完，
+        连接才会回到连接池被下次请求复用，否则关闭时连接会被丢弃。chunks 是调用方
+        正在使用的 iter_content 迭代器，必须接着它读：丢弃读到一半的迭代器同样会断开
+        连接。剩余数据超过 max_bytes 或读取出错时直接关闭连接。
+        """
+        try:
+            drained = 0
+            for chunk in chunks if chunks is not None else response.iter_content(chunk_size=8192):
+                drained += len(chunk)
+                if drained > max_bytes:
+                    break
+        except Exception:
+            pass
+        finally:
+            response.close()
+
+    def _post_http2(self, client, url, json, headers, timeout, stream):
+        # 统一转换为requests异常，调用方的异常处理保持不变
+        try:
+            request = client.build_request('POST', url, json=json, headers=headers, timeout=timeout)
+            response = client.send(request, stream=stream)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        return _HttpxResponse(response)
+
+    def close(self):
+        """关闭所有连接（包括仍有在途请求的旧连接池），之后的请求重新建立连接池"""
+        with self._lock:
+            clients = self._retired + ([self._clients] if self._clients is not None else [])
+            self._clients = None
+            self._retired = []
+        for item in clients:
+            item.retired = True
+            item.close()
+
+
+# 全局传输层实例
+http_transport = HTTPTransport()
@@ -18,9 +18,13 @@ class KeyboardHandler:
         self.interrupt_callback = None
         
     def start_monitoring(self, interrupt_callback=None):
-        """开始监控键盘事件"""
+        """开始监控键盘事件
+
+        Returns:
+            bool: 本次调用是否启动了监控（已在监控中时返回False，由启动方负责停止）
+        """
         if self.is_monitoring:
-            return
+            return False
             
         self.is_monitoring = True
         self.stop_event.clear()
@@ -28,6 +32,7 @@ class KeyboardHandler:
         
         self.monitor_thread = threading.Thread(target=self._monitor_keys, daemon=True)
         self.monitor_thread.start()
+        return True
         
     def stop_monitoring(self):
         """停止监控键盘事件"""
@@ -80,8 +85,8 @@ class KeyboardHandler:
 keyboard_handler = KeyboardHandler()
 
 def start_task_monitoring(interrupt_callback=None):
-    """开始任务监控（监听ESC键）"""
-    keyboard_handler.start_monitoring(interrupt_callback)
+    """开始任务监控（监听ESC键），返回本次调用是否启动了监控"""
+    return keyboard_handler.start_monitoring(interrupt_callback)
     
 def stop_task_monitoring():
     """停止任务监控"""
@@ -95,8 +100,13 @@ def show_esc_hint():
 task_interrupted = threading.Event()
 
 def interrupt_current_task():
-    """中断当前任务"""
+    """中断当前任务
+
+    运行在会话事件循环中的任务直接取消；标志位仍然设置，供线程中执行的阻塞操作（如命令执行）检查。
+    """
     task_interrupted.set()
+    from .async_runtime import async_runtime
+    async_runtime.cancel_running()
     
 def is_task_interrupted():
     """检查任务是否被中断"""
@@ -0,0 +1,136 @@
+"""
+文件行偏移索引 - 用mmap建立行起始偏移，按行范围读取和拼接修改文件
+"""
+
+import os
+import re
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+
+# 与文本模式读取（通用换行）一致：\r\n、\r、\n 都算换行
+_NEWLINE_RE = re.compile(rb'\r\n|\r|\n')
+# 不含 \r 的文件（最常见）只需查找 \n，速度约快三倍
+_LF_RE = re.compile(rb'\n')
+
+
+class LineIndex:
+    """单个文件的行偏移索引
+
+    offsets[i] 为第 i+1 行的起始字节偏移，行号范围读取只需要 seek 到对应偏移读取该范围的字节。
+    """
+
+    def __init__(self, path, mtime_ns, size, offsets, newline):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets
+        self.newline = newline
+
+    @classmethod
+    def build(cls, path):
+        stat = os.stat(path)
+        offsets = array('Q')
+        newline = '\n'
+        if stat.st_size:
+            offsets.append(0)
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                newline_re = _NEWLINE_RE if mm.find(b'\r') != -1 else _LF_RE
+                first = newline_re.search(mm)
+                if first:
+                    newline = first.group(0).decode('ascii')
+                offsets.extend(match.end() for match in newline_re.finditer(mm))
+            # 文件以换行结尾时，最后一个偏移不是新的一行
+            if offsets[-1] == stat.st_size:
+                offsets.pop()
+        return cls(path, stat.st_mtime_ns, stat.st_size, offsets, newline)
+
+    @property
+    def line_count(self):
+        return len(self.offsets)
+
+    def byte_range(self, start_line, end_line):
+        """第 start_line 到 end_line 行（含，从1开始）对应的字节范围"""
+        begin = self.offsets[start_line - 1]
+        end = self.offsets[end_line] if end_line < len(self.offsets) else self.size
+        return begin, end
+
+    def read_lines(self, start_line, end_line):
+        """读取行范围，返回与 readlines() 相同形式的行列表（换行统一为\\n）"""
+        begin, end = self.byte_range(start_line, end_line)
+        with open(self.path, 'rb') as f:
+            f.seek(begin)
+            text = f.read(end - begin).decode('utf-8')
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        lines = text.split('\n')
+        tail = lines.pop()
+        result = [line + '\n' for line in lines]
+        if tail:
+            result.append(tail)
+        return result
+
+
+class LineIndexCache:
+    """按 (路径, mtime, 大小) 缓存的行索引，最多保留 max_entries 个文件"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """获取文件的行索引，文件变化后自动重建"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None and index.mtime_ns == stat.st_mtime_ns and index.size == stat.st_size:
+                self._entries.move_to_end(key)
+                return index
+
+        index = LineIndex.build(key)
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+    def read_lines(self, path, start_line, end_line):
+        """读取文件第 start_line-end_line 行；行号无效时返回None"""
+        index = self.get(path)
+        if start_line < 1 or end_line > index.line_count or start_line > end_line:
+            return None
+        return index.read_lines(start_line, end_line)
+
+    def splice_lines(self, path, start_line, end_line, new_lines):
+        """用 new_lines 替换第 start_line 到 end_line 行（end_line = start_line - 1 时为插入）
+
+        只重写替换位置之后的字节，不把整个文件拆成行列表；新行使用文件原有的换行符。
+        """
+        index = self.get(path)
+        if start_line <= index.line_count:
+            begin = index.offsets[start_line - 1]
+        else:
+            begin = index.size
+        end = index.byte_range(start_line, end_line)[1] if end_line >= start_line else begin
+
+        data = "".join(line[:-1] + index.newline if line.endswith('\n') else line
+                       for line in new_lines).encode('utf-8')
+        with open(index.path, 'r+b') as f:
+            f.seek(end)
+            tail = f.read()
+            f.seek(begin)
+            f.write(data)
+            f.write(tail)
+            f.truncate()
+        self.invalidate(path)
+
+
+# 全局行索引缓存实例
+line_index_cache = LineIndexCache()
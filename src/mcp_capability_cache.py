@@ -0,0 +1,81 @@
+"""
+MCP服务器能力缓存 - 按 服务器命令+版本 在磁盘上缓存工具和资源列表，热启动时跳过列表请求
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+CACHE_VERSION = 1
+
+
+class MCPCapabilityCache:
+    """MCP服务器能力缓存
+
+    缓存文件为 ~/.byteiq_mcp_cache.json，条目按服务器的完整命令（command + args）保存，
+    记录 initialize 返回的服务器版本、capabilities 以及 tools/list、resources/list 的原始结果。
+    启动时先用缓存的工具列表让工具立即可见，initialize 返回的版本与缓存一致时不再请求列表；
+    没有版本号的服务器每次都重新获取。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(os.path.expanduser("~"), ".byteiq_mcp_cache.json")
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(command: List[str]) -> str:
+        return json.dumps(list(command), ensure_ascii=False)
+
+    def _load(self) -> Dict[str, Any]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._entries = data.get('servers', {}) if data.get('version') == CACHE_VERSION else {}
+            except (OSError, ValueError, AttributeError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, command: List[str]) -> Optional[Dict[str, Any]]:
+        """获取服务器命令对应的缓存条目"""
+        with self._lock:
+            return self._load().get(self.key(command))
+
+    def put(self, command: List[str], server_version: Optional[str], capabilities: Dict[str, Any],
+            tools: List[Dict[str, Any]], resources: List[Dict[str, Any]]):
+        """保存一次完整的能力发现结果"""
+        with self._lock:
+            self._load()[self.key(command)] = {
+                "server_version": server_version,
+                "capabilities": capabilities,
+                "tools": tools,
+                "resources": resources,
+                "t": time.time()
+            }
+            self._save()
+
+    def update(self, command: List[str], **listing):
+        """服务器通知列表变化后，更新缓存中的 tools 或 resources"""
+        with self._lock:
+            entry = self._load().get(self.key(command))
+            if entry is None:
+                return
+            entry.update(listing)
+            entry["t"] = time.time()
+            self._save()
+
+    def _save(self):
+        try:
+            tmp_file = self.path + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'servers': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.path)
+        except OSError:
+            pass
+
+
+# 全局MCP能力缓存实例
+mcp_capability_cache = MCPCapabilityCache()
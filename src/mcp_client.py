@@ -5,16 +5,21 @@ MCP (Model Context Protocol) 客户端
 
 import json
 import asyncio
-import subprocess
 import logging
+import itertools
+import threading
 from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass
 from colorama import Fore, Style
+from .config import config_store
+from .mcp_transport import StdioTransport, JsonRpcError
+from .mcp_capability_cache import mcp_capability_cache
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def _empty_listing():
+    return []
+
 @dataclass
 class MCPTool:
     """MCP工具定义"""
@@ -41,7 +46,7 @@ class MCPServer:
     env: Dict[str, str] = None
     server_type: str = "process"  # "process" 或 "sse"
     url: str = None  # SSE服务器的URL
-    process: subprocess.Popen = None
+    transport: StdioTransport = None  # 进程类型服务器的 stdio 连接
     tools: List[MCPTool] = None
     resources: List[MCPResource] = None
 
@@ -53,6 +58,11 @@ class MCPClient:
         self.available_tools: Dict[str, MCPTool] = {}
         self.available_resources: Dict[str, MCPResource] = {}
         self.is_initialized = False
+        self._sse_ids = itertools.count(1)
+        self._startup_tasks: Dict[str, asyncio.Task] = {}
+        self._starting = set()  # 正在启动的服务器名
+        self._autostarted = False
+        self._autostart_lock = threading.Lock()  # 并发执行的多个MCP工具调用只启动一次
     
     def add_server(self, name: str, command: List[str], args: List[str] = None, env: Dict[str, str] = None,
                    server_type: str = "process", url: str = None):
@@ -68,10 +78,38 @@ class MCPClient:
             resources=[]
         )
         self.servers[name] = server
-        logger.info(f"添加MCP服务器: {name} (类型: {server_type})")
+        logger.debug(f"添加MCP服务器: {name} (类型: {server_type})")
+    
+    def add_servers_from_config(self, mcp_config, server_names: List[str]) -> List[str]:
+        """按 mcp_config 中的配置添加服务器，返回成功添加的服务器名"""
+        added = []
+        for server_name in server_names:
+            server_config = mcp_config.get_server_config(server_name)
+            if not server_config:
+                continue
+            existing = self.servers.get(server_name)
+            if existing and (server_name in self._starting
+                             or (existing.transport is not None and existing.transport.is_running)):
+                # 已在启动或运行中的服务器保留原对象，重复启动时复用
+                added.append(server_name)
+                continue
+            self.add_server(
+                server_name,
+                server_config.get("command", []),
+                server_config.get("args", []),
+                server_config.get("env", {}),
+                server_config.get("type", "process"),
+                server_config.get("url")
+            )
+            added.append(server_name)
+        return added
     
     async def start_server(self, server_name: str) -> bool:
-        """启动MCP服务器"""
+        """启动MCP服务器
+
+        进程类型服务器先用能力缓存中的工具/资源列表让工具立即可见；initialize 返回的服务器
+        版本与缓存一致时跳过 tools/list 和 resources/list。
+        """
         if server_name not in self.servers:
             logger.error(f"未找到服务器配置: {server_name}")
             return False
@@ -80,174 +118,292 @@ class MCPClient:
         try:
             if server.server_type == "sse":
                 # SSE类型服务器不需要启动进程，直接初始化连接
-                logger.info(f"连接SSE MCP服务器 {server_name}: {server.url}")
+                logger.debug(f"连接SSE MCP服务器 {server_name}: {server.url}")
                 await self._initialize_sse_server(server)
                 return True
             else:
                 # 进程类型服务器
                 # 构建完整命令
                 full_command = server.command + server.args
-
-                # 启动服务器进程
-                server.process = subprocess.Popen(
-                    full_command,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    env={**server.env} if server.env else None
+                cached = mcp_capability_cache.get(full_command)
+                if cached:
+                    self._set_tools(server, cached.get("tools", []))
+                    self._set_resources(server, cached.get("resources", []))
+
+                # 启动服务器进程（异步管道，读取任务按请求id分发响应）
+                if server.transport is not None:
+                    await server.transport.close()
+                server.transport = StdioTransport(
+                    server_name,
+                    on_notification=lambda method, params: self._on_notification(server, method, params)
                 )
+                await server.transport.start(full_command, server.env)
 
-                logger.info(f"MCP服务器 {server_name} 启动成功")
+                logger.debug(f"MCP服务器 {server_name} 启动成功")
 
                 # 初始化连接并获取能力
-                await self._initialize_server(server)
-                return True
+                if await self._initialize_server(server, full_command, cached):
+                    return True
+                self._set_tools(server, [])
+                self._set_resources(server, [])
+                return False
             
         except Exception as e:
             logger.error(f"启动MCP服务器 {server_name} 失败: {e}")
+            self._set_tools(server, [])
+            self._set_resources(server, [])
             return False
     
-    async def _initialize_server(self, server: MCPServer):
-        """初始化服务器连接并获取工具和资源列表"""
+    def start_servers_background(self, server_names: List[str]):
+        """在会话事件循环中并发启动服务器，不等待完成，返回 concurrent.futures.Future
+
+        启动期间调用这些服务器的工具时，由 wait_ready() 等待对应服务器就绪。
+        后台启动与当前对话无关，不登记为可中断任务，用户按ESC中断对话时不会取消启动。
+        """
+        from .async_runtime import async_runtime
+        for name in server_names:
+            if name in self.servers:
+                # 先标记为启动中，事件循环还没开始执行任务时调用工具也会等待
+                self._starting.add(name)
+        return async_runtime.submit(self.start_servers(server_names), track=False)
+    
+    def start_configured_servers(self, mcp_config):
+        """首次使用MCP工具时在后台启动已启用的服务器（每个会话只执行一次）
+
+        服务器不随程序启动，避免拖慢启动和在输入提示符上输出日志；已通过 /mcp 手动启动过的
+        服务器不再重复启动，之后手动停止的服务器也不会被自动拉起。
+        """
+        with self._autostart_lock:
+            if self._autostarted:
+                return
+            self._autostarted = True
+            names = [name for name in mcp_config.get_enabled_servers() if name not in self.servers]
+            names = self.add_servers_from_config(mcp_config, names)
+            if names:
+                self.start_servers_background(names)
+    
+    async def start_servers(self, server_names: List[str]) -> Dict[str, bool]:
+        """并发启动多个服务器，返回 {服务器名: 是否成功}"""
+        names = [name for name in server_names if name in self.servers]
+        tasks = [self._startup_task(name) for name in names]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return {name: result is True for name, result in zip(names, results)}
+    
+    def _startup_task(self, server_name: str) -> asyncio.Task:
+        """创建（或复用进行中的）服务器启动任务（在事件循环中调用）"""
+        task = self._startup_tasks.get(server_name)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self.start_server(server_name))
+            self._startup_tasks[server_name] = task
+            task.add_done_callback(lambda _: self._starting.discard(server_name))
+        self._starting.add(server_name)
+        return task
+    
+    async def wait_ready(self, server_name: str, timeout: Optional[float] = None) -> bool:
+        """就绪屏障：服务器正在启动时等待启动完成，只阻塞需要该服务器的调用"""
+        if server_name not in self._starting:
+            return True
+        if timeout is None:
+            timeout = config_store.get_float('mcp_startup_timeout', 60.0)
+        deadline = asyncio.get_running_loop().time() + timeout
+        # start_servers_background 提交后任务可能还没创建
+        while server_name not in self._startup_tasks or self._startup_tasks[server_name].done():
+            if server_name not in self._starting:
+                return True
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        task = self._startup_tasks[server_name]
+        try:
+            return bool(await asyncio.wait_for(asyncio.shield(task),
+                                               max(0.0, deadline - asyncio.get_running_loop().time())))
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # 启动任务被 stop_server 取消
+            if task.cancelled():
+                return False
+            raise
+    
+    async def wait_starting_servers(self):
+        """等待所有启动中的服务器（用于工具尚未出现在列表中的情况）"""
+        for name in list(self._starting):
+            await self.wait_ready(name)
+    
+    async def _initialize_server(self, server: MCPServer, full_command: List[str],
+                                 cached: Optional[Dict[str, Any]] = None) -> bool:
+        """初始化服务器连接并获取工具和资源列表，返回是否初始化成功"""
         try:
             # 发送初始化请求
-            init_request = {
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "initialize",
-                "params": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {},
-                        "resources": {}
-                    },
-                    "clientInfo": {
-                        "name": "forge-ai-code",
-                        "version": "1.2.7"
-                    }
+            init_params = {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {
+                    "tools": {},
+                    "resources": {}
+                },
+                "clientInfo": {
+                    "name": "forge-ai-code",
+                    "version": "1.2.7"
                 }
             }
             
             # 发送请求并获取响应
-            response = await self._send_request(server, init_request)
+            response = await self._send_request(server, "initialize", init_params)
             
-            if response and "result" in response:
-                # 获取服务器能力
-                capabilities = response["result"].get("capabilities", {})
-                
-                # 获取工具列表
-                if "tools" in capabilities:
-                    await self._fetch_tools(server)
-                
-                # 获取资源列表
-                if "resources" in capabilities:
-                    await self._fetch_resources(server)
-                
-                logger.info(f"服务器 {server.name} 初始化完成")
+            if not response or "result" not in response:
+                logger.error(f"初始化服务器 {server.name} 失败: {response}")
+                return False
+            
+            # 按协议在初始化完成后发送 initialized 通知
+            await server.transport.notify("notifications/initialized")
+            
+            # 获取服务器能力
+            capabilities = response["result"].get("capabilities", {})
+            server_version = (response["result"].get("serverInfo") or {}).get("version")
+            
+            # 服务器版本与缓存一致：直接使用缓存的工具和资源列表
+            if cached and server_version and cached.get("server_version") == server_version:
+                logger.debug(f"服务器 {server.name} 初始化完成（使用缓存的能力列表）")
+                return True
+            
+            # 并发获取工具列表和资源列表
+            tools_data, resources_data = await asyncio.gather(
+                self._fetch_tools(server) if "tools" in capabilities else _empty_listing(),
+                self._fetch_resources(server) if "resources" in capabilities else _empty_listing()
+            )
+            if server_version and tools_data is not None and resources_data is not None:
+                mcp_capability_cache.put(full_command, server_version, capabilities, tools_data, resources_data)
+            
+            logger.debug(f"服务器 {server.name} 初始化完成")
+            return True
             
         except Exception as e:
             logger.error(f"初始化服务器 {server.name} 失败: {e}")
+            return False
     
-    async def _fetch_tools(self, server: MCPServer):
-        """获取服务器提供的工具列表"""
-        try:
-            request = {
-                "jsonrpc": "2.0",
-                "id": 2,
-                "method": "tools/list"
-            }
+    def _set_tools(self, server: MCPServer, tools_data: List[Dict[str, Any]]):
+        """用 tools/list 的原始结果替换服务器的工具"""
+        server.tools.clear()
+        for key in [key for key, tool in self.available_tools.items() if tool.server_name == server.name]:
+            del self.available_tools[key]
+        
+        for tool_data in tools_data:
+            tool = MCPTool(
+                name=tool_data["name"],
+                description=tool_data.get("description", ""),
+                input_schema=tool_data.get("inputSchema", {}),
+                server_name=server.name
+            )
             
-            response = await self._send_request(server, request)
+            server.tools.append(tool)
+            self.available_tools[f"{server.name}:{tool.name}"] = tool
+    
+    def _set_resources(self, server: MCPServer, resources_data: List[Dict[str, Any]]):
+        """用 resources/list 的原始结果替换服务器的资源"""
+        server.resources.clear()
+        for key in [key for key, resource in self.available_resources.items()
+                    if resource.server_name == server.name]:
+            del self.available_resources[key]
+        
+        for resource_data in resources_data:
+            resource = MCPResource(
+                uri=resource_data["uri"],
+                name=resource_data.get("name", ""),
+                description=resource_data.get("description", ""),
+                mime_type=resource_data.get("mimeType", ""),
+                server_name=server.name
+            )
+            
+            server.resources.append(resource)
+            self.available_resources[f"{server.name}:{resource.uri}"] = resource
+    
+    async def _fetch_tools(self, server: MCPServer) -> Optional[List[Dict[str, Any]]]:
+        """获取服务器提供的工具列表，返回原始结果（失败时返回None）"""
+        try:
+            response = await self._send_request(server, "tools/list")
             
             if response and "result" in response:
                 tools_data = response["result"].get("tools", [])
-                
-                for tool_data in tools_data:
-                    tool = MCPTool(
-                        name=tool_data["name"],
-                        description=tool_data.get("description", ""),
-                        input_schema=tool_data.get("inputSchema", {}),
-                        server_name=server.name
-                    )
-                    
-                    server.tools.append(tool)
-                    self.available_tools[f"{server.name}:{tool.name}"] = tool
-                
-                logger.info(f"从服务器 {server.name} 获取到 {len(tools_data)} 个工具")
+                self._set_tools(server, tools_data)
+                logger.debug(f"从服务器 {server.name} 获取到 {len(tools_data)} 个工具")
+                return tools_data
         
         except Exception as e:
             logger.error(f"获取服务器 {server.name} 工具列表失败: {e}")
+        return None
     
-    async def _fetch_resources(self, server: MCPServer):
-        """获取服务器提供的资源列表"""
+    async def _fetch_resources(self, server: MCPServer) -> Optional[List[Dict[str, Any]]]:
+        """获取服务器提供的资源列表，返回原始结果（失败时返回None）"""
         try:
-            request = {
-                "jsonrpc": "2.0",
-                "id": 3,
-                "method": "resources/list"
-            }
-            
-            response = await self._send_request(server, request)
+            response = await self._send_request(server, "resources/list")
             
             if response and "result" in response:
                 resources_data = response["result"].get("resources", [])
-                
-                for resource_data in resources_data:
-                    resource = MCPResource(
-                        uri=resource_data["uri"],
-                        name=resource_data.get("name", ""),
-                        description=resource_data.get("description", ""),
-                        mime_type=resource_data.get("mimeType", ""),
-                        server_name=server.name
-                    )
-                    
-                    server.resources.append(resource)
-                    self.available_resources[f"{server.name}:{resource.uri}"] = resource
-                
-                logger.info(f"从服务器 {server.name} 获取到 {len(resources_data)} 个资源")
+                self._set_resources(server, resources_data)
+                logger.debug(f"从服务器 {server.name} 获取到 {len(resources_data)} 个资源")
+                return resources_data
         
         except Exception as e:
             logger.error(f"获取服务器 {server.name} 资源列表失败: {e}")
+        return None
     
-    async def _send_request(self, server: MCPServer, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """向MCP服务器发送请求"""
+    async def _refresh_listing(self, server: MCPServer, kind: str):
+        """服务器通知列表变化：重新获取并更新能力缓存"""
+        if kind == "tools":
+            data = await self._fetch_tools(server)
+        else:
+            data = await self._fetch_resources(server)
+        if data is not None:
+            mcp_capability_cache.update(server.command + server.args, **{kind: data})
+    
+    async def _send_request(self, server: MCPServer, method: str, params: Optional[Dict[str, Any]] = None,
+                            timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """向MCP服务器发送请求，返回响应消息；超时或连接断开时返回 {"error": 原因}
+
+        进程类型服务器的请求可以并发发出，timeout 默认取配置项 mcp_request_timeout（秒，默认30）。
+        """
+        if timeout is None:
+            timeout = config_store.get_float('mcp_request_timeout', 30.0)
         try:
             if server.server_type == "sse":
-                return await self._send_sse_request(server, request)
-            else:
-                if not server.process or server.process.poll() is not None:
-                    logger.error(f"服务器 {server.name} 进程未运行")
-                    return None
-
-                # 发送JSON-RPC请求
-                request_json = json.dumps(request) + "\n"
-                server.process.stdin.write(request_json)
-                server.process.stdin.flush()
-
-                # 读取响应
-                response_line = server.process.stdout.readline()
-                if response_line:
-                    return json.loads(response_line.strip())
+                request = {"jsonrpc": "2.0", "id": next(self._sse_ids), "method": method}
+                if params is not None:
+                    request["params"] = params
+                return await asyncio.wait_for(self._send_sse_request(server, request), timeout)
 
+            if server.transport is None or not server.transport.is_running:
+                logger.error(f"服务器 {server.name} 进程未运行")
                 return None
+            return await server.transport.request(method, params, timeout=timeout)
 
-        except Exception as e:
+        except asyncio.TimeoutError:
+            logger.error(f"服务器 {server.name} 的 {method} 请求超时（{timeout}秒）")
+            return {"error": f"MCP服务器 {server.name} 响应超时（{timeout}秒）"}
+        except JsonRpcError as e:
             logger.error(f"发送请求到服务器 {server.name} 失败: {e}")
-            return None
+            return {"error": str(e)}
     
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """调用MCP工具"""
-        # 首先尝试直接查找工具
-        tool = None
-        if tool_name in self.available_tools:
-            tool = self.available_tools[tool_name]
+    def _on_notification(self, server: MCPServer, method: str, params: Any):
+        """处理服务器通知：工具/资源列表变化时重新获取"""
+        if method == "notifications/tools/list_changed":
+            asyncio.ensure_future(self._refresh_listing(server, "tools"))
+        elif method == "notifications/resources/list_changed":
+            asyncio.ensure_future(self._refresh_listing(server, "resources"))
         else:
-            # 如果直接查找失败，尝试通过简单名称查找
-            for full_name, available_tool in self.available_tools.items():
-                if available_tool.name == tool_name:
-                    tool = available_tool
-                    break
+            logger.debug(f"收到服务器 {server.name} 的通知: {method}")
+    
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """调用MCP工具（同一服务器上的多个调用可以并发进行）
+
+        工具所在的服务器仍在启动时先等待它就绪（最长 mcp_startup_timeout 秒）；工具还不在
+        列表中（首次启动、没有能力缓存）时等待所有启动中的服务器后再查找。timeout 只限制
+        请求本身，不包括等待服务器就绪的时间。
+        """
+        tool = self._find_tool(tool_name)
+        if not tool and self._starting:
+            await self.wait_starting_servers()
+            tool = self._find_tool(tool_name)
 
         if not tool:
             logger.error(f"未找到工具: {tool_name}")
@@ -255,19 +411,16 @@ class MCPClient:
             return None
 
         server = self.servers[tool.server_name]
+        if not await self.wait_ready(server.name):
+            return {"error": f"MCP服务器 {server.name} 未就绪（启动失败或超时）"}
         
         try:
-            request = {
-                "jsonrpc": "2.0",
-                "id": 4,
-                "method": "tools/call",
-                "params": {
-                    "name": tool.name,
-                    "arguments": arguments
-                }
+            params = {
+                "name": tool.name,
+                "arguments": arguments
             }
             
-            response = await self._send_request(server, request)
+            response = await self._send_request(server, "tools/call", params, timeout)
 
             if response:
                 if "result" in response:
@@ -286,32 +439,47 @@ class MCPClient:
             logger.error(f"调用工具 {tool_name} 失败: {e}")
             return {"error": str(e)}
     
-    async def read_resource(self, resource_uri: str) -> Optional[Dict[str, Any]]:
-        """读取MCP资源"""
-        resource_key = None
-        for key, resource in self.available_resources.items():
+    def _find_tool(self, tool_name: str) -> Optional[MCPTool]:
+        # 首先尝试直接查找工具
+        if tool_name in self.available_tools:
+            return self.available_tools[tool_name]
+        # 如果直接查找失败，尝试通过简单名称查找
+        for available_tool in self.available_tools.values():
+            if available_tool.name == tool_name:
+                return available_tool
+        return None
+    
+    def server_for_tool(self, tool_name: str) -> Optional[str]:
+        """工具所在的服务器名；工具列表中还没有该工具时按 "服务器:工具" 形式的前缀判断，都不确定时返回None"""
+        tool = self._find_tool(tool_name)
+        if tool:
+            return tool.server_name
+        server_name = tool_name.split(":", 1)[0] if ":" in tool_name else None
+        return server_name if server_name in self.servers else None
+    
+    def _find_resource(self, resource_uri: str) -> Optional[MCPResource]:
+        for resource in self.available_resources.values():
             if resource.uri == resource_uri:
-                resource_key = key
-                break
+                return resource
+        return None
+    
+    async def read_resource(self, resource_uri: str) -> Optional[Dict[str, Any]]:
+        """读取MCP资源（与 call_tool 相同的就绪等待）"""
+        resource = self._find_resource(resource_uri)
+        if not resource and self._starting:
+            await self.wait_starting_servers()
+            resource = self._find_resource(resource_uri)
         
-        if not resource_key:
+        if not resource:
             logger.error(f"未找到资源: {resource_uri}")
             return None
         
-        resource = self.available_resources[resource_key]
         server = self.servers[resource.server_name]
+        if not await self.wait_ready(server.name):
+            return {"error": f"MCP服务器 {server.name} 未就绪（启动失败或超时）"}
         
         try:
-            request = {
-                "jsonrpc": "2.0",
-                "id": 5,
-                "method": "resources/read",
-                "params": {
-                    "uri": resource_uri
-                }
-            }
-            
-            response = await self._send_request(server, request)
+            response = await self._send_request(server, "resources/read", {"uri": resource_uri})
             
             if response and "result" in response:
                 return response["result"]
@@ -333,31 +501,39 @@ class MCPClient:
         """获取所有可用资源列表"""
         return list(self.available_resources.values())
     
+    async def stop_server(self, server_name: str):
+        """停止单个MCP服务器"""
+        task = self._startup_tasks.get(server_name)
+        if task is not None and not task.done():
+            task.cancel()
+        server = self.servers.get(server_name)
+        if server is None or server.transport is None:
+            return
+        try:
+            await server.transport.close()
+            # 已停止服务器的工具和资源不再对AI可见
+            self._set_tools(server, [])
+            self._set_resources(server, [])
+            logger.debug(f"MCP服务器 {server_name} 已停止")
+        except Exception as e:
+            logger.error(f"停止MCP服务器 {server_name} 失败: {e}")
+    
     async def stop_all_servers(self):
         """停止所有MCP服务器"""
-        for server_name, server in self.servers.items():
-            if server.process and server.process.poll() is None:
-                try:
-                    server.process.terminate()
-                    server.process.wait(timeout=5)
-                    logger.info(f"MCP服务器 {server_name} 已停止")
-                except Exception as e:
-                    logger.error(f"停止MCP服务器 {server_name} 失败: {e}")
-                    try:
-                        server.process.kill()
-                    except:
-                        pass
+        await asyncio.gather(*(self.stop_server(name) for name in list(self.servers)))
     
     def get_server_status(self) -> Dict[str, str]:
         """获取所有服务器状态"""
         status = {}
         for name, server in self.servers.items():
-            if server.server_type == "sse":
+            if name in self._starting:
+                status[name] = "启动中"
+            elif server.server_type == "sse":
                 # SSE服务器状态基于URL可访问性
                 status[name] = "运行中" if server.url else "未配置"
-            elif server.process is None:
+            elif server.transport is None:
                 status[name] = "未启动"
-            elif server.process.poll() is None:
+            elif server.transport.is_running:
                 status[name] = "运行中"
             else:
                 status[name] = "已停止"
@@ -388,7 +564,7 @@ class MCPClient:
                 server.tools.append(search_tool)
                 self.available_tools[f"{server.name}:search"] = search_tool
 
-                logger.info(f"SSE服务器 {server.name} 初始化完成，添加了搜索工具")
+                logger.debug(f"SSE服务器 {server.name} 初始化完成，添加了搜索工具")
 
         except Exception as e:
             logger.error(f"初始化SSE服务器 {server.name} 失败: {e}")
@@ -0,0 +1,213 @@
+"""
+MCP stdio 传输层 - 基于 asyncio 子进程管道的 JSON-RPC 2.0 多路复用连接
+"""
+
+import os
+import json
+import asyncio
+import logging
+import itertools
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 单条消息的最大长度（工具结果可能很大，asyncio 默认只有64KB）
+STREAM_LIMIT = 16 * 1024 * 1024
+# JSON-RPC 错误码
+METHOD_NOT_FOUND = -32601
+
+
+class JsonRpcError(Exception):
+    """连接已关闭或请求无法发出"""
+
+
+class StdioTransport:
+    """一个 stdio MCP 服务器的 JSON-RPC 连接
+
+    - 每个请求分配自增 id，响应由后台读取任务按 id 交给对应的 Future，多个请求可以同时在途
+    - 没有 id 的消息是通知，交给 on_notification(method, params)；服务器发来的请求
+      （如 ping）由传输层直接应答
+    - request() 支持单独的超时，超时后发送 notifications/cancelled 并丢弃迟到的响应
+    - 进程退出或输出关闭时，所有未完成的请求以 JsonRpcError 结束
+    所有方法都必须在同一个事件循环（会话事件循环）中调用。
+    """
+
+    def __init__(self, name: str, on_notification: Optional[Callable[[str, Any], None]] = None):
+        self.name = name
+        self.on_notification = on_notification
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._write_lock = asyncio.Lock()
+        self._reader_task = None
+        self._stderr_task = None
+        self._closed_error: Optional[str] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.returncode is None and self._closed_error is None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def start(self, command: List[str], env: Optional[Dict[str, str]] = None):
+        """启动服务器进程和后台读取任务"""
+        self.process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # 在当前环境变量的基础上叠加服务器配置的变量，保留 PATH 等
+            env={**os.environ, **env} if env else None,
+            limit=STREAM_LIMIT
+        )
+        self._closed_error = None
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """发送请求并等待响应，返回完整的响应消息（含 result 或 error）"""
+        request_id = next(self._ids)
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._write(message)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            await self._cancel_remote(request_id, "timeout")
+            raise
+        except asyncio.CancelledError:
+            await self._cancel_remote(request_id, "cancelled")
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None):
+        """发送通知（不等待响应）"""
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._write(message)
+
+    async def _write(self, message: Dict[str, Any]):
+        if not self.is_running:
+            raise JsonRpcError(self._closed_error or f"服务器 {self.name} 进程未运行")
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        async with self._write_lock:
+            try:
+                self.process.stdin.write(data)
+                await self.process.stdin.drain()
+            except (ConnectionError, OSError) as e:
+                raise JsonRpcError(f"写入服务器 {self.name} 失败: {e}")
+
+    async def _cancel_remote(self, request_id: int, reason: str):
+        """通知服务器放弃已超时/已取消的请求（尽力而为）"""
+        if not self.is_running:
+            return
+        try:
+            await asyncio.shield(self.notify("notifications/cancelled",
+                                             {"requestId": request_id, "reason": reason}))
+        except BaseException:
+            pass
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    # 部分服务器会把日志打印到 stdout
+                    logger.debug(f"MCP服务器 {self.name} 输出了非JSON内容: {line[:200]!r}")
+                    continue
+                if isinstance(message, dict):
+                    await self._dispatch(message)
+        except (asyncio.LimitOverrunError, ValueError) as e:
+            self._fail_pending(f"服务器 {self.name} 的消息超过长度限制: {e}")
+            return
+        except asyncio.CancelledError:
+            self._fail_pending(f"与服务器 {self.name} 的连接已关闭")
+            raise
+        self._fail_pending(f"服务器 {self.name} 已关闭输出")
+
+    async def _dispatch(self, message: Dict[str, Any]):
+        method = message.get("method")
+        if method is None:
+            # 响应：按 id 交给等待中的请求，迟到的（已超时）响应直接丢弃
+            future = self._pending.get(message.get("id"))
+            if future is not None and not future.done():
+                future.set_result(message)
+            return
+
+        if "id" not in message:
+            if self.on_notification:
+                try:
+                    self.on_notification(method, message.get("params"))
+                except Exception as e:
+                    logger.debug(f"处理MCP通知 {method} 失败: {e}")
+            return
+
+        # 服务器发来的请求：只支持 ping，其余回复“方法不存在”
+        if method == "ping":
+            reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+        else:
+            reply = {"jsonrpc": "2.0", "id": message["id"],
+                     "error": {"code": METHOD_NOT_FOUND, "message": f"Method not found: {method}"}}
+        try:
+            await self._write(reply)
+        except JsonRpcError:
+            pass
+
+    async def _drain_stderr(self):
+        """持续读取 stderr，避免管道写满后服务器阻塞"""
+        try:
+            while True:
+                line = await self.process.stderr.readline()
+                if not line:
+                    return
+                logger.debug(f"[{self.name}] {line.decode('utf-8', errors='replace').rstrip()}")
+        except (asyncio.CancelledError, ValueError):
+            return
+
+    def _fail_pending(self, reason: str):
+        self._closed_error = reason
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(JsonRpcError(reason))
+
+    async def close(self, timeout: float = 5.0):
+        """关闭连接并结束服务器进程：先关闭 stdin 等待退出，超时后 terminate，再超时 kill"""
+        process = self.process
+        if process is None:
+            return
+        if process.returncode is None:
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+            for stop in (None, process.terminate, process.kill):
+                if stop is not None:
+                    try:
+                        stop()
+                    except ProcessLookupError:
+                        break
+                try:
+                    await asyncio.wait_for(process.wait(), timeout)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        for task in (self._reader_task, self._stderr_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._fail_pending(f"与服务器 {self.name} 的连接已关闭")
@@ -0,0 +1,234 @@
+"""
+并行文件扫描引擎 - 线程负责文件IO，进程池负责大量文件的正则匹配
+"""
+
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+)
+
+# 每个进程任务处理的文件数，减少进程间通信次数
+PROCESS_CHUNK_SIZE = 64
+
+
+def _scan_settings():
+    """读取扫描相关配置: (工作线程/进程数, 启用进程池的文件数阈值)"""
+    from .config import config_store
+    workers = config_store.get_int('scan_workers', 0) or min(32, (os.cpu_count() or 1) + 4)
+    process_threshold = config_store.get_int('scan_process_threshold', 2000)
+    return workers, process_threshold
+
+
+def search_file(file_path, pattern, flags=re.IGNORECASE):
+    """在单个文件中搜索正则，返回 ["路径:行号: 内容", ...]"""
+    search_pattern = re.compile(pattern, flags)
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception:
+        return []
+
+    if not search_pattern.search(content):
+        return []
+    # 找到匹配的行
+    return [f"{file_path}:{i}: {line.strip()}"
+            for i, line in enumerate(content.split('\n'), 1)
+            if search_pattern.search(line)]
+
+
+def _map_chunk(func, file_paths):
+    """进程池任务：对一组文件执行 func"""
+    return [(file_path, func(file_path)) for file_path in file_paths]
+
+
+def _search_chunk(file_paths, pattern, flags):
+    """进程池任务：搜索一组文件"""
+    results = []
+    for file_path in file_paths:
+        results.extend(search_file(file_path, pattern, flags))
+    return results
+
+
+class ParallelScanner:
+    """共享的并行扫描引擎
+
+    - map_files(): 用线程池对每个文件执行函数，按完成顺序流式返回结果
+    - map_files_cpu(): CPU密集的逐文件任务（如解析语法树），文件较多时改用进程池分块执行
+    - search(): 正则搜索，文件数超过阈值时改用进程池分块执行，结果按文件顺序产出；
+      调用方停止迭代时取消尚未开始的任务，实现提前结束
+    - walk(): 多线程遍历目录树
+    进程池在首次需要时创建并在会话内复用，避免每次搜索都付出进程启动开销。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread_pool = None
+        self._process_pool = None
+        self._workers = None
+
+    def _pools(self, need_processes=False):
+        workers, process_threshold = _scan_settings()
+        with self._lock:
+            if workers != self._workers:
+                self._shutdown_pools()
+                self._workers = workers
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="byteiq-scan")
+            if need_processes and self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1))
+            return self._thread_pool, self._process_pool, process_threshold
+
+    def map_files(self, func, file_paths, ordered=False):
+        """并行对每个文件调用 func(file_path)，产出 (file_path, result)
+
+        默认按完成顺序产出；ordered=True 时按 file_paths 的顺序产出，先完成的结果暂存到
+        前面的文件完成为止。同时在途的任务数有上限，调用方提前停止迭代时最多只多做一个窗口的工作。
+        """
+        thread_pool, _, _ = self._pools()
+        window = self._workers * 4
+        paths = iter(file_paths)
+        if ordered:
+            yield from self._map_ordered(
+                lambda file_path: (file_path, thread_pool.submit(func, file_path)), paths, window)
+            return
+        pending = {}
+
+        def fill():
+            for file_path in paths:
+                pending[thread_pool.submit(func, file_path)] = file_path
+                if len(pending) >= window:
+                    break
+
+        try:
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+                fill()
+        finally:
+            # 调用方提前停止时取消剩余任务
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _map_ordered(submit, items, window):
+        """按提交顺序产出结果的滑动窗口：submit(item) 返回 (键, future)，产出 (键, 结果)"""
+        queued = deque()
+        try:
+            for item in items:
+                queued.append(submit(item))
+                if len(queued) >= window:
+                    key, future = queued.popleft()
+                    yield key, future.result()
+            while queued:
+                key, future = queued.popleft()
+                yield key, future.result()
+        finally:
+            # 调用方提前停止时取消剩余任务
+            for _, future in queued:
+                future.cancel()
+
+    def map_files_cpu(self, func, file_paths, process_threshold=None):
+        """对每个文件调用 func(file_path)，按完成顺序产出 (file_path, result)
+
+        文件数达到 process_threshold（默认取配置 scan_process_threshold）且有多个CPU时
+        在进程池中分块执行，避免GIL限制；func 必须是可被pickle的模块级函数。
+        """
+        file_paths = list(file_paths)
+        _, _, default_threshold = self._pools()
+        threshold = default_threshold if process_threshold is None else process_threshold
+        if len(file_paths) < threshold or (os.cpu_count() or 1) < 2:
+            yield from self.map_files(func, file_paths)
+            return
+
+        _, process_pool, _ = self._pools(need_processes=True)
+        futures = [process_pool.submit(_map_chunk, func, file_paths[i:i + PROCESS_CHUNK_SIZE])
+                   for i in range(0, len(file_paths), PROCESS_CHUNK_SIZE)]
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def search(self, pattern, file_paths, flags=re.IGNORECASE):
+        """并行正则搜索，按 file_paths 的顺序逐个产出匹配行
+
+        结果顺序与逐个文件串行搜索相同，凑够条数后停止迭代时每次得到的都是同一批结果。
+        """
+        file_paths = list(file_paths)
+        _, _, process_threshold = self._pools()
+
+        if len(file_paths) < process_threshold or (os.cpu_count() or 1) < 2:
+            matches = self.map_files(lambda path: search_file(path, pattern, flags), file_paths, ordered=True)
+            for _, lines in matches:
+                yield from lines
+            return
+
+        _, process_pool, _ = self._pools(need_processes=True)
+        chunks = (file_paths[i:i + PROCESS_CHUNK_SIZE]
+                  for i in range(0, len(file_paths), PROCESS_CHUNK_SIZE))
+        window = (os.cpu_count() or 1) * 2
+        matches = self._map_ordered(
+            lambda chunk: (None, process_pool.submit(_search_chunk, chunk, pattern, flags)), chunks, window)
+        for _, lines in matches:
+            yield from lines
+
+    def walk(self, root, skip_dir=None, want_file=None):
+        """多线程遍历目录树，返回满足条件的文件路径列表
+
+        skip_dir(name) 返回True的目录不进入；want_file(name) 返回True的文件被收集。
+        """
+        thread_pool, _, _ = self._pools()
+        found = []
+
+        def list_dir(path):
+            subdirs, files = [], []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir():
+                                # 与 os.walk 一致：不进入符号链接目录
+                                if not entry.is_symlink() and not (skip_dir and skip_dir(entry.name)):
+                                    subdirs.append(entry.path)
+                            elif not want_file or want_file(entry.name):
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            return subdirs, files
+
+        pending = {thread_pool.submit(list_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, files = future.result()
+                found.extend(files)
+                pending.update(thread_pool.submit(list_dir, subdir) for subdir in subdirs)
+        return found
+
+    def _shutdown_pools(self):
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def shutdown(self):
+        """关闭线程池和进程池"""
+        with self._lock:
+            self._shutdown_pools()
+
+
+# 全局并行扫描引擎实例
+parallel_scanner = ParallelScanner()
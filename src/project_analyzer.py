@@ -3,10 +3,27 @@
 """
 
 import os
+import ast
 import json
+import time
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 from colorama import Fore, Style
+from .parallel_scanner import parallel_scanner
+from .analysis_manifest import get_analysis_manifest, analysis_artifact_names, text_digest
+
+# 顶层模块名 -> 框架名
+PYTHON_FRAMEWORKS = {
+    'flask': "Flask",
+    'django': "Django",
+    'fastapi': "FastAPI",
+    'streamlit': "Streamlit",
+    'tkinter': "Tkinter",
+}
+# 需要记录的第三方库
+PYTHON_TRACKED_IMPORTS = ('colorama', 'requests', 'numpy', 'pandas')
+# 清单中保存单文件特征的分区；特征提取改为基于语法树后换用新分区，旧的逐行匹配结果不再复用
+FEATURES_SECTION = "py_features"
 
 class ProjectAnalyzer:
     """项目分析器"""
@@ -14,10 +31,14 @@ class ProjectAnalyzer:
     def __init__(self, project_path: str = "."):
         self.project_path = Path(project_path).resolve()
         self.analysis_result = {}
+        self.manifest = None
+        # 分析文档、清单和生成的配置文件不计入项目文件
+        self.artifact_names = analysis_artifact_names(self.project_path)
         
     def analyze_project(self) -> Dict[str, Any]:
         """分析项目并返回分析结果"""
         print(f"{Fore.CYAN}🔍 开始分析项目: {self.project_path}{Style.RESET_ALL}")
+        self.manifest = get_analysis_manifest(str(self.project_path))
         
         self.analysis_result = {
             "project_info": self._analyze_project_info(),
@@ -56,7 +77,7 @@ class ProjectAnalyzer:
         }
         
         # 忽略的目录
-        ignore_dirs = {'.git', '__pycache__', '.vscode', '.idea', 'node_modules', '.env'}
+        ignore_dirs = {'.git', '__pycache__', '.vscode', '.idea', 'node_modules', '.env'} | self.artifact_names
         
         for root, dirs, files in os.walk(self.project_path):
             # 过滤忽略的目录
@@ -67,7 +88,7 @@ class ProjectAnalyzer:
                 structure["directories"].append(rel_root)
             
             for file in files:
-                if file.startswith('.'):
+                if file.startswith('.') or file in self.artifact_names:
                     continue
                     
                 structure["total_files"] += 1
@@ -142,41 +163,88 @@ class ProjectAnalyzer:
             "imports": set(),
         }
         
-        # 分析Python文件
-        for py_file in self.project_path.rglob("*.py"):
-            if '__pycache__' in str(py_file):
-                continue
-                
-            features["languages"].add("Python")
-            try:
-                with open(py_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    self._analyze_python_code(content, features)
-            except Exception:
-                pass
-        
-        # 分析其他文件类型
-        for js_file in self.project_path.rglob("*.js"):
-            features["languages"].add("JavaScript")
+        # 一次遍历收集所有文件，代替按扩展名多次 rglob
+        language_by_suffix = {'.js': "JavaScript", '.ts': "TypeScript", '.html': "HTML", '.css': "CSS"}
+        python_files = []
+        for file_path in parallel_scanner.walk(str(self.project_path)):
+            suffix = os.path.splitext(file_path)[1]
+            if suffix == '.py':
+                if '__pycache__' not in file_path:
+                    features["languages"].add("Python")
+                    python_files.append(file_path)
+            elif suffix in language_by_suffix:
+                features["languages"].add(language_by_suffix[suffix])
+
+        # 增量分析：内容未变化的文件直接使用清单中记录的特征
+        changed, unchanged, removed = self.manifest.diff(FEATURES_SECTION, python_files)
+        for file_path in unchanged:
+            for key, values in self.manifest.get(FEATURES_SECTION, file_path).get("features", {}).items():
+                features[key].update(values)
+        for rel_path in removed:
+            self.manifest.remove(FEATURES_SECTION, rel_path)
         
-        for ts_file in self.project_path.rglob("*.ts"):
-            features["languages"].add("TypeScript")
-            
-        for html_file in self.project_path.rglob("*.html"):
-            features["languages"].add("HTML")
-            
-        for css_file in self.project_path.rglob("*.css"):
-            features["languages"].add("CSS")
+        # 并行读取并分析变化的Python文件，每个文件得到独立的特征集合后合并
+        for file_path, file_features in parallel_scanner.map_files(self._analyze_python_file, list(changed)):
+            for key, values in file_features.items():
+                features[key].update(values)
+            self.manifest.record(FEATURES_SECTION, file_path, changed[file_path],
+                                 features={key: sorted(values) for key, values in file_features.items()})
+        self.manifest.save()
         
-        # 转换set为list以便JSON序列化
+        # 转换set为有序list以便JSON序列化，生成的内容在多次分析间保持一致
         for key in features:
             if isinstance(features[key], set):
-                features[key] = list(features[key])
+                features[key] = sorted(features[key])
         
         return features
     
+    def _analyze_python_file(self, file_path: str) -> Dict[str, set]:
+        """读取并分析单个Python文件（在扫描线程中运行）"""
+        features = {"frameworks": set(), "patterns": set(), "imports": set()}
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                self._analyze_python_code(f.read(), features)
+        except Exception:
+            pass
+        return features
+
     def _analyze_python_code(self, content: str, features: Dict[str, Any]):
-        """分析Python代码特征"""
+        """分析Python代码特征（基于语法树，无法解析时退回逐行匹配）"""
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            self._analyze_python_lines(content, features)
+            return
+
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                # 相对导入是项目内部模块，不代表框架或第三方库
+                if isinstance(node, ast.Import):
+                    modules = [alias.name for alias in node.names]
+                else:
+                    modules = [node.module] if node.module and not node.level else []
+                for module in modules:
+                    top_level = module.split('.')[0].lower()
+                    if top_level in PYTHON_FRAMEWORKS:
+                        features["frameworks"].add(PYTHON_FRAMEWORKS[top_level])
+                    elif top_level in PYTHON_TRACKED_IMPORTS:
+                        features["imports"].add(top_level)
+            elif isinstance(node, ast.ClassDef):
+                features["patterns"].add("面向对象编程")
+            elif isinstance(node, (ast.AsyncFunctionDef, ast.Await, ast.AsyncFor, ast.AsyncWith)):
+                features["patterns"].add("异步编程")
+            elif isinstance(node, ast.If) and self._is_main_guard(node.test):
+                features["patterns"].add("脚本模式")
+
+    @staticmethod
+    def _is_main_guard(test) -> bool:
+        """判断是否为 if __name__ == "__main__" """
+        return (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name)
+                and test.left.id == "__name__" and len(test.comparators) == 1
+                and isinstance(test.comparators[0], ast.Constant) and test.comparators[0].value == "__main__")
+
+    def _analyze_python_lines(self, content: str, features: Dict[str, Any]):
+        """逐行匹配分析Python代码特征（用于有语法错误的文件）"""
         lines = content.split('\n')
         
         for line in lines:
@@ -184,24 +252,15 @@ class ProjectAnalyzer:
             
             # 分析导入
             if line.startswith('import ') or line.startswith('from '):
-                if 'flask' in line.lower():
-                    features["frameworks"].add("Flask")
-                elif 'django' in line.lower():
-                    features["frameworks"].add("Django")
-                elif 'fastapi' in line.lower():
-                    features["frameworks"].add("FastAPI")
-                elif 'streamlit' in line.lower():
-                    features["frameworks"].add("Streamlit")
-                elif 'tkinter' in line.lower():
-                    features["frameworks"].add("Tkinter")
-                elif 'colorama' in line.lower():
-                    features["imports"].add("colorama")
-                elif 'requests' in line.lower():
-                    features["imports"].add("requests")
-                elif 'numpy' in line.lower():
-                    features["imports"].add("numpy")
-                elif 'pandas' in line.lower():
-                    features["imports"].add("pandas")
+                for keyword, framework in PYTHON_FRAMEWORKS.items():
+                    if keyword in line.lower():
+                        features["frameworks"].add(framework)
+                        break
+                else:
+                    for name in PYTHON_TRACKED_IMPORTS:
+                        if name in line.lower():
+                            features["imports"].add(name)
+                            break
             
             # 分析模式
             if 'class ' in line and ':' in line:
@@ -266,9 +325,12 @@ class ProjectAnalyzer:
         
         for root, dirs, files in os.walk(self.project_path):
             # 忽略特定目录
-            dirs[:] = [d for d in dirs if d not in {'.git', '__pycache__', 'node_modules'}]
+            dirs[:] = [d for d in dirs if d not in {'.git', '__pycache__', 'node_modules'}
+                       and d not in self.artifact_names]
             
             for file in files:
+                if file in self.artifact_names:
+                    continue
                 try:
                     file_path = os.path.join(root, file)
                     total_size += os.path.getsize(file_path)
@@ -292,6 +354,18 @@ class ProjectAnalyzer:
         
         # 生成基础内容
         base_content = self._generate_md_content()
+        base_hash = text_digest(base_content)
+        
+        # 项目分析结果与上次相同且 BYTEIQ.md 未被改动时，直接沿用，不再请求AI
+        record = self.manifest.section("byteiq_md") if self.manifest else {}
+        if record.get("base") == base_hash and record.get("ai") == bool(ai_client):
+            try:
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    if text_digest(f.read()) == record.get("output"):
+                        print(f"  • 项目未变化，沿用现有 BYTEIQ.md: {output_path}")
+                        return str(output_path)
+            except OSError:
+                pass
         
         # 如果提供了AI客户端，让AI参与优化内容
         if ai_client:
@@ -303,6 +377,11 @@ class ProjectAnalyzer:
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(content)
         
+        if self.manifest:
+            self.manifest.set_value("byteiq_md", base=base_hash, output=text_digest(content),
+                                    ai=content is not base_content, t=time.time())
+            self.manifest.save()
+        
         print(f"  • BYTEIQ.md 已生成: {output_path}")
         return str(output_path)
     
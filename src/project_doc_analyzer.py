@@ -6,18 +6,31 @@
 import os
 import json
 import time
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 from colorama import Fore, Style
-from .config import load_config
+from .config import config_store
 from .ai_client import ai_client
 from .prompt_templates import get_refusal_guidelines
+from .parallel_scanner import parallel_scanner
+from .doc_pipeline import DocAnalysisPipeline, FileChunk
+from .doc_protocol import SECTION_START, SECTION_END, format_instructions, parse_response
+from .token_counter import token_counter, model_context_tokens
+from .analysis_manifest import get_analysis_manifest, docs_folder_name, analysis_artifact_names
+
+# 清单中单文件分析文档使用的分区
+MANIFEST_SECTION = "docs"
+# 分析请求的输出token上限，小上下文模型按上下文的1/4预留
+ANALYSIS_MAX_OUTPUT_TOKENS = 12000
+# 批量请求中除文件内容以外的说明文字的估算token数
+BATCH_PROMPT_OVERHEAD_TOKENS = 200
 
 class ProjectDocAnalyzer:
     """项目文档分析器 - 超大型项目分析模式"""
     
     def __init__(self):
-        self.config = load_config()
+        self.config = config_store.snapshot()
         self.is_active = False
         self.current_project_path = None
         self.analyzed_files = []
@@ -26,8 +39,14 @@ class ProjectDocAnalyzer:
         self.total_files = 0
         self.processed_files = 0
         self.docs_folder = None  # 存储文档的文件夹路径
+        self.project_files = []  # 本次扫描到的全部文件（按分析优先级排序）
+        self.manifest = None  # 项目分析清单
+        self.file_signatures = {}  # 待分析文件 -> 内容签名
+        self._partial_docs = {}  # 切分成多段的文件 -> {段号: 分析结果}
+        self.output_tokens = ANALYSIS_MAX_OUTPUT_TOKENS
         self.current_task_batch = []  # 当前任务批次
-        self.batch_size = 2  # 每批处理的文件数量
+        self.pipeline = None  # 正在运行的分析流水线
+        self._output_lock = threading.Lock()
         
     def get_single_file_analyzer_prompt(self):
         """获取单文件分析器的专用系统提示词"""
@@ -75,18 +94,18 @@ class ProjectDocAnalyzer:
 
 ## 导入依赖
 - **导入模块**: 模块名 - 用途
-
----
 ```
 
-如果分析多个文件，请为每个文件重复上述格式，用 `---` 分隔。
-请只输出分析结果，不要添加其他说明文字。"""
+每个文件的分析结果必须单独包裹在标记行之间，序号与请求中的“文件 序号”一致：
+{SECTION_START.format(index='序号')}
+（上述格式的分析结果）
+{SECTION_END.format(index='序号')}
+即使只有一个文件也要使用标记。请只输出带标记的分析结果，标记之外不要添加其他说明文字。"""
 
         
     def _create_docs_folder(self):
         """创建文档存储文件夹"""
-        project_name = os.path.basename(self.current_project_path)
-        self.docs_folder = os.path.join(self.current_project_path, f"{project_name}_analysis_docs")
+        self.docs_folder = os.path.join(self.current_project_path, docs_folder_name(self.current_project_path))
         
         if not os.path.exists(self.docs_folder):
             os.makedirs(self.docs_folder)
@@ -94,122 +113,170 @@ class ProjectDocAnalyzer:
         else:
             print(f"{Fore.CYAN}📁 使用现有文档文件夹: {self.docs_folder}{Style.RESET_ALL}")
     
+    def _batch_token_budget(self) -> int:
+        """每批文件内容的token上限
+
+        取配置项 doc_analysis_batch_tokens 与模型上下文剩余空间中的较小值：上下文长度减去
+        输出预留、系统提示词和批量请求的说明文字（model_context_tokens 可覆盖按模型名推断的上下文长度）。
+        """
+        context_tokens = model_context_tokens()
+        self.output_tokens = min(ANALYSIS_MAX_OUTPUT_TOKENS, context_tokens // 4)
+        available = (context_tokens - self.output_tokens - BATCH_PROMPT_OVERHEAD_TOKENS
+                     - token_counter.count(self.get_single_file_analyzer_prompt()))
+        configured = config_store.get_int('doc_analysis_batch_tokens', 24000)
+        return max(512, min(configured, available))
+
     def _start_batch_analysis(self):
-        """开始批次分析流程"""
-        total_batches = (self.total_files + self.batch_size - 1) // self.batch_size
-        
-        for batch_num in range(total_batches):
-            start_idx = batch_num * self.batch_size
-            end_idx = min(start_idx + self.batch_size, self.total_files)
-            
-            batch_files = self.analysis_order[start_idx:end_idx]
-            
-            print(f"\n{Fore.MAGENTA}📦 开始处理第 {batch_num + 1}/{total_batches} 批次 ({len(batch_files)} 个文件){Style.RESET_ALL}")
-            
-            # 批量分析文件
-            self._analyze_batch_files(batch_files)
-            self.processed_files += len(batch_files)
-            
-            # 显示进度
-            progress = (self.processed_files / self.total_files) * 100
-            print(f"{Fore.CYAN}📊 进度: {self.processed_files}/{self.total_files} ({progress:.1f}%){Style.RESET_ALL}")
-            print(f"{Fore.GREEN}✅ 第 {batch_num + 1} 批次完成{Style.RESET_ALL}")
+        """开始批次分析流程
+
+        文件按token预算装箱分批（超大文件按函数/类边界切段），多个批次同时请求模型，每个批次完成后
+        立即写出分析文档。配置项: doc_analysis_concurrency (并发请求数，默认4)、doc_analysis_batch_tokens
+        (每批文件内容的token上限，默认24000，不会超过模型上下文)、doc_analysis_max_retries
+        (限流/服务端错误重试次数，默认5)
+        """
+        self._partial_docs = {}
+        self.pipeline = DocAnalysisPipeline(
+            request_fn=lambda batch: self._call_ai_for_analysis(self._build_batch_prompt(batch.files)),
+            on_result=self._on_batch_done,
+            on_failure=self._on_batch_failed,
+            concurrency=config_store.get_int('doc_analysis_concurrency', 4),
+            batch_tokens=self._batch_token_budget(),
+            max_retries=config_store.get_int('doc_analysis_max_retries', 5),
+            max_repairs=config_store.get_int('doc_analysis_max_repairs', 2)
+        )
+        print(f"{Fore.CYAN}📋 每批最多约 {self.pipeline.batch_tokens:,} tokens，同时进行 {self.pipeline.concurrency} 个分析请求{Style.RESET_ALL}")
         
-        print(f"\n{Fore.GREEN}🎉 所有文件分析完成！{Style.RESET_ALL}")
+        try:
+            self.pipeline.run(self.analysis_order, self._read_file_for_analysis)
+        except KeyboardInterrupt:
+            print(f"\n{Fore.YELLOW}⚠️ 分析已被用户中断{Style.RESET_ALL}")
+        
+        progress = self.pipeline.get_progress()
+        if not self.pipeline.stopped:
+            print(f"\n{Fore.GREEN}🎉 所有文件分析完成！{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}📊 成功 {progress['done_files']} 个，失败 {progress['failed_files']} 个，"
+              f"共 {progress['batches_done']} 个批次，用时 {_format_duration(progress['elapsed_seconds'])}{Style.RESET_ALL}")
         print(f"{Fore.CYAN}📁 分析文档保存在: {self.docs_folder}{Style.RESET_ALL}")
         self.is_active = False
     
-    def _analyze_batch_files(self, batch_files: list):
-        """批量分析文件"""
+    def _read_file_for_analysis(self, file_path: str) -> Optional[str]:
+        """预读阶段：读取待分析文件，失败时返回None"""
         try:
-            print(f"{Fore.YELLOW}🔍 批量分析 {len(batch_files)} 个文件{Style.RESET_ALL}")
-            
-            # 构建批量分析请求
-            analysis_prompt = "请分析以下文件的内容：\n\n"
-            
-            for i, file_path in enumerate(batch_files, 1):
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        file_content = f.read()
-                    
-                    file_name = os.path.basename(file_path)
-                    analysis_prompt += f"""## 文件 {i}: {file_name}
-文件路径: {file_path}
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return f.read()
+        except Exception as e:
+            with self._output_lock:
+                print(f"{Fore.RED}❌ 读取文件 {file_path} 失败: {e}{Style.RESET_ALL}")
+            return None
+    
+    def _build_batch_prompt(self, batch_files: List[FileChunk]) -> str:
+        """构建批量分析请求"""
+        parts = ["请分析以下文件的内容：\n\n"]
+        for i, chunk in enumerate(batch_files, 1):
+            file_name = os.path.basename(chunk.path)
+            if chunk.is_partial:
+                file_name += f"（第 {chunk.part}/{chunk.parts} 部分，第 {chunk.start_line}-{chunk.end_line} 行）"
+            parts.append(f"""## 文件 {i}: {file_name}
+文件路径: {chunk.path}
 
 文件内容:
 ```
-{file_content}
+{chunk.content}
 ```
 
-"""
-                except Exception as e:
-                    print(f"{Fore.RED}❌ 读取文件 {file_path} 失败: {e}{Style.RESET_ALL}")
-                    continue
-            
-            analysis_prompt += "\n请为每个文件按照指定格式输出分析结果，用 `---` 分隔不同文件的分析。"
-            
-            # 调用AI进行批量分析
-            response = self._call_ai_for_analysis(analysis_prompt)
-            
-            if response:
-                # 解析并保存批量分析结果
-                self._save_batch_analysis_results(batch_files, response)
-                print(f"{Fore.GREEN}✅ 批次分析完成{Style.RESET_ALL}")
-            else:
-                print(f"{Fore.RED}❌ 批次分析失败{Style.RESET_ALL}")
-                
-        except Exception as e:
-            print(f"{Fore.RED}❌ 批量分析时出错: {e}{Style.RESET_ALL}")
+""")
+        parts.append("\n" + format_instructions(len(batch_files)))
+        return "".join(parts)
+    
+    def _on_batch_done(self, batch, response: str) -> List[FileChunk]:
+        """批次完成：立即保存该批次的分析结果并显示进度，返回需要补发的文件"""
+        with self._output_lock:
+            invalid = self._save_batch_analysis_results(batch.files, response)
+            # 分段文件在所有段都完成后才计入
+            invalid_paths = {chunk.path for chunk in invalid}
+            self.processed_files += len({chunk.path for chunk in batch.files
+                                         if chunk.path not in self._partial_docs
+                                         and chunk.path not in invalid_paths})
+            status = self.get_status()
+            print(f"{Fore.CYAN}📊 进度: {status['progress']} ({status['percent']}%)，"
+                  f"预计剩余: {status['eta']}{Style.RESET_ALL}")
+            return invalid
     
-    def _call_ai_for_analysis(self, prompt: str) -> str:
-        """调用AI进行文件分析"""
+    def _on_batch_failed(self, batch, error: str):
+        with self._output_lock:
+            names = ", ".join(os.path.basename(path) for path in batch.paths)
+            print(f"{Fore.RED}❌ 批次分析失败 ({names}): {error}{Style.RESET_ALL}")
+    
+    def _call_ai_for_analysis(self, prompt: str) -> Dict:
+        """调用AI进行文件分析，返回 AIClient.chat_completion 的结果"""
+        # 使用单文件分析的系统提示词
+        system_prompt = self.get_single_file_analyzer_prompt()
+        
+        # 构建消息
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        
+        # 独立请求：不写入对话历史，也不执行工具
         try:
-            # 使用单文件分析的系统提示词
-            system_prompt = self.get_single_file_analyzer_prompt()
-            
-            # 构建消息
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ]
-            
-            # 调用AI客户端，禁用工具调用
-            response = ai_client.chat_completion(messages, stream=False, tools=None)
-            return response
-            
+            return ai_client.chat_completion(messages, max_tokens=self.output_tokens)
         except Exception as e:
-            print(f"{Fore.RED}AI分析调用失败: {e}{Style.RESET_ALL}")
+            # 网络异常已在 chat_completion 中转换为错误字典，这里的异常重试也无济于事
+            return {"error": f"AI分析调用失败: {e}", "status_code": None, "retryable": False}
+    
+    def _collect_part(self, chunk: FileChunk, file_analysis: str) -> Optional[str]:
+        """收集分段文件的一段分析结果，所有段都到齐时返回按顺序合并的结果
+
+        已收集的段在合并结果写入文档后才由调用方清除，写入失败时补发的段可以重新合并。
+        """
+        if not chunk.is_partial:
+            return file_analysis
+        parts = self._partial_docs.setdefault(chunk.path, {})
+        parts[chunk.part] = file_analysis
+        if len(parts) < chunk.parts:
+            print(f"{Fore.CYAN}🧩 {os.path.basename(chunk.path)} 第 {chunk.part}/{chunk.parts} 部分分析完成{Style.RESET_ALL}")
             return None
+        return "\n\n".join(parts[part] for part in sorted(parts))
     
-    def _save_batch_analysis_results(self, batch_files: list, analysis_result: str):
-        """保存批量分析结果到对应的md文件"""
+    def _save_batch_analysis_results(self, batch_files: List[FileChunk], analysis_result: str) -> List[FileChunk]:
+        """保存批量分析结果到对应的md文件，返回结果缺失、格式错误或未能保存、需要补发的文件"""
+        invalid = []
+        handled = set()  # 已保存（或分段已收集）的文件序号
         try:
-            # 按 --- 分割分析结果
-            file_analyses = analysis_result.split('---')
+            # 按文件标记拆分并校验分析结果
+            sections, problems = parse_response(analysis_result, len(batch_files))
             
             # 为每个文件保存对应的分析结果
-            for i, file_path in enumerate(batch_files):
-                if i < len(file_analyses):
-                    file_analysis = file_analyses[i].strip()
-                    if file_analysis:
+            for i, chunk in enumerate(batch_files, 1):
+                file_path = chunk.path
+                if i in sections:
+                    file_analysis = self._collect_part(chunk, sections[i])
+                    if file_analysis is not None:
                         # 生成md文件名
-                        file_name = os.path.basename(file_path)
-                        name_without_ext = os.path.splitext(file_name)[0]
-                        md_file_name = f"{name_without_ext}.md"
+                        md_file_name = self._doc_file_name(file_path)
                         md_file_path = os.path.join(self.docs_folder, md_file_name)
                         
                         # 写入分析结果
                         with open(md_file_path, 'w', encoding='utf-8') as f:
                             f.write(file_analysis)
+                        self._partial_docs.pop(file_path, None)
+                        
+                        # 记入清单，下次分析时内容未变化的文件直接复用该文档
+                        signature = self.file_signatures.get(file_path)
+                        if self.manifest and signature:
+                            self.manifest.record(MANIFEST_SECTION, file_path, signature, doc=md_file_name)
                         
                         print(f"{Fore.CYAN}💾 分析文档已保存: {md_file_name}{Style.RESET_ALL}")
-                    else:
-                        print(f"{Fore.YELLOW}⚠️ 文件 {os.path.basename(file_path)} 的分析结果为空{Style.RESET_ALL}")
+                    handled.add(i)
                 else:
-                    print(f"{Fore.YELLOW}⚠️ 文件 {os.path.basename(file_path)} 缺少分析结果{Style.RESET_ALL}")
+                    invalid.append(chunk)
+                    print(f"{Fore.YELLOW}⚠️ 文件 {os.path.basename(file_path)} 的分析结果无效"
+                          f"（{problems.get(i, '缺少分析结果')}），将单独补发{Style.RESET_ALL}")
             
         except Exception as e:
-            print(f"{Fore.RED}保存批量分析结果失败: {e}{Style.RESET_ALL}")
+            print(f"{Fore.RED}保存批量分析结果失败: {e}，未保存的文件将单独补发{Style.RESET_ALL}")
+            invalid = [chunk for i, chunk in enumerate(batch_files, 1) if i not in handled]
             # 如果批量保存失败，尝试保存整个结果到一个文件
             try:
                 fallback_file = os.path.join(self.docs_folder, f"batch_analysis_{int(time.time())}.md")
@@ -218,6 +285,43 @@ class ProjectDocAnalyzer:
                 print(f"{Fore.CYAN}💾 批量分析结果已保存到: {os.path.basename(fallback_file)}{Style.RESET_ALL}")
             except Exception as fallback_error:
                 print(f"{Fore.RED}备用保存也失败: {fallback_error}{Style.RESET_ALL}")
+        finally:
+            # 每批保存一次清单，中断后重新分析时已完成的批次不会重做
+            if self.manifest:
+                self.manifest.save()
+        return invalid
+
+    def _doc_file_name(self, file_path: str) -> str:
+        """分析文档文件名：项目内相对路径把目录分隔符换成点，如 src/ai_client.py -> src.ai_client.py.md"""
+        rel_path = os.path.relpath(file_path, self.current_project_path)
+        return rel_path.replace(os.sep, '.').replace('/', '.') + ".md"
+
+    def _plan_incremental_analysis(self):
+        """对比清单，只保留新增和内容变化的文件待分析，清理已删除文件的分析文档"""
+        self.manifest = get_analysis_manifest(self.current_project_path)
+        changed, unchanged, removed = self.manifest.diff(MANIFEST_SECTION, self.project_files)
+
+        # 内容未变但分析文档已被删除的文件同样需要重新分析
+        for file_path in unchanged:
+            entry = self.manifest.get(MANIFEST_SECTION, file_path)
+            doc = entry.get('doc') if entry else None
+            if not doc or not os.path.exists(os.path.join(self.docs_folder, doc)):
+                changed[file_path] = {key: entry[key] for key in ('h', 's', 'm')}
+        
+        for rel_path in removed:
+            entry = self.manifest.remove(MANIFEST_SECTION, rel_path)
+            doc = entry.get('doc') if entry else None
+            if doc:
+                try:
+                    os.remove(os.path.join(self.docs_folder, doc))
+                except OSError:
+                    pass
+        self.manifest.save()
+
+        self.file_signatures = changed
+        self.analysis_order = [path for path in self.project_files if path in changed]
+        self.total_files = len(self.analysis_order)
+        return len(self.project_files) - self.total_files, len(removed)
 
     def start_analysis(self, project_path: str = None) -> bool:
         """启动项目分析模式"""
@@ -237,6 +341,8 @@ class ProjectDocAnalyzer:
         self.is_active = True
         self.analyzed_files = []
         self.file_docs = {}
+        self.processed_files = 0
+        self.pipeline = None
         
         print(f"{Fore.CYAN}🚀 启动项目文件分析模式{Style.RESET_ALL}")
         print(f"{Fore.WHITE}项目路径: {project_path}{Style.RESET_ALL}")
@@ -247,19 +353,25 @@ class ProjectDocAnalyzer:
         # 扫描项目文件
         self._scan_project_files()
         
-        if not self.analysis_order:
+        if not self.project_files:
             print(f"{Fore.YELLOW}⚠️ 未找到可分析的文件{Style.RESET_ALL}")
             self.is_active = False
             return False
-            
-        print(f"{Fore.GREEN}✓ 发现 {self.total_files} 个文件待分析{Style.RESET_ALL}")
         
-        # 计算任务批次
-        total_batches = (self.total_files + self.batch_size - 1) // self.batch_size
-        print(f"{Fore.CYAN}📋 将分为 {total_batches} 个批次处理，每批最多 {self.batch_size} 个文件{Style.RESET_ALL}")
+        # 增量分析：只分析上次分析后新增或修改的文件
+        reused, removed = self._plan_incremental_analysis()
+        print(f"{Fore.GREEN}✓ 发现 {len(self.project_files)} 个文件，{self.total_files} 个待分析"
+              f"（{reused} 个未变化，复用已有文档；{removed} 个已删除）{Style.RESET_ALL}")
         
         # 开始批次分析流程
-        self._start_batch_analysis()
+        if self.analysis_order:
+            self._start_batch_analysis()
+        else:
+            self.is_active = False
+        
+        # 用全部文件的分析文档重新生成汇总
+        if not (self.pipeline and self.pipeline.stopped):
+            self._generate_summary_document()
         
         return True
         
@@ -281,19 +393,18 @@ class ProjectDocAnalyzer:
             'venv', 'env', '.env', 'build', 'dist', '.pytest_cache'
         }
         
-        files_to_analyze = []
-        
-        for root, dirs, files in os.walk(project_path):
-            # 过滤忽略的目录
-            dirs[:] = [d for d in dirs if d not in ignore_dirs]
-            
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() in supported_extensions:
-                    files_to_analyze.append(str(file_path))
+        # 多线程遍历目录树；排序保证同优先级文件的顺序稳定。分析文档、清单和汇总文档不参与分析
+        artifacts = analysis_artifact_names(project_path)
+        files_to_analyze = sorted(parallel_scanner.walk(
+            str(project_path),
+            skip_dir=lambda name: name in ignore_dirs or name in artifacts,
+            want_file=lambda name: (os.path.splitext(name)[1].lower() in supported_extensions
+                                    and name not in artifacts)
+        ))
         
         # 按优先级排序文件
-        self.analysis_order = self._sort_files_by_priority(files_to_analyze)
+        self.project_files = self._sort_files_by_priority(files_to_analyze)
+        self.analysis_order = list(self.project_files)
         self.total_files = len(self.analysis_order)
         
     def _sort_files_by_priority(self, files: List[str]) -> List[str]:
@@ -399,6 +510,8 @@ class ProjectDocAnalyzer:
         print(f"{Fore.LIGHTCYAN_EX}生成项目文档汇总{Style.RESET_ALL}")
         print(f"{Fore.LIGHTCYAN_EX}{'='*60}{Style.RESET_ALL}")
         
+        self._load_cached_docs()
+        
         # 生成汇总文档内容
         summary_content = self._create_summary_content()
         
@@ -411,9 +524,9 @@ class ProjectDocAnalyzer:
                 
             print(f"{Fore.GREEN}✓ 项目文档已生成: {output_file}{Style.RESET_ALL}")
             print(f"{Fore.CYAN}📊 分析统计:{Style.RESET_ALL}")
-            print(f"  - 总文件数: {self.total_files}")
-            print(f"  - 成功分析: {self.processed_files}")
-            print(f"  - 失败文件: {self.total_files - self.processed_files}")
+            print(f"  - 总文件数: {len(self.project_files)}")
+            print(f"  - 本次分析: {self.processed_files}/{self.total_files}")
+            print(f"  - 已有文档: {len(self.analyzed_files)}")
             
         except Exception as e:
             print(f"{Fore.RED}❌ 保存文档失败: {str(e)}{Style.RESET_ALL}")
@@ -421,8 +534,25 @@ class ProjectDocAnalyzer:
         # 结束分析模式
         self.stop_analysis()
         
+    def _load_cached_docs(self):
+        """按分析顺序读取清单中记录的单文件分析文档"""
+        self.analyzed_files = []
+        self.file_docs = {}
+        for file_path in self.project_files:
+            entry = self.manifest.get(MANIFEST_SECTION, file_path) if self.manifest else None
+            if not entry or not entry.get('doc'):
+                continue
+            try:
+                with open(os.path.join(self.docs_folder, entry['doc']), 'r', encoding='utf-8') as f:
+                    self.file_docs[file_path] = f.read()
+                self.analyzed_files.append(file_path)
+            except OSError:
+                continue
+        
     def _create_summary_content(self) -> str:
         """创建汇总文档内容"""
+        total_files = len(self.project_files)
+        analyzed = len(self.analyzed_files)
         content = f"""# 项目文档汇总
 
 > 由ByteIQ超大型项目分析模式自动生成
@@ -431,9 +561,9 @@ class ProjectDocAnalyzer:
 
 ## 📊 项目概览
 
-- **总文件数**: {self.total_files}
-- **成功分析**: {self.processed_files}
-- **分析完成率**: {(self.processed_files/self.total_files*100):.1f}%
+- **总文件数**: {total_files}
+- **成功分析**: {analyzed}
+- **分析完成率**: {(analyzed / total_files * 100 if total_files else 0):.1f}%
 
 ## 📁 文件分析结果
 
@@ -484,19 +614,45 @@ class ProjectDocAnalyzer:
         if not self.is_active:
             return
             
+        if self.pipeline:
+            self.pipeline.stop()
         self.is_active = False
         self.current_project_path = None
         print(f"{Fore.YELLOW}📄 项目分析模式已结束{Style.RESET_ALL}")
         
     def get_status(self) -> Dict:
-        """获取当前分析状态"""
+        """获取当前分析状态（含流水线进度和预计剩余时间）"""
+        progress = self.pipeline.get_progress() if self.pipeline else {}
+        eta_seconds = progress.get('eta_seconds')
         return {
             'is_active': self.is_active,
             'project_path': self.current_project_path,
             'total_files': self.total_files,
             'processed_files': self.processed_files,
-            'progress': f"{self.processed_files}/{self.total_files}" if self.total_files > 0 else "0/0"
+            'failed_files': progress.get('failed_files', 0),
+            'progress': f"{self.processed_files}/{self.total_files}" if self.total_files > 0 else "0/0",
+            'percent': round(self.processed_files / self.total_files * 100, 1) if self.total_files else 0.0,
+            'batches_done': progress.get('batches_done', 0),
+            'batches_planned': progress.get('batches_planned', 0),
+            'in_flight': progress.get('in_flight', 0),
+            'retries': progress.get('retries', 0),
+            'repairs': progress.get('repairs', 0),
+            'elapsed_seconds': progress.get('elapsed_seconds', 0.0),
+            'eta_seconds': eta_seconds,
+            'eta': _format_duration(eta_seconds) if eta_seconds is not None else ("计算中" if self.is_active else "-")
         }
 
+
+def _format_duration(seconds: float) -> str:
+    """把秒数格式化为 1小时2分 / 3分4秒 / 5秒"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    if minutes:
+        return f"{minutes}分{secs}秒"
+    return f"{secs}秒"
+
 # 全局实例
 project_doc_analyzer = ProjectDocAnalyzer()
@@ -0,0 +1,92 @@
+"""
+系统提示词构建器 - 按 (模式, 强度, BYTEIQ.md 版本, 思考模式) 缓存组装好的系统提示词
+"""
+
+import time
+import threading
+
+
+class SystemPromptBuilder:
+    """带缓存的系统提示词构建器
+
+    提示词模板和 BYTEIQ.md 增强内容在键不变时只组装一次，之后每轮返回同一个字符串对象，
+    保证发送给模型的系统提示词前缀逐字节一致，便于服务端的提示词缓存命中。
+    思考模式的附加说明总是拼接在末尾，不影响前面的公共前缀。
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_build_ms = 0.0
+        self.total_build_ms = 0.0
+        self.builds = 0
+
+    def _cache_key(self, thinking_mode):
+        from .modes import mode_manager
+        from .config import config_store
+        from .byteiq_config import byteiq_config_manager
+
+        return (
+            mode_manager.get_current_mode(),
+            config_store.get_str('prompt_strength', 'claude'),
+            byteiq_config_manager.get_config_signature(),
+            thinking_mode,
+        )
+
+    def _assemble(self, mode, strength, thinking_mode):
+        from .prompt_templates import get_prompt_template
+        from .byteiq_config import byteiq_config_manager
+        from .agent_enhancer import agent_enhancer
+
+        base_prompt = get_prompt_template(mode, strength)
+        # 使用BYTEIQ.md配置增强提示词
+        prompt = byteiq_config_manager.get_enhanced_system_prompt(base_prompt)
+        return agent_enhancer.enhance_prompt_with_thinking(prompt, thinking_mode)
+
+    def build(self, thinking_mode="normal"):
+        """获取当前设置下的系统提示词"""
+        start = time.perf_counter()
+        key = self._cache_key(thinking_mode)
+        with self._lock:
+            prompt = self._cache.get(key)
+        if prompt is None:
+            prompt = self._assemble(key[0], key[1], thinking_mode)
+            with self._lock:
+                # 键中包含 BYTEIQ.md 的签名，旧版本的条目不会再被命中，超出上限时整体清空
+                if len(self._cache) >= self.max_entries:
+                    self._cache.clear()
+                prompt = self._cache.setdefault(key, prompt)
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.last_build_ms = elapsed_ms
+            self.total_build_ms += elapsed_ms
+            self.builds += 1
+        return prompt
+
+    def invalidate(self):
+        """清空缓存（提示词模板或项目配置被显式修改后调用）"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self):
+        """获取缓存命中和构建耗时统计"""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "last_build_ms": round(self.last_build_ms, 3),
+                "avg_build_ms": round(self.total_build_ms / self.builds, 3) if self.builds else 0.0
+            }
+
+
+# 全局系统提示词构建器实例
+system_prompt_builder = SystemPromptBuilder()
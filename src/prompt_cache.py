@@ -0,0 +1,105 @@
+"""
+提示词缓存支持 - 保持请求消息前缀稳定、插入缓存断点并统计缓存命中的输入token
+"""
+
+import threading
+
+from .config import config_store
+
+# 写入 cache_control 时使用的断点标记
+CACHE_BREAKPOINT = {"type": "ephemeral"}
+
+
+class PromptCache:
+    """服务端提示词缓存的请求侧支持
+
+    - trim_history(): 历史记录只在超过上限时一次性裁剪到保留长度（检查点式裁剪），
+      两次裁剪之间消息只追加不移动，请求前缀保持不变
+    - apply_breakpoints(): 对支持的模型（默认模型名含 claude/anthropic）在系统提示词和
+      稳定前缀的最后一条消息上加 cache_control 断点
+    - record_usage(): 从响应的 usage 中统计缓存命中/写入的输入token
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.last_usage = None
+
+    def trim_history(self, history):
+        """检查点式裁剪：HistoryBuffer 超过 history_max_messages 条时原地裁剪到最近的 history_keep_messages 条"""
+        max_messages = config_store.get_int('history_max_messages', 40)
+        keep_messages = min(config_store.get_int('history_keep_messages', 20), max_messages)
+        if len(history) > max_messages:
+            # 从 user 消息开始保留，避免以孤立的 assistant 回复开头
+            history.trim_to(keep_messages, start_role="user")
+
+    def breakpoints_enabled(self, model):
+        """当前模型是否发送 cache_control 断点（配置项 prompt_cache_control: auto/true/false）"""
+        setting = config_store.get('prompt_cache_control', 'auto')
+        if isinstance(setting, str) and setting.strip().lower() == 'auto':
+            model = (model or "").lower()
+            return 'claude' in model or 'anthropic' in model
+        if isinstance(setting, str):
+            return setting.strip().lower() in ('1', 'true', 'yes', 'on')
+        return bool(setting)
+
+    def apply_breakpoints(self, messages, model):
+        """返回带缓存断点的消息列表；不修改传入的消息对象
+
+        断点放在第一条系统消息和最后一条之前的消息上（即本轮新增输入之前的稳定前缀末尾）。
+        """
+        if len(messages) < 2 or not self.breakpoints_enabled(model):
+            return messages
+        result = list(messages)
+        positions = {0, len(messages) - 2}
+        for i in positions:
+            message = result[i]
+            content = message.get("content")
+            if isinstance(content, str) and content:
+                result[i] = dict(message, content=[
+                    {"type": "text", "text": content, "cache_control": CACHE_BREAKPOINT}
+                ])
+        return result
+
+    def request_options(self):
+        """流式请求的附加参数：请求在最后一个数据块中返回 usage"""
+        if config_store.get_bool('stream_include_usage', True):
+            return {"stream_options": {"include_usage": True}}
+        return {}
+
+    def record_usage(self, usage):
+        """记录一次响应的 usage，兼容 OpenAI / DeepSeek / Anthropic 的字段名"""
+        if not isinstance(usage, dict):
+            return
+        details = usage.get('prompt_tokens_details') or {}
+        input_tokens = usage.get('prompt_tokens') or usage.get('input_tokens') or 0
+        cached = (details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens')
+                  or usage.get('cache_read_input_tokens') or 0)
+        written = usage.get('cache_creation_input_tokens') or 0
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached
+            self.cache_write_tokens += written
+            self.last_usage = {"input_tokens": input_tokens, "cached_tokens": cached}
+
+    def get_stats(self):
+        """获取缓存命中统计"""
+        with self._lock:
+            uncached = max(self.input_tokens - self.cached_tokens, 0)
+            return {
+                "requests": self.requests,
+                "input_tokens": self.input_tokens,
+                "cached_tokens": self.cached_tokens,
+                "uncached_tokens": uncached,
+                "cache_write_tokens": self.cache_write_tokens,
+                "hit_rate": round(self.cached_tokens / self.input_tokens * 100, 1) if self.input_tokens else 0.0,
+                "last_usage": self.last_usage
+            }
+
+
+# 全局提示词缓存实例
+prompt_cache = PromptCache()
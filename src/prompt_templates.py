@@ -124,8 +124,12 @@ def get_sprint_claude_prompt():
 **CRITICAL**: You can and SHOULD call multiple tools in the same response when appropriate. There is NO restriction on calling multiple tools simultaneously. Use parallel tool execution for efficiency.
 
 ## File Operations
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start</start_line><end_line>end</end_line></precise_reading> - Read specific lines
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create new file
 <write_file><path>file_path</path><content>content</content></write_file> - Overwrite file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -176,8 +180,12 @@ You are ByteIQ, a professional CLI AI programming assistant. You help users with
 **CRITICAL**: You can and SHOULD call multiple tools in the same response when appropriate. There is NO restriction on calling multiple tools simultaneously. Use parallel tool execution for efficiency.
 
 ## File Operation Tools
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>file_content</content></create_file> - Create new file
 <write_file><path>file_path</path><content>file_content</content></write_file> - Overwrite file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -287,8 +295,12 @@ def get_sprint_flash_prompt():
 4. **Never Give Up** - Fix errors immediately, never end prematurely
 
 # 🛠️ Core Tool Calling Standards (Most Important)
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create file
 <write_file><path>file_path</path><content>content</content></write_file> - Write file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -367,8 +379,12 @@ def get_default_flash_prompt():
 {get_refusal_guidelines()}
 
 # 🛠️ Core Tool List (Most Important)
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create file
 <write_file><path>file_path</path><content>content</content></write_file> - Write file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -466,8 +482,12 @@ Always analyze what the user truly needs, not just surface requests. Implement c
 # TOOL USAGE REQUIREMENTS (MANDATORY)
 
 ## File Operations
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start</start_line><end_line>end</end_line></precise_reading> - Read specific lines
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create new file
 <write_file><path>file_path</path><content>content</content></write_file> - Overwrite file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -577,8 +597,12 @@ def get_default_qwen_prompt():
 {get_refusal_guidelines()}
 
 # 🛠️ Core Tool List (Most Important)
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create file
 <write_file><path>file_path</path><content>content</content></write_file> - Write file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -659,8 +683,12 @@ def get_sprint_mini_prompt():
 3. **Tool Usage** - Proper tool execution
 
 # 🛠️ Core Tools (Most Important)
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create file
 <code_search><keyword>search_keyword</keyword></code_search> - Search code
 
@@ -720,8 +748,12 @@ def get_default_mini_prompt():
 {get_refusal_guidelines()}
 
 # 🛠️ Core Tool List (Most Important)
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
 <precise_reading><path>file_path</path><start_line>start_line</start_line><end_line>end_line</end_line></precise_reading> - Precisely read specified line range
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create file
 <write_file><path>file_path</path><content>content</content></write_file> - Write file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
@@ -806,7 +838,11 @@ You are in specialized bug fixing mode. Your primary goal is to identify, analyz
 You have access to ONLY these essential tools for bug fixing:
 
 ## File Operations
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create new file
 <write_file><path>file_path</path><content>content</content></write_file> - Overwrite file completely
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code at specific line
@@ -886,7 +922,11 @@ def get_fix_bug_qwen_prompt():
 Specialized mode for efficient bug identification and resolution.
 
 # 🛠️ ESSENTIAL TOOLS
-<read_file><path>file_path</path></read_file> - Read entire file content
+<read_file><path>file_path</path></read_file> - Read file content (large files return a structural outline with line ranges first)
+<read_file><path>file_path</path><cursor>line</cursor></read_file> - Read a large file page by page, starting from the cursor given in the previous result
+<find_definition><symbol>name_or_Class.method</symbol></find_definition> - Find where a Python symbol is defined (file, line range, base classes and subclasses)
+<find_references><symbol>name</symbol></find_references> - Find the lines that use or import a Python symbol
+<list_symbols><path>file_path</path></list_symbols> - List the classes, functions and methods of a Python file with their line ranges
 <create_file><path>file_path</path><content>content</content></create_file> - Create new file
 <write_file><path>file_path</path><content>content</content></write_file> - Overwrite file
 <insert_code><path>file_path</path><line>line_number</line><content>code</content></insert_code> - Insert code
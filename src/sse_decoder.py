@@ -0,0 +1,114 @@
+"""
+SSE流式解码 - 增量切分 data: 行并解析JSON，合并终端输出按帧率刷新
+"""
+
+import sys
+import json
+import time
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+_DATA_PREFIX = b"data:"
+_DONE = b"[DONE]"
+
+
+def _loads(payload):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class SSEDecoder:
+    """OpenAI兼容接口的SSE增量解码器
+
+    feed() 接收任意切分的原始字节块，按行处理 data: 字段，返回本块内完整的JSON事件；
+    不完整的末行留到下一块。收到 [DONE] 后 done 为True，之后的数据被忽略。
+    安装了 orjson 时用它解析JSON。
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self.done = False
+
+    def feed(self, data):
+        if self.done or not data:
+            return []
+        if self._pending:
+            data = self._pending + data
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self):
+        """处理流结束时没有换行的最后一行"""
+        pending, self._pending = self._pending, b""
+        if self.done or not pending:
+            return []
+        return self._parse_lines([pending])
+
+    def _parse_lines(self, lines):
+        events = []
+        for line in lines:
+            if not line.startswith(_DATA_PREFIX):
+                continue
+            payload = line[5:].strip()
+            if payload == _DONE:
+                self.done = True
+                break
+            try:
+                events.append(_loads(payload))
+            except ValueError:  # orjson.JSONDecodeError 也是 ValueError 的子类
+                continue
+        return events
+
+
+def event_content(event):
+    """取出事件中第一个choice的增量文本"""
+    choices = event.get("choices")
+    if choices:
+        return (choices[0].get("delta") or {}).get("content") or ""
+    return ""
+
+
+class StreamPrinter:
+    """合并流式增量输出，按帧率批量写入终端
+
+    每个增量单独 print+flush 时，每次写入都经过 MonitoredStdout 和终端刷新；这里把两次刷新
+    之间收到的文本合并成一次写入。写入时才取 sys.stdout，兼容按线程替换的输出代理。
+    """
+
+    def __init__(self, fps=30):
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self._parts = []
+        self._last_flush = 0.0
+
+    def write(self, text):
+        if not text:
+            return
+        self._parts.append(text)
+        now = time.monotonic()
+        if now - self._last_flush >= self.interval:
+            self._emit(now)
+
+    def flush(self):
+        if self._parts:
+            self._emit(time.monotonic())
+
+    def _emit(self, now):
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._last_flush = now
+        stdout = sys.stdout
+        stdout.write(text)
+        stdout.flush()
+
+
+def stream_fps():
+    """流式输出的刷新帧率（配置项 stream_output_fps，默认30，0表示不合并）"""
+    from .config import config_store
+    return config_store.get_int('stream_output_fps', 30)
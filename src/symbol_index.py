@@ -0,0 +1,388 @@
+"""
+Python符号索引 - 用ast解析项目中的定义、引用、导入和类继承关系，按文件增量更新
+"""
+
+import os
+import ast
+import json
+import threading
+
+from .code_index import iter_search_files
+from .config import config_store
+from .file_cache import file_cache, split_lines
+from .parallel_scanner import parallel_scanner
+
+INDEX_VERSION = 1
+# 单次查询最多返回的结果数
+MAX_RESULTS = 50
+
+
+def _dotted_name(node):
+    """把 Name/Attribute（以及 Generic[T] 这类下标）还原为点分名称，无法还原时返回None"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    if isinstance(node, ast.Subscript):
+        return _dotted_name(node.value)
+    return None
+
+
+def _target_names(target):
+    """赋值目标中被绑定的名称（支持元组解包，忽略属性和下标赋值）"""
+    if isinstance(target, ast.Name):
+        return [target.id]
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for element in target.elts for name in _target_names(element)]
+    if isinstance(target, ast.Starred):
+        return _target_names(target.value)
+    return []
+
+
+def extract_symbols(file_path):
+    """解析单个Python文件（在进程池中运行）
+
+    返回可JSON序列化的字典：
+    - defs: [名称, 类型, 限定名, 起始行, 结束行, 基类列表]，类型为 class/function/method/variable
+    - imports: [模块, 导入名, 别名, 行号]
+    - refs: {名称: [行号, ...]}，包括变量读取和属性访问
+    文件无法读取时返回None，语法错误时返回 {"error": 原因}。
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except SyntaxError as e:
+        return {"error": f"语法错误: {e.msg} (行 {e.lineno})"}
+    except ValueError as e:
+        return {"error": str(e)}
+
+    defs = []
+    assigned = set()
+
+    def visit(body, prefix, in_class):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                qualname = prefix + node.name
+                bases = [name for name in map(_dotted_name, node.bases) if name]
+                defs.append([node.name, "class", qualname, node.lineno, node.end_lineno, bases])
+                visit(node.body, qualname + ".", True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = prefix + node.name
+                defs.append([node.name, "method" if in_class else "function", qualname,
+                             node.lineno, node.end_lineno, []])
+                visit(node.body, qualname + ".<locals>.", False)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and not prefix.endswith("<locals>."):
+                # 模块级变量和类属性，重复赋值只记录第一次
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name in _target_names(target):
+                        if prefix + name not in assigned:
+                            assigned.add(prefix + name)
+                            defs.append([name, "variable", prefix + name, node.lineno, node.end_lineno, []])
+            elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+                # if TYPE_CHECKING / try-except ImportError 等块中的定义
+                for field in ('body', 'orelse', 'finalbody'):
+                    visit(getattr(node, field, []), prefix, in_class)
+                for handler in getattr(node, 'handlers', []):
+                    visit(handler.body, prefix, in_class)
+
+    visit(tree.body, "", False)
+
+    imports = []
+    refs = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append([alias.name, None, alias.asname, node.lineno])
+        elif isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            for alias in node.names:
+                imports.append([module, alias.name, alias.asname, node.lineno])
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            refs.setdefault(node.id, set()).add(node.lineno)
+        elif isinstance(node, ast.Attribute):
+            refs.setdefault(node.attr, set()).add(node.lineno)
+
+    return {"defs": defs, "imports": imports,
+            "refs": {name: sorted(lines) for name, lines in refs.items()}}
+
+
+class SymbolIndex:
+    """项目级Python符号索引
+
+    索引保存在 <项目根目录>/.byteiq_memory/symbol_index.json。查询前按文件的 mtime 和大小
+    增量刷新，变化的文件用 ast 重新解析（文件较多时在进程池中并行）；写入类工具执行后
+    直接调用 notify_changed() 更新对应文件。内存中维护 名称 -> 文件 的定义和引用倒排表，
+    查询只需要打开命中的文件。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.index_file = os.path.join(self.root, '.byteiq_memory', 'symbol_index.json')
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        # 相对路径 -> {"m": mtime_ns, "s": size, "d": extract_symbols() 的结果}
+        self.files = {}
+        self.defined = {}
+        self.referenced = {}
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                return
+            for rel_path, entry in data.get('files', {}).items():
+                self._add_entry(rel_path, entry)
+        except (OSError, ValueError, AttributeError):
+            # 索引不存在或已损坏：从空索引开始重建
+            self.files = {}
+            self.defined = {}
+            self.referenced = {}
+
+    def save(self):
+        """把索引写回磁盘（只在有变化时写入）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+                tmp_file = self.index_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': INDEX_VERSION, 'files': self.files}, f,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_file, self.index_file)
+                self._dirty = False
+            except OSError:
+                pass
+
+    def _add_entry(self, rel_path, entry):
+        self.files[rel_path] = entry
+        data = entry.get('d') or {}
+        for definition in data.get('defs', ()):
+            self.defined.setdefault(definition[0], set()).add(rel_path)
+        for name in data.get('refs', ()):
+            self.referenced.setdefault(name, set()).add(rel_path)
+
+    def _remove_entry(self, rel_path):
+        entry = self.files.pop(rel_path, None)
+        if entry is None:
+            return
+        data = entry.get('d') or {}
+        for postings, names in ((self.defined, [d[0] for d in data.get('defs', ())]),
+                                (self.referenced, data.get('refs', ()))):
+            for name in names:
+                posting = postings.get(name)
+                if posting is not None:
+                    posting.discard(rel_path)
+                    if not posting:
+                        del postings[name]
+
+    def _set_entry(self, rel_path, stat, data):
+        self._remove_entry(rel_path)
+        self._add_entry(rel_path, {'m': stat.st_mtime_ns, 's': stat.st_size, 'd': data})
+        self._dirty = True
+
+    def refresh(self):
+        """按 mtime/大小 增量刷新索引，变化的文件并行解析"""
+        with self._lock:
+            self._load()
+            seen = set()
+            changed = {}
+            for file_path in iter_search_files(self.root):
+                if not file_path.endswith('.py'):
+                    continue
+                rel_path = os.path.relpath(file_path, self.root)
+                seen.add(rel_path)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entry = self.files.get(rel_path)
+                if entry and entry['m'] == stat.st_mtime_ns and entry['s'] == stat.st_size:
+                    continue
+                changed[file_path] = (rel_path, stat)
+
+            threshold = config_store.get_int('symbol_index_process_threshold', 64)
+            for file_path, data in parallel_scanner.map_files_cpu(extract_symbols, list(changed), threshold):
+                rel_path, stat = changed[file_path]
+                self._set_entry(rel_path, stat, data)
+
+            for rel_path in [p for p in self.files if p not in seen]:
+                self._remove_entry(rel_path)
+                self._dirty = True
+            self.save()
+
+    def notify_changed(self, path):
+        """文件被写入/修改/删除后调用，直接更新该文件的索引"""
+        with self._lock:
+            if not self._loaded:
+                # 索引尚未加载，下次查询刷新时会根据mtime发现变化
+                return
+            abs_path = os.path.abspath(path)
+            if not self.covers(abs_path) or not abs_path.endswith('.py'):
+                return
+            self._update_file(abs_path)
+
+    def _update_file(self, abs_path):
+        """单独刷新一个文件，返回其条目（文件不存在时为None）"""
+        rel_path = os.path.relpath(abs_path, self.root)
+        try:
+            stat = os.stat(abs_path)
+        except OSError:
+            if rel_path in self.files:
+                self._remove_entry(rel_path)
+                self._dirty = True
+            return None
+        entry = self.files.get(rel_path)
+        if not entry or entry['m'] != stat.st_mtime_ns or entry['s'] != stat.st_size:
+            self._set_entry(rel_path, stat, extract_symbols(abs_path))
+        return self.files[rel_path]
+
+    def covers(self, path):
+        """path 是否位于索引的项目目录内"""
+        rel_path = os.path.relpath(os.path.abspath(path), self.root)
+        return rel_path != os.pardir and not rel_path.startswith(os.pardir + os.sep)
+
+    def _source_line(self, rel_path, line):
+        try:
+            lines = split_lines(file_cache.read_text(os.path.join(self.root, rel_path)))
+            return lines[line - 1].strip() if 0 < line <= len(lines) else ""
+        except (OSError, UnicodeDecodeError):
+            return ""
+
+    def _display_path(self, rel_path):
+        return os.path.relpath(os.path.join(self.root, rel_path)).replace(os.sep, '/')
+
+    def find_definitions(self, symbol):
+        """查找定义，symbol 可以是名称或限定名（如 Class.method）
+
+        返回 [(相对路径, 定义)]，按路径和行号排序。
+        """
+        name = symbol.split('.')[-1]
+        with self._lock:
+            self.refresh()
+            results = []
+            for rel_path in sorted(self.defined.get(name, ())):
+                for definition in self.files[rel_path]['d']['defs']:
+                    qualname = definition[2].replace('<locals>.', '')
+                    if definition[0] == name and (qualname == symbol or qualname.endswith('.' + symbol)
+                                                  or '.' not in symbol):
+                        results.append((rel_path, definition))
+            return results
+
+    def subclasses(self, class_name):
+        """直接继承 class_name 的类 [(相对路径, 定义)]（按基类名的最后一段匹配）"""
+        name = class_name.split('.')[-1]
+        with self._lock:
+            return [(rel_path, definition)
+                    for rel_path, entry in sorted(self.files.items())
+                    for definition in (entry.get('d') or {}).get('defs', ())
+                    if definition[1] == 'class' and any(base.split('.')[-1] == name for base in definition[5])]
+
+    def find_references(self, symbol):
+        """查找引用位置 [(相对路径, 行号)]，包括导入该名称的语句"""
+        name = symbol.split('.')[-1]
+        with self._lock:
+            self.refresh()
+            results = []
+            for rel_path in sorted(self.referenced.get(name, set()) | self._importers(name)):
+                data = self.files[rel_path]['d']
+                lines = set(data.get('refs', {}).get(name, ()))
+                lines.update(item[3] for item in data.get('imports', ()) if name in (item[1], item[2]))
+                results.extend((rel_path, line) for line in sorted(lines))
+            return results
+
+    def _importers(self, name):
+        return {rel_path for rel_path, entry in self.files.items()
+                if any(name in (item[1], item[2]) for item in (entry.get('d') or {}).get('imports', ()))}
+
+    def file_symbols(self, path):
+        """获取单个文件的符号信息；不在项目内的文件直接解析"""
+        abs_path = os.path.abspath(path)
+        if not self.covers(abs_path):
+            return extract_symbols(abs_path)
+        with self._lock:
+            self._load()
+            entry = self._update_file(abs_path)
+            self.save()
+            return entry['d'] if entry else None
+
+    # ---- 工具输出 ----
+
+    def format_definitions(self, symbol):
+        definitions = self.find_definitions(symbol)
+        if not definitions:
+            # 内置类或第三方库的类没有定义，但仍可以列出项目中的子类
+            children = self.subclasses(symbol)
+            if children:
+                return f"项目中没有 '{symbol}' 的定义，继承它的类:\n" + "\n".join(
+                    f"{self._display_path(p)}:{d[3]}-{d[4]} [class] {d[2]}" for p, d in children[:MAX_RESULTS])
+            return f"未找到符号 '{symbol}' 的定义"
+        output = [f"符号 '{symbol}' 的定义 ({len(definitions)} 处):"]
+        for rel_path, (name, kind, qualname, start, end, bases) in definitions[:MAX_RESULTS]:
+            output.append(f"{self._display_path(rel_path)}:{start}-{end} [{kind}] {qualname.replace('<locals>.', '')}")
+            output.append(f"    {self._source_line(rel_path, start)}")
+            if kind == 'class':
+                if bases:
+                    output.append(f"    基类: {', '.join(bases)}")
+                children = self.subclasses(name)
+                if children:
+                    output.append("    子类: " + ", ".join(
+                        f"{d[2]} ({self._display_path(p)}:{d[3]})" for p, d in children[:MAX_RESULTS]))
+        if len(definitions) > MAX_RESULTS:
+            output.append(f"... (还有 {len(definitions) - MAX_RESULTS} 处未列出)")
+        return "\n".join(output)
+
+    def format_references(self, symbol):
+        references = self.find_references(symbol)
+        if not references:
+            return f"未找到符号 '{symbol}' 的引用"
+        output = [f"符号 '{symbol}' 的引用 ({len(references)} 处):"]
+        for rel_path, line in references[:MAX_RESULTS]:
+            output.append(f"{self._display_path(rel_path)}:{line}: {self._source_line(rel_path, line)}")
+        if len(references) > MAX_RESULTS:
+            output.append(f"... (还有 {len(references) - MAX_RESULTS} 处未列出)")
+        return "\n".join(output)
+
+    def format_file_symbols(self, path):
+        data = self.file_symbols(path)
+        if data is None:
+            return f"错误：无法读取文件 {path}"
+        if data.get('error'):
+            return f"无法解析 {path}: {data['error']}"
+        output = [f"文件 {path} 的符号:"]
+        for name, kind, qualname, start, end, bases in data['defs']:
+            if '<locals>' in qualname or (kind == 'variable' and qualname.count('.') > 1):
+                continue
+            depth = qualname.count('.')
+            suffix = f"({', '.join(bases)})" if bases else ""
+            output.append(f"{'  ' * depth}[{kind}] {name}{suffix}  行 {start}-{end}")
+        if data['imports']:
+            modules = sorted({module if not imported else f"{module}.{imported}"
+                              for module, imported, _, _ in data['imports']})
+            output.append(f"导入: {', '.join(modules)}")
+        return "\n".join(output)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root=None):
+    """获取指定项目根目录（默认当前目录）的符号索引实例"""
+    root = os.path.abspath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SymbolIndex(root)
+        return index
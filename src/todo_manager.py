@@ -6,8 +6,9 @@ TODO任务管理器
 import json
 import os
 import uuid
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from colorama import Fore, Style
 
 class TodoItem:
@@ -55,15 +56,28 @@ class TodoItem:
         return item
 
 class TodoManager:
-    """TODO管理器"""
+    """TODO管理器
+
+    持久化分两部分：todo_data.json 是快照，<快照>.journal 是追加写的变更日志。
+    每次修改只向日志追加一行记录；日志累计 compact_threshold 条后把当前状态
+    写成新快照（临时文件 + os.replace 原子替换）并清空日志。加载时先读快照再重放日志。
+    读取方通过 subscribe() 注册回调，在任务变化时收到通知，不需要重新解析文件。
+    """
     
-    def __init__(self, data_file: str = "todo_data.json"):
+    def __init__(self, data_file: str = "todo_data.json", compact_threshold: int = 200):
         self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        self.compact_threshold = compact_threshold
         self.todos: Dict[str, TodoItem] = {}
+        # 每次变化递增，供读取方判断缓存是否过期
+        self.version = 0
+        self._journal_entries = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.RLock()
         self.load_todos()
     
     def load_todos(self):
-        """加载TODO数据"""
+        """加载TODO数据（快照 + 变更日志）"""
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
@@ -73,65 +87,144 @@ class TodoManager:
                         self.todos[todo.id] = todo
             except Exception as e:
                 print(f"加载TODO数据失败: {e}")
+        self._replay_journal()
     
-    def save_todos(self):
-        """保存TODO数据"""
+    def _replay_journal(self):
+        """重放变更日志；写入中断导致的不完整末行直接忽略"""
+        if not os.path.exists(self.journal_file):
+            return
         try:
-            data = [todo.to_dict() for todo in self.todos.values()]
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        if entry['op'] == 'put':
+                            todo = TodoItem.from_dict(entry['todo'])
+                            self.todos[todo.id] = todo
+                        elif entry['op'] == 'del':
+                            self.todos.pop(entry['id'], None)
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self._journal_entries += 1
         except Exception as e:
-            print(f"保存TODO数据失败: {e}")
+            print(f"加载TODO变更日志失败: {e}")
+    
+    def save_todos(self):
+        """保存TODO数据：原子写入完整快照并清空变更日志"""
+        with self._lock:
+            try:
+                data = [todo.to_dict() for todo in self.todos.values()]
+                tmp_file = self.data_file + ".tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.data_file)
+                # 快照已包含日志中的所有变更；即使在删除日志前中断，重放 put/del 也是幂等的
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                self._journal_entries = 0
+            except Exception as e:
+                print(f"保存TODO数据失败: {e}")
+    
+    def _record(self, entries: List[Dict]):
+        """向变更日志追加记录，必要时压缩，并通知订阅者"""
+        with self._lock:
+            try:
+                lines = "".join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+                                for entry in entries)
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                self._journal_entries += len(entries)
+            except Exception as e:
+                print(f"保存TODO数据失败: {e}")
+            if self._journal_entries >= self.compact_threshold:
+                self.save_todos()
+            self.version += 1
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception:
+                pass
+    
+    def _put_entry(self, todo_id: str) -> Dict:
+        return {'op': 'put', 'todo': self.todos[todo_id].to_dict()}
+    
+    def subscribe(self, callback: Callable[[], None]):
+        """注册任务变化回调"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+    
+    def unsubscribe(self, callback: Callable[[], None]):
+        """取消任务变化回调"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+    
+    def get_active_todos(self) -> List[TodoItem]:
+        """获取未完成（pending / in_progress）的任务，按创建顺序"""
+        with self._lock:
+            return [todo for todo in self.todos.values()
+                    if todo.status in ("pending", "in_progress")]
     
     def add_todo(self, title: str, description: str = "", priority: str = "medium", 
                  parent_id: Optional[str] = None) -> str:
         """添加TODO项目"""
-        todo = TodoItem(title, description, priority, parent_id)
-        self.todos[todo.id] = todo
-        
-        # 如果有父任务，添加到父任务的子任务列表
-        if parent_id and parent_id in self.todos:
-            self.todos[parent_id].subtasks.append(todo.id)
-            self.todos[parent_id].updated_at = datetime.now().isoformat()
-        
-        self.save_todos()
-        return todo.id
+        with self._lock:
+            todo = TodoItem(title, description, priority, parent_id)
+            self.todos[todo.id] = todo
+            entries = [self._put_entry(todo.id)]
+            
+            # 如果有父任务，添加到父任务的子任务列表
+            if parent_id and parent_id in self.todos:
+                self.todos[parent_id].subtasks.append(todo.id)
+                self.todos[parent_id].updated_at = datetime.now().isoformat()
+                entries.append(self._put_entry(parent_id))
+            
+            self._record(entries)
+            return todo.id
     
     def update_todo(self, todo_id: str, **kwargs) -> bool:
         """更新TODO项目"""
-        if todo_id not in self.todos:
-            return False
-        
-        todo = self.todos[todo_id]
-        for key, value in kwargs.items():
-            if hasattr(todo, key):
-                setattr(todo, key, value)
-        
-        todo.updated_at = datetime.now().isoformat()
-        self.save_todos()
-        return True
+        with self._lock:
+            if todo_id not in self.todos:
+                return False
+            
+            todo = self.todos[todo_id]
+            for key, value in kwargs.items():
+                if hasattr(todo, key):
+                    setattr(todo, key, value)
+            
+            todo.updated_at = datetime.now().isoformat()
+            self._record([self._put_entry(todo_id)])
+            return True
     
     def delete_todo(self, todo_id: str) -> bool:
         """删除TODO项目"""
-        if todo_id not in self.todos:
-            return False
-        
-        todo = self.todos[todo_id]
-        
-        # 删除所有子任务
-        for subtask_id in todo.subtasks:
-            self.delete_todo(subtask_id)
-        
-        # 从父任务中移除
-        if todo.parent_id and todo.parent_id in self.todos:
-            parent = self.todos[todo.parent_id]
-            if todo_id in parent.subtasks:
-                parent.subtasks.remove(todo_id)
-                parent.updated_at = datetime.now().isoformat()
-        
-        del self.todos[todo_id]
-        self.save_todos()
-        return True
+        with self._lock:
+            if todo_id not in self.todos:
+                return False
+            
+            todo = self.todos[todo_id]
+            
+            # 删除所有子任务
+            for subtask_id in list(todo.subtasks):
+                self.delete_todo(subtask_id)
+            
+            entries = [{'op': 'del', 'id': todo_id}]
+            # 从父任务中移除
+            if todo.parent_id and todo.parent_id in self.todos:
+                parent = self.todos[todo.parent_id]
+                if todo_id in parent.subtasks:
+                    parent.subtasks.remove(todo_id)
+                    parent.updated_at = datetime.now().isoformat()
+                    entries.append(self._put_entry(todo.parent_id))
+            
+            del self.todos[todo_id]
+            self._record(entries)
+            return True
     
     def get_todo(self, todo_id: str) -> Optional[TodoItem]:
         """获取TODO项目"""
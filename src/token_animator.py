@@ -7,7 +7,7 @@ import threading
 import time
 import sys
 from colorama import Fore, Style
-import tiktoken
+from .token_counter import token_counter
 
 class TokenAnimator:
     def __init__(self):
@@ -19,17 +19,16 @@ class TokenAnimator:
         self.upload_target = 0
         self.download_current = 0
         self.download_target = 0
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        
+
     def count_tokens(self, text: str) -> int:
-        """计算文本的token数量"""
-        try:
-            return len(self.encoding.encode(text))
-        except:
-            # 简单估算：中文按2个字符=1token，英文按4个字符=1token
-            chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
-            other_chars = len(text) - chinese_chars
-            return chinese_chars // 2 + other_chars // 4
+        """计算文本的token数量（与上下文管理器共享缓存）"""
+        return token_counter.count(text, fallback=self._estimate_tokens)
+
+    def _estimate_tokens(self, text: str) -> int:
+        # 简单估算：中文按2个字符=1token，英文按4个字符=1token
+        chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
+        other_chars = len(text) - chinese_chars
+        return chinese_chars // 2 + other_chars // 4
     
     def start_upload_animation(self, text: str):
         """开始上传动画"""
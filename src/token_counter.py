@@ -0,0 +1,135 @@
+"""
+Token计数缓存 - 按内容哈希缓存tiktoken编码结果，供上下文管理和Token动画共享
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+
+class TokenCounter:
+    """带LRU缓存的token计数器
+
+    相同的文本（文件内容、项目上下文、重复发送的消息）只编码一次，
+    之后按内容哈希直接取出计数。
+    """
+
+    def __init__(self, max_entries=2048, encoding_name="cl100k_base"):
+        self.max_entries = max_entries
+        self.encoding_name = encoding_name
+        self._encoding = None
+        # 编码加载失败（如离线时无法下载编码文件）后不再重试，之后一律按估算值计数
+        self._encoding_failed = not TIKTOKEN_AVAILABLE
+        self._encoding_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def encoding(self):
+        """tiktoken 编码，未安装或加载失败时为None"""
+        if self._encoding is None and not self._encoding_failed:
+            with self._encoding_lock:
+                if self._encoding is None and not self._encoding_failed:
+                    try:
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception:
+                        self._encoding_failed = True
+        return self._encoding
+
+    def count(self, text, fallback=None):
+        """计算文本的token数量
+
+        编码不可用或编码失败时调用 fallback(text) 进行估算（默认按 len//3），估算结果不写入缓存。
+        """
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+
+        encoding = self.encoding
+        if encoding is None:
+            return fallback(text) if fallback else len(text) // 3
+        try:
+            tokens = len(encoding.encode(text))
+        except Exception:
+            return fallback(text) if fallback else len(text) // 3
+
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def get_stats(self):
+        """获取缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0.0
+            }
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# 常见模型的上下文长度（按模型名子串匹配，靠前的优先）
+MODEL_CONTEXT_TOKENS = (
+    ("gpt-3.5", 16385),
+    ("gpt-4o", 128000),
+    ("gpt-4.1", 1000000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("claude", 200000),
+    ("deepseek", 64000),
+    ("qwen", 128000),
+    ("glm", 128000),
+    ("moonshot", 128000),
+    ("kimi", 128000),
+    ("gemini", 1000000),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("o4", 200000),
+)
+DEFAULT_CONTEXT_TOKENS = 32000
+
+
+def model_context_tokens(model=None):
+    """模型的上下文长度：配置项 model_context_tokens 优先，否则按模型名推断"""
+    from .config import config_store
+    configured = config_store.get_int('model_context_tokens', 0)
+    if configured > 0:
+        return configured
+    model = (model or config_store.get_str('model', '')).lower()
+    for name, tokens in MODEL_CONTEXT_TOKENS:
+        if name in model:
+            return tokens
+    return DEFAULT_CONTEXT_TOKENS
+
+
+# 全局token计数器实例
+token_counter = TokenCounter()
@@ -0,0 +1,241 @@
+"""
+流式工具调用解析器 - 单次线性扫描提取XML工具调用和思考文本
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# 工具名 -> 字段列表。字段名以 '?' 结尾表示可选的末尾字段
+TOOL_SPECS: Dict[str, Tuple[str, ...]] = {
+    'read_file': ('path', 'cursor?'),
+    'precise_reading': ('path', 'start_line', 'end_line'),
+    'write_file': ('path', 'content'),
+    'create_file': ('path', 'content'),
+    'insert_code': ('path', 'line', 'content'),
+    'replace_code': ('path', 'start_line', 'end_line', 'content'),
+    'execute_command': ('command',),
+    'add_todo': ('title', 'description', 'priority'),
+    'update_todo': ('id', 'status', 'progress?'),
+    'show_todos': (),
+    'delete_file': ('path',),
+    'mcp_call_tool': ('tool', 'arguments'),
+    'mcp_read_resource': ('uri',),
+    'mcp_list_tools': (),
+    'mcp_list_resources': (),
+    'mcp_server_status': (),
+    'task_complete': ('summary',),
+    'plan': ('completed_action', 'next_step', 'original_request', 'completed_tasks'),
+    'code_search': ('keyword',),
+    'find_definition': ('symbol',),
+    'find_references': ('symbol',),
+    'list_symbols': ('path',),
+}
+
+
+class _ToolSpec:
+    """单个工具的标签结构，与原先的正则表达式语义保持一致"""
+
+    def __init__(self, name: str, fields: Tuple[str, ...]):
+        self.name = name
+        self.optional_field = None
+        if fields and fields[-1].endswith('?'):
+            self.optional_field = fields[-1][:-1]
+            fields = fields[:-1]
+        self.fields = fields
+
+        # 开始标签包含第一个字段，例如 <read_file><path>
+        self.open_tag = f"<{name}>" + (f"<{fields[0]}>" if fields else "")
+        # 结束标签包含最后一个字段的闭合，例如 </path></read_file>
+        if fields and not self.optional_field:
+            self.terminator = f"</{fields[-1]}></{name}>"
+        else:
+            self.terminator = f"</{name}>"
+
+    def parse_body(self, body: str) -> Optional[Tuple]:
+        """解析开始标签与结束标签之间的内容，格式不符时返回None"""
+        if not self.fields:
+            return () if body == "" else None
+
+        values = []
+        pos = 0
+        for current, following in zip(self.fields, self.fields[1:]):
+            separator = f"</{current}><{following}>"
+            end = body.find(separator, pos)
+            if end == -1:
+                return None
+            values.append(body[pos:end])
+            pos = end + len(separator)
+
+        if not self.optional_field:
+            values.append(body[pos:])
+            return tuple(values)
+
+        # 带可选末尾字段: ...</status> 或 ...</status><progress>...</progress>
+        last = self.fields[-1]
+        rest = body[pos:]
+        optional_open = f"</{last}><{self.optional_field}>"
+        optional_close = f"</{self.optional_field}>"
+        split_at = rest.find(optional_open)
+        if split_at != -1 and rest.endswith(optional_close):
+            values.append(rest[:split_at])
+            values.append(rest[split_at + len(optional_open):-len(optional_close)])
+            return tuple(values)
+        if rest.endswith(f"</{last}>"):
+            values.append(rest[:-len(f"</{last}>")])
+            values.append(None)
+            return tuple(values)
+        return None
+
+
+class StreamingToolParser:
+    """增量式工具调用解析器
+
+    可以按流式响应的分块逐次调用 feed()，流结束时调用 close()。
+    每个字符只被扫描常数次，工具内容（如大段 write_file）以分块列表累积，
+    找到结束标签时才拼接一次，避免重复的正则扫描和字符串拼接。
+    """
+
+    def __init__(self, tool_names=None):
+        names = tool_names or TOOL_SPECS.keys()
+        self.specs: Dict[str, _ToolSpec] = {
+            name: _ToolSpec(name, TOOL_SPECS[name]) for name in names
+        }
+        self._by_open_tag = {spec.open_tag: spec for spec in self.specs.values()}
+        open_tags = sorted(self._by_open_tag, key=len, reverse=True)
+        self._open_re = re.compile('|'.join(re.escape(tag) for tag in open_tags))
+        self._max_open_len = len(open_tags[0])
+
+        self.tool_calls: List[Dict] = []
+        self.source_length = 0
+        self.is_closed = False
+        self._thought_parts: List[str] = []
+
+        self._position = 0      # 下一段待处理文本在整个响应中的绝对位置
+        self._carry = ""        # 标签外：末尾可能是半个开始标签
+        self._current = None    # 标签内：当前正在解析的工具
+        self._tool_start = 0
+        self._body_start = 0
+        self._body_parts: List[str] = []
+        self._tail = ""         # 标签内：上一块末尾，用于跨块查找结束标签
+
+    @classmethod
+    def parse(cls, text: str, tool_names=None) -> 'StreamingToolParser':
+        """一次性解析完整文本"""
+        parser = cls(tool_names)
+        parser.feed(text)
+        parser.close()
+        return parser
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """输入一个文本分块，返回本次新完成的工具调用"""
+        if not chunk:
+            return []
+        new_from = len(self.tool_calls)
+        self.source_length += len(chunk)
+        self._process(chunk)
+        return self.tool_calls[new_from:]
+
+    def close(self) -> List[Dict]:
+        """流结束：未闭合的工具调用按普通文本处理，返回本次新完成的工具调用"""
+        new_from = len(self.tool_calls)
+        while self._current is not None:
+            # 未找到结束标签，开始标签视为普通文本，其后内容重新扫描
+            pending = "".join(self._body_parts)
+            self._abandon_current()
+            self._process(pending)
+        if self._carry:
+            self._thought_parts.append(self._carry)
+            self._carry = ""
+        self.is_closed = True
+        return self.tool_calls[new_from:]
+
+    @property
+    def thought_text(self) -> str:
+        """去除所有工具调用后剩下的思考文本"""
+        return "".join(self._thought_parts).strip()
+
+    def _process(self, text: str):
+        while text:
+            if self._current is None:
+                text = self._scan_outside(text)
+            else:
+                text = self._scan_inside(text)
+
+    def _scan_outside(self, text: str) -> str:
+        data = self._carry + text
+        base = self._position - len(self._carry)
+        self._carry = ""
+
+        match = self._open_re.search(data)
+        if match:
+            self._thought_parts.append(data[:match.start()])
+            self._current = self._by_open_tag[match.group(0)]
+            self._tool_start = base + match.start()
+            self._body_start = base + match.end()
+            self._body_parts = []
+            self._tail = ""
+            self._position = self._body_start
+            return data[match.end():]
+
+        # 末尾可能是被分块截断的开始标签，先留到下一块
+        cut = self._partial_tag_start(data)
+        self._thought_parts.append(data[:cut])
+        self._carry = data[cut:]
+        self._position = base + len(data)
+        return ""
+
+    def _partial_tag_start(self, data: str) -> int:
+        # 开始标签本身含多个 '<'，只需检查末尾不超过最长标签长度的范围
+        lt = data.find('<', max(0, len(data) - self._max_open_len + 1))
+        while lt != -1:
+            suffix = data[lt:]
+            if any(tag.startswith(suffix) for tag in self._by_open_tag):
+                return lt
+            lt = data.find('<', lt + 1)
+        return len(data)
+
+    def _scan_inside(self, text: str) -> str:
+        spec = self._current
+        terminator = spec.terminator
+        window = self._tail + text
+        idx = window.find(terminator)
+
+        if idx == -1:
+            self._body_parts.append(text)
+            keep = len(terminator) - 1
+            self._tail = window[-keep:] if keep else ""
+            self._position += len(text)
+            return ""
+
+        joined = "".join(self._body_parts) + text
+        body_end = len(joined) - len(window) + idx
+        body = joined[:body_end]
+        rest = joined[body_end + len(terminator):]
+        self._body_parts = []
+        self._tail = ""
+
+        values = spec.parse_body(body)
+        if values is None:
+            # 字段不完整：与非贪婪正则一致，把这个结束标签并入内容，继续找下一个结束标签；
+            # 直到流结束都没有合适的结束标签时，close() 再把开始标签作为文本处理
+            consumed = body_end + len(terminator)
+            self._body_parts = [joined[:consumed]]
+            self._position = self._body_start + consumed
+            return rest
+
+        self.tool_calls.append({
+            "tool_name": spec.name,
+            "matches": [values],
+            "start_pos": self._tool_start,
+        })
+        self._current = None
+        self._position = self._body_start + body_end + len(terminator)
+        return rest
+
+    def _abandon_current(self):
+        self._thought_parts.append(self._current.open_tag)
+        self._current = None
+        self._body_parts = []
+        self._tail = ""
+        self._position = self._body_start
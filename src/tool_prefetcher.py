@@ -0,0 +1,126 @@
+"""
+流式工具预执行器 - 在AI响应仍在流式输出时提前执行只读工具
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 可以在流式输出期间提前执行的只读工具
+PREFETCHABLE_TOOLS = {'read_file', 'precise_reading', 'code_search',
+                      'find_definition', 'find_references', 'list_symbols'}
+
+
+class _ThreadCapturingStdout:
+    """按线程截获输出的标准输出代理
+
+    工作线程中的打印先写入各自的缓冲区，等主流程按工具顺序处理到该调用时
+    再统一输出，避免与流式文本和确认提示交错。全局只有一个实例，由
+    install_output_capture() 安装，预执行器和调度器共用它而不各自替换 sys.stdout。
+    """
+
+    def __init__(self, target=None):
+        self._target = target
+        self._local = threading.local()
+
+    def start_capture(self):
+        self._local.buffer = []
+
+    def stop_capture(self):
+        buffer = getattr(self._local, 'buffer', None)
+        self._local.buffer = None
+        return "".join(buffer or [])
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(text)
+            return len(text)
+        return self._target.write(text)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            return self._target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+# 全局输出截获代理实例
+output_capture = _ThreadCapturingStdout()
+
+
+def install_output_capture():
+    """安装全局输出截获代理（已安装时不做任何事），返回该代理
+
+    代理一旦安装就不再卸载；未截获的线程直接写入被包装的原标准输出。
+    只在主线程、没有工具正在执行时调用，例如对话开始时。
+    """
+    if sys.stdout is not output_capture:
+        output_capture._target = sys.stdout
+        sys.stdout = output_capture
+    return output_capture
+
+
+class ToolPrefetcher:
+    """只读工具预执行器
+
+    流式解析器每完成一个工具调用就调用 submit()。在响应中出现第一个非只读工具
+    之前，只读且当前模式允许自动执行的工具会被提交到线程池；一旦出现写入/执行类
+    工具就停止预执行，保证后续读取能看到前面写入的结果。其余工具由
+    process_response 交给 tool_execution_engine 按依赖图调度执行。
+    """
+
+    def __init__(self, tool_processor, max_workers=4):
+        self.tool_processor = tool_processor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+        self.stopped = False
+        self.prefetched_count = 0
+        self._stdout = install_output_capture()
+
+    def submit(self, tool_call):
+        """流式解析出一个完整工具调用时调用"""
+        from .modes import mode_manager
+
+        tool_name = tool_call['tool_name']
+        if self.stopped:
+            return
+        if tool_name not in PREFETCHABLE_TOOLS or mode_manager.can_auto_execute(tool_name) is not True:
+            # 非只读工具之后的读取可能依赖其结果，不再预执行
+            self.stopped = True
+            return
+
+        self.futures[id(tool_call)] = (
+            tool_call,
+            self.executor.submit(self._run, tool_name, tool_call['matches'])
+        )
+        self.prefetched_count += 1
+
+    def _run(self, tool_name, matches):
+        self._stdout.start_capture()
+        try:
+            tool_result, tool_summary = self.tool_processor._execute_tool_with_matches(
+                tool_name, matches, animate=False)
+        finally:
+            output = self._stdout.stop_capture()
+        return tool_result, tool_summary, output
+
+    def take(self, tool_call):
+        """取出预执行结果 (tool_result, tool_summary)，没有预执行时返回None"""
+        entry = self.futures.pop(id(tool_call), None)
+        if entry is None or entry[0] is not tool_call:
+            return None
+
+        tool_result, tool_summary, output = entry[1].result()
+        if output:
+            sys.stdout.write(output)
+            sys.stdout.flush()
+        return tool_result, tool_summary
+
+    def shutdown(self):
+        """丢弃未使用的结果并等待运行中的工具结束"""
+        for _, future in self.futures.values():
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.futures.clear()
@@ -0,0 +1,349 @@
+"""
+工具执行引擎 - 按工具调用涉及的路径和副作用构建依赖图，互不依赖的调用并发执行
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore, Style
+
+from .config import config_store
+from .tool_prefetcher import install_output_capture
+
+# 工具副作用类型
+READ = 'read'          # 只读取文件/状态
+WRITE = 'write'        # 修改文件/状态
+BARRIER = 'barrier'    # 副作用无法确定（执行命令、调用外部工具、结束任务），与前后所有调用都有依赖
+
+
+class ToolEffect:
+    """工具的副作用声明
+
+    kind 为 READ/WRITE/BARRIER；path_index 为路径参数的位置（缺省时按当前目录处理），
+    scope 为 'file'（单个文件）或 'tree'（整个目录子树，如搜索、列目录）；
+    resource 为路径之外的共享状态名（如 todo 列表、MCP连接），也可以是按参数列表返回
+    状态名的函数。'mcp:服务器名' 这样的子资源与其父资源 'mcp' 冲突，与其他子资源不冲突。
+    """
+
+    __slots__ = ('kind', 'path_index', 'scope', 'resource')
+
+    def __init__(self, kind, path_index=None, scope='file', resource=None):
+        self.kind = kind
+        self.path_index = path_index
+        self.scope = scope
+        self.resource = resource
+
+
+def _mcp_tool_resource(args):
+    """mcp_call_tool 只占用工具所在的MCP服务器；服务器未知时占用整个MCP"""
+    from .mcp_client import mcp_client
+
+    server_name = mcp_client.server_for_tool(args[0]) if args and isinstance(args[0], str) else None
+    return f'mcp:{server_name}' if server_name else 'mcp'
+
+
+# 工具名 -> 副作用声明；未声明的工具按 BARRIER 处理
+TOOL_EFFECTS = {
+    'read_file': ToolEffect(READ, 0),
+    'precise_reading': ToolEffect(READ, 0),
+    'code_search': ToolEffect(READ, 1, scope='tree'),
+    'find_definition': ToolEffect(READ, 1, scope='tree'),
+    'find_references': ToolEffect(READ, 1, scope='tree'),
+    'list_symbols': ToolEffect(READ, 0),
+    'write_file': ToolEffect(WRITE, 0),
+    'create_file': ToolEffect(WRITE, 0),
+    'insert_code': ToolEffect(WRITE, 0),
+    'replace_code': ToolEffect(WRITE, 0),
+    'delete_file': ToolEffect(WRITE, 0),
+    'show_todos': ToolEffect(READ, resource='todo'),
+    'add_todo': ToolEffect(WRITE, resource='todo'),
+    'update_todo': ToolEffect(WRITE, resource='todo'),
+    'mcp_read_resource': ToolEffect(READ, resource='mcp'),
+    'mcp_list_tools': ToolEffect(READ, resource='mcp'),
+    'mcp_list_resources': ToolEffect(READ, resource='mcp'),
+    'mcp_server_status': ToolEffect(READ, resource='mcp'),
+    # 同一服务器上的调用按顺序执行，不同服务器上的调用可以并发
+    'mcp_call_tool': ToolEffect(WRITE, resource=_mcp_tool_resource),
+    'plan': ToolEffect(READ),
+    'execute_command': ToolEffect(BARRIER),
+    'task_complete': ToolEffect(BARRIER),
+    'end_guidance_start_fixing': ToolEffect(BARRIER),
+}
+_UNKNOWN_EFFECT = ToolEffect(BARRIER)
+
+
+def register_tool_effect(tool_name, effect):
+    """为新工具声明副作用，使其参与并发调度"""
+    TOOL_EFFECTS[tool_name] = effect
+
+
+def tool_call_args(matches):
+    """把解析器给出的 matches 转为去除首尾空白的参数列表"""
+    # 没有参数的工具（如 <show_todos/>）
+    if not matches or matches[0] is None:
+        raw_args = ()
+    else:
+        raw_args = matches[0] if isinstance(matches[0], tuple) else (matches[0],)
+    return [arg.strip() if isinstance(arg, str) else arg for arg in raw_args]
+
+
+def _normalize_path(path):
+    return os.path.normcase(os.path.abspath(path or '.'))
+
+
+def _contains(tree, path):
+    return path == tree or path.startswith(tree.rstrip(os.sep) + os.sep)
+
+
+def _overlaps(a, b):
+    """两个资源键是否可能指向同一数据"""
+    if a[0] == 'res' or b[0] == 'res':
+        return a[0] == b[0] and (a[1] == b[1] or a[1].startswith(b[1] + ':') or b[1].startswith(a[1] + ':'))
+    if a[0] == 'tree' and _contains(a[1], b[1]):
+        return True
+    if b[0] == 'tree' and _contains(b[1], a[1]):
+        return True
+    return a[1] == b[1]
+
+
+class ToolNode:
+    """依赖图中的一个工具调用"""
+
+    __slots__ = ('index', 'tool_call', 'tool_name', 'matches', 'args', 'effect', 'reads', 'writes',
+                 'deps', 'result', 'summary', 'output', 'elapsed', 'prefetched', 'done')
+
+    def __init__(self, index, tool_call):
+        self.index = index
+        self.tool_call = tool_call
+        self.tool_name = tool_call['tool_name']
+        self.matches = tool_call['matches']
+        self.args = tool_call_args(self.matches)
+        self.effect = TOOL_EFFECTS.get(self.tool_name, _UNKNOWN_EFFECT)
+        self.reads = set()
+        self.writes = set()
+        self.deps = []
+        self.result = None
+        self.summary = ""
+        self.output = ""
+        self.elapsed = None
+        self.prefetched = False
+        self.done = threading.Event()
+
+        effect = self.effect
+        keys = set()
+        if effect.path_index is not None:
+            path = self.args[effect.path_index] if len(self.args) > effect.path_index else '.'
+            keys.add((effect.scope, _normalize_path(path if isinstance(path, str) else '.')))
+        resource = effect.resource(self.args) if callable(effect.resource) else effect.resource
+        if resource:
+            keys.add(('res', resource))
+        if effect.kind == WRITE:
+            self.writes = keys
+        else:
+            self.reads = keys
+
+    @property
+    def is_barrier(self):
+        return self.effect.kind == BARRIER
+
+    def conflicts_with(self, later):
+        """后面的调用 later 是否必须等待本调用完成"""
+        if self.is_barrier or later.is_barrier:
+            return True
+        if any(_overlaps(w, key) for w in self.writes for key in later.reads | later.writes):
+            return True
+        return any(_overlaps(r, w) for r in self.reads for w in later.writes)
+
+
+def build_tool_graph(tool_calls):
+    """按文本顺序构建依赖图：每个调用依赖于前面所有与之冲突的调用"""
+    nodes = []
+    for index, tool_call in enumerate(tool_calls):
+        node = ToolNode(index, tool_call)
+        node.deps = [earlier.index for earlier in nodes if earlier.conflicts_with(node)]
+        nodes.append(node)
+    return nodes
+
+
+class ToolLatencyStats:
+    """按工具名统计执行耗时，以及并发执行节省的时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tools = {}
+        self.batches = 0
+        self.wall_time = 0.0
+        self.serial_time = 0.0
+
+    def record(self, tool_name, seconds):
+        with self._lock:
+            stats = self.tools.setdefault(tool_name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def record_batch(self, wall_time, serial_time):
+        with self._lock:
+            self.batches += 1
+            self.wall_time += wall_time
+            self.serial_time += serial_time
+
+    def get_stats(self):
+        """获取各工具的调用次数、平均/最大耗时(ms)，按总耗时排序"""
+        with self._lock:
+            tools = [{
+                'tool': name,
+                'count': stats['count'],
+                'avg_ms': round(stats['total'] * 1000 / stats['count'], 1),
+                'max_ms': round(stats['max'] * 1000, 1),
+                'total_ms': round(stats['total'] * 1000, 1)
+            } for name, stats in self.tools.items()]
+            tools.sort(key=lambda item: item['total_ms'], reverse=True)
+            return {
+                'batches': self.batches,
+                'wall_ms': round(self.wall_time * 1000, 1),
+                'serial_ms': round(self.serial_time * 1000, 1),
+                'tools': tools
+            }
+
+
+class ToolExecutionEngine:
+    """工具执行引擎
+
+    一次响应中的工具调用先构建依赖图：读取同一文件不冲突，写入与对同一文件（或其所在
+    目录子树）的读写冲突，BARRIER 工具与前后所有调用冲突。可以自动执行的调用提交到线程池，
+    只等待自己依赖的调用；需要用户确认的调用和 BARRIER 工具在主线程执行，执行前先等待并
+    输出前面所有调用的结果。工作线程中的打印被截获，结果和输出始终按文本顺序交给 on_result。
+    """
+
+    def __init__(self):
+        self.stats = ToolLatencyStats()
+
+    def run(self, processor, tool_calls, permission=None, prefetcher=None, on_result=None, should_stop=None):
+        """执行一组工具调用，返回 (按文本顺序的 ToolNode 列表, 是否因中断而未执行全部调用)
+
+        permission(tool_name) 返回 True/False/"confirm"，默认按当前模式判断；
+        prefetcher 为流式输出期间已预执行只读工具的 ToolPrefetcher；
+        on_result(node, total) 在主线程按文本顺序调用，此时该调用的输出已经打印；
+        should_stop() 在调度、确认和执行每个调用前检查，返回True后不再执行新的调用。
+        """
+        from .modes import mode_manager
+
+        permission = permission or mode_manager.can_auto_execute
+        nodes = build_tool_graph(tool_calls)
+        total = len(nodes)
+        workers = max(1, config_store.get_int('tool_workers', 4))
+        executor = ThreadPoolExecutor(max_workers=min(workers, total)) if workers > 1 and total > 1 else None
+        stdout = install_output_capture()
+        started = time.perf_counter()
+        emitted = 0
+        interrupted = False
+
+        def emit_until(end):
+            nonlocal emitted
+            while emitted < end:
+                node = nodes[emitted]
+                node.done.wait()
+                if node.output:
+                    sys.stdout.write(node.output)
+                    sys.stdout.flush()
+                if on_result:
+                    on_result(node, total)
+                emitted += 1
+
+        scheduled = 0
+        try:
+            for node in nodes:
+                if should_stop and should_stop():
+                    interrupted = True
+                    break
+                scheduled += 1
+                allowed = permission(node.tool_name)
+                if allowed is False:
+                    node.result = f"当前模式 ({mode_manager.get_current_mode()}) 不允许此操作"
+                    node.summary = f"操作被禁止: {node.tool_name}"
+                    node.done.set()
+                elif allowed == "confirm" or node.is_barrier or executor is None:
+                    # 在主线程执行：先按顺序输出前面所有调用的结果，再确认/执行
+                    emit_until(node.index)
+                    self._run_inline(processor, node, total, allowed == "confirm", prefetcher, should_stop)
+                else:
+                    executor.submit(self._run_pooled, processor, node, nodes, prefetcher, stdout, should_stop)
+            # 中断时已提交的调用仍会执行完，其结果照常输出
+            emit_until(scheduled)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+        timed = [node.elapsed for node in nodes if node.elapsed is not None]
+        if timed:
+            self.stats.record_batch(time.perf_counter() - started, sum(timed))
+        return nodes[:emitted], interrupted
+
+    def _run_inline(self, processor, node, total, needs_confirm, prefetcher=None, should_stop=None):
+        try:
+            # 只有无需确认的只读工具会被预执行，取到结果时直接使用
+            prefetched = prefetcher.take(node.tool_call) if prefetcher and not needs_confirm else None
+            if prefetched is not None:
+                node.result, node.summary = prefetched
+                node.prefetched = True
+                return
+            if self._stopped(node, should_stop):
+                return
+            if needs_confirm:
+                summary = processor._summarize_tool_call(node.tool_name, node.args)
+                print(f"\n{Fore.YELLOW}AI 想要 ({node.index + 1}/{total}) {summary}{Style.RESET_ALL}")
+                if not processor._ask_user_confirmation(f"执行操作: {summary}"):
+                    node.result = "用户取消了操作"
+                    node.summary = f"用户取消 - {summary}"
+                    return
+                # 等待确认期间任务可能已被中断
+                if self._stopped(node, should_stop):
+                    return
+            self._execute(processor, node, animate=True)
+        finally:
+            node.done.set()
+
+    def _run_pooled(self, processor, node, nodes, prefetcher, stdout, should_stop=None):
+        for dep in node.deps:
+            nodes[dep].done.wait()
+        stdout.start_capture()
+        try:
+            prefetched = prefetcher.take(node.tool_call) if prefetcher else None
+            if prefetched is not None:
+                node.result, node.summary = prefetched
+                node.prefetched = True
+            elif not self._stopped(node, should_stop):
+                self._execute(processor, node, animate=False)
+        except Exception as e:
+            node.result = f"❌ 工具执行失败: {str(e)}"
+            node.summary = f"❌ {node.tool_name} 执行失败: {str(e)}"
+        finally:
+            node.output = stdout.stop_capture()
+            node.done.set()
+
+    def _stopped(self, node, should_stop):
+        """任务已被中断时把调用标记为未执行并返回True"""
+        if should_stop and should_stop():
+            node.result = "任务已被用户中断，未执行此操作"
+            node.summary = f"已中断 - {node.tool_name}"
+            return True
+        return False
+
+    def _execute(self, processor, node, animate):
+        start = time.perf_counter()
+        try:
+            node.result, node.summary = processor._execute_tool_with_matches(
+                node.tool_name, node.matches, animate=animate)
+        finally:
+            node.elapsed = time.perf_counter() - start
+            self.stats.record(node.tool_name, node.elapsed)
+
+    def get_stats(self):
+        return self.stats.get_stats()
+
+
+# 全局工具执行引擎实例
+tool_execution_engine = ToolExecutionEngine()
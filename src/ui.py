@@ -28,14 +28,14 @@ def print_welcome_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
     # 导入配置和主题管理器
-    from src.config import load_config
+    from src.config import config_store
 
 
     # 获取当前工作目录
     current_dir = os.getcwd()
 
     # 加载配置
-    config = load_config()
+    config = config_store.snapshot()
 
     # 获取配置信息
     model = config.get("model", "gpt-3.5-turbo")
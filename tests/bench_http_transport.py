@@ -0,0 +1,75 @@
+"""
+连接池基准 - 在本地模拟的 OpenAI 兼容服务器上比较每次新建连接与共享连接池的首个token延迟
+
+模拟服务器对每个新连接等待 --connect-ms 毫秒，代表 TCP+TLS 建连的往返开销。
+
+用法: python tests/bench_http_transport.py [--requests 20] [--connect-ms 50] [--first-token-ms 20]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+from src.http_transport import HTTPTransport  # noqa: E402
+from src.sse_decoder import SSEDecoder, event_content  # noqa: E402
+
+
+def time_to_first_token(post, release, url):
+    """发送一次流式请求，返回 (首个token延迟, 完整响应耗时)"""
+    start = time.perf_counter()
+    response = post(url, json={"stream": True, "messages": [{"role": "user", "content": "hi"}]},
+                    timeout=30, stream=True)
+    decoder = SSEDecoder()
+    first = None
+    chunks = response.iter_content(chunk_size=None)
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            if first is None and event_content(event):
+                first = time.perf_counter() - start
+        if decoder.done:
+            break
+    release(response, chunks)
+    return first, time.perf_counter() - start
+
+
+def run(label, post, release, url, count):
+    samples = [time_to_first_token(post, release, url) for _ in range(count)]
+    ttft = [first * 1000 for first, _ in samples]
+    total = [elapsed * 1000 for _, elapsed in samples]
+    print(f"{label:<20}{statistics.median(ttft):>12.1f}{statistics.mean(ttft):>12.1f}"
+          f"{statistics.median(total):>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--connect-ms', type=float, default=50.0)
+    parser.add_argument('--first-token-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    tokens = ["token "] * 200
+    with MockOpenAIServer(tokens, connect_delay=args.connect_ms / 1000,
+                          first_token_delay=args.first_token_ms / 1000) as server:
+        print(f"请求数: {args.requests}  建连开销: {args.connect_ms} ms  首token延迟: {args.first_token_ms} ms")
+        print(f"{'':<20}{'TTFT中位(ms)':>12}{'TTFT均值(ms)':>12}{'完整响应中位(ms)':>14}")
+
+        run("每次新建连接", requests.post, lambda response, chunks: response.close(), server.url, args.requests)
+        bare_connections = server.connections
+
+        transport = HTTPTransport()
+        try:
+            run("共享连接池", transport.post, transport.release, server.url, args.requests)
+        finally:
+            transport.close()
+        print(f"建立的连接数: 新建连接 {bare_connections}，连接池 {server.connections - bare_connections}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+并行扫描基准 - 在合成的文件树上比较逐个文件串行搜索与 parallel_scanner
+
+用法: python tests/bench_parallel_scanner.py [--files 50000] [--lines 40] [--keep DIR]
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.code_index import iter_search_files  # noqa: E402
+from src.parallel_scanner import parallel_scanner  # noqa: E402
+
+MAX_RESULTS = 20
+
+
+def make_tree(root, files, lines, rare_every):
+    """生成 files 个 .py 文件，每 100 个一个目录；每 rare_every 个文件含一行 qqqq_rare"""
+    body = "".join(f"alpha beta line {i}\n" for i in range(lines - 1))
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // 100:04d}")
+        if i % 100 == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"m{i:06d}.py"), 'w', encoding='utf-8') as f:
+            f.write(body + ("qqqq_rare = 1\n" if i % rare_every == rare_every - 1 else "x = 0\n"))
+
+
+def serial_search(query, file_paths):
+    """改动前 code_search 的做法：逐个读取全部候选文件，最后截取前 20 条"""
+    search_pattern = re.compile(query, re.IGNORECASE)
+    results = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+                if search_pattern.search(content):
+                    for i, line in enumerate(content.split('\n'), 1):
+                        if search_pattern.search(line):
+                            results.append(f"{file_path}:{i}: {line.strip()}")
+        except Exception:
+            continue
+    return results[:MAX_RESULTS]
+
+
+def parallel_search(query, file_paths):
+    results = []
+    matches = parallel_scanner.search(query, file_paths)
+    try:
+        for line in matches:
+            results.append(line)
+            if len(results) >= MAX_RESULTS:
+                break
+    finally:
+        matches.close()
+    return results
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--lines', type=int, default=40)
+    parser.add_argument('--keep', help="使用/保留该目录中的文件树，不存在时生成")
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="byteiq-scan-bench-")
+    rare_every = max(1, args.files // 2 // MAX_RESULTS)
+    try:
+        if not os.path.isdir(root) or not os.listdir(root):
+            print(f"生成 {args.files} 个文件 ({args.lines} 行) 到 {root} ...")
+            make_tree(root, args.files, args.lines, rare_every)
+
+        walk_serial, file_paths = timed(lambda: sorted(iter_search_files(root)))
+        walk_parallel, walked = timed(lambda: parallel_scanner.walk(root, want_file=lambda name: name.endswith('.py')))
+        print(f"文件数: {len(file_paths)}  CPU: {os.cpu_count()}")
+        print(f"{'场景':<36}{'串行(s)':>10}{'并行(s)':>10}")
+        print(f"{'遍历目录':<36}{walk_serial:>10.3f}{walk_parallel:>10.3f}")
+        assert len(walked) == len(file_paths)
+
+        for title, query in (("每个文件都匹配 (alpha beta|qqqq)", "alpha beta|qqqq"),
+                             ("少量匹配，约一半文件后凑满 20 条", "qqqq_rare")):
+            serial_time, expected = timed(serial_search, query, file_paths)
+            parallel_time, results = timed(parallel_search, query, file_paths)
+            # 并行搜索按文件顺序产出，前 20 条与串行结果相同
+            assert results == expected, (results[:3], expected[:3])
+            print(f"{title:<36}{serial_time:>10.3f}{parallel_time:>10.3f}")
+    finally:
+        parallel_scanner.shutdown()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
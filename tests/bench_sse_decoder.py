@@ -0,0 +1,152 @@
+"""
+流式解码基准 - 回放 SSE 数据，比较原先的逐行解码+逐增量输出与 SSEDecoder+StreamPrinter
+
+默认生成 100k 个 token 的 SSE 数据并按网络数据块回放；--fixture 可以回放录制的原始响应体。
+终端输出写入一个统计写入次数的 stdout 替身（底层为 os.devnull），与 MonitoredStdout 一样
+每次 write 都经过一层包装。
+
+用法: python tests/bench_sse_decoder.py [--tokens 100000] [--chunk 4096] [--fps 30] [--fixture 文件]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai_server import sse_chunks  # noqa: E402
+from src.sse_decoder import SSEDecoder, StreamPrinter, event_content  # noqa: E402
+
+
+class CountingStdout:
+    """统计 write/flush 次数的 stdout 替身"""
+
+    def __init__(self, target):
+        self.target = target
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return self.target.write(text)
+
+    def flush(self):
+        self.flushes += 1
+        self.target.flush()
+
+
+def make_fixture(count, seed=14):
+    """生成 count 个 token 的 SSE 响应体，中英文和代码片段混合"""
+    words = ["def", " compute", "(", "value", ")", ":", "\n    ", "return", " 结果", "，", "然后",
+             "读取文件", " the", " file", "。", "<read_file>", "<path>", "src/a.py", "</path>", "😀"]
+    rng = random.Random(seed)
+    return b"".join(sse_chunks([rng.choice(words) for _ in range(count)]))
+
+
+def iter_lines(chunks):
+    """原先使用的 requests.Response.iter_lines 的切行方式"""
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def old_loop(chunks):
+    """原先的路径：逐行 decode + json.loads，每个增量 print+flush，字符串 += 拼接"""
+    full_response = ""
+    for line in iter_lines(chunks):
+        if line:
+            line_str = line.decode('utf-8')
+            if line_str.startswith('data: '):
+                data_str = line_str[6:]
+                if data_str.strip() == '[DONE]':
+                    break
+                try:
+                    chunk_data = json.loads(data_str)
+                    if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
+                        delta = chunk_data['choices'][0].get('delta', {})
+                        if 'content' in delta:
+                            content = delta['content']
+                            print(content, end="", flush=True)
+                            full_response += content
+                except json.JSONDecodeError:
+                    continue
+    return full_response
+
+
+def new_loop(chunks, fps):
+    """现在的路径：按数据块解码，合并同一块内的增量，按帧率写出"""
+    decoder = SSEDecoder()
+    printer = StreamPrinter(fps)
+    response_parts = []
+    try:
+        for chunk in chunks:
+            deltas = [content for content in map(event_content, decoder.feed(chunk)) if content]
+            if deltas:
+                content = "".join(deltas)
+                printer.write(content)
+                response_parts.append(content)
+            if decoder.done:
+                break
+        for event in decoder.close():
+            content = event_content(event)
+            if content:
+                printer.write(content)
+                response_parts.append(content)
+    finally:
+        printer.flush()
+    return "".join(response_parts)
+
+
+def measure(func, chunks, *args):
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sink = CountingStdout(devnull)
+        with contextlib.redirect_stdout(sink):
+            start = time.perf_counter()
+            text = func(chunks, *args)
+            elapsed = time.perf_counter() - start
+    return text, elapsed, sink.writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=100000)
+    parser.add_argument('--chunk', type=int, default=4096, help="网络数据块大小 (字节)")
+    parser.add_argument('--fps', type=int, default=30, help="StreamPrinter 帧率")
+    parser.add_argument('--fixture', help="回放的原始 SSE 响应体文件")
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            data = f.read()
+    else:
+        data = make_fixture(args.tokens)
+    chunks = [data[i:i + args.chunk] for i in range(0, len(data), args.chunk)]
+    events = data.count(b"\ndata: ") + 1 - data.count(b"data: [DONE]")
+
+    old_text, old_time, old_writes = measure(old_loop, chunks)
+    new_text, new_time, new_writes = measure(new_loop, chunks, args.fps)
+    assert old_text == new_text, "两条路径的输出不一致"
+
+    print(f"SSE 数据: {len(data) / 1024 / 1024:.1f} MB, {events} 个事件, "
+          f"{len(chunks)} 个数据块 x {args.chunk} 字节")
+    print(f"{'':<28}{'耗时(s)':>10}{'token/s':>12}{'写入次数':>10}")
+    for label, elapsed, writes in (("原先 (逐行 + 逐增量输出)", old_time, old_writes),
+                                   (f"SSEDecoder + StreamPrinter({args.fps})", new_time, new_writes)):
+        print(f"{label:<28}{elapsed:>10.3f}{events / elapsed:>12,.0f}{writes:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+工具调用解析基准 - 比较原先的逐个正则解析与 StreamingToolParser
+
+用法: python tests/bench_tool_parser.py [--kb 600] [--chunk 40] [--repeat 5]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tool_parser import TOOL_SPECS, StreamingToolParser  # noqa: E402
+
+
+def regex_patterns(tool_names=None):
+    """按原先 process_response 中正则的写法，由 TOOL_SPECS 生成每个工具的正则
+
+    例如 '<read_file><path>(.*?)</path></read_file>'；可选的末尾字段与原先 update_todo
+    的写法相同：'(?:<progress>(.*?)</progress>)?'。
+    """
+    patterns = {}
+    for name in tool_names or TOOL_SPECS:
+        parts = []
+        for field in TOOL_SPECS[name]:
+            if field.endswith('?'):
+                field = field[:-1]
+                parts.append(f"(?:<{field}>(.*?)</{field}>)?")
+            else:
+                parts.append(f"<{field}>(.*?)</{field}>")
+        patterns[name] = f"<{name}>{''.join(parts)}</{name}>"
+    return patterns
+
+
+def regex_tool_calls(text, tool_names=None):
+    """原先的解析路径：每个正则扫描一遍全文，再按出现位置排序"""
+    found_tool_calls = []
+    for tool_name, pattern in regex_patterns(tool_names).items():
+        for match in re.finditer(pattern, text, re.DOTALL):
+            found_tool_calls.append({
+                "tool_name": tool_name,
+                "matches": [match.groups()],
+                "start_pos": match.start()
+            })
+    found_tool_calls.sort(key=lambda x: x['start_pos'])
+    return found_tool_calls
+
+
+def regex_thought(text, tool_names=None):
+    """原先的 _extract_thought_process：逐个正则 re.sub 去掉工具调用"""
+    processed_text = text
+    for pattern in regex_patterns(tool_names).values():
+        processed_text = re.sub(pattern, '', processed_text, flags=re.DOTALL)
+    return processed_text.strip()
+
+
+def regex_parse(text, tool_names=None):
+    """返回 (工具调用列表, 思考文本)，工具调用格式与 StreamingToolParser.tool_calls 相同"""
+    return regex_tool_calls(text, tool_names), regex_thought(text, tool_names)
+
+
+def make_response(target_kb):
+    """生成包含思考文本、若干小工具调用和两个大 write_file 的响应"""
+    code_line = "    result = compute(value, other_value)  # <tag> & 'quoted'\n"
+    body_lines = max(1, target_kb * 1024 // 2 // len(code_line))
+    big_body = "def generated():\n" + code_line * body_lines
+    parts = ["我先查看相关文件，然后修改实现。\n"]
+    for i in range(20):
+        parts.append(f"第 {i} 步：读取文件。<read_file><path>src/module_{i}.py</path></read_file>\n")
+    parts.append(f"<write_file><path>src/big_a.py</path><content>{big_body}</content></write_file>\n")
+    parts.append("<update_todo><id>abc</id><status>in_progress</status><progress>50</progress></update_todo>")
+    parts.append(f"<create_file><path>src/big_b.py</path><content>{big_body}</content></create_file>\n")
+    parts.append("<code_search><keyword>compute</keyword></code_search><show_todos></show_todos>")
+    parts.append("<task_complete><summary>完成</summary></task_complete>")
+    return "".join(parts)
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kb', type=int, default=600, help="响应大小 (KB)")
+    parser.add_argument('--chunk', type=int, default=40, help="流式分块大小 (字符)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_response(args.kb)
+    chunks = [text[i:i + args.chunk] for i in range(0, len(text), args.chunk)]
+
+    def regex_path():
+        # 原先每个响应解析一次工具调用，并提取两次思考文本
+        regex_tool_calls(text)
+        regex_thought(text)
+        regex_thought(text)
+
+    def streaming():
+        tool_parser = StreamingToolParser()
+        for chunk in chunks:
+            tool_parser.feed(chunk)
+        tool_parser.close()
+        return tool_parser
+
+    def one_shot():
+        return StreamingToolParser.parse(text)
+
+    expected_calls, expected_thought = regex_parse(text)
+    parsed = streaming()
+    assert parsed.tool_calls == expected_calls and parsed.thought_text == expected_thought
+
+    print(f"响应大小: {len(text.encode('utf-8')) // 1024} KB, 工具调用: {len(expected_calls)}, "
+          f"分块: {len(chunks)} x {args.chunk} 字符")
+    print(f"{'正则路径 (解析 + 两次思考文本)':<32}{best_of(args.repeat, regex_path) * 1000:>10.1f} ms")
+    print(f"{'流式解析 (逐块 feed)':<32}{best_of(args.repeat, streaming) * 1000:>10.1f} ms")
+    print(f"{'一次性解析 parse()':<32}{best_of(args.repeat, one_shot) * 1000:>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
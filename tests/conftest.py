@@ -0,0 +1,20 @@
+"""
+测试配置 - 把项目根目录加入导入路径，并让配置读写使用临时文件
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(tmp_path, monkeypatch):
+    """测试中的配置写入临时文件，不读取也不修改用户的 ~/.byteiq_config.json"""
+    from src.config import config_store
+    monkeypatch.setattr(config_store, 'path', str(tmp_path / 'byteiq_config.json'))
+    yield config_store
@@ -0,0 +1,80 @@
+"""
+模拟的 stdio MCP 服务器 - 供 MCP 传输层和客户端的测试使用
+
+用法: python tests/fake_mcp_server.py [启动延迟秒数]
+每个 tools/call 请求在单独的线程中处理，sleep 工具按参数延迟后再回复，
+因此响应可以与请求顺序不同。收到的 notifications/cancelled 记录在 stderr。
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+SERVER_VERSION = "1.0.0"
+
+TOOLS = [
+    {"name": "echo", "description": "原样返回 text", "inputSchema": {"type": "object"}},
+    {"name": "sleep", "description": "等待 seconds 秒后返回 text", "inputSchema": {"type": "object"}},
+    {"name": "exit", "description": "立即退出进程", "inputSchema": {"type": "object"}},
+]
+
+_write_lock = threading.Lock()
+
+
+def send(message):
+    with _write_lock:
+        sys.stdout.write(json.dumps(message, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+def reply(request_id, result):
+    send({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+
+def call_tool(request_id, params):
+    name = params.get("name")
+    arguments = params.get("arguments") or {}
+    if name == "sleep":
+        time.sleep(float(arguments.get("seconds", 0)))
+    elif name == "exit":
+        sys.stdout.flush()
+        os._exit(0)
+    elif name != "echo":
+        send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32602, "message": f"未知工具: {name}"}})
+        return
+    reply(request_id, {"content": [{"type": "text", "text": str(arguments.get("text", ""))}]})
+
+
+def main():
+    # 模拟启动缓慢的服务器：延迟后才开始处理请求
+    if len(sys.argv) > 1:
+        time.sleep(float(sys.argv[1]))
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        message = json.loads(line)
+        method = message.get("method")
+        request_id = message.get("id")
+        if method == "initialize":
+            reply(request_id, {"protocolVersion": "2024-11-05",
+                               "capabilities": {"tools": {}, "resources": {}},
+                               "serverInfo": {"name": "fake", "version": SERVER_VERSION}})
+        elif method == "tools/list":
+            reply(request_id, {"tools": TOOLS})
+        elif method == "resources/list":
+            reply(request_id, {"resources": []})
+        elif method == "tools/call":
+            threading.Thread(target=call_tool, args=(request_id, message.get("params") or {}),
+                             daemon=True).start()
+        elif method == "notifications/cancelled":
+            sys.stderr.write(f"cancelled {message['params']['requestId']}\n")
+            sys.stderr.flush()
+        elif request_id is not None:
+            send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": "Method not found"}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+本地模拟的 OpenAI 兼容服务器 - 供传输层和流式解码的测试、基准使用
+
+POST /v1/chat/completions 按请求中的 stream 字段返回 SSE 流或完整 JSON。
+每个新连接可以额外等待 connect_delay 秒，模拟 TCP+TLS 建连的往返开销；
+服务器记录建立过的连接数，用于验证连接复用。
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def sse_chunks(tokens, model="mock-model"):
+    """把 token 列表编码为 OpenAI 流式响应的 SSE 事件（bytes 列表，含结尾的 [DONE]）"""
+    events = []
+    for i, token in enumerate(tokens):
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": token},
+                         "finish_reason": "stop" if i == len(tokens) - 1 else None}],
+        }
+        events.append(b"data: " + json.dumps(payload, ensure_ascii=False).encode('utf-8') + b"\n\n")
+    events.append(b"data: [DONE]\n\n")
+    return events
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 每个 SSE 事件单独写出，关闭 Nagle 避免与客户端的延迟确认叠加出约 40ms 的停顿
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.connect_delay:
+            time.sleep(server.connect_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with server.lock:
+            server.requests += 1
+        if server.first_token_delay:
+            time.sleep(server.first_token_delay)
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for event in sse_chunks(server.tokens):
+                self.wfile.write(f"{len(event):X}\r\n".encode('ascii') + event + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            body = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(server.tokens)}}],
+            }, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """在后台线程运行的模拟服务器，可用作上下文管理器"""
+
+    daemon_threads = True
+
+    def __init__(self, tokens=("你好", "，", "world"), connect_delay=0.0, first_token_delay=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.tokens = list(tokens)
+        self.connect_delay = connect_delay
+        self.first_token_delay = first_token_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/chat/completions"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._thread.join(timeout=2)
@@ -0,0 +1,153 @@
+"""
+项目分析清单测试 - diff() 区分新增、修改、未变化和删除的文件，清单可以跨实例保存和加载
+"""
+
+import json
+import os
+
+import pytest
+
+import src.analysis_manifest as analysis_manifest
+from src.analysis_manifest import AnalysisManifest, analysis_artifact_names
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "proj"
+    files = [_write(root / "a.py", "a = 1\n"), _write(root / "pkg" / "b.py", "b = 2\n"),
+             _write(root / "c.py", "c = 3\n")]
+    return root, files
+
+
+def _record_all(manifest, section, changed):
+    for file_path, signature in changed.items():
+        manifest.record(section, file_path, signature, doc=os.path.basename(file_path) + ".md")
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+
+def test_first_diff_reports_every_file_as_changed(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    changed, unchanged, removed = manifest.diff("docs", files)
+    assert sorted(changed) == sorted(files)
+    assert unchanged == [] and removed == []
+    assert set(changed[files[0]]) == {'h', 's', 'm'}
+
+
+def test_recorded_files_are_unchanged_without_hashing(project, monkeypatch):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+
+    # 大小和 mtime 都没变时不读取文件内容
+    monkeypatch.setattr(analysis_manifest, 'file_digest', lambda path: pytest.fail(f"hashed {path}"))
+    changed, unchanged, removed = manifest.diff("docs", files)
+    assert changed == {} and unchanged == files and removed == []
+    assert manifest.get("docs", files[1])["doc"] == "b.py.md"
+
+
+def test_modified_added_and_removed_files(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+
+    _write(root / "pkg" / "b.py", "b = 22  # 修改\n")
+    new_file = _write(root / "d.py", "d = 4\n")
+    os.remove(files[2])
+    current = [files[0], files[1], new_file]
+    changed, unchanged, removed = manifest.diff("docs", current)
+    assert sorted(changed) == sorted([files[1], new_file])
+    assert unchanged == [files[0]]
+    assert removed == ["c.py"]
+
+    assert manifest.remove("docs", "c.py")["doc"] == "c.py.md"
+    assert manifest.remove("docs", "c.py") is None
+
+
+def test_touched_file_with_same_content_is_unchanged(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+
+    _bump_mtime(files[1])
+    changed, unchanged, removed = manifest.diff("docs", files)
+    assert changed == {}
+    # 保持传入顺序
+    assert unchanged == files
+    # 签名更新为新的 mtime，下次不再计算哈希
+    assert manifest.get("docs", files[1])["m"] == os.stat(files[1]).st_mtime_ns
+
+
+def test_same_size_edit_detected_by_hash(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+
+    _write(root / "a.py", "a = 9\n")
+    _bump_mtime(files[0])
+    changed, unchanged, _ = manifest.diff("docs", files)
+    assert list(changed) == [files[0]]
+    assert unchanged == files[1:]
+
+
+def test_sections_are_independent(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+    changed, unchanged, _ = manifest.diff("py_features", files)
+    assert sorted(changed) == sorted(files) and unchanged == []
+
+
+def test_save_and_reload(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    _record_all(manifest, "docs", manifest.diff("docs", files)[0])
+    manifest.set_value("byteiq_md", base="abc")
+    manifest.save()
+    assert not os.path.exists(manifest.path + '.tmp')
+
+    reloaded = AnalysisManifest(str(root))
+    changed, unchanged, removed = reloaded.diff("docs", files)
+    assert changed == {} and unchanged == files and removed == []
+    assert reloaded.section("byteiq_md") == {"base": "abc"}
+
+
+def test_corrupt_or_old_manifest_starts_empty(project):
+    root, files = project
+    manifest = AnalysisManifest(str(root))
+    with open(manifest.path, 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    assert sorted(AnalysisManifest(str(root)).diff("docs", files)[0]) == sorted(files)
+
+    with open(manifest.path, 'w', encoding='utf-8') as f:
+        json.dump({"version": 0, "sections": {"docs": {"a.py": {}}}}, f)
+    assert AnalysisManifest(str(root)).section("docs") == {}
+
+
+def test_obsolete_features_section_dropped_on_load(project):
+    root, _ = project
+    manifest = AnalysisManifest(str(root))
+    with open(manifest.path, 'w', encoding='utf-8') as f:
+        json.dump({"version": analysis_manifest.MANIFEST_VERSION,
+                   "sections": {"features": {"a.py": {}}, "docs": {}}}, f)
+    reloaded = AnalysisManifest(str(root))
+    reloaded.save()
+    with open(reloaded.path, encoding='utf-8') as f:
+        assert list(json.load(f)["sections"]) == ["docs"]
+
+
+def test_artifact_names_cover_manifest_and_docs(project):
+    root, _ = project
+    names = analysis_artifact_names(str(root))
+    assert {"proj_analysis_docs", "proj_analysis_manifest.json", "BYTEIQ.md"} <= names
+    assert os.path.basename(AnalysisManifest(str(root)).path) in names
@@ -0,0 +1,148 @@
+"""
+命令执行器测试 - OutputBuffer 的开头/结尾/日志溢写，以及超时、中断和后台子进程
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+import src.command_runner as command_runner
+from src.command_runner import CommandRunner, OutputBuffer
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="使用 POSIX shell 语法")
+
+
+def _python(code):
+    return f'"{sys.executable}" -c "{code}"'
+
+
+def _feed_lines(buffer, count, width=10):
+    for i in range(count):
+        buffer.feed(f"{i:0{width}d}\n")
+    buffer.finish()
+
+
+def test_small_output_kept_whole(tmp_path):
+    buffer = OutputBuffer(1024, str(tmp_path / "out.log"))
+    assert buffer.feed("a\nb") == ["a"]
+    assert buffer.finish() == ["b"]
+    buffer.close()
+    assert buffer.text() == "a\nb"
+    assert not buffer.spilled and not os.path.exists(buffer.log_path)
+
+
+def test_head_and_tail_kept_and_full_output_spilled(tmp_path):
+    log_path = str(tmp_path / "logs" / "out.log")
+    buffer = OutputBuffer(400, log_path, header="$ cmd\n")
+    _feed_lines(buffer, 200)
+    buffer.close()
+
+    # 每行 11 字节：开头 100 字节放 9 行，结尾 300 字节放 27 行
+    assert buffer.head == [f"{i:010d}" for i in range(9)]
+    assert list(buffer.tail) == [f"{i:010d}" for i in range(173, 200)]
+    assert buffer.dropped_lines == 200 - 9 - 27
+    assert buffer.total_lines == 200 and buffer.total_bytes == 2200
+
+    text = buffer.text()
+    assert "... (省略中间 164 行，共 200 行) ..." in text
+    assert text.endswith(f"[完整输出 (200 行) 已保存到 {log_path}，可用 read_file 分页查看]")
+    with open(log_path, encoding='utf-8') as f:
+        assert f.read() == "$ cmd\n" + "".join(f"{i:010d}\n" for i in range(200))
+
+
+def test_long_line_truncated_in_memory_but_logged(tmp_path):
+    log_path = str(tmp_path / "out.log")
+    buffer = OutputBuffer(400, log_path)
+    long_line = "x" * 1000
+    buffer.feed("first\n" + long_line + "\nlast\n")
+    buffer.close()
+    assert buffer.truncated_lines == 1 and buffer.dropped_lines == 0
+    assert "该行共 1000 字符，已截断" in buffer.text()
+    with open(log_path, encoding='utf-8') as f:
+        assert f.read() == f"first\n{long_line}\nlast\n"
+
+
+def test_line_endings_split_across_chunks():
+    buffer = OutputBuffer(1024)
+    lines = []
+    for chunk in ["a\r", "\nb\r", "c", "\r\n", "d"]:
+        lines.extend(buffer.feed(chunk))
+    lines.extend(buffer.finish())
+    # \r\n 是一个换行，单独的 \r（进度条）也分行
+    assert lines == ["a", "b", "c", "d"]
+
+
+def test_without_log_path_nothing_spilled():
+    buffer = OutputBuffer(400)
+    _feed_lines(buffer, 100)
+    assert not buffer.spilled and buffer.dropped_lines > 0
+    assert "完整输出" not in buffer.text()
+
+
+def test_run_large_output_keeps_head_and_tail(tmp_path, isolated_config):
+    isolated_config.update(command_output_kb=4)
+    lines = []
+    result = CommandRunner().run(_python("for i in range(5000): print(i)"), on_output=lines.extend,
+                                 cwd=str(tmp_path))
+    assert result['return_code'] == 0
+    assert lines == [str(i) for i in range(5000)]
+    assert result['total_lines'] == 5000 and result['omitted_lines'] > 0
+    output = result['output'].split("\n")
+    assert output[0] == "0" and output[-2] == "4999"
+    assert result['log_path'].startswith(str(tmp_path / ".byteiq_memory" / "command_logs"))
+    with open(result['log_path'], encoding='utf-8') as f:
+        assert f.read().splitlines()[1:] == [str(i) for i in range(5000)]
+
+
+@posix_only
+def test_background_child_does_not_block_exit(tmp_path):
+    # 后台子进程继承了输出管道，shell 退出后即结束读取
+    started = time.monotonic()
+    result = CommandRunner().run("sleep 5 & echo started", cwd=str(tmp_path), timeout=30)
+    assert time.monotonic() - started < 3
+    assert result['return_code'] == 0
+    assert result['output'] == "started"
+    assert not result['timed_out'] and not result['interrupted']
+
+
+@posix_only
+def test_idle_timeout_kills_process_group(tmp_path):
+    marker = tmp_path / "survived"
+    started = time.monotonic()
+    result = CommandRunner().run(f"echo begin; (sleep 2; touch {marker}) & sleep 30", cwd=str(tmp_path),
+                                 timeout=0, idle_timeout=0.5)
+    assert time.monotonic() - started < 10
+    assert result['timed_out'] == 'idle' and result['timeout'] == 0.5
+    assert result['output'] == "begin"
+    # 整个进程组都被终止，后台子进程没有继续运行
+    time.sleep(2.5)
+    assert not marker.exists()
+
+
+def test_should_stop_interrupts(tmp_path):
+    started = time.monotonic()
+    deadline = started + 0.3
+    result = CommandRunner().run(_python("import time; time.sleep(30)"), cwd=str(tmp_path),
+                                 should_stop=lambda: time.monotonic() > deadline)
+    assert result['interrupted']
+    assert result['return_code'] != 0
+    assert time.monotonic() - started < 10
+
+
+def test_total_timeout(tmp_path):
+    result = CommandRunner().run(_python("import time; time.sleep(30)"), cwd=str(tmp_path), timeout=0.5)
+    assert result['timed_out'] == 'total' and result['timeout'] == 0.5
+
+
+def test_old_logs_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(command_runner, 'MAX_LOG_FILES', 3)
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    for i in range(5):
+        path = log_dir / f"{i}.log"
+        path.write_text("x")
+        os.utime(path, (1000 + i, 1000 + i))
+    CommandRunner._prune_logs(str(log_dir))
+    assert sorted(os.listdir(log_dir)) == ["3.log", "4.log"]
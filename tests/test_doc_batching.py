@@ -0,0 +1,108 @@
+"""
+文档分析装箱测试 - BatchPacker 的 first-fit 装箱和 split_content 的按定义边界切分
+"""
+
+from src.doc_pipeline import BATCH_FULL_RATIO, BatchPacker, FileChunk, split_content
+from src.token_counter import token_counter
+
+
+def _chunk(name, tokens):
+    return FileChunk(name, "", tokens)
+
+
+def _pack(capacity, sizes, max_open=4):
+    packer = BatchPacker(capacity, max_open=max_open)
+    emitted = []
+    for i, size in enumerate(sizes):
+        emitted.extend(packer.add(_chunk(f"f{i}", size)))
+    emitted.extend(packer.flush())
+    return emitted
+
+
+def test_every_chunk_packed_once_within_capacity():
+    sizes = [37, 80, 12, 55, 3, 99, 41, 60, 8, 23, 70, 15, 44, 5, 90]
+    batches = _pack(100, sizes)
+    names = [chunk.path for batch in batches for chunk in batch.files]
+    assert sorted(names) == sorted(f"f{i}" for i in range(len(sizes)))
+    assert all(batch.tokens <= 100 for batch in batches)
+    assert all(batch.tokens == sum(chunk.tokens for chunk in batch.files) for batch in batches)
+    # first-fit 的请求数接近下界
+    assert len(batches) <= -(-sum(sizes) // 100) + 2
+
+
+def test_small_files_fill_earlier_batches():
+    packer = BatchPacker(100)
+    assert packer.add(_chunk("big", 70)) == []
+    assert packer.add(_chunk("medium", 50)) == []
+    # 放进第一个装得下的批次
+    assert packer.add(_chunk("small", 20)) == []
+    batches = packer.flush()
+    assert [batch.paths for batch in batches] == [["big", "small"], ["medium"]]
+
+
+def test_full_batch_is_emitted_immediately():
+    packer = BatchPacker(100)
+    assert packer.add(_chunk("a", 60)) == []
+    ready = packer.add(_chunk("b", int(100 * BATCH_FULL_RATIO) - 60))
+    assert [batch.paths for batch in ready] == [["a", "b"]]
+    assert packer.flush() == []
+    # 单个就接近容量的文件直接成批
+    assert [batch.paths for batch in packer.add(_chunk("c", 99))] == [["c"]]
+
+
+def test_fullest_batch_emitted_when_too_many_open():
+    packer = BatchPacker(100, max_open=2)
+    assert packer.add(_chunk("a", 60)) == []
+    assert packer.add(_chunk("b", 70)) == []
+    ready = packer.add(_chunk("c", 50))
+    assert [batch.paths for batch in ready] == [["b"]]
+    assert [batch.paths for batch in packer.flush()] == [["a"], ["c"]]
+
+
+def _module(functions, body_lines=6):
+    parts = ["import os\n", "\n"]
+    for i in range(functions):
+        parts.append(f"def function_{i}(value):\n")
+        parts.extend(f"    value = value + {j}  # step {j}\n" for j in range(body_lines))
+        parts.append("    return value\n\n")
+    return "".join(parts)
+
+
+def test_split_respects_budget_and_reassembles():
+    content = _module(30)
+    budget = token_counter.count(content) // 5
+    chunks = split_content(content, budget)
+    assert len(chunks) >= 5
+    assert "".join(text for _, _, text, _ in chunks) == content
+    for start_line, end_line, text, tokens in chunks:
+        assert tokens == token_counter.count(text) <= budget
+        assert end_line - start_line + 1 == len(text.splitlines())
+    # 行号连续覆盖整个文件
+    assert chunks[0][0] == 1
+    assert chunks[-1][1] == len(content.splitlines())
+    assert all(a[1] + 1 == b[0] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_split_prefers_definition_boundaries():
+    content = _module(20)
+    chunks = split_content(content, token_counter.count(content) // 4)
+    for _, _, text, _ in chunks[1:]:
+        assert text.startswith("def function_")
+
+
+def test_split_keeps_decorator_with_definition():
+    content = "".join(f"@decorator_{i}\ndef handler_{i}():\n" + "    x = 1\n" * 8 + "\n" for i in range(12))
+    chunks = split_content(content, token_counter.count(content) // 3)
+    assert len(chunks) > 1
+    for _, _, text, _ in chunks[1:]:
+        assert text.startswith("@decorator_")
+
+
+def test_single_long_line_is_cut_by_characters():
+    content = "var a=" + ",".join(str(i) for i in range(3000)) + ";"
+    budget = token_counter.count(content) // 4
+    chunks = split_content(content, budget)
+    assert len(chunks) >= 4
+    assert "".join(text for _, _, text, _ in chunks) == content
+    assert all(tokens <= budget for _, _, _, tokens in chunks)
+    assert all((start, end) == (1, 1) for start, end, _, _ in chunks)
@@ -0,0 +1,166 @@
+"""
+文档分析流水线测试 - 有界并发、重试分类、补发和失败统计
+"""
+
+import threading
+import time
+
+import pytest
+
+import src.doc_pipeline as doc_pipeline
+from src.doc_pipeline import CHUNK_OVERHEAD_TOKENS, DocAnalysisPipeline
+from src.token_counter import token_counter
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # 退避时间上限设为0，重试立即进行
+    monkeypatch.setattr(doc_pipeline, 'MAX_BACKOFF_SECONDS', 0)
+
+
+def _files(count):
+    return {f"src/m{i}.py": f"def f{i}():\n    return {i}\n" for i in range(count)}
+
+
+def _one_file_per_batch(files):
+    """每个批次只装得下一个文件的预算"""
+    largest = max(token_counter.count(path) + token_counter.count(content) for path, content in files.items())
+    return int((largest + CHUNK_OVERHEAD_TOKENS) * 1.5)
+
+
+def _run(files, request_fn, on_result=None, **kwargs):
+    failures = []
+    saved = []
+
+    def default_result(batch, content):
+        saved.extend(chunk.path for chunk in batch.files)
+        return []
+
+    pipeline = DocAnalysisPipeline(request_fn, on_result or default_result,
+                                   on_failure=lambda batch, error: failures.append((batch.paths, error)),
+                                   **kwargs)
+    pipeline.run(list(files), files.get)
+    return pipeline, saved, failures
+
+
+def test_all_files_analyzed_with_bounded_concurrency():
+    files = _files(40)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def request_fn(batch):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return {"content": "ok"}
+
+    # 每批只装得下一个文件，共40个请求
+    pipeline, saved, failures = _run(files, request_fn, concurrency=3, batch_tokens=_one_file_per_batch(files))
+    assert sorted(saved) == sorted(files)
+    assert failures == []
+    assert 1 < peak[0] <= 3
+    progress = pipeline.get_progress()
+    assert progress["done_files"] == 40 and progress["failed_files"] == 0
+    assert progress["batches_done"] == progress["batches_planned"] == 40
+    assert progress["in_flight"] == 0
+
+
+def test_non_retryable_error_fails_without_retry():
+    calls = []
+
+    def request_fn(batch):
+        calls.append(batch.index)
+        return {"error": "请先设置API密钥", "status_code": None, "retryable": False}
+
+    pipeline, saved, failures = _run(_files(1), request_fn, max_retries=5)
+    assert calls == [0]
+    assert failures == [(["src/m0.py"], "请先设置API密钥")]
+    assert pipeline.retries == 0
+    assert pipeline.failed_files == 1 and pipeline.done_files == 0
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(status):
+    calls = []
+    pipeline, _, failures = _run(_files(1), lambda batch: calls.append(1) or {"error": "bad", "status_code": status})
+    assert len(calls) == 1
+    assert pipeline.failed_files == 1
+
+
+def test_network_errors_are_retried_until_limit():
+    calls = []
+
+    def request_fn(batch):
+        calls.append(1)
+        return {"error": "Connection refused"}
+
+    pipeline, _, failures = _run(_files(1), request_fn, max_retries=3)
+    assert len(calls) == 4
+    assert pipeline.retries == 3
+    assert failures == [(["src/m0.py"], "Connection refused")]
+
+
+def test_server_error_then_success():
+    responses = [{"error": "busy", "status_code": 503}, {"error": "busy", "status_code": 502}, {"content": "ok"}]
+    pipeline, saved, failures = _run(_files(1), lambda batch: responses.pop(0))
+    assert saved == ["src/m0.py"]
+    assert failures == []
+    assert pipeline.retries == 2 and pipeline.done_files == 1
+
+
+def test_rate_limit_pauses_all_workers():
+    first = threading.Event()
+    starts = []
+
+    def request_fn(batch):
+        starts.append(time.time())
+        if not first.is_set():
+            first.set()
+            return {"error": "rate limited", "status_code": 429, "retry_after": 0.3}
+        return {"content": "ok"}
+
+    files = _files(2)
+    started = time.time()
+    pipeline, saved, failures = _run(files, request_fn, concurrency=1, batch_tokens=_one_file_per_batch(files))
+    assert sorted(saved) == ["src/m0.py", "src/m1.py"]
+    # 限流后的请求都在冷却时间之后发出
+    assert all(start - started >= 0.3 for start in starts[1:])
+    assert pipeline.retries == 1
+
+
+def test_invalid_chunks_are_resent_alone_until_repair_limit():
+    files = _files(3)
+    batches = []
+
+    def on_result(batch, content):
+        batches.append(batch.paths)
+        # m1 的结果总是不合格
+        return [chunk for chunk in batch.files if chunk.path == "src/m1.py"]
+
+    pipeline, _, failures = _run(files, lambda batch: {"content": "ok"}, on_result=on_result,
+                                 batch_tokens=1000, max_repairs=2)
+    assert batches == [list(files), ["src/m1.py"], ["src/m1.py"]]
+    assert pipeline.repairs == 2
+    assert [paths for paths, _ in failures] == [["src/m1.py"]]
+    assert pipeline.done_files == 2 and pipeline.failed_files == 1
+
+
+def test_save_error_marks_batch_failed():
+    def on_result(batch, content):
+        raise OSError("disk full")
+
+    pipeline, _, failures = _run(_files(2), lambda batch: {"content": "ok"}, on_result=on_result,
+                                 batch_tokens=1000)
+    assert failures == [(["src/m0.py", "src/m1.py"], "保存结果失败: disk full")]
+    assert pipeline.failed_files == 2
+
+
+def test_unreadable_file_counts_as_failed():
+    files = _files(2)
+    pipeline = DocAnalysisPipeline(lambda batch: {"content": "ok"}, lambda batch, content: [])
+    pipeline.run(list(files) + ["missing.py"], files.get)
+    assert pipeline.done_files == 2 and pipeline.failed_files == 1
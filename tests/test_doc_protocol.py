@@ -0,0 +1,101 @@
+"""
+文档分析响应协议测试 - 按文件标记拆分批量响应并校验各段结果
+"""
+
+from src.doc_protocol import REQUIRED_HEADING, format_instructions, parse_response
+
+
+def _section(index, body="内容", heading=REQUIRED_HEADING):
+    return f"<<<FILE {index}>>>\n{heading}: file{index}.py\n{body}\n<<<END FILE {index}>>>\n"
+
+
+def test_sections_mapped_back_by_index():
+    response = "前言会被忽略\n" + _section(2, "第二个") + _section(1, "第一个") + _section(3)
+    sections, problems = parse_response(response, 3)
+    assert problems == {}
+    assert sections == {
+        1: f"{REQUIRED_HEADING}: file1.py\n第一个",
+        2: f"{REQUIRED_HEADING}: file2.py\n第二个",
+        3: f"{REQUIRED_HEADING}: file3.py\n内容",
+    }
+
+
+def test_missing_truncated_and_invalid_sections():
+    response = _section(1) + _section(2, heading="## 概要") + "<<<FILE 3>>>\n# 文件分析: file3.py\n被截断"
+    sections, problems = parse_response(response, 4)
+    assert list(sections) == [1]
+    assert problems == {
+        2: f"缺少“{REQUIRED_HEADING}”标题",
+        3: "缺少结束标记",
+        4: "缺少分析结果",
+    }
+
+
+def test_empty_section_is_invalid():
+    sections, problems = parse_response("<<<FILE 1>>>\n\n<<<END FILE 1>>>", 1)
+    assert sections == {} and problems == {1: "分析结果为空"}
+
+
+def test_two_valid_results_for_one_index_are_duplicates():
+    sections, problems = parse_response(_section(1, "甲") + _section(1, "乙") + _section(2), 2)
+    assert list(sections) == [2]
+    assert problems == {1: "结果重复"}
+    # 第三次出现仍然是重复
+    sections, problems = parse_response(_section(1) + _section(1) + _section(1), 1)
+    assert sections == {} and problems == {1: "结果重复"}
+
+
+def test_valid_result_replaces_earlier_unclosed_one():
+    # 模型重新开始输出同一个文件：前一段未闭合，后一段完整
+    response = "<<<FILE 1>>>\n# 文件分析: file1.py\n写到一半\n" + _section(1, "完整") + _section(2)
+    sections, problems = parse_response(response, 2)
+    assert problems == {}
+    assert sections[1].endswith("完整")
+
+
+def test_valid_result_replaces_earlier_invalid_one():
+    response = _section(1, heading="没有标题") + _section(1, "修正后")
+    sections, problems = parse_response(response, 1)
+    assert problems == {}
+    assert sections[1].endswith("修正后")
+
+
+def test_unclosed_repeat_after_valid_result_is_ignored():
+    sections, problems = parse_response(_section(1) + "<<<FILE 1>>>\n# 文件分析: 又开始", 1)
+    assert list(sections) == [1] and problems == {}
+
+
+def test_mismatched_end_marker_leaves_section_open():
+    response = "<<<FILE 1>>>\n# 文件分析: a\n<<<END FILE 2>>>\n" + _section(2)
+    sections, problems = parse_response(response, 2)
+    assert list(sections) == [2]
+    assert problems == {1: "缺少结束标记"}
+
+
+def test_out_of_range_indices_are_dropped():
+    sections, problems = parse_response(_section(1) + _section(5) + "<<<FILE 0>>>\n", 1)
+    assert list(sections) == [1] and problems == {}
+
+
+def test_single_file_without_markers():
+    sections, problems = parse_response(f"```markdown\n{REQUIRED_HEADING}: a.py\n正文\n```", 1)
+    assert sections == {1: f"{REQUIRED_HEADING}: a.py\n正文"} and problems == {}
+    sections, problems = parse_response("没有标题的回复", 1)
+    assert sections == {} and problems == {1: f"缺少“{REQUIRED_HEADING}”标题"}
+    # 多个文件时没有标记的响应无法对应
+    sections, problems = parse_response(f"{REQUIRED_HEADING}: a.py", 2)
+    assert sections == {} and set(problems) == {1, 2}
+
+
+def test_fenced_sections_and_indented_markers():
+    response = "  <<<FILE 1>>>  \n```md\n# 文件分析: a.py\n正文\n```\n\t<<<END FILE 1>>>\n"
+    sections, problems = parse_response(response, 1)
+    assert sections == {1: "# 文件分析: a.py\n正文"} and problems == {}
+
+
+def test_format_instructions_example_parses():
+    instructions = format_instructions(3)
+    assert "全部 3 个文件" in instructions
+    example = instructions.split("例如：\n\n", 1)[1].replace("[文件名]", "a.py")
+    sections, problems = parse_response(example, 1)
+    assert list(sections) == [1] and problems == {}
@@ -0,0 +1,121 @@
+"""
+文件内容缓存测试 - 按 mtime/大小判断是否过期，invalidate() 和 LRU 淘汰
+"""
+
+import os
+
+import pytest
+
+from src.file_cache import FileContentCache, split_lines
+
+
+def _write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def _write_bytes(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def _set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_file_served_from_cache(tmp_path):
+    path = _write(tmp_path / "a.py", "a = 1\n")
+    cache = FileContentCache(max_bytes=1024)
+    assert cache.peek(path) is None
+    assert cache.read_text(path) == "a = 1\n"
+    assert cache.read_text(path) == "a = 1\n"
+    assert cache.peek(path) == "a = 1\n"
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["bytes"] == stats["bytes_saved"] // 2 == 6
+
+
+def test_changed_mtime_or_size_rereads(tmp_path):
+    path = _write(tmp_path / "a.py", "a = 1\n")
+    cache = FileContentCache(max_bytes=1024)
+    cache.read_text(path)
+    mtime = os.stat(path).st_mtime_ns
+
+    # 大小变化
+    _write(tmp_path / "a.py", "a = 100\n")
+    _set_mtime(path, mtime)
+    assert cache.peek(path) is None
+    assert cache.read_text(path) == "a = 100\n"
+
+    # 大小不变，mtime 变化
+    _write(tmp_path / "a.py", "a = 200\n")
+    _set_mtime(path, mtime + 1_000_000_000)
+    assert cache.read_text(path) == "a = 200\n"
+    assert cache.get_stats()["misses"] == 3
+
+
+def test_same_mtime_rewrite_needs_invalidate(tmp_path):
+    path = _write(tmp_path / "a.py", "a = 1\n")
+    cache = FileContentCache(max_bytes=1024)
+    cache.read_text(path)
+    mtime = os.stat(path).st_mtime_ns
+
+    # mtime 粒度内的同大小改写无法通过 stat 发现，写入类工具需要调用 invalidate()
+    _write(tmp_path / "a.py", "a = 2\n")
+    _set_mtime(path, mtime)
+    assert cache.read_text(path) == "a = 1\n"
+    cache.invalidate(os.path.join(str(tmp_path), ".", "a.py"))
+    assert cache.read_text(path) == "a = 2\n"
+
+
+def test_deleted_file_raises_and_is_not_peeked(tmp_path):
+    path = _write(tmp_path / "a.py", "a = 1\n")
+    cache = FileContentCache(max_bytes=1024)
+    cache.read_text(path)
+    os.remove(path)
+    assert cache.peek(path) is None
+    with pytest.raises(FileNotFoundError):
+        cache.read_text(path)
+
+
+def test_newlines_normalized_and_invalid_utf8_raises(tmp_path):
+    cache = FileContentCache(max_bytes=1024)
+    path = _write_bytes(tmp_path / "crlf.txt", b"a\r\nb\rc\n")
+    assert cache.read_text(path) == "a\nb\nc\n"
+    with open(path, encoding='utf-8') as f:
+        assert split_lines(cache.read_text(path)) == f.readlines()
+
+    bad = _write_bytes(tmp_path / "bad.bin", b"\xff\xfe\x00")
+    with pytest.raises(UnicodeDecodeError):
+        cache.read_text(bad)
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_lru_eviction_and_large_files(tmp_path):
+    cache = FileContentCache(max_bytes=100)
+    paths = [_write(tmp_path / f"f{i}.txt", str(i) * 20) for i in range(6)]
+    for path in paths[:5]:
+        cache.read_text(path)
+    # 最近使用过的 f0 保留，最久未使用的 f1 被淘汰
+    cache.read_text(paths[0])
+    cache.read_text(paths[5])
+    assert cache.peek(paths[0]) is not None
+    assert cache.peek(paths[1]) is None
+    assert cache.get_stats()["bytes"] <= 100
+
+    # 超过预算四分之一的文件不缓存
+    big = _write(tmp_path / "big.txt", "x" * 26)
+    assert cache.read_text(big) == "x" * 26
+    assert cache.peek(big) is None
+
+
+def test_clear(tmp_path):
+    cache = FileContentCache(max_bytes=1024)
+    cache.read_text(_write(tmp_path / "a.py", "a"))
+    cache.clear()
+    assert cache.get_stats()["entries"] == 0 and cache.get_stats()["bytes"] == 0
+
+
+def test_split_lines_matches_readlines():
+    for text in ["", "a", "a\n", "a\nb", "a\n\nb\n\n"]:
+        assert split_lines(text) == text.splitlines(keepends=True)
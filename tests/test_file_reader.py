@@ -0,0 +1,118 @@
+"""
+按大小读取文件测试 - 分页游标往返拼回原文、大纲和按扩展名配置的限制
+"""
+
+import pytest
+
+from src.file_cache import split_lines
+from src.file_reader import SizeAwareReader
+
+
+@pytest.fixture
+def small_limits(isolated_config):
+    isolated_config.update(read_file_limits={'*': {'max_tokens': 50, 'page_tokens': 40}})
+    return SizeAwareReader()
+
+
+def _write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def _read_all_pages(reader, path, cursor='1'):
+    pages = []
+    while cursor is not None:
+        result = reader.read(path, cursor)
+        assert isinstance(result, dict), result
+        assert result['mode'] == 'page'
+        pages.append(result)
+        cursor = result['next_cursor']
+    return pages
+
+
+def _page_all(lines, budget):
+    parts = []
+    cursor = (1, 0)
+    while True:
+        content, end_line, next_cursor = SizeAwareReader.page(lines, cursor[0], cursor[1], budget)
+        assert 0 < len(content) <= budget
+        parts.append(content)
+        if next_cursor is None:
+            return parts
+        line, _, column = next_cursor.partition(':')
+        cursor = (int(line), int(column or 0))
+
+
+@pytest.mark.parametrize("budget", [1, 7, 20, 64, 1000])
+def test_page_cursor_round_trip(budget):
+    text = "".join(f"line {i} " + "x" * (i * 3) + "\n" for i in range(30)) + "no trailing newline"
+    parts = _page_all(split_lines(text), budget)
+    assert "".join(parts) == text
+
+
+def test_page_keeps_whole_lines_when_possible():
+    lines = ["aaaa\n", "bbbb\n", "cccc\n"]
+    assert SizeAwareReader.page(lines, 1, 0, 12) == ("aaaa\nbbbb\n", 2, "3")
+    # 单独一行超出预算时在行内切开
+    assert SizeAwareReader.page(lines, 1, 0, 3) == ("aaa", 1, "1:3")
+    assert SizeAwareReader.page(lines, 1, 3, 3) == ("a\n", 1, "2")
+    assert SizeAwareReader.page(lines, 3, 0, 100) == ("cccc\n", 3, None)
+
+
+def test_read_pages_reassemble_file(small_limits, tmp_path):
+    text = "".join(f"value_{i} = {i}\n" for i in range(200))
+    path = _write(tmp_path / "data.txt", text)
+    pages = _read_all_pages(small_limits, path)
+    assert len(pages) > 1
+    assert "".join(page['content'] for page in pages) == text
+    assert pages[0]['start_line'] == 1 and pages[-1]['end_line'] == 200
+    assert all(a['end_line'] + 1 == b['start_line'] for a, b in zip(pages, pages[1:]))
+    assert "已读到文件末尾" in pages[-1]['message']
+
+
+def test_minified_single_line_paged_by_column(small_limits, tmp_path):
+    text = "var a=[" + ",".join(str(i) for i in range(2000)) + "];"
+    path = _write(tmp_path / "app.min.js", text)
+    pages = _read_all_pages(small_limits, path)
+    assert len(pages) > 1
+    assert "".join(page['content'] for page in pages) == text
+    assert all(':' in page['next_cursor'] for page in pages[:-1])
+
+
+def test_small_file_returned_in_full(small_limits, tmp_path):
+    path = _write(tmp_path / "a.py", "a = 1\n")
+    result = small_limits.read(path)
+    assert result['mode'] == 'full' and result['content'] == "a = 1\n"
+
+
+def test_large_python_file_returns_outline(small_limits, tmp_path):
+    text = "".join(f"class C{i}:\n    def run(self):\n        return {i}\n\n" for i in range(20))
+    path = _write(tmp_path / "big.py", text)
+    result = small_limits.read(path)
+    assert result['mode'] == 'outline' and result['next_cursor'] == '1'
+    assert "class C0  [行 1-3]" in result['content']
+    assert "  def run()  [行 2-3]" in result['content']
+
+
+def test_outline_disabled_returns_first_page(isolated_config, tmp_path):
+    # .log 自带的限制优先于 '*'，关闭大纲
+    isolated_config.update(read_file_limits={'.log': {'max_tokens': 50, 'page_tokens': 40}})
+    path = _write(tmp_path / "server.log", "".join(f"request {i} ok\n" for i in range(200)))
+    result = SizeAwareReader().read(path)
+    assert result['mode'] == 'page' and result['start_line'] == 1 and result['next_cursor']
+
+
+@pytest.mark.parametrize("cursor", ["abc", "0", "999", "1:500"])
+def test_invalid_cursor_returns_error(small_limits, tmp_path, cursor):
+    path = _write(tmp_path / "a.txt", "short\nfile\n")
+    result = small_limits.read(path, cursor)
+    assert isinstance(result, str) and result.startswith("错误")
+
+
+def test_limits_merge_longest_suffix_and_config(isolated_config):
+    reader = SizeAwareReader()
+    assert reader.limits("x.min.js")['outline'] is False
+    assert reader.limits("x.js")['max_tokens'] == 8000
+    isolated_config.update(read_file_limits={'.min.js': {'max_tokens': 10}, '.tsx': {'page_tokens': 99}})
+    assert reader.limits("X.MIN.JS") == {'max_tokens': 10, 'page_tokens': 2000, 'outline': False}
+    assert reader.limits("a.tsx")['page_tokens'] == 99
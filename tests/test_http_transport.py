@@ -0,0 +1,104 @@
+"""
+共享HTTP传输层测试 - 使用本地模拟的 OpenAI 兼容服务器
+"""
+
+import requests
+
+from mock_openai_server import MockOpenAIServer
+from src.http_transport import HTTPTransport
+from src.sse_decoder import SSEDecoder, event_content
+
+
+def _stream_text(transport, response):
+    decoder = SSEDecoder()
+    parts = []
+    chunks = response.iter_content(chunk_size=None)
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            parts.append(event_content(event))
+        if decoder.done:
+            break
+    transport.release(response, chunks)
+    return "".join(parts)
+
+
+def test_streaming_requests_reuse_one_connection():
+    # 收到 [DONE] 后提前结束读取，release() 读完结尾数据后连接仍可复用
+    transport = HTTPTransport()
+    with MockOpenAIServer(tokens=["你", "好", "!"]) as server:
+        try:
+            for _ in range(5):
+                response = transport.post(server.url, json={"stream": True, "messages": []},
+                                          timeout=10, stream=True)
+                assert response.status_code == 200
+                assert _stream_text(transport, response) == "你好!"
+        finally:
+            transport.close()
+        assert server.requests == 5
+        assert server.connections == 1
+
+
+def test_closing_a_stream_early_discards_the_connection():
+    # 对照：不读完结尾数据直接关闭，每次请求都要重新建连
+    transport = HTTPTransport()
+    with MockOpenAIServer() as server:
+        try:
+            for _ in range(3):
+                response = transport.post(server.url, json={"stream": True}, timeout=10, stream=True)
+                decoder = SSEDecoder()
+                for chunk in response.iter_content(chunk_size=None):
+                    decoder.feed(chunk)
+                    if decoder.done:
+                        break
+                response.close()
+        finally:
+            transport.close()
+        assert server.connections == 3
+
+
+def test_bare_requests_open_a_connection_per_call():
+    with MockOpenAIServer() as server:
+        for _ in range(3):
+            response = requests.post(server.url, json={"messages": []}, timeout=10)
+            assert response.json()["choices"][0]["message"]["content"] == "你好，world"
+        assert server.connections == 3
+
+
+def test_non_streaming_post_and_pool_rebuild_on_config_change(isolated_config):
+    transport = HTTPTransport()
+    with MockOpenAIServer() as server:
+        try:
+            assert transport.post(server.url, json={}, timeout=10).json()["choices"]
+            assert transport.post(server.url, json={}, timeout=10).json()["choices"]
+            assert server.connections == 1
+
+            # 连接池配置变化时重建会话，之后的请求重新建连并继续复用
+            isolated_config.update(http_pool_maxsize=4)
+            transport.post(server.url, json={}, timeout=10).close()
+            transport.post(server.url, json={}, timeout=10).close()
+            assert server.connections == 2
+        finally:
+            transport.close()
+
+
+def test_config_change_waits_for_in_flight_streams(isolated_config):
+    # 配置变化后旧连接池继续服务未读完的流式响应，响应关闭后才关闭旧连接池
+    transport = HTTPTransport()
+    with MockOpenAIServer(tokens=["旧", "连接"]) as server:
+        try:
+            response = transport.post(server.url, json={"stream": True}, timeout=10, stream=True)
+            old_clients = transport._clients
+            closed = []
+            old_close = old_clients.session.close
+            old_clients.session.close = lambda: (closed.append(True), old_close())
+
+            isolated_config.update(http_pool_maxsize=4)
+            assert transport.post(server.url, json={}, timeout=10).json()["choices"]
+            assert transport._clients is not old_clients
+            assert closed == []
+
+            assert _stream_text(transport, response) == "旧连接"
+            assert closed == [True]
+            assert transport._retired == []
+        finally:
+            transport.close()
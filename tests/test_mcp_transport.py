@@ -0,0 +1,115 @@
+"""
+MCP stdio 传输层测试 - 使用本地模拟的 MCP 服务器进程
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import pytest
+
+from src.mcp_transport import JsonRpcError, StdioTransport
+
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_mcp_server.py")
+
+
+def _run(coro_fn, *args):
+    """启动模拟服务器，执行测试协程后关闭连接"""
+    async def main():
+        transport = StdioTransport("fake")
+        await transport.start([sys.executable, FAKE_SERVER, *args])
+        try:
+            return await coro_fn(transport)
+        finally:
+            await transport.close(timeout=2)
+    return asyncio.run(main())
+
+
+def _call(transport, name, timeout=None, **arguments):
+    return transport.request("tools/call", {"name": name, "arguments": arguments}, timeout=timeout)
+
+
+def _text(response):
+    return response["result"]["content"][0]["text"]
+
+
+def test_request_and_response():
+    async def scenario(transport):
+        init = await transport.request("initialize", {}, timeout=10)
+        assert init["result"]["serverInfo"]["name"] == "fake"
+        tools = await transport.request("tools/list", timeout=10)
+        assert [tool["name"] for tool in tools["result"]["tools"]] == ["echo", "sleep", "exit"]
+        unknown = await transport.request("no/such/method", timeout=10)
+        assert unknown["error"]["code"] == -32601
+        assert transport.in_flight == 0
+    _run(scenario)
+
+
+def test_concurrent_requests_matched_out_of_order():
+    async def scenario(transport):
+        await transport.request("initialize", {}, timeout=10)
+        order = []
+
+        async def call(name, **arguments):
+            response = await _call(transport, name, timeout=10, **arguments)
+            order.append(_text(response))
+            return _text(response)
+
+        started = time.monotonic()
+        results = await asyncio.gather(call("sleep", seconds=0.5, text="slow"),
+                                       call("sleep", seconds=0.2, text="medium"),
+                                       call("echo", text="fast"))
+        # 每个请求拿到自己的响应，而不是按到达顺序分配
+        assert results == ["slow", "medium", "fast"]
+        assert order == ["fast", "medium", "slow"]
+        # 请求同时在途，总耗时接近最慢的一个
+        assert time.monotonic() - started < 1.0
+    _run(scenario)
+
+
+def test_timeout_sends_cancel_and_drops_late_response(caplog):
+    caplog.set_level(logging.DEBUG, logger="src.mcp_transport")
+
+    async def scenario(transport):
+        await transport.request("initialize", {}, timeout=10)
+        with pytest.raises(asyncio.TimeoutError):
+            await _call(transport, "sleep", timeout=0.1, seconds=0.3, text="late")
+        assert transport.in_flight == 0
+        # 迟到的响应被丢弃，不影响后续请求
+        await asyncio.sleep(0.4)
+        assert _text(await _call(transport, "echo", timeout=10, text="next")) == "next"
+        assert transport.is_running
+    _run(scenario)
+    # 服务器在 stderr 记录收到的取消通知
+    assert "[fake] cancelled 2" in caplog.text
+
+
+def test_server_exit_fails_pending_requests():
+    async def scenario(transport):
+        await transport.request("initialize", {}, timeout=10)
+        pending = asyncio.ensure_future(_call(transport, "sleep", timeout=10, seconds=5))
+        await asyncio.sleep(0.1)
+        with pytest.raises(JsonRpcError):
+            await _call(transport, "exit", timeout=10)
+        with pytest.raises(JsonRpcError):
+            await pending
+        assert not transport.is_running
+        # 连接关闭后新请求立即失败
+        with pytest.raises(JsonRpcError):
+            await transport.request("tools/list", timeout=10)
+    _run(scenario)
+
+
+def test_server_notifications_and_close_without_start():
+    received = []
+
+    async def scenario():
+        transport = StdioTransport("idle", on_notification=lambda method, params: received.append(method))
+        await transport.close()
+        with pytest.raises(JsonRpcError):
+            await transport.request("initialize")
+        await transport._dispatch({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+    asyncio.run(scenario())
+    assert received == ["notifications/tools/list_changed"]
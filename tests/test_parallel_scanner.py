@@ -0,0 +1,86 @@
+"""
+并行扫描引擎测试
+"""
+
+import os
+import re
+import time
+
+from src import parallel_scanner as parallel_scanner_module
+from src.parallel_scanner import ParallelScanner, search_file
+
+
+def _make_tree(root, count):
+    paths = []
+    for i in range(count):
+        directory = os.path.join(root, f"pkg{i % 7}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"mod{i:04d}.py")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# module {i}\n" + "value = 1\n" * (i % 5) + "target = True\n")
+        paths.append(path)
+    return sorted(paths)
+
+
+def test_search_returns_matches_in_file_order(tmp_path, monkeypatch, isolated_config):
+    isolated_config.update(scan_workers=8)
+    paths = _make_tree(str(tmp_path), 200)
+    expected = [line for path in paths for line in search_file(path, "target")]
+
+    # 让排在前面的文件更慢完成，完成顺序与文件顺序相反
+    def slow_first(path, pattern, flags=re.IGNORECASE):
+        index = paths.index(path)
+        if index < 8:
+            time.sleep(0.02 * (8 - index))
+        return search_file(path, pattern, flags)
+
+    monkeypatch.setattr(parallel_scanner_module, 'search_file', slow_first)
+    scanner = ParallelScanner()
+    try:
+        results = list(scanner.search("target", paths))
+    finally:
+        scanner.shutdown()
+
+    assert results == expected
+
+
+def test_search_early_stop_returns_same_prefix(tmp_path, isolated_config):
+    isolated_config.update(scan_workers=4)
+    paths = _make_tree(str(tmp_path), 300)
+    scanner = ParallelScanner()
+    try:
+        runs = []
+        for _ in range(3):
+            matches = scanner.search("target", paths)
+            first = []
+            for line in matches:
+                first.append(line)
+                if len(first) >= 20:
+                    break
+            matches.close()
+            runs.append(first)
+    finally:
+        scanner.shutdown()
+
+    assert runs[0] == runs[1] == runs[2]
+    assert runs[0] == [f"{path}:{path_lines}: target = True"
+                       for path, path_lines in ((p, int(os.path.basename(p)[3:7]) % 5 + 2) for p in paths[:20])]
+
+
+def test_map_files_ordered(tmp_path, isolated_config):
+    isolated_config.update(scan_workers=4)
+    scanner = ParallelScanner()
+    items = [str(i) for i in range(50)]
+
+    def work(item):
+        time.sleep(0.001 * (50 - int(item)) / 10)
+        return int(item) * 2
+
+    try:
+        results = list(scanner.map_files(work, items, ordered=True))
+        unordered = sorted(scanner.map_files(work, items), key=lambda pair: int(pair[0]))
+    finally:
+        scanner.shutdown()
+
+    assert results == [(item, int(item) * 2) for item in items]
+    assert unordered == results
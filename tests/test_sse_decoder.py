@@ -0,0 +1,96 @@
+"""
+SSE增量解码测试 - 任意字节切分下的解码结果应与整段解码一致
+"""
+
+import json
+import random
+
+import pytest
+
+from mock_openai_server import sse_chunks
+from src.sse_decoder import SSEDecoder, event_content
+
+TOKENS = ["你好", "，", "world", " 😀", "é", "\\n换行\n", "</path>", "ß€𝄞"]
+
+
+def _stream(line_ending=b"\n"):
+    data = b"".join(sse_chunks(TOKENS))
+    return data.replace(b"\n", line_ending)
+
+
+def _decode(pieces):
+    decoder = SSEDecoder()
+    events = []
+    for piece in pieces:
+        events.extend(decoder.feed(piece))
+    events.extend(decoder.close())
+    return "".join(event_content(event) for event in events), decoder.done
+
+
+def _split(data, cuts):
+    bounds = [0] + sorted(cuts) + [len(data)]
+    return [data[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("line_ending", [b"\n", b"\r\n"])
+def test_every_single_split_point(line_ending):
+    data = _stream(line_ending)
+    expected = "".join(TOKENS)
+    assert _decode([data]) == (expected, True)
+    for cut in range(len(data) + 1):
+        assert _decode(_split(data, [cut])) == (expected, True), cut
+
+
+@pytest.mark.parametrize("line_ending", [b"\n", b"\r\n"])
+def test_random_and_byte_by_byte_splits(line_ending):
+    data = _stream(line_ending)
+    expected = "".join(TOKENS)
+    rng = random.Random(14)
+    for _ in range(200):
+        cuts = rng.sample(range(1, len(data)), rng.randint(1, 40))
+        assert _decode(_split(data, cuts)) == (expected, True)
+    assert _decode([data[i:i + 1] for i in range(len(data))]) == (expected, True)
+
+
+def test_split_inside_multibyte_characters():
+    data = _stream()
+    # 每个多字节UTF-8字符内部的每个位置都切一次
+    cuts = [i for i in range(len(data)) if 0x80 <= data[i] < 0xC0]
+    assert len(cuts) >= 20
+    assert _decode(_split(data, cuts)) == ("".join(TOKENS), True)
+
+
+def test_split_between_cr_and_lf():
+    data = _stream(b"\r\n")
+    cuts = [i + 1 for i in range(len(data) - 1) if data[i:i + 2] == b"\r\n"]
+    assert len(cuts) == 2 * (len(TOKENS) + 1)
+    assert _decode(_split(data, cuts)) == ("".join(TOKENS), True)
+
+
+def test_done_stops_decoding():
+    decoder = SSEDecoder()
+    events = decoder.feed(b'data: {"choices":[{"delta":{"content":"a"}}]}\n\ndata: [DONE]\n\n'
+                          b'data: {"choices":[{"delta":{"content":"b"}}]}\n\n')
+    assert [event_content(event) for event in events] == ["a"]
+    assert decoder.done
+    assert decoder.feed(b'data: {"choices":[{"delta":{"content":"c"}}]}\n') == []
+    assert decoder.close() == []
+
+
+def test_close_parses_last_line_without_newline():
+    decoder = SSEDecoder()
+    payload = json.dumps({"choices": [{"delta": {"content": "末尾"}}]}, ensure_ascii=False)
+    assert decoder.feed(("data: " + payload).encode('utf-8')) == []
+    assert [event_content(event) for event in decoder.close()] == ["末尾"]
+    assert decoder.close() == []
+
+
+def test_ignores_comments_other_fields_and_bad_json():
+    decoder = SSEDecoder()
+    events = decoder.feed(b': keep-alive\r\nevent: message\r\nid: 1\r\n'
+                          b'data: {not json}\r\n'
+                          b'data:{"choices":[{"delta":{"content":"x"}}]}\r\n\r\n'
+                          b'data: {"choices":[],"usage":{"total_tokens":3}}\r\n')
+    assert [event_content(event) for event in events] == ["x", ""]
+    assert events[1]["usage"] == {"total_tokens": 3}
+    assert not decoder.done
@@ -0,0 +1,144 @@
+"""
+Python符号索引测试 - 增量刷新只重新解析变化的文件，notify_changed() 和跨实例加载
+"""
+
+import os
+
+import pytest
+
+import src.symbol_index as symbol_index
+from src.symbol_index import SymbolIndex, extract_symbols
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "proj"
+    _write(root / "base.py", "class Base:\n    def run(self):\n        return 1\n")
+    _write(root / "pkg" / "child.py", "from base import Base\n\n\nclass Child(Base):\n    pass\n")
+    _write(root / "util.py", "LIMIT = 10\n\n\ndef helper():\n    return LIMIT\n")
+    _write(root / ".hidden" / "skip.py", "def hidden():\n    pass\n")
+    return root
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """记录被重新解析的文件（相对路径的文件名）"""
+    calls = []
+
+    def counting(file_path):
+        calls.append(os.path.basename(file_path))
+        return extract_symbols(file_path)
+
+    monkeypatch.setattr(symbol_index, 'extract_symbols', counting)
+    return calls
+
+
+def _names(results):
+    return [(rel_path.replace(os.sep, '/'), definition[2]) for rel_path, definition in results]
+
+
+def test_first_refresh_parses_every_file(project, parsed):
+    index = SymbolIndex(str(project))
+    assert _names(index.find_definitions("Base")) == [("base.py", "Base")]
+    assert sorted(parsed) == ["base.py", "child.py", "util.py"]
+    assert _names(index.subclasses("Base")) == [("pkg/child.py", "Child")]
+    assert os.path.exists(index.index_file)
+
+
+def test_unchanged_files_not_reparsed(project, parsed):
+    index = SymbolIndex(str(project))
+    index.refresh()
+    parsed.clear()
+    index.find_definitions("helper")
+    index.find_references("LIMIT")
+    assert parsed == []
+
+
+def test_only_changed_file_reparsed(project, parsed):
+    index = SymbolIndex(str(project))
+    index.refresh()
+    parsed.clear()
+
+    _write(project / "util.py", "LIMIT = 10\n\n\ndef helper2():\n    return LIMIT\n")
+    _bump_mtime(str(project / "util.py"))
+    assert index.find_definitions("helper") == []
+    assert _names(index.find_definitions("helper2")) == [("util.py", "helper2")]
+    assert parsed == ["util.py"]
+    # 旧名称从倒排表中移除
+    assert "helper" not in index.defined
+
+
+def test_added_and_deleted_files(project, parsed):
+    index = SymbolIndex(str(project))
+    index.refresh()
+    parsed.clear()
+
+    _write(project / "pkg" / "extra.py", "from base import Base\n\n\nclass Extra(Base):\n    pass\n")
+    os.remove(str(project / "pkg" / "child.py"))
+    index.refresh()
+    assert parsed == ["extra.py"]
+    assert _names(index.subclasses("Base")) == [("pkg/extra.py", "Extra")]
+    assert index.find_definitions("Child") == []
+    # 导入语句和基类引用，已删除文件中的引用不再出现
+    assert [(os.path.basename(p), line) for p, line in index.find_references("Base")] == [("extra.py", 1),
+                                                                                          ("extra.py", 4)]
+
+
+def test_notify_changed_updates_single_file(project, parsed):
+    index = SymbolIndex(str(project))
+    # 索引尚未加载时忽略通知
+    index.notify_changed(str(project / "util.py"))
+    assert parsed == []
+    index.refresh()
+    parsed.clear()
+
+    path = _write(project / "util.py", "def renamed():\n    pass\n")
+    index.notify_changed(path)
+    assert parsed == ["util.py"]
+    assert "renamed" in index.defined and "helper" not in index.defined
+
+    os.remove(path)
+    index.notify_changed(path)
+    assert "renamed" not in index.defined
+    # 项目外或非Python文件不处理
+    index.notify_changed(str(project.parent / "outside.py"))
+    index.notify_changed(str(project / "notes.txt"))
+    assert parsed == ["util.py"]
+
+
+def test_saved_index_reused_by_new_instance(project, parsed):
+    SymbolIndex(str(project)).refresh()
+    parsed.clear()
+
+    reloaded = SymbolIndex(str(project))
+    assert _names(reloaded.find_definitions("Base.run")) == [("base.py", "Base.run")]
+    assert parsed == []
+
+
+def test_corrupt_index_rebuilt(project, parsed):
+    index = SymbolIndex(str(project))
+    os.makedirs(os.path.dirname(index.index_file))
+    with open(index.index_file, 'w', encoding='utf-8') as f:
+        f.write("{broken")
+    assert _names(index.find_definitions("helper")) == [("util.py", "helper")]
+    assert len(parsed) == 3
+
+
+def test_syntax_error_recorded_and_recovered(project):
+    index = SymbolIndex(str(project))
+    path = _write(project / "broken.py", "def oops(:\n")
+    assert "语法错误" in index.format_file_symbols(path)
+    _write(project / "broken.py", "def fixed():\n    pass\n")
+    _bump_mtime(path)
+    assert _names(index.find_definitions("fixed")) == [("broken.py", "fixed")]
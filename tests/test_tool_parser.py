@@ -0,0 +1,116 @@
+"""
+流式工具调用解析器测试 - 与原先的正则解析路径对比
+"""
+
+import random
+
+import pytest
+
+from bench_tool_parser import make_response, regex_parse
+from src.tool_parser import StreamingToolParser
+
+CASES = [
+    "",
+    "只有思考文本，没有工具调用",
+    "<read_file><path>a.py</path></read_file>",
+    "先读取 <read_file><path>a.py</path></read_file> 再搜索 <code_search><keyword>def \\w+</keyword></code_search> 结束",
+    "<read_file><path>big.py</path><cursor>120:4</cursor></read_file>",
+    "<write_file><path>x.py</path><content>print('<b>')\nif a < b:\n    pass\n</content></write_file>",
+    "<replace_code><path>x.py</path><start_line>3</start_line><end_line>5</end_line><content>  y = 1\n</content></replace_code>",
+    "<insert_code><path>x.py</path><line>1</line><content>import os</content></insert_code>",
+    "<update_todo><id>t1</id><status>completed</status></update_todo>",
+    "<update_todo><id>t1</id><status>in_progress</status><progress>40</progress></update_todo>",
+    "<add_todo><title>标题</title><description></description><priority>high</priority></add_todo>",
+    "<show_todos></show_todos><mcp_list_tools></mcp_list_tools><mcp_server_status></mcp_server_status>",
+    "<mcp_call_tool><tool>fetch</tool><arguments>{\"url\": \"http://x\"}</arguments></mcp_call_tool>",
+    "<plan><completed_action>a</completed_action><next_step>b</next_step>"
+    "<original_request>c</original_request><completed_tasks>d</completed_tasks></plan>",
+    "<task_complete><summary>多行\n总结</summary></task_complete>",
+    "<find_definition><symbol>A.run</symbol></find_definition><list_symbols><path>a.py</path></list_symbols>",
+    # 格式不完整的调用：结果同样与正则路径一致
+    "<read_file><path>a.py</read_file> 之后 <read_file><path>b.py</path></read_file>",
+    "<read_file><path>never closed",
+    "<write_file><path>a</path><content>unterminated <read_file><path>c.py</path></read_file>",
+    "<show_todos>不是空的</show_todos><show_todos></show_todos>",
+    "<read_file><read_file><path>a.py</path></read_file>",
+    "半个标签在结尾 <read_fi",
+    "中文路径 <read_file><path>文档/说明.md</path></read_file>\r\n完成",
+]
+
+
+def _parse_chunked(text, sizes):
+    parser = StreamingToolParser()
+    pos = 0
+    for size in sizes:
+        parser.feed(text[pos:pos + size])
+        pos += size
+    parser.feed(text[pos:])
+    parser.close()
+    return parser
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_matches_regex_path(text):
+    expected_calls, expected_thought = regex_parse(text)
+    parser = StreamingToolParser.parse(text)
+    assert parser.tool_calls == expected_calls
+    assert parser.thought_text == expected_thought
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_chunked_feed_matches_one_shot(text):
+    expected = StreamingToolParser.parse(text)
+    rng = random.Random(len(text))
+    for _ in range(30):
+        sizes = [rng.randint(1, 12) for _ in range(len(text))]
+        parser = _parse_chunked(text, sizes)
+        assert parser.tool_calls == expected.tool_calls
+        assert parser.thought_text == expected.thought_text
+    # 逐字符输入
+    parser = _parse_chunked(text, [1] * len(text))
+    assert parser.tool_calls == expected.tool_calls
+
+
+def test_large_response_matches_regex_path():
+    text = make_response(64)
+    expected_calls, expected_thought = regex_parse(text)
+    parser = _parse_chunked(text, [40] * (len(text) // 40))
+    assert parser.tool_calls == expected_calls
+    assert parser.thought_text == expected_thought
+    assert parser.source_length == len(text) and parser.is_closed
+
+
+def test_feed_returns_calls_as_they_complete():
+    parser = StreamingToolParser()
+    assert parser.feed("<read_file><path>a.py</pa") == []
+    completed = parser.feed("th></read_file> text")
+    assert [call['tool_name'] for call in completed] == ['read_file']
+    assert completed[0]['matches'] == [('a.py', None)]
+
+
+def test_tool_names_filter():
+    text = "<read_file><path>a</path></read_file><write_file><path>b</path><content>c</content></write_file>"
+    names = ('read_file', 'execute_command')
+    parser = StreamingToolParser.parse(text, names)
+    assert parser.tool_calls == regex_parse(text, names)[0]
+
+
+def test_tool_calls_inside_content_are_not_executed():
+    # 与正则路径唯一的区别：写入文件内容中的工具调用示例属于内容本身，不再被当作调用
+    text = ("<write_file><path>doc.md</path><content>示例: <read_file><path>b.py</path></read_file>"
+            "</content></write_file>")
+    regex_calls, _ = regex_parse(text)
+    parser = StreamingToolParser.parse(text)
+    assert [call['tool_name'] for call in regex_calls] == ['write_file', 'read_file']
+    assert parser.tool_calls == regex_calls[:1]
+
+
+def test_malformed_terminator_extends_like_regex():
+    # 第一个 </read_file> 之前没有 </path>，与非贪婪正则一样延伸到下一个结束标签
+    text = "<read_file><path>a.py</read_file> 之后 <read_file><path>b.py</path></read_file>"
+    parser = StreamingToolParser()
+    assert parser.feed(text[:30]) == []
+    parser.feed(text[30:])
+    parser.close()
+    assert parser.tool_calls == regex_parse(text)[0]
+    assert parser.tool_calls[0]['matches'] == [('a.py</read_file> 之后 <read_file><path>b.py', None)]
@@ -0,0 +1,95 @@
+"""
+工具依赖图测试 - 按路径、目录子树和共享资源判断哪些调用必须等待前面的调用
+"""
+
+from src.mcp_client import mcp_client
+from src.tool_parser import StreamingToolParser
+from src.tool_scheduler import ToolEffect, WRITE, build_tool_graph, register_tool_effect, TOOL_EFFECTS
+
+
+def _deps(text):
+    return [node.deps for node in build_tool_graph(StreamingToolParser.parse(text).tool_calls)]
+
+
+def _read(path):
+    return f"<read_file><path>{path}</path></read_file>"
+
+
+def _write(path):
+    return f"<write_file><path>{path}</path><content>x</content></write_file>"
+
+
+def _calls(*calls):
+    """直接构造解析结果，用于解析器不提供的参数（如搜索目录）"""
+    return [node.deps for node in build_tool_graph(
+        [{"tool_name": name, "matches": [tuple(args) if args else None]} for name, *args in calls])]
+
+
+def test_reads_are_independent():
+    assert _deps(_read("a.py") + _read("b.py") + _read("a.py")) == [[], [], []]
+
+
+def test_write_orders_reads_and_writes_of_same_file():
+    text = _read("a.py") + _write("a.py") + _read("a.py") + _write("b.py") + _write("./a.py")
+    # 依赖列出前面所有冲突的调用；不同写法的同一路径视为同一文件
+    assert _deps(text) == [[], [0], [1], [], [0, 1, 2]]
+
+
+def test_tree_scope_covers_files_below_it():
+    deps = _calls(("write_file", "pkg/a.py", "x"), ("code_search", "foo", "pkg"), ("code_search", "foo", "other"),
+                  ("write_file", "pkg/sub/b.py", "x"), ("read_file", "pkg/a.py"))
+    # 搜索 pkg 依赖前面对 pkg/a.py 的写入；写 pkg/sub/b.py 要等搜索 pkg 结束
+    assert deps == [[], [0], [], [1], [0]]
+
+
+def test_sibling_prefix_is_not_inside_tree():
+    assert _calls(("write_file", "pkg2/a.py", "x"), ("code_search", "foo", "pkg")) == [[], []]
+
+
+def test_search_without_directory_covers_current_directory():
+    # 解析器给出的 code_search 只有关键字，按整个当前目录处理
+    text = _write("pkg/a.py") + "<code_search><keyword>foo</keyword></code_search>" + _write("b.py")
+    assert _deps(text) == [[], [0], [1]]
+
+
+def test_todo_resource():
+    text = ("<show_todos></show_todos><show_todos></show_todos>"
+            "<add_todo><title>t</title><description></description><priority>high</priority></add_todo>"
+            "<update_todo><id>t1</id><status>completed</status></update_todo>" + _read("a.py"))
+    assert _deps(text) == [[], [], [0, 1], [0, 1, 2], []]
+
+
+def test_barrier_depends_on_everything():
+    text = (_read("a.py") + "<execute_command><command>ls</command></execute_command>" + _read("b.py")
+            + "<task_complete><summary>完成</summary></task_complete>")
+    assert _deps(text) == [[], [0], [1], [0, 1, 2]]
+
+
+def test_unknown_tool_is_barrier():
+    nodes = build_tool_graph([{"tool_name": "read_file", "matches": [("a.py",)]},
+                              {"tool_name": "no_such_tool", "matches": [None]},
+                              {"tool_name": "read_file", "matches": [("b.py",)]}])
+    assert nodes[1].is_barrier
+    assert [node.deps for node in nodes] == [[], [0], [1]]
+
+
+def _mcp_call(tool):
+    return f"<mcp_call_tool><tool>{tool}</tool><arguments>{{}}</arguments></mcp_call_tool>"
+
+
+def test_mcp_calls_serialized_per_server(monkeypatch):
+    servers = {"fetch": "web", "search": "web", "query": "db"}
+    monkeypatch.setattr(mcp_client, "server_for_tool", servers.get)
+    text = (_mcp_call("fetch") + _mcp_call("query") + _mcp_call("search")
+            + "<mcp_list_tools></mcp_list_tools>" + _mcp_call("unknown") + _mcp_call("query"))
+    # 不同服务器并发，同一服务器按顺序；列工具读取整个 MCP 状态；未知服务器占用整个 MCP
+    assert _deps(text) == [[], [], [0], [0, 1, 2], [0, 1, 2, 3], [1, 3, 4]]
+
+
+def test_registered_effect_takes_part_in_scheduling(monkeypatch):
+    monkeypatch.setitem(TOOL_EFFECTS, "custom_writer", TOOL_EFFECTS["read_file"])
+    register_tool_effect("custom_writer", ToolEffect(WRITE, 0))
+    nodes = build_tool_graph([{"tool_name": "read_file", "matches": [("a.py",)]},
+                              {"tool_name": "custom_writer", "matches": [("a.py",)]}])
+    assert [node.deps for node in nodes] == [[], [0]]
+
@@ -18,7 +18,7 @@ from datetime import datetime
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.config import load_config, save_config
+from src.config import config_store, load_config, save_config
 from src.ai_client import ai_client
 from src.todo_manager import todo_manager
 from src.commands import get_available_commands, get_command_descriptions
@@ -63,7 +63,7 @@ def index():
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """获取配置信息"""
-    config = load_config()
+    config = config_store.snapshot()
     # 隐藏敏感信息
     safe_config = {
         'language': config.get('language', 'zh-CN'),
@@ -191,8 +191,7 @@ def chat():
             return jsonify({'success': False, 'message': '消息不能为空'})
         
         # 检查API密钥
-        config = load_config()
-        if not config.get('api_key'):
+        if not config_store.get_str('api_key'):
             return jsonify({'success': False, 'message': '请先设置API密钥'})
         
         # 创建或获取会话
@@ -313,8 +312,7 @@ def handle_ai_message(data):
             return
         
         # 检查API密钥
-        config = load_config()
-        if not config.get('api_key'):
+        if not config_store.get_str('api_key'):
             emit('ai_error', {'message': '请先设置API密钥'})
             return
         